@@ -0,0 +1,55 @@
+"""
+Compare the fast signer with the generic pycoin solver on P2WPKH transactions.
+
+Usage: python scripts/benchmarks/btc_signing.py [input_count ...]
+"""
+import sys
+import time
+
+from tilapia.lib.provider import data
+from tilapia.lib.provider.chains.btc.sdk import network, transaction
+from tilapia.lib.secret import data as secret_data
+from tilapia.lib.secret import manager as secret_manager
+
+
+def _build_unsigned_tx(btc_network, signer, input_count: int) -> data.UnsignedTx:
+    pubkey_hash = btc_network.keys.public(signer.get_pubkey(compressed=True)).hash160(is_compressed=True)
+    address = btc_network.address.for_p2pkh_wit(pubkey_hash)
+    inputs = [
+        data.TransactionInput(address=address, value=10000, utxo=data.UTXO(txid=f"{i + 1:064x}", vout=0, value=10000))
+        for i in range(input_count)
+    ]
+    outputs = [data.TransactionOutput(address=address, value=10000 * input_count - 1000)]
+    return data.UnsignedTx(inputs=inputs, outputs=outputs, fee_price_per_unit=1, fee_limit=1000)
+
+
+def _timeit(fn) -> float:
+    started_at = time.perf_counter()
+    fn()
+    return time.perf_counter() - started_at
+
+
+def main(input_counts):
+    btc_network = network.get_network_by_chain_code("btc")
+    signer = secret_manager.raw_create_key_by_prvkey(secret_data.CurveEnum.SECP256K1, bytes(31) + b"\x01")
+
+    print(f"{'inputs':>8} {'pycoin(s)':>12} {'fast(s)':>12} {'speedup':>8}")
+    for input_count in input_counts:
+        unsigned_tx = _build_unsigned_tx(btc_network, signer, input_count)
+        pycoin_tx = transaction.create_pycoin_tx(btc_network, unsigned_tx, transaction.TX_VERSION, 80)
+        fast_tx = transaction.create_pycoin_tx(btc_network, unsigned_tx, transaction.TX_VERSION, 80)
+
+        pycoin_cost = _timeit(
+            lambda: pycoin_tx.sign(
+                hash160_lookup=transaction.build_hash160_lookup(btc_network, [signer]),
+                p2sh_lookup=transaction.build_p2sh_lookup(btc_network, [signer]),
+            )
+        )
+        fast_cost = _timeit(lambda: transaction.fast_sign_tx(btc_network, fast_tx, [signer]))
+        assert pycoin_tx.as_hex() == fast_tx.as_hex()
+
+        print(f"{input_count:>8} {pycoin_cost:>12.4f} {fast_cost:>12.4f} {pycoin_cost / fast_cost:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [1, 10, 100, 500])
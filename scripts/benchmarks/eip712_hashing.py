@@ -0,0 +1,118 @@
+"""
+Compare EIP712 hashing with a cold plan (compiled on every message, same as before the plan cache),
+a warm plan, and the eth_account reference implementation, on permit and order payloads.
+
+Usage: python scripts/benchmarks/eip712_hashing.py [rounds]
+"""
+import json
+import sys
+import time
+
+from eth_account.messages import _hash_eip191_message, encode_structured_data
+
+from tilapia.lib.provider.chains.eth.sdk import message as message_sdk
+
+_DOMAIN_TYPE = [
+    {"name": "name", "type": "string"},
+    {"name": "version", "type": "string"},
+    {"name": "chainId", "type": "uint256"},
+    {"name": "verifyingContract", "type": "address"},
+]
+_DOMAIN = {
+    "name": "Benchmark",
+    "version": "1",
+    "chainId": 1,
+    "verifyingContract": "0xCcCCccccCCCCcCCCCCCcCcCccCcCCCcCcccccccC",
+}
+
+PERMIT = {
+    "types": {
+        "EIP712Domain": _DOMAIN_TYPE,
+        "Permit": [
+            {"name": "owner", "type": "address"},
+            {"name": "spender", "type": "address"},
+            {"name": "value", "type": "uint256"},
+            {"name": "nonce", "type": "uint256"},
+            {"name": "deadline", "type": "uint256"},
+        ],
+    },
+    "primaryType": "Permit",
+    "domain": _DOMAIN,
+    "message": {
+        "owner": "0xCD2a3d9F938E13CD947Ec05AbC7FE734Df8DD826",
+        "spender": "0xbBbBBBBbbBBBbbbBbbBbbbbBBbBbbbbBbBbbBBbB",
+        "value": 10**18,
+        "nonce": 0,
+        "deadline": 1700000000,
+    },
+}
+
+ORDER = {
+    "types": {
+        "EIP712Domain": _DOMAIN_TYPE,
+        "Asset": [
+            {"name": "token", "type": "address"},
+            {"name": "amount", "type": "uint256"},
+        ],
+        "Order": [
+            {"name": "maker", "type": "address"},
+            {"name": "taker", "type": "address"},
+            {"name": "offer", "type": "Asset[]"},
+            {"name": "consideration", "type": "Asset[]"},
+            {"name": "salt", "type": "uint256"},
+            {"name": "expiry", "type": "uint256"},
+            {"name": "memo", "type": "string"},
+        ],
+    },
+    "primaryType": "Order",
+    "domain": _DOMAIN,
+    "message": {
+        "maker": "0xCD2a3d9F938E13CD947Ec05AbC7FE734Df8DD826",
+        "taker": "0xbBbBBBBbbBBBbbbBbbBbbbbBBbBbbbbBbBbbBBbB",
+        "offer": [{"token": "0xDeaDbeefdEAdbeefdEadbEEFdeadbeEFdEaDbeeF", "amount": 1000 + i} for i in range(4)],
+        "consideration": [{"token": "0xB0BdaBea57B0BDABeA57b0bdABEA57b0BDabEa57", "amount": 2000}],
+        "salt": 42,
+        "expiry": 1700000000,
+        "memo": "benchmark",
+    },
+}
+
+
+def _timeit(fn, rounds: int) -> float:
+    started_at = time.perf_counter()
+    for i in range(rounds):
+        fn(i)
+    return time.perf_counter() - started_at
+
+
+def _messages(payload: dict, rounds: int):
+    messages = []
+    for i in range(rounds):
+        data = json.loads(json.dumps(payload))
+        data["message"]["expiry" if "expiry" in data["message"] else "nonce"] = i
+        messages.append(json.dumps(data))
+
+    return messages
+
+
+def _hash_with_cold_plan(message: str) -> bytes:
+    message_sdk._EIP712_PLANS.clear()
+    return message_sdk.hash_message(message)
+
+
+def main(rounds: int):
+    print(f"{'payload':>8} {'reference(s)':>14} {'cold plan(s)':>14} {'warm plan(s)':>14} {'speedup':>8}")
+    for name, payload in (("permit", PERMIT), ("order", ORDER)):
+        messages = _messages(payload, rounds)
+        if name == "permit":  # eth_account 0.5.x hashes arrays of structs differently from metamask
+            for message in messages[:3]:
+                assert message_sdk.hash_message(message) == _hash_eip191_message(encode_structured_data(text=message))
+
+        reference_cost = _timeit(lambda i: _hash_eip191_message(encode_structured_data(text=messages[i])), rounds)
+        cold_cost = _timeit(lambda i: _hash_with_cold_plan(messages[i]), rounds)
+        warm_cost = _timeit(lambda i: message_sdk.hash_message(messages[i]), rounds)
+        print(f"{name:>8} {reference_cost:>14.4f} {cold_cost:>14.4f} {warm_cost:>14.4f} {cold_cost / warm_cost:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,101 @@
+"""
+Resolve the utxo ids of (txid, vout) tuples, compare the OR chains in chunks of 10 which were used before,
+the row values of basic.orm.lookup, and the join with a temporary table of the tuples.
+
+Usage: python scripts/benchmarks/orm_lookup.py [tuple_count ...]
+"""
+import functools
+import random
+import sys
+import time
+
+import peewee
+
+from tilapia.lib.basic.orm import bulk, lookup
+from tilapia.lib.basic.orm.database import SqliteDatabase
+from tilapia.lib.utxo import daos, models
+
+UTXO_COUNT = 100000
+
+
+def _create_utxos(rng: random.Random) -> list:
+    utxos = [
+        daos.new_utxo("btc", "btc", f"address{rng.randint(0, 99)}", f"{i:064x}", rng.randint(0, 3), 0, 1000)
+        for i in range(UTXO_COUNT)
+    ]
+    daos.bulk_create_utxos(utxos)
+    return [(i.txid, i.vout) for i in utxos]
+
+
+def _by_or_chains(tuples: list) -> list:
+    res = []
+    for batch in peewee.chunked(tuples, 10):
+        expression = functools.reduce(
+            lambda a, b: a | b, ((models.UTXO.txid == txid) & (models.UTXO.vout == vout) for txid, vout in batch)
+        )
+        query = models.UTXO.select(models.UTXO.id).where(models.UTXO.chain_code == "btc", expression).tuples()
+        res.extend(i[0] for i in query)
+
+    return res
+
+
+def _by_row_values(tuples: list) -> list:
+    return daos.query_utxo_ids_by_txid_vout_tuples("btc", tuples)
+
+
+def _by_temp_table(database: SqliteDatabase, tuples: list) -> list:
+    with database.atomic():
+        database.execute_sql("CREATE TEMP TABLE IF NOT EXISTS outpoint (txid TEXT, vout INTEGER)")
+        database.execute_sql("DELETE FROM outpoint")
+        for batch in peewee.chunked(tuples, bulk.MAX_ROWS_PER_STATEMENT):
+            database.execute_sql(
+                f"INSERT INTO outpoint VALUES {', '.join(['(?, ?)'] * len(batch))}", [j for i in batch for j in i]
+            )
+
+        cursor = database.execute_sql(
+            "SELECT utxo.id FROM outpoint JOIN utxo "
+            "ON utxo.chain_code = ? AND utxo.txid = outpoint.txid AND utxo.vout = outpoint.vout",
+            ["btc"],
+        )
+        return [i[0] for i in cursor]
+
+
+def _measure(func, tuples: list):
+    started_at = time.perf_counter()
+    ids = func(tuples)
+    return len(ids), time.perf_counter() - started_at
+
+
+def main(tuple_counts):
+    rng = random.Random(0)
+    database = SqliteDatabase(":memory:")
+
+    with database.bind_ctx((models.UTXO,)):
+        database.create_tables((models.UTXO,))
+        outpoints = _create_utxos(rng)
+        database.execute_sql("ANALYZE")
+
+        print(f"row values supported: {lookup.ROW_VALUES_SUPPORTED}, utxos: {UTXO_COUNT}")
+        print(f"{'tuples':>7} {'method':>11} {'statements':>10} {'found':>7} {'ms':>10}")
+        for tuple_count in tuple_counts:
+            tuples = rng.sample(outpoints, tuple_count)
+            statements = {
+                "or_chains": -(-tuple_count // 10),
+                "row_values": -(-tuple_count // lookup.batch_size_of_keys(2, reserved_variables=1)),
+                "temp_table": 3 + -(-tuple_count // bulk.MAX_ROWS_PER_STATEMENT),
+            }
+            methods = (
+                ("or_chains", _by_or_chains),
+                ("row_values", _by_row_values),
+                ("temp_table", functools.partial(_by_temp_table, database)),
+            )
+
+            for name, func in methods:
+                found, seconds = _measure(func, tuples)
+                print(f"{tuple_count:>7} {name:>11} {statements[name]:>10} {found:>7} {seconds * 1000:>10.2f}")
+
+    database.close()
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [10, 1000, 50000])
@@ -0,0 +1,113 @@
+"""
+Replay random payment streams against a P2WPKH wallet, compare the fees paid by the sliding window chooser
+with the ones by the waste-aware coin selection, the changes are put back to the wallet as new utxos.
+The total includes the future fee to spend the remaining utxos at the long term fee rate.
+
+Usage: python scripts/benchmarks/utxo_selection.py [utxo_count ...]
+"""
+import random
+import sys
+import time
+
+from tilapia.lib.provider.chains.btc.sdk import transaction
+from tilapia.lib.utxo import selection, utxo_chooser
+
+ENCODING = "P2WPKH"
+DUST_THRESHOLD = 546
+LONG_TERM_FEE_RATE = 10
+PAYMENTS = 300
+
+
+def _make_stream(seed: int, utxo_count: int):
+    rng = random.Random(seed)
+    utxos = [int(rng.lognormvariate(12, 1.5)) + DUST_THRESHOLD for _ in range(utxo_count)]
+    payments = [
+        (int(rng.lognormvariate(13, 1.2)), max(1, int(rng.gauss(LONG_TERM_FEE_RATE, 8)))) for _ in range(PAYMENTS)
+    ]
+    return utxos, payments
+
+
+def _fee_of(input_count: int, has_change: bool, fee_rate: int) -> int:
+    outputs = [ENCODING, ENCODING] if has_change else [ENCODING]
+    return transaction.calculate_vsize([ENCODING] * input_count, outputs) * fee_rate
+
+
+def _choose_by_window(utxos: list, amount: int, fee_rate: int) -> list:
+    # Likes utxo.manager.choose_utxos, then re-choose with the fee of the chosen inputs until covered
+    require_value = amount + _fee_of(1, True, fee_rate)
+    for _ in range(5):
+        larger = [i for i in utxos if i >= require_value]
+        if larger:
+            chosen = [min(larger)]
+        else:
+            chosen = utxo_chooser.choose([i for i in utxos if i < require_value], require_value)
+
+        fee = _fee_of(len(chosen), True, fee_rate)
+        if sum(chosen) >= amount + fee:
+            return chosen
+
+        require_value = amount + fee
+
+    return []
+
+
+def _choose_by_selection(utxos: list, amount: int, fee_rate: int, rng: random.Random) -> list:
+    params = selection.SelectionParams.for_btc(ENCODING, [ENCODING], fee_rate, LONG_TERM_FEE_RATE, DUST_THRESHOLD)
+    result = selection.select_coins(utxos, [selection.input_vsize_of(ENCODING)] * len(utxos), amount, params, rng=rng)
+    return [utxos[i] for i in result.indexes] if result else []
+
+
+def _replay(utxos: list, payments: list, choose) -> dict:
+    utxos = list(utxos)
+    stats = dict(fees=0, inputs=0, changeless=0, failed=0, seconds=0.0)
+
+    for amount, fee_rate in payments:
+        started_at = time.perf_counter()
+        chosen = choose(utxos, amount, fee_rate)
+        stats["seconds"] += time.perf_counter() - started_at
+
+        if not chosen:
+            stats["failed"] += 1
+            continue
+
+        change = sum(chosen) - amount - _fee_of(len(chosen), True, fee_rate)
+        if change < DUST_THRESHOLD:
+            change = 0
+            stats["changeless"] += 1
+
+        stats["fees"] += sum(chosen) - amount - change
+        stats["inputs"] += len(chosen)
+        for value in chosen:
+            utxos.remove(value)
+        if change:
+            utxos.append(change)
+
+    stats["remaining"] = len(utxos)
+    stats["total"] = stats["fees"] + len(utxos) * selection.input_vsize_of(ENCODING) * LONG_TERM_FEE_RATE
+    return stats
+
+
+def main(utxo_counts):
+    print(
+        f"{'utxos':>7} {'chooser':>10} {'fees(sat)':>12} {'inputs':>8} {'changeless':>10} "
+        f"{'failed':>7} {'remaining':>9} {'total(sat)':>12} {'ms/select':>10}"
+    )
+    for utxo_count in utxo_counts:
+        utxos, payments = _make_stream(utxo_count, utxo_count)
+        rng = random.Random(utxo_count)
+        choosers = (
+            ("window", _choose_by_window),
+            ("selection", lambda *args: _choose_by_selection(*args, rng=rng)),
+        )
+
+        for name, choose in choosers:
+            stats = _replay(utxos, payments, choose)
+            print(
+                f"{utxo_count:>7} {name:>10} {stats['fees']:>12} {stats['inputs']:>8} {stats['changeless']:>10} "
+                f"{stats['failed']:>7} {stats['remaining']:>9} {stats['total']:>12} "
+                f"{stats['seconds'] * 1000 / len(payments):>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [100, 1000, 10000])
@@ -0,0 +1,93 @@
+import datetime
+from unittest import TestCase
+from unittest.mock import patch
+
+import peewee
+
+from tilapia.lib.basic.orm import bulk, test_utils
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+
+
+class _Item(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    key = peewee.CharField()
+    sub_key = peewee.IntegerField()
+    value = peewee.IntegerField()
+    created_time = AutoDateTimeField()
+
+    class Meta:
+        indexes = ((("key", "sub_key"), True),)
+
+
+@test_utils.cls_test_database(_Item)
+class TestBulk(TestCase):
+    def test_batch_size_of(self):
+        self.assertEqual(199, bulk.batch_size_of(_Item, max_variables=999))
+        self.assertEqual(333, bulk.batch_size_of(_Item, columns_count=3, max_variables=999))
+        self.assertEqual(1, bulk.batch_size_of(_Item, columns_count=2000, max_variables=999))
+
+    def test_unique_key_of(self):
+        self.assertEqual([_Item.key, _Item.sub_key], bulk.unique_key_of(_Item))
+
+    def test_bulk_insert(self):
+        database = _Item._meta.database
+        with patch.object(database, "execute_sql", wraps=database.execute_sql) as fake_execute_sql:
+            result = bulk.bulk_insert(_Item, (dict(key="a", sub_key=i, value=i) for i in range(1000)), batch_size=300)
+
+        self.assertEqual(1000, result.rows)
+        self.assertGreater(result.rows_per_second, 0)
+        inserts = [i[0][0] for i in fake_execute_sql.call_args_list if i[0][0].startswith("INSERT")]
+        self.assertEqual(4, len(inserts))
+        self.assertEqual(300 * 4, inserts[0].count("?"))
+        self.assertEqual(100 * 4, inserts[-1].count("?"))
+        self.assertEqual(1000, _Item.select().count())
+
+        with self.subTest("Insert model instances"):
+            bulk.bulk_insert(_Item, [_Item(key="b", sub_key=0, value=0), _Item(key="b", sub_key=1, value=1)])
+            self.assertEqual(1002, _Item.select().count())
+
+        with self.subTest("Rows with different columns"):
+            created_time = datetime.datetime(2021, 1, 1)
+            bulk.bulk_insert(
+                _Item,
+                [
+                    dict(key="c", sub_key=0, value=0),
+                    dict(key="c", sub_key=1, value=1, id=5000, created_time=created_time),
+                ],
+            )
+            item = _Item.get(key="c", sub_key=1)
+            self.assertEqual((5000, created_time), (item.id, item.created_time))
+            self.assertNotEqual(created_time, _Item.get(key="c", sub_key=0).created_time)  # Filled by the default
+            _Item.delete().where(_Item.key == "c").execute()
+
+        with self.subTest("Conflict"):
+            with self.assertRaises(peewee.IntegrityError):
+                bulk.bulk_insert(_Item, [dict(key="b", sub_key=2, value=2), dict(key="b", sub_key=1, value=-1)])
+            self.assertEqual(1002, _Item.select().count())  # Rolled back as a whole
+
+        with self.subTest("Ignore conflicts"):
+            bulk.bulk_insert(
+                _Item, [dict(key="b", sub_key=1, value=-1), dict(key="b", sub_key=2, value=2)], ignore_conflicts=True
+            )
+            self.assertEqual(
+                [(0, 0), (1, 1), (2, 2)],
+                list(_Item.select(_Item.sub_key, _Item.value).where(_Item.key == "b").tuples()),
+            )
+
+        with self.subTest("Upsert"):
+            bulk.bulk_insert(
+                _Item, [dict(key="b", sub_key=1, value=10), dict(key="b", sub_key=3, value=30)], preserve=[_Item.value]
+            )
+            self.assertEqual(
+                [(0, 0), (1, 10), (2, 2), (3, 30)],
+                list(_Item.select(_Item.sub_key, _Item.value).where(_Item.key == "b").tuples()),
+            )
+
+    def test_bulk_update(self):
+        bulk.bulk_insert(_Item, (dict(key="a", sub_key=i, value=i) for i in range(500)))
+        items = list(_Item.select())
+        for i in items:
+            i.value *= 2
+
+        self.assertEqual(500, bulk.bulk_update(_Item, items, [_Item.value]).rows)
+        self.assertEqual(sum(range(500)) * 2, _Item.select(peewee.fn.SUM(_Item.value)).scalar())
@@ -0,0 +1,62 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from tilapia.lib.basic.orm.database import SqliteDatabase
+
+
+class TestSqliteDatabase(TestCase):
+    def setUp(self) -> None:
+        self.database = SqliteDatabase(":memory:")
+
+    def tearDown(self) -> None:
+        self.database.close()
+
+    def test_on_commit__not_in_transaction(self):
+        callback = Mock()
+        self.database.on_commit(callback)
+        callback.assert_called_once()
+
+    def test_on_commit(self):
+        callback_a, callback_b = Mock(), Mock()
+
+        with self.database.atomic():
+            self.database.on_commit(callback_a)
+            with self.database.atomic():
+                self.database.on_commit(callback_b)
+
+            callback_a.assert_not_called()
+            callback_b.assert_not_called()
+
+        callback_a.assert_called_once()
+        callback_b.assert_called_once()
+
+    def test_on_commit__rolled_back(self):
+        callback_a, callback_b = Mock(), Mock()
+
+        with self.assertRaises(ValueError):
+            with self.database.atomic():
+                self.database.on_commit(callback_a)
+                raise ValueError()
+
+        callback_a.assert_not_called()
+
+        with self.database.atomic():
+            self.database.on_commit(callback_a)
+            try:
+                with self.database.atomic():
+                    self.database.on_commit(callback_b)
+                    raise ValueError()
+            except ValueError:
+                pass
+
+        callback_a.assert_called_once()
+        callback_b.assert_not_called()
+
+    def test_on_commit__error_in_callback(self):
+        callback = Mock()
+
+        with self.database.atomic():
+            self.database.on_commit(Mock(side_effect=ValueError()))
+            self.database.on_commit(callback)
+
+        callback.assert_called_once()
@@ -0,0 +1,59 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import peewee
+
+from tilapia.lib.basic.orm import bulk, lookup, test_utils
+from tilapia.lib.basic.orm.models import BaseModel
+
+
+class _Item(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    key = peewee.CharField()
+    sub_key = peewee.IntegerField()
+    value = peewee.IntegerField()
+
+
+@test_utils.cls_test_database(_Item)
+class TestLookup(TestCase):
+    def setUp(self) -> None:
+        bulk.bulk_insert(_Item, (dict(key=f"k{i % 10}", sub_key=i // 10, value=i) for i in range(1000)))
+
+    def test_batch_size_of_keys(self):
+        self.assertEqual(499, lookup.batch_size_of_keys(2, max_variables=999))
+        self.assertEqual(498, lookup.batch_size_of_keys(2, reserved_variables=3, max_variables=999))
+        self.assertEqual(1, lookup.batch_size_of_keys(2000, max_variables=999))
+
+    def test_select_by_keys(self):
+        query = _Item.select(_Item.value).where(_Item.value < 500).tuples()
+        keys = [("k1", 3), ("k2", 30), ("k3", 60), ("k1", 3), ("k4", 100)]
+
+        self.assertEqual(
+            [31, 302], sorted(i[0] for i in lookup.select_by_keys(query, [_Item.key, _Item.sub_key], keys))
+        )
+        self.assertEqual([], list(lookup.select_by_keys(query, [_Item.key, _Item.sub_key], [])))
+
+        with self.subTest("Single column"):
+            self.assertEqual([2, 4], sorted(i[0] for i in lookup.select_by_keys(query, [_Item.id], [3, 5, 3, 600])))
+
+        with self.subTest("In batches"):
+            keys = [(f"k{i % 10}", i // 10) for i in range(0, 1000, 3)]
+            database = _Item._meta.database
+            with patch.object(database, "execute_sql", wraps=database.execute_sql) as fake_execute_sql:
+                values = [i[0] for i in lookup.select_by_keys(query, [_Item.key, _Item.sub_key], keys, batch_size=100)]
+
+            self.assertEqual(list(range(0, 500, 3)), sorted(values))
+            self.assertEqual(4, fake_execute_sql.call_count)
+
+        with self.subTest("Without row values"), patch.object(lookup, "ROW_VALUES_SUPPORTED", False):
+            values = [i[0] for i in lookup.select_by_keys(query, [_Item.key, _Item.sub_key], keys)]
+            self.assertEqual(list(range(0, 500, 3)), sorted(values))
+
+    def test_execute_by_keys(self):
+        query = _Item.update(value=-1).where(_Item.key == "k1")
+        self.assertEqual(2, lookup.execute_by_keys(query, [_Item.sub_key], [0, 1, 1, 200], batch_size=1))
+        self.assertEqual([-1, -1, 21], [i.value for i in _Item.select().where(_Item.key == "k1").limit(3)])
+
+        query = _Item.delete().where(_Item.value < 500)
+        self.assertEqual(2, lookup.execute_by_keys(query, [_Item.key, _Item.sub_key], [("k1", 0), ("k2", 0)]))
+        self.assertEqual(998, _Item.select().count())
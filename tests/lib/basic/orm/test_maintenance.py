@@ -0,0 +1,66 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from tilapia.lib.basic.orm import maintenance
+from tilapia.lib.basic.orm.database import SqliteDatabase
+
+
+class TestMaintenance(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _create_database(self, auto_vacuum: str) -> SqliteDatabase:
+        database = SqliteDatabase(
+            os.path.join(self.tmp_dir.name, f"{auto_vacuum}.sqlite"), pragmas={"auto_vacuum": auto_vacuum}
+        )
+        database.execute_sql("CREATE TABLE item (value TEXT)")
+        database.execute_sql("CREATE INDEX item_value ON item (value)")
+        database.execute_sql(
+            "WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < 2000) "
+            "INSERT INTO item SELECT hex(randomblob(500)) FROM seq"
+        )
+        database.execute_sql("DELETE FROM item")
+        self.addCleanup(database.close)
+        return database
+
+    def test_analyze(self):
+        database = self._create_database("incremental")
+        self.assertEqual({"statement": "analyze"}, maintenance.analyze(database))
+        self.assertTrue(database.table_exists("sqlite_stat1"))
+        self.assertEqual({"statement": "optimize"}, maintenance.analyze(database))
+
+    def test_incremental_vacuum(self):
+        database = self._create_database("incremental")
+        freelist_count = database.execute_sql("PRAGMA freelist_count").fetchone()[0]
+        self.assertGreater(freelist_count, 1000)
+
+        receipt = maintenance.incremental_vacuum(database, pages_per_step=100, max_steps=1)
+        self.assertEqual((100, 1), (receipt["reclaimed_pages"], receipt["steps"]))
+
+        receipt = maintenance.incremental_vacuum(database, pages_per_step=100, max_steps=2)
+        self.assertEqual(
+            {
+                "auto_vacuum": "incremental",
+                "page_size": 4096,
+                "freelist_pages": freelist_count - 300,
+                "reclaimed_pages": 200,
+                "steps": 2,
+            },
+            receipt,
+        )
+
+        receipt = maintenance.incremental_vacuum(database, pages_per_step=1000, max_steps=100)
+        self.assertEqual((0, freelist_count - 300), (receipt["freelist_pages"], receipt["reclaimed_pages"]))
+
+    def test_incremental_vacuum__not_enabled(self):
+        database = self._create_database("none")
+        receipt = maintenance.incremental_vacuum(database, pages_per_step=100, max_steps=3)
+        self.assertEqual(("none", 0, 0), (receipt["auto_vacuum"], receipt["reclaimed_pages"], receipt["steps"]))
+
+        receipt = maintenance.enable_incremental_vacuum(database)
+        self.assertEqual("incremental", receipt["auto_vacuum"])
+        self.assertEqual(0, database.execute_sql("PRAGMA freelist_count").fetchone()[0])  # Freed by VACUUM
@@ -0,0 +1,55 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from tilapia.lib.basic.orm import test_utils
+from tilapia.lib.maintenance import manager
+from tilapia.lib.throttle import models as throttle_models
+
+
+@test_utils.cls_test_database(throttle_models.Throttle)
+class TestMaintenanceManager(TestCase):
+    @patch("tilapia.lib.maintenance.manager._steps")
+    def test_run_maintenance(self, fake_steps):
+        step_a, step_b = Mock(return_value=3), Mock(side_effect=IOError("disk"))
+        fake_steps.return_value = [("step_a", step_a), ("step_b", step_b), ("step_c", Mock(return_value={"x": 1}))]
+
+        report = manager.run_maintenance()
+        self.assertEqual(["step_a", "step_b", "step_c"], list(report))
+        self.assertEqual(3, report["step_a"]["receipt"])
+        self.assertEqual("OSError('disk')", report["step_b"]["error"])  # The others go on
+        self.assertEqual({"x": 1}, report["step_c"]["receipt"])
+        self.assertTrue(all(i["seconds"] >= 0 for i in report.values()))
+
+        with self.subTest("Run once per interval"):
+            self.assertEqual({}, manager.run_maintenance())
+            self.assertEqual(1, step_a.call_count)
+
+        with self.subTest("Force"):
+            self.assertEqual(["step_a", "step_b", "step_c"], list(manager.run_maintenance(force=True)))
+            self.assertEqual(2, step_a.call_count)
+
+    @patch("tilapia.lib.maintenance.manager.orm_maintenance")
+    @patch("tilapia.lib.maintenance.manager.throttle_manager.purge_expired")
+    @patch("tilapia.lib.maintenance.manager.price_manager")
+    @patch("tilapia.lib.maintenance.manager.utxo_manager")
+    def test_run_maintenance__steps(self, fake_utxo_manager, fake_price_manager, fake_purge_expired, fake_orm_maintenance):
+        fake_utxo_manager.prune_spent_utxos.return_value = 10
+        fake_price_manager.compact_prices.return_value = 2
+        fake_purge_expired.return_value = 1
+        fake_orm_maintenance.analyze.return_value = {"statement": "optimize"}
+        fake_orm_maintenance.incremental_vacuum.return_value = {"reclaimed_pages": 100}
+
+        report = manager.run_maintenance()
+        self.assertEqual(
+            {
+                "spent_utxos": 10,
+                "superseded_prices": 2,
+                "expired_throttles": 1,
+                "analyze": {"statement": "optimize"},
+                "vacuum": {"reclaimed_pages": 100},
+            },
+            {k: v["receipt"] for k, v in report.items()},
+        )
+        fake_utxo_manager.prune_spent_utxos.assert_called_once_with(30, chunk_size=1000, max_chunks=100)
+        fake_price_manager.compact_prices.assert_called_once_with(7)
+        fake_orm_maintenance.incremental_vacuum.assert_called_once_with(manager.orm_database.db, 1000, 100)
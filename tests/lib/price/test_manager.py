@@ -1,6 +1,7 @@
+import datetime
 import decimal
 from unittest import TestCase
-from unittest.mock import Mock, call, patch
+from unittest.mock import Mock, patch
 
 from tilapia.lib.basic.orm import test_utils
 from tilapia.lib.price import daos, data, manager, models
@@ -27,31 +28,21 @@ class TestPriceManager(TestCase):
 
             fake_coin_manager.get_all_coins.assert_called_once()
             fake_coin_manager.query_coins_by_codes.assert_not_called()
-            fake_daos.create_or_update.assert_has_calls(
+            fake_daos.bulk_create_or_update.assert_called_once_with(
                 [
-                    call(
-                        coin_code="btc",
-                        unit="usd",
-                        channel=data.Channel.CGK,
-                        price=123456,
-                    ),
-                    call(
-                        coin_code="eth",
-                        unit="usd",
-                        channel=data.Channel.CGK,
-                        price=12345,
-                    ),
+                    ("btc", "usd", data.Channel.CGK, 123456),
+                    ("eth", "usd", data.Channel.CGK, 12345),
                 ]
             )
             fake_coin_manager.get_all_coins.reset_mock()
-            fake_daos.create_or_update.reset_mock()
+            fake_daos.bulk_create_or_update.reset_mock()
 
         with self.subTest("Price specific coins"):
             fake_coin_manager.query_coins_by_codes.return_value = []
             manager.pricing(["btc", "eth", "bsc"])
             fake_coin_manager.query_coins_by_codes.assert_called_once_with(["btc", "eth", "bsc"])
             fake_coin_manager.get_all_coins.assert_not_called()
-            fake_daos.create_or_update.assert_not_called()
+            fake_daos.bulk_create_or_update.assert_not_called()
 
     @patch("tilapia.lib.price.manager.coin_manager")
     def test_get_last_price(self, fake_coin_manager):
@@ -85,3 +76,23 @@ class TestPriceManager(TestCase):
         self.assertEqual(78, manager.get_last_price("bsc_cc", "cny"))
         self.assertEqual(0, manager.get_last_price("bsc_abc", "usd"))
         self.assertEqual(111, manager.get_last_price("bsc_abc", "usd", default=decimal.Decimal(111)))
+
+    def test_compact_prices(self):
+        daos.create_or_update("btc", "usd", data.Channel.CGK, decimal.Decimal(120000))
+        daos.create_or_update("eth", "usd", data.Channel.CGK, decimal.Decimal(15000))
+        daos.create_or_update("eth", "usd", data.Channel.UNISWAP, decimal.Decimal(15001))
+        daos.create_or_update("eth", "btc", data.Channel.UNISWAP, decimal.Decimal(0.125))
+        models.Price.update(modified_time=datetime.datetime.now() - datetime.timedelta(days=8)).where(
+            models.Price.channel == data.Channel.CGK
+        ).execute()
+
+        self.assertEqual(0, manager.compact_prices(10))
+        self.assertEqual(1, manager.compact_prices(7))  # Only eth/usd of CGK superseded by UNISWAP
+        self.assertEqual(
+            [
+                ("btc", "usd", data.Channel.CGK),
+                ("eth", "btc", data.Channel.UNISWAP),
+                ("eth", "usd", data.Channel.UNISWAP),
+            ],
+            sorted((i.coin_code, i.unit, i.channel) for i in models.Price.select()),
+        )
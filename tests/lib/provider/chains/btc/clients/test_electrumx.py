@@ -0,0 +1,104 @@
+from unittest import TestCase
+from unittest.mock import Mock, call, patch
+
+from tilapia.lib.provider import data
+from tilapia.lib.provider.chains.btc.clients import electrumx
+
+
+@patch.object(electrumx.ElectrumX, "_electrum_script_hash_of_address", side_effect=lambda i: f"hash_of_{i}")
+@patch("tilapia.lib.provider.chains.btc.clients.electrumx.json_rpc")
+class TestElectrumX(TestCase):
+    def test_batch_search_txids_by_addresses(self, fake_json_rpc, fake_script_hash):
+        fake_rpc = Mock()
+        fake_json_rpc.JsonRPCRequest.return_value = fake_rpc
+        fake_rpc.batch_call.return_value = [
+            [{"tx_hash": "txid_a", "height": 100}, {"tx_hash": "txid_b", "height": -1}],
+            [],
+        ]
+
+        client = electrumx.ElectrumX("tcp://electrumx.testing:50001")
+        self.assertEqual(
+            {"address_a": [("txid_a", 100), ("txid_b", 0)], "address_b": []},
+            client.batch_search_txids_by_addresses(["address_a", "address_b"]),
+        )
+        fake_rpc.batch_call.assert_called_once_with(
+            [
+                ("blockchain.scripthash.get_history", ["hash_of_address_a"]),
+                ("blockchain.scripthash.get_history", ["hash_of_address_b"]),
+            ]
+        )
+
+    def test_batch_search_utxos_by_addresses(self, fake_json_rpc, fake_script_hash):
+        fake_rpc = Mock()
+        fake_json_rpc.JsonRPCRequest.return_value = fake_rpc
+        fake_rpc.batch_call.return_value = [
+            [{"tx_hash": "txid_a", "tx_pos": 1, "value": 1000, "height": 100}, {"tx_hash": "txid_b", "height": 0}],
+            [],
+        ]
+
+        client = electrumx.ElectrumX("tcp://electrumx.testing:50001")
+        self.assertEqual(
+            {"address_a": [data.UTXO(txid="txid_a", vout=1, value=1000)], "address_b": []},
+            client.batch_search_utxos_by_addresses(["address_a", "address_b"]),
+        )
+        fake_rpc.batch_call.assert_called_once_with(
+            [
+                ("blockchain.scripthash.listunspent", ["hash_of_address_a"]),
+                ("blockchain.scripthash.listunspent", ["hash_of_address_b"]),
+            ]
+        )
+
+    def test_batch_get_transactions_without_prevouts(self, fake_json_rpc, fake_script_hash):
+        fake_rpc = Mock()
+        fake_json_rpc.JsonRPCRequest.return_value = fake_rpc
+        fake_rpc.batch_call.return_value = [
+            {
+                "txid": "txid_a",
+                "hex": "raw_a",
+                "vsize": 200,
+                "blockhash": "block_a",
+                "blocktime": 1600000000,
+                "confirmations": 3,
+                "vin": [{"txid": "prev_a", "vout": 1}, {"txid": "prev_b", "vout": 0}],
+                "vout": [
+                    {"n": 1, "value": 0, "scriptPubKey": {"type": "nulldata"}},
+                    {"n": 0, "value": 0.0001, "scriptPubKey": {"address": "address_a"}},
+                ],
+            },
+            None,  # not found
+        ]
+
+        client = electrumx.ElectrumX("tcp://electrumx.testing:50001")
+        self.assertEqual(
+            [
+                data.Transaction(
+                    txid="txid_a",
+                    status=data.TransactionStatus.CONFIRM_SUCCESS,
+                    inputs=[
+                        data.TransactionInput(address="", value=0, utxo=data.UTXO(txid="prev_a", vout=1, value=0)),
+                        data.TransactionInput(address="", value=0, utxo=data.UTXO(txid="prev_b", vout=0, value=0)),
+                    ],
+                    outputs=[
+                        data.TransactionOutput(address="address_a", value=10000),
+                        data.TransactionOutput(address="", value=0),
+                    ],
+                    fee=data.TransactionFee(limit=200, used=200, price_per_unit=0),
+                    block_header=data.BlockHeader(
+                        block_hash="block_a", block_number=0, block_time=1600000000, confirmations=3
+                    ),
+                    raw_tx="raw_a",
+                )
+            ],
+            client.batch_get_transactions_without_prevouts(["txid_a", "txid_b"]),
+        )
+        fake_rpc.batch_call.assert_has_calls(
+            [
+                call(
+                    [
+                        ("blockchain.transaction.get", ["txid_a", True]),
+                        ("blockchain.transaction.get", ["txid_b", True]),
+                    ],
+                    ignore_errors=True,
+                )
+            ]
+        )
@@ -1,6 +1,10 @@
+import itertools
 from unittest import TestCase
 
-from tilapia.lib.provider.chains.btc.sdk import transaction
+from tilapia.lib.provider import data
+from tilapia.lib.provider.chains.btc.sdk import network, transaction
+from tilapia.lib.secret import data as secret_data
+from tilapia.lib.secret import manager as secret_manager
 
 
 class TestTransaction(TestCase):
@@ -10,3 +14,61 @@ class TestTransaction(TestCase):
         self.assertEqual(255, transaction.calculate_vsize(["P2PKH"], ["P2WPKH", "P2PKH", "P2WPKH-P2SH"]))
         self.assertEqual(199, transaction.calculate_vsize(["P2WPKH-P2SH"], ["P2WPKH", "P2PKH", "P2WPKH-P2SH"]))
         self.assertEqual(246, transaction.calculate_vsize([], [], op_return="a" * 200))
+
+    def test_fast_sign_tx(self):
+        btc_network = network.get_network_by_chain_code("btc")
+        signers = [
+            secret_manager.raw_create_key_by_prvkey(secret_data.CurveEnum.SECP256K1, bytes([i]).rjust(32, b"\0"))
+            for i in range(1, 4)
+        ]
+        inputs = []
+        for index, (signer, encoding) in enumerate(itertools.product(signers, ("P2PKH", "P2WPKH", "P2WPKH-P2SH"))):
+            address = _address_of_signer(btc_network, signer, encoding)
+            inputs.append(
+                data.TransactionInput(
+                    address=address,
+                    value=10000 + index,
+                    utxo=data.UTXO(txid=f"{index + 1:064x}", vout=index, value=10000 + index),
+                )
+            )
+        unsigned_tx = data.UnsignedTx(
+            inputs=inputs,
+            outputs=[
+                data.TransactionOutput(address="bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4", value=50000),
+                data.TransactionOutput(address="3JvL6Ymt8MVWiCNHC7oWU6nLeHNJKLZGLN", value=40000),
+            ],
+            fee_price_per_unit=1,
+            fee_limit=sum(i.value for i in inputs) - 90000,
+        )
+
+        with self.subTest("Same as the generic pycoin solver"):
+            expected_tx = transaction.create_pycoin_tx(btc_network, unsigned_tx, transaction.TX_VERSION, 80)
+            expected_tx.sign(
+                hash160_lookup=transaction.build_hash160_lookup(btc_network, signers),
+                p2sh_lookup=transaction.build_p2sh_lookup(btc_network, signers),
+            )
+
+            tx = transaction.create_pycoin_tx(btc_network, unsigned_tx, transaction.TX_VERSION, 80)
+            self.assertTrue(transaction.fast_sign_tx(btc_network, tx, signers))
+            self.assertEqual(0, tx.bad_solution_count())
+            self.assertEqual(expected_tx.as_hex(), tx.as_hex())
+
+        with self.subTest("Unsupported if any signer is missing"):
+            tx = transaction.create_pycoin_tx(btc_network, unsigned_tx, transaction.TX_VERSION, 80)
+            self.assertFalse(transaction.fast_sign_tx(btc_network, tx, signers[:2]))
+            self.assertEqual(len(inputs), tx.bad_solution_count())
+
+    def test_is_fast_signing_supported(self):
+        self.assertTrue(transaction.is_fast_signing_supported(network.get_network_by_chain_code("btc")))
+        self.assertTrue(transaction.is_fast_signing_supported(network.get_network_by_chain_code("ltc")))
+        self.assertFalse(transaction.is_fast_signing_supported(network.get_network_by_chain_code("bch")))
+
+
+def _address_of_signer(btc_network, signer, encoding: str) -> str:
+    pubkey_hash = btc_network.keys.public(signer.get_pubkey(compressed=True)).hash160(is_compressed=True)
+    if encoding == "P2PKH":
+        return btc_network.address.for_p2pkh(pubkey_hash)
+    elif encoding == "P2WPKH":
+        return btc_network.address.for_p2pkh_wit(pubkey_hash)
+    else:
+        return btc_network.address.for_p2s(btc_network.contract.for_p2pkh_wit(pubkey_hash))
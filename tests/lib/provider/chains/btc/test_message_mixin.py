@@ -97,3 +97,28 @@ class TestBTCMessageMixin(TestCase):
                 "G8JawPtQOrybrSP1WHQnQPr67B9S3qrxBrl1mlzoTJOSHEpmnF7D3+t+LX0Xei9J20B5AIdPbeL3AaTBZ4N3bY0=",
             )
         )
+
+    def test_verify_messages(self):
+        self.assertEqual(
+            [True, True, False, False],
+            self.provider.verify_messages(
+                [
+                    (
+                        self.p2pkh_address,
+                        self.message,
+                        "H8eojIhqVBXWAIRRLwl1wOQyPeAwGlZgbGwcDXH+kNlbFhbJPS4eWW5cDwFgIkgna9u2hZ1TS9iUuVjyCKpNm9c=",
+                    ),
+                    (
+                        self.p2wpkh_address,
+                        self.message,
+                        "J8eojIhqVBXWAIRRLwl1wOQyPeAwGlZgbGwcDXH+kNlbFhbJPS4eWW5cDwFgIkgna9u2hZ1TS9iUuVjyCKpNm9c=",
+                    ),
+                    (
+                        self.p2wpkh_address,
+                        "foobar",
+                        "J8eojIhqVBXWAIRRLwl1wOQyPeAwGlZgbGwcDXH+kNlbFhbJPS4eWW5cDwFgIkgna9u2hZ1TS9iUuVjyCKpNm9c=",
+                    ),
+                    (self.p2pkh_address, self.message, "invalid"),
+                ]
+            ),
+        )
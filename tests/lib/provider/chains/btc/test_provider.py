@@ -161,3 +161,12 @@ class TestBTCProvider(TestCase):
                 {"1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH": self.signer, "3JvL6Ymt8MVWiCNHC7oWU6nLeHNJKLZGLN": self.signer},
             ),
         )
+
+        with self.subTest("Signal opt-in RBF"):
+            signed_tx = self.provider.sign_transaction(
+                unsigned_tx.clone(payload=dict(op_return="Hello OneKey", rbf=True)),
+                {"1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH": self.signer, "3JvL6Ymt8MVWiCNHC7oWU6nLeHNJKLZGLN": self.signer},
+            )
+            tx = self.provider.network.tx.from_hex(signed_tx.raw_tx)
+            self.assertEqual([0xFFFFFFFD, 0xFFFFFFFD], [i.sequence for i in tx.txs_in])
+            self.assertNotEqual("b7d23466fb080dc165c8f898060c357c375fd29749108bba9c4649b39a4021d1", signed_tx.txid)
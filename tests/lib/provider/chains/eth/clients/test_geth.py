@@ -0,0 +1,290 @@
+from unittest import TestCase
+from unittest.mock import Mock, call, patch
+
+from tilapia.lib.basic.request.exceptions import JsonRPCException
+from tilapia.lib.provider import data
+from tilapia.lib.provider.chains.eth.clients import geth
+
+
+class TestGeth(TestCase):
+    @patch("tilapia.lib.provider.chains.eth.clients.geth.JsonRPCRequest")
+    def test_batch_get_transaction_by_txids(self, fake_rpc_creator):
+        fake_rpc = Mock()
+        fake_rpc_creator.return_value = fake_rpc
+
+        def _tx(txid: str, nonce: int) -> dict:
+            return {
+                "hash": txid,
+                "from": "0xA",
+                "to": "0xB",
+                "value": "0x10",
+                "gas": "0x5208",
+                "gasPrice": "0x3b9aca00",
+                "nonce": hex(nonce),
+            }
+
+        fake_rpc.batch_call.side_effect = [
+            [
+                _tx("0x01", 1),
+                {"blockNumber": "0x64", "status": "0x1", "gasUsed": "0x5208"},
+                None,  # not found
+                None,
+                _tx("0x03", 3),
+                None,  # pending
+                _tx("0x04", 4),
+                {"blockNumber": "0x64", "status": "0x0", "gasUsed": "0x5000"},
+            ],
+            [{"hash": "0xblock", "number": "0x64", "timestamp": "0x5f5e1000"}],
+        ]
+
+        client = geth.Geth("https://geth.testing")
+        transactions = client.batch_get_transaction_by_txids(["0x01", "0x02", "0x03", "0x04"])
+
+        block_header = data.BlockHeader(block_hash="0xblock", block_number=100, block_time=0x5F5E1000)
+        self.assertEqual(
+            [
+                ("0x01", data.TransactionStatus.CONFIRM_SUCCESS, block_header, 21000, 1),
+                ("0x03", data.TransactionStatus.PENDING, None, 21000, 3),
+                ("0x04", data.TransactionStatus.CONFIRM_REVERTED, block_header, 0x5000, 4),
+            ],
+            [(i.txid, i.status, i.block_header, i.fee.used, i.nonce) for i in transactions],
+        )
+        self.assertEqual("0xa", transactions[0].inputs[0].address)
+        fake_rpc.batch_call.assert_has_calls(
+            [
+                call(
+                    [
+                        ("eth_getTransactionByHash", ["0x01"]),
+                        ("eth_getTransactionReceipt", ["0x01"]),
+                        ("eth_getTransactionByHash", ["0x02"]),
+                        ("eth_getTransactionReceipt", ["0x02"]),
+                        ("eth_getTransactionByHash", ["0x03"]),
+                        ("eth_getTransactionReceipt", ["0x03"]),
+                        ("eth_getTransactionByHash", ["0x04"]),
+                        ("eth_getTransactionReceipt", ["0x04"]),
+                    ],
+                    ignore_errors=True,
+                    timeout=10,
+                ),
+                call([("eth_getBlockByNumber", ["0x64", False])], timeout=10),  # the same block is only fetched once
+            ]
+        )
+
+    @patch("tilapia.lib.provider.chains.eth.clients.geth.JsonRPCRequest")
+    def test_scan_blocks(self, fake_rpc_creator):
+        fake_rpc = Mock()
+        fake_rpc_creator.return_value = fake_rpc
+        address_aa, address_bb, address_cc, address_dd, address_ee = (
+            f"0x{i * 20}" for i in ("aa", "bb", "cc", "dd", "ee")
+        )
+
+        def _tx(txid: str, sender: str, receiver: str) -> dict:
+            return {
+                "hash": txid,
+                "from": sender,
+                "to": receiver,
+                "value": "0x0",
+                "gas": "0x5208",
+                "gasPrice": "0x1",
+                "nonce": "0x0",
+            }
+
+        def _transfer_log(token_address: str, sender: str, receiver: str, value: int) -> dict:
+            return {
+                "address": token_address,
+                "topics": [
+                    geth.TRANSFER_EVENT_TOPIC,
+                    "0x" + sender[2:].rjust(64, "0"),
+                    "0x" + receiver[2:].rjust(64, "0"),
+                ],
+                "data": hex(value),
+            }
+
+        fake_rpc.batch_call.side_effect = [
+            [
+                {
+                    "hash": "0xb1",
+                    "parentHash": "0xb0",
+                    "number": "0x1",
+                    "timestamp": "0x10",
+                    "transactions": [
+                        _tx("0x01", address_aa, address_bb),  # send from the watched address
+                        _tx("0x02", address_cc, address_dd),  # unrelated
+                        _tx("0x03", address_cc, address_ee),  # token transfer to the watched address
+                        _tx("0x04", address_cc, address_ee),  # token transfer not related
+                        _tx("0x05", address_aa, None),  # contract creation by the watched address
+                        _tx("0x06", address_cc, address_dd),  # token transfer to the watched address through a router
+                    ],
+                },
+                None,  # not available yet
+            ],
+            [
+                {"blockNumber": "0x1", "status": "0x1", "gasUsed": "0x5208", "logs": []},
+                {
+                    "blockNumber": "0x1",
+                    "status": "0x1",
+                    "gasUsed": "0x5208",
+                    "logs": [_transfer_log(address_ee, address_cc, address_aa, 100)],
+                },
+                {"blockNumber": "0x1", "status": "0x1", "gasUsed": "0x5208", "logs": []},
+                {
+                    "blockNumber": "0x1",
+                    "status": "0x1",
+                    "gasUsed": "0x5208",
+                    "logs": [
+                        _transfer_log(address_ee, address_dd, address_bb, 300),
+                        _transfer_log(address_ee, address_dd, address_aa, 200),
+                    ],
+                },
+            ],
+        ]
+        fake_rpc.call.return_value = [
+            {"transactionHash": "0x03", "logIndex": "0x0", **_transfer_log(address_ee, address_cc, address_aa, 100)},
+            {"transactionHash": "0x04", "logIndex": "0x0", **_transfer_log(address_ee, address_cc, address_dd, 100)},
+            {"transactionHash": "0x06", "logIndex": "0x0", **_transfer_log(address_ee, address_dd, address_bb, 300)},
+            {"transactionHash": "0x06", "logIndex": "0x1", **_transfer_log(address_ee, address_dd, address_aa, 200)},
+        ]
+
+        blocks = geth.Geth("https://geth.testing").scan_blocks([1, 2], {address_aa}, {address_ee})
+
+        self.assertEqual(1, len(blocks))
+        self.assertEqual(
+            (data.BlockHeader(block_hash="0xb1", block_number=1, block_time=16), "0xb0"),
+            (blocks[0].header, blocks[0].parent_hash),
+        )
+        self.assertEqual(["0x01", "0x03", "0x05", "0x06"], [i.txid for i in blocks[0].transactions])
+        self.assertEqual("", blocks[0].transactions[2].outputs[0].address)
+        self.assertEqual(  # All the transfers are kept in the log order, so the index of each one is stable
+            [
+                (address_cc, address_dd, 0, None),
+                (address_dd, address_bb, 300, address_ee),
+                (address_dd, address_aa, 200, address_ee),
+            ],
+            [
+                (i.address, o.address, o.value, o.token_address)
+                for i, o in zip(blocks[0].transactions[3].inputs, blocks[0].transactions[3].outputs)
+            ],
+        )
+        token_transfer = blocks[0].transactions[1]
+        self.assertEqual(
+            [(address_cc, address_ee, 0, None), (address_cc, address_aa, 100, address_ee)],
+            [
+                (i.address, o.address, o.value, o.token_address)
+                for i, o in zip(token_transfer.inputs, token_transfer.outputs)
+            ],
+        )
+        fake_rpc.batch_call.assert_has_calls(
+            [
+                call(
+                    [("eth_getBlockByNumber", ["0x1", True]), ("eth_getBlockByNumber", ["0x2", True])],
+                    ignore_errors=True,
+                    timeout=30,
+                ),
+                call(
+                    [
+                        ("eth_getTransactionReceipt", ["0x01"]),
+                        ("eth_getTransactionReceipt", ["0x03"]),
+                        ("eth_getTransactionReceipt", ["0x05"]),
+                        ("eth_getTransactionReceipt", ["0x06"]),
+                    ],
+                    ignore_errors=True,
+                    timeout=30,
+                ),
+            ]
+        )
+        fake_rpc.call.assert_called_once_with(
+            "eth_getLogs",
+            [{"fromBlock": "0x1", "toBlock": "0x1", "topics": [geth.TRANSFER_EVENT_TOPIC], "address": [address_ee]}],
+        )
+
+    @patch("tilapia.lib.provider.chains.eth.clients.geth.JsonRPCRequest")
+    def test_search_token_transfers(self, fake_rpc_creator):
+        fake_rpc = Mock()
+        fake_rpc_creator.return_value = fake_rpc
+        address_a, address_b, address_c, token_a = (f"0x{i * 20}" for i in ("aa", "bb", "cc", "ee"))
+
+        def _topic(address: str) -> str:
+            return "0x" + address[2:].rjust(64, "0")
+
+        logs = [
+            {
+                "address": token_a,
+                "topics": [geth.TRANSFER_EVENT_TOPIC, _topic(sender), _topic(receiver)],
+                "data": hex(value),
+                "transactionHash": txid,
+                "logIndex": hex(log_index),
+                "blockNumber": hex(block_number),
+            }
+            for txid, log_index, sender, receiver, value, block_number in (
+                ("0x01", 0, address_a, address_b, 10, 5),
+                ("0x02", 0, address_c, address_b, 15, 12),  # not related
+                ("0x02", 1, address_b, address_a, 20, 12),
+                ("0x03", 0, address_a, address_a, 30, 18),
+                ("0x04", 0, address_b, address_c, 40, 18),  # not related
+            )
+        ]
+
+        def _fake_call(method, params):
+            self.assertEqual("eth_getLogs", method)
+            log_filter = params[0]
+            self.assertEqual(([geth.TRANSFER_EVENT_TOPIC], [token_a]), (log_filter["topics"], log_filter["address"]))
+            from_block, to_block = int(log_filter["fromBlock"], 16), int(log_filter["toBlock"], 16)
+            if to_block - from_block >= 8:
+                raise JsonRPCException(
+                    "too many", json_response={"error": {"message": "query returned more than 10000 results"}}
+                )
+
+            return [i for i in logs if from_block <= int(i["blockNumber"], 16) <= to_block]
+
+        def _fake_batch_call(calls, **kwargs):
+            results = []
+            for method, (value, *_) in calls:
+                if method == "eth_getBlockByNumber":
+                    results.append({"hash": f"0xb{value}", "number": value, "timestamp": "0x10"})
+                    continue
+
+                tx_logs = [i for i in logs if i["transactionHash"] == value]
+                if method == "eth_getTransactionByHash":
+                    results.append(
+                        {"hash": value, "from": address_c, "to": token_a, "value": "0x0", "gas": "0x1", "nonce": "0x0"}
+                    )
+                else:
+                    results.append({"blockNumber": tx_logs[0]["blockNumber"], "status": "0x1", "logs": tx_logs})
+
+            return results
+
+        fake_rpc.call.side_effect = _fake_call
+        fake_rpc.batch_call.side_effect = _fake_batch_call
+        transactions = geth.Geth("https://geth.testing").search_token_transfers(
+            [address_a.upper().replace("0X", "0x")], 0, 19, [token_a]
+        )
+
+        self.assertEqual(
+            [
+                ("0x03", [(address_a, address_a, 30)]),
+                ("0x02", [(address_c, address_b, 15), (address_b, address_a, 20)]),  # All of the tx, in the log order
+                ("0x01", [(address_a, address_b, 10)]),
+            ],
+            [
+                (tx.txid, [(i.address, o.address, o.value) for i, o in zip(tx.inputs[1:], tx.outputs[1:])])
+                for tx in transactions
+            ],
+        )
+        self.assertEqual({token_a}, {o.token_address for tx in transactions for o in tx.outputs[1:]})
+        self.assertEqual(
+            [("eth_getTransactionByHash", ["0x01"]), ("eth_getTransactionReceipt", ["0x01"])],
+            fake_rpc.batch_call.call_args_list[0].args[0][:2],
+        )
+
+        ranges = [(c.args[1][0]["fromBlock"], c.args[1][0]["toBlock"]) for c in fake_rpc.call.call_args_list]
+        self.assertEqual(
+            [
+                ("0x0", "0x13"),
+                ("0x0", "0x9"),
+                ("0x0", "0x4"),
+                ("0x5", "0x9"),
+                ("0xa", "0xe"),
+                ("0xf", "0x13"),
+            ],
+            ranges,
+        )
@@ -139,3 +139,22 @@ class TestMessageSDK(TestCase):
         for case_name, expected, case in cases:
             with self.subTest(case_name):
                 self.assertEqual(_to_bytes(expected), message_sdk.hash_message(case))
+
+    def test_eip712_plan_cache(self):
+        _, expected, case = _eip712_v4_testcases()[0]
+        data = json.loads(case)
+        reordered_types = {k: data["types"][k] for k in reversed(list(data["types"]))}
+
+        plan = message_sdk._get_eip712_plan(data["types"], 4)
+        self.assertIs(plan, message_sdk._get_eip712_plan(reordered_types, 4))
+        self.assertIsNot(plan, message_sdk._get_eip712_plan(data["types"], 3))
+
+        message_sdk.hash_message(case)
+        self.assertIn("Mail", plan._struct_encoders)
+        self.assertIn("Person", plan._type_hashes)
+
+        data["message"]["contents"] = "Hello, Alice!"
+        self.assertNotEqual(_to_bytes(expected), message_sdk.hash_message(json.dumps(data)))
+        data["types"] = reordered_types
+        data["message"]["contents"] = "Hello, Bob!"
+        self.assertEqual(_to_bytes(expected), message_sdk.hash_message(json.dumps(data)))
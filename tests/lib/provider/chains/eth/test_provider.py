@@ -316,3 +316,22 @@ class TestETHProvider(TestCase):
                     signers,
                 ),
             )
+
+    def test_get_payload_of_raw_tx(self):
+        with self.subTest("ETH Transfer Tx"):
+            self.assertEqual(
+                {},
+                self.provider.get_payload_of_raw_tx(
+                    "0xf86c80851911a1d18082520894a305fab8bda7e1638235b054889b3217441dd64588d01b493cdc1dbc008025a018c8df4036ef8e80434b789d84e14bbbc4db461bfcc14ffdf4faf4784cd8bf4fa0557d08ae22b87620bbadfb75e27a33ce4fb03aabd95c30925b4483315ab4493f"
+                ),
+            )
+
+        with self.subTest("ERC20 Transfer Tx"):
+            self.assertEqual(
+                {
+                    "data": "0xa9059cbb000000000000000000000000a305fab8bda7e1638235b054889b3217441dd64500000000000000000000000000000000000000000000000000000003110c5a4f"
+                },
+                self.provider.get_payload_of_raw_tx(
+                    "0xf8a98085174876e80082e03194a0b86991c6218b36c1d19d4a2e9eb0ce3606eb4880b844a9059cbb000000000000000000000000a305fab8bda7e1638235b054889b3217441dd64500000000000000000000000000000000000000000000000000000003110c5a4f26a0ff00510948d652626624d8f518309a66f7ec2149da47735f378e90c267c579f8a022afc54c308fcddd4a19b313ecf03be9ee328e670e9109f141902dd89e43aaf7"
+                ),
+            )
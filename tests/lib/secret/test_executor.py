@@ -0,0 +1,79 @@
+import time
+from unittest import TestCase
+
+from tilapia.lib.secret import exceptions
+from tilapia.lib.secret import executor as secret_executor
+from tilapia.lib.secret import manager as secret_manager
+from tilapia.lib.secret.data import CurveEnum
+
+
+class TestCryptoExecutor(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.mnemonic = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+        cls.passphrase = "OneKey"
+        cls.master_seed = bytes.fromhex(
+            "ac7728a67cf7fe4a237668db29f7d93243da5cecd3e7cb790dc393e31fdfaadf8ced5e17bb53be83823faae50eb4fc4a8d67486fa04851238accc29005734692"
+        )
+        cls.address_level_path = "m/44'/60'/0'/0/0"
+        cls.address_level_prvkey = "77f22e0d920c7b59df81a629dc75c27513b5360a45d55f3253454f5d3cb23bab"
+
+    def _assert_jobs(self, executor: secret_executor.CryptoExecutor):
+        self.assertEqual(
+            self.master_seed,
+            executor.run(
+                secret_executor._job_mnemonic_to_seed,
+                secret_executor.MnemonicToSeedRequest(self.mnemonic, self.passphrase),
+            ),
+        )
+
+        response = executor.run(
+            secret_executor._job_derive_keys,
+            secret_executor.DeriveKeysRequest(
+                CurveEnum.SECP256K1, self.master_seed, [self.address_level_path, "m/44'/60'/0'/0/1"]
+            ),
+        )
+        self.assertEqual(2, len(response.prvkeys))
+        self.assertEqual(self.address_level_prvkey, response.prvkeys[0].hex())
+        self.assertEqual(
+            secret_manager.raw_create_key_by_master_seed(CurveEnum.SECP256K1, self.master_seed, "m/44'/60'/0'/0/1")
+            .get_prvkey()
+            .hex(),
+            response.prvkeys[1].hex(),
+        )
+
+    def test_in_process(self):
+        executor = secret_executor.CryptoExecutor(in_process=True)
+        self._assert_jobs(executor)
+
+        with self.assertRaises(Exception):
+            executor.run(secret_executor._job_keystore_decrypt, secret_executor.KeystoreDecryptRequest("{}", "moon"))
+
+        metrics = executor.metrics()
+        self.assertEqual(3, metrics["submitted"])
+        self.assertEqual(2, metrics["succeeded"])
+        self.assertEqual(1, metrics["failed"])
+        self.assertEqual(0, metrics["pending"])
+
+    def test_process_pool(self):
+        executor = secret_executor.CryptoExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        self._assert_jobs(executor)
+
+        with self.assertRaises(exceptions.CryptoJobTimeout):
+            executor.run(time.sleep, 1, timeout=0.05)
+        self.assertEqual(1, executor.metrics()["timeout"])
+
+    def test_keystore(self):
+        executor = secret_executor.CryptoExecutor(in_process=True)
+        prvkey = bytes.fromhex(self.address_level_prvkey)
+
+        keyfile = executor.run(
+            secret_executor._job_keystore_encrypt, secret_executor.KeystoreEncryptRequest(prvkey, "moon")
+        )
+        self.assertEqual(
+            prvkey,
+            executor.run(
+                secret_executor._job_keystore_decrypt, secret_executor.KeystoreDecryptRequest(keyfile, "moon")
+            ),
+        )
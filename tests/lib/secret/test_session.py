@@ -0,0 +1,89 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from tilapia.lib.secret import exceptions
+from tilapia.lib.secret import session as secret_session
+
+
+class TestSecretSession(TestCase):
+    def setUp(self) -> None:
+        patch_sessions = patch.dict(secret_session._SESSIONS, clear=True)
+        patch_sessions.start()
+        self.addCleanup(patch_sessions.stop)
+
+    @staticmethod
+    def _use_signer(token: str, owner: str, pubkey_id: int):
+        with secret_session.use_signers(token, owner, [pubkey_id]) as signers:
+            return signers[pubkey_id]
+
+    def test_open_and_close_session(self):
+        signer = Mock()
+        token = secret_session.open_session("wallet:1", {11: signer})
+
+        with secret_session.use_signers(token, "wallet:1", [11]) as signers:
+            self.assertEqual({11: signer}, signers)
+        with self.assertRaises(exceptions.SigningSessionNotFound):
+            self._use_signer(token, "wallet:2", 11)
+        with self.assertRaises(AssertionError):
+            self._use_signer(token, "wallet:1", 12)
+
+        self.assertFalse(secret_session.close_session(token, owner="wallet:2"))
+        self.assertTrue(secret_session.close_session(token, owner="wallet:1"))
+        self.assertFalse(secret_session.close_session(token))
+        with self.assertRaises(exceptions.SigningSessionNotFound):
+            self._use_signer(token, "wallet:1", 11)
+
+    @patch("tilapia.lib.secret.session.time.time")
+    def test_session_expired(self, fake_time):
+        fake_time.return_value = 1000
+        token = secret_session.open_session("wallet:1", {11: Mock()}, ttl=60)
+        self.assertEqual(1, secret_session.count_sessions())
+
+        fake_time.return_value = 1059
+        self._use_signer(token, "wallet:1", 11)
+
+        fake_time.return_value = 1060
+        with self.assertRaises(exceptions.SigningSessionNotFound):
+            self._use_signer(token, "wallet:1", 11)
+        self.assertEqual(0, secret_session.count_sessions())
+
+    def test_max_sessions(self):
+        tokens = [secret_session.open_session("wallet:1", {11: Mock()}) for _ in range(secret_session.MAX_SESSIONS)]
+
+        with self.assertRaises(exceptions.TooManySigningSessions):
+            secret_session.open_session("wallet:2", {21: Mock()})
+
+        secret_session.close_session(tokens[0])
+        secret_session.open_session("wallet:2", {21: Mock()})
+
+        self.assertEqual(secret_session.MAX_SESSIONS - 1, secret_session.close_sessions_by_owner("wallet:1"))
+        self.assertEqual(1, secret_session.count_sessions())
+
+    def test_zeroize_on_close(self):
+        signer = Mock(_signing_key="secret")
+        token = secret_session.open_session("wallet:1", {11: signer})
+        secret_session.close_session(token)
+        self.assertIsNone(signer._signing_key)
+
+    def test_zeroize_after_signing(self):
+        signer = Mock(_signing_key="secret")
+        token = secret_session.open_session("wallet:1", {11: signer})
+
+        with secret_session.use_signers(token, "wallet:1", [11]) as signers:
+            self.assertTrue(secret_session.close_session(token))
+            self.assertEqual("secret", signers[11]._signing_key)  # Still signing
+
+        self.assertIsNone(signer._signing_key)
+
+    def test_add_signers(self):
+        token_a = secret_session.open_session("wallet:1", {11: Mock()})
+        token_b = secret_session.open_session("wallet:1", {11: Mock()})
+        secret_session.open_session("wallet:2", {21: Mock()})
+
+        self.assertEqual(2, secret_session.add_signers("wallet:1", lambda: {12: Mock()}))
+        self.assertEqual(0, secret_session.add_signers("wallet:3", lambda: {31: Mock()}))
+
+        with secret_session.use_signers(token_a, "wallet:1", [11, 12]) as signers_a, secret_session.use_signers(
+            token_b, "wallet:1", [12]
+        ) as signers_b:
+            self.assertIsNot(signers_a[12], signers_b[12])  # Each session owns its signers
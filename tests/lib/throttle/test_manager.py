@@ -0,0 +1,78 @@
+import concurrent.futures
+import datetime
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from tilapia.lib.basic.orm import database as orm_database
+from tilapia.lib.basic.orm import test_utils
+from tilapia.lib.throttle import daos, manager, models
+
+
+@test_utils.cls_test_database(models.Throttle)
+class TestThrottleManager(TestCase):
+    def test_acquire(self):
+        self.assertEqual(["a", "b"], manager.acquire(["a", "b", "a"], ttl=60))
+        self.assertEqual(["c"], manager.acquire(["a", "c", "b"], ttl=60))
+        self.assertEqual([], manager.acquire(["a"], ttl=60))
+
+        with self.subTest("Force"):
+            self.assertEqual(["b", "a"], manager.acquire(["b", "a"], ttl=60, force=True))
+
+        with self.subTest("Released"):
+            self.assertEqual(1, manager.release(["a"]))
+            self.assertEqual(["a"], manager.acquire(["a", "b"], ttl=60))
+
+        with self.subTest("Expired"):
+            later = datetime.datetime.now() + datetime.timedelta(seconds=61)
+            with patch("tilapia.lib.throttle.manager.datetime") as fake_datetime:
+                fake_datetime.datetime.now.return_value = later
+                fake_datetime.timedelta = datetime.timedelta
+                self.assertEqual(["a", "b", "c"], manager.acquire(["a", "b", "c"], ttl=60))
+
+    def test_acquire__evicted(self):
+        daos.bulk_create_or_update(["expired"], datetime.datetime.now())
+        for ttl, key in enumerate("abc", start=1):
+            manager.acquire([key], ttl=ttl)
+
+        self.assertEqual(["a", "b", "c"], sorted(i.key for i in models.Throttle.select()))  # The expired one evicted
+
+        with patch.object(manager, "MAX_KEYS", 3):
+            manager.acquire(["d"], ttl=60)
+
+        # The ones expiring soonest are evicted beyond the cap
+        self.assertEqual(["b", "c", "d"], sorted(i.key for i in models.Throttle.select()))
+
+    def test_purge_expired(self):
+        daos.bulk_create_or_update(["a", "b"], datetime.datetime.now())
+        daos.bulk_create_or_update(["c"], datetime.datetime.now() + datetime.timedelta(seconds=60))
+
+        self.assertEqual(2, manager.purge_expired())
+        self.assertEqual(["c"], [i.key for i in models.Throttle.select()])
+
+    def test_lease(self):
+        with manager.lease("a", ttl=60) as leased:
+            self.assertTrue(leased)
+            with manager.lease("a", ttl=60) as leased_again:
+                self.assertFalse(leased_again)
+
+            self.assertEqual(1, models.Throttle.select().count())  # Still held after the inner one exited
+
+        self.assertEqual(0, models.Throttle.select().count())
+
+    def test_acquire__concurrent_workers(self):
+        # Each thread connects to the database file by itself, likes the workers in the other processes
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = orm_database.SqliteDatabase(
+                os.path.join(tmp_dir, "throttle.db"), pragmas={"journal_mode": "wal"}, timeout=10
+            )
+            with database.bind_ctx((models.Throttle,)):
+                database.create_tables((models.Throttle,))
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+                    results = list(executor.map(lambda i: manager.acquire(["a", f"b{i % 4}"], ttl=60), range(40)))
+                database.close()
+
+                self.assertEqual(1, sum(1 for i in results if "a" in i))
+                self.assertEqual(4, sum(1 for i in results for j in i if j.startswith("b")))
@@ -0,0 +1,20 @@
+from unittest import TestCase
+
+from tilapia.lib.transaction import codec
+from tilapia.lib.transaction.data import RawTxCodec
+
+
+class TestCodec(TestCase):
+    def test_encode_and_decode(self):
+        for raw_tx, expected_codec in (
+            ("0xf86b8085", RawTxCodec.PREFIXED_HEX),
+            ("0200000001", RawTxCodec.HEX),
+            ("0x0200000001ABCD", RawTxCodec.TEXT),  # Uppercase hex can't be restored from bytes
+            ("0x123", RawTxCodec.TEXT),
+            ('{"signatures": []}', RawTxCodec.TEXT),
+            ("", RawTxCodec.TEXT),
+        ):
+            with self.subTest(raw_tx=raw_tx):
+                actual_codec, payload = codec.encode_raw_tx(raw_tx)
+                self.assertEqual(expected_codec, actual_codec)
+                self.assertEqual(raw_tx, codec.decode_raw_tx(actual_codec, payload))
@@ -1,18 +1,35 @@
+import csv
 import datetime
 import decimal
+import io
+import json
+import os
+import tempfile
+import time
 from unittest import TestCase
 from unittest.mock import Mock, call, patch
 
 import peewee
 
+from tilapia.lib.basic.functional.wraps import timeout_lock
 from tilapia.lib.basic.orm import test_utils
 from tilapia.lib.coin import data as coin_data
 from tilapia.lib.provider import data as provider_data
 from tilapia.lib.provider import exceptions as provider_exceptions
-from tilapia.lib.transaction import daos, data, manager, models
+from tilapia.lib.provider import interfaces as provider_interfaces
+from tilapia.lib.throttle import manager as throttle_manager
+from tilapia.lib.throttle import models as throttle_models
+from tilapia.lib.transaction import daos, data, exceptions, manager, models, tracker
 
 
-@test_utils.cls_test_database(models.TxAction)
+@test_utils.cls_test_database(
+    models.TxAction,
+    models.AddressSyncCursor,
+    models.ScannedBlock,
+    models.TxOutput,
+    models.RawTx,
+    throttle_models.Throttle,
+)
 class TestTransactionManager(TestCase):
     @patch("tilapia.lib.transaction.manager.coin_manager")
     @patch("tilapia.lib.transaction.manager.provider_manager")
@@ -31,7 +48,6 @@ class TestTransactionManager(TestCase):
                     fee_limit=decimal.Decimal(1000),
                     fee_price_per_unit=decimal.Decimal(20),
                     nonce=11,
-                    raw_tx="",
                 ),
                 daos.new_action(
                     txid="txid_a",
@@ -44,7 +60,6 @@ class TestTransactionManager(TestCase):
                     fee_limit=decimal.Decimal(1000),
                     fee_price_per_unit=decimal.Decimal(20),
                     index=1,
-                    raw_tx="",
                 ),
                 daos.new_action(
                     txid="txid_b",
@@ -57,7 +72,6 @@ class TestTransactionManager(TestCase):
                     fee_limit=decimal.Decimal(1000),
                     fee_price_per_unit=decimal.Decimal(20),
                     nonce=3,
-                    raw_tx="",
                 ),
                 daos.new_action(
                     txid="txid_c",
@@ -70,7 +84,6 @@ class TestTransactionManager(TestCase):
                     fee_limit=decimal.Decimal(1000),
                     fee_price_per_unit=decimal.Decimal(20),
                     nonce=3,
-                    raw_tx="",
                 ),
                 daos.new_action(
                     txid="txid_d",
@@ -83,7 +96,6 @@ class TestTransactionManager(TestCase):
                     fee_limit=decimal.Decimal(1000),
                     fee_price_per_unit=decimal.Decimal(10),
                     nonce=11,
-                    raw_tx="",
                 ),
                 daos.new_action(
                     txid="txid_e",
@@ -96,7 +108,6 @@ class TestTransactionManager(TestCase):
                     fee_limit=decimal.Decimal(1000),
                     fee_price_per_unit=decimal.Decimal(15),
                     nonce=11,
-                    raw_tx="",
                 ),
             ]
         )
@@ -111,10 +122,8 @@ class TestTransactionManager(TestCase):
             chain_model=coin_data.ChainModel.ACCOUNT, nonce_supported=True
         )
 
-        def _fake_get_transaction_by_txid(chain_code, txid):
-            if txid not in ("txid_a", "txid_b", "txid_c"):
-                raise provider_exceptions.TransactionNotFound(txid)
-            return {
+        def _fake_batch_get_transaction_by_txids(chain_code, txids):
+            tx = {
                 "eth": provider_data.Transaction(
                     txid="txid_a",
                     status=provider_data.TransactionStatus.CONFIRM_SUCCESS,
@@ -136,8 +145,9 @@ class TestTransactionManager(TestCase):
                     ),
                 ),
             }.get(chain_code)
+            return [tx] if tx and tx.txid in txids else []
 
-        fake_provider_manager.get_transaction_by_txid.side_effect = _fake_get_transaction_by_txid
+        fake_provider_manager.batch_get_transaction_by_txids.side_effect = _fake_batch_get_transaction_by_txids
 
         manager.update_pending_actions()
 
@@ -226,17 +236,192 @@ class TestTransactionManager(TestCase):
                 for i in txns
             ],
         )
-        fake_provider_manager.get_transaction_by_txid.assert_has_calls(
+        fake_provider_manager.batch_get_transaction_by_txids.assert_has_calls(
             [
-                call("bsc", "txid_b"),
-                call("eth", "txid_a"),
-                call("eth", "txid_d"),
-                call("eth", "txid_e"),
-                call("heco", "txid_c"),
+                call("bsc", ["txid_b"]),
+                call("eth", ["txid_a", "txid_d", "txid_e"]),
+                call("heco", ["txid_c"]),
             ],
             any_order=True,
         )
 
+    @patch("tilapia.lib.transaction.manager._PENDING_TX_TRACKER", tracker.PendingTxTracker())
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    def test_update_pending_actions__superseded_tx_mined(self, fake_provider_manager, fake_coin_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(
+            chain_model=coin_data.ChainModel.ACCOUNT, nonce_supported=True
+        )
+        daos.bulk_create(
+            daos.new_action(
+                txid=txid,
+                status=data.TxActionStatus.PENDING,
+                chain_code="eth",
+                coin_code="eth",
+                value=decimal.Decimal(10),
+                from_address="address_a",
+                to_address="address_b",
+                fee_limit=decimal.Decimal(21000),
+                fee_price_per_unit=decimal.Decimal(price),
+                nonce=11,
+            )
+            for txid, price in (("txid_a", 100), ("txid_b", 150))
+        )
+        manager.mark_actions_replaced("eth", "txid_a", "txid_b")
+
+        fake_provider_manager.batch_get_transaction_by_txids.side_effect = lambda chain_code, txids: [
+            provider_data.Transaction(
+                txid="txid_a",
+                status=provider_data.TransactionStatus.CONFIRM_SUCCESS,
+                fee=provider_data.TransactionFee(limit=21000, used=21000, price_per_unit=100),
+                block_header=provider_data.BlockHeader(block_hash="block_a", block_number=1001, block_time=1600000000),
+            )
+        ]
+
+        manager.update_pending_actions()
+        fake_provider_manager.batch_get_transaction_by_txids.assert_called_once()
+        chain_code, txids = fake_provider_manager.batch_get_transaction_by_txids.call_args[0]
+        self.assertEqual(("eth", ["txid_a", "txid_b"]), (chain_code, sorted(txids)))
+        self.assertEqual(
+            [
+                ("txid_a", data.TxActionStatus.CONFIRM_SUCCESS, None),
+                ("txid_b", data.TxActionStatus.REPLACED, "txid_a"),
+            ],
+            [(i.txid, i.status, i.replaced_by) for i in models.TxAction.select().order_by(models.TxAction.id)],
+        )
+
+        with self.subTest("Stop polling once the replacement is settled"):
+            self.assertEqual([], daos.query_superseded_actions())
+
+    @patch("tilapia.lib.transaction.manager._PENDING_TX_TRACKER", tracker.PendingTxTracker())
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    def test_update_pending_actions__too_old(self, fake_provider_manager, fake_coin_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(chain_model=coin_data.ChainModel.ACCOUNT)
+        daos.new_action(
+            txid="txid_a",
+            status=data.TxActionStatus.PENDING,
+            chain_code="eth",
+            coin_code="eth",
+            value=decimal.Decimal(0),
+            from_address="address_a",
+            to_address="address_b",
+            fee_limit=decimal.Decimal(1000),
+            created_time=datetime.datetime.now() - datetime.timedelta(days=4),
+        ).save()
+
+        def _status():
+            return models.TxAction.get(models.TxAction.txid == "txid_a").status
+
+        with self.subTest("Failed to be checked"):
+            fake_provider_manager.batch_get_transaction_by_txids.side_effect = IOError("Connection refused")
+            manager.update_pending_actions()
+            self.assertEqual(data.TxActionStatus.PENDING, _status())
+
+        with self.subTest("Not due"):
+            fake_provider_manager.batch_get_transaction_by_txids.reset_mock(side_effect=True)
+            fake_provider_manager.batch_get_transaction_by_txids.return_value = []
+            manager._PENDING_TX_TRACKER.mark_checked([("eth", "txid_a")], time.time())
+            manager.update_pending_actions()
+            fake_provider_manager.batch_get_transaction_by_txids.assert_not_called()
+            self.assertEqual(data.TxActionStatus.PENDING, _status())
+
+        with self.subTest("Checked and still not found"):
+            manager.update_pending_actions(txid="txid_a")
+            fake_provider_manager.batch_get_transaction_by_txids.assert_called_once_with("eth", ["txid_a"])
+            self.assertEqual(data.TxActionStatus.UNKNOWN, _status())
+
+    @patch("tilapia.lib.transaction.manager._PENDING_TX_TRACKER", tracker.PendingTxTracker(15, 1800))
+    @patch("tilapia.lib.transaction.manager.time")
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    def test_update_pending_actions__backoff(self, fake_provider_manager, fake_time):
+        created_time = datetime.datetime.now() - datetime.timedelta(minutes=10)
+        daos.new_action(
+            txid="txid_a",
+            status=data.TxActionStatus.PENDING,
+            chain_code="eth",
+            coin_code="eth",
+            value=decimal.Decimal(0),
+            from_address="address_a",
+            to_address="address_b",
+            fee_limit=decimal.Decimal(1000),
+            created_time=created_time,
+        ).save()
+        fake_provider_manager.batch_get_transaction_by_txids.return_value = []
+
+        for seconds, checked in ((0, True), (60, False), (959, False), (960, True), (1000, False)):
+            with self.subTest(seconds=seconds):
+                fake_time.time.return_value = created_time.timestamp() + 600 + seconds
+                manager.update_pending_actions()
+                self.assertEqual(checked, fake_provider_manager.batch_get_transaction_by_txids.called)
+                fake_provider_manager.batch_get_transaction_by_txids.reset_mock()
+
+        self.assertEqual(
+            {
+                "queue_size": 1,
+                "due": 0,
+                "age_histogram": {"<1m": 0, "<10m": 0, "<1h": 1, "<1d": 0, ">=1d": 0},
+                "chains": {"eth": {"pending": 1, "due": 0, "lag": 40}},
+            },
+            manager.get_pending_tracker_metrics(),
+        )
+
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    def test_raw_txs(self, fake_coin_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(chain_model=coin_data.ChainModel.ACCOUNT)
+        fake_coin_manager.get_coin_info.return_value = Mock(code="eth")
+        fake_coin_manager.query_coins_by_token_addresses.return_value = []
+        raw_tx = "0x" + "f86b" * 100
+        action_info = dict(
+            status=data.TxActionStatus.CONFIRM_SUCCESS,
+            chain_code="eth",
+            coin_code="eth",
+            value=decimal.Decimal(1),
+            from_address="address_a",
+            to_address="address_b",
+            fee_limit=decimal.Decimal(21000),
+            block_number=1,
+        )
+
+        # 1. the raw tx of a local action is stored apart and compressed
+        manager.create_action(txid="txid_a", raw_tx=raw_tx, **action_info)
+        manager.create_action(txid="txid_b", raw_tx="", **action_info)
+        self.assertEqual(1, models.RawTx.select().count())
+        self.assertLess(len(models.RawTx.get().payload), len(raw_tx) / 10)
+
+        # 2. the raw txs of the synced actions are saved once for each txid
+        tx = provider_data.Transaction(
+            txid="txid_c",
+            status=provider_data.TransactionStatus.PENDING,
+            inputs=[provider_data.TransactionInput(address="address_a", value=1)] * 2,
+            outputs=[provider_data.TransactionOutput(address="address_b", value=1)] * 2,
+            fee=provider_data.TransactionFee(limit=21000, used=21000),
+            raw_tx="c0ffee",
+        )
+        self.assertEqual(1, manager._save_synced_actions("eth", [daos.new_action(txid="txid_c", **action_info)], [tx]))
+        self.assertEqual(
+            {"txid_a": raw_tx, "txid_c": "c0ffee"}, manager.query_raw_txs("eth", ["txid_a", "txid_b", "txid_c"])
+        )
+        self.assertIsNone(manager.get_raw_tx("eth", "txid_b"))
+
+        # 3. the raw txs of the old confirmed actions are moved to the archive file
+        self.assertEqual(0, manager.archive_raw_txs(min_age_days=0))  # No archive file configured
+
+        with tempfile.TemporaryDirectory() as tmp_dir, patch.dict(
+            "tilapia.lib.conf.settings.RAW_TX_ARCHIVE", {"path": os.path.join(tmp_dir, "archive.sqlite")}
+        ):
+            try:
+                models.TxAction.update(created_time=datetime.datetime.now() - datetime.timedelta(days=10)).where(
+                    models.TxAction.txid == "txid_a"
+                ).execute()
+                self.assertEqual(0, manager.archive_raw_txs())
+                self.assertEqual(1, manager.archive_raw_txs(min_age_days=7))
+                self.assertEqual(["txid_c"], [i.txid for i in models.RawTx.select()])
+                self.assertEqual(raw_tx, manager.get_raw_tx("eth", "txid_a"))
+            finally:
+                models.archive_database.obj.close()
+                models.archive_database.initialize(None)
+
     def test_unique_indexes_of_tx_action(self):
         models.TxAction.create(
             txid="txid_a",
@@ -248,7 +433,6 @@ class TestTransactionManager(TestCase):
             to_address="contract_a",
             fee_limit=decimal.Decimal(1000),
             fee_price_per_unit=decimal.Decimal(20),
-            raw_tx="",
             nonce=0,
             index=0,
         )
@@ -266,15 +450,13 @@ class TestTransactionManager(TestCase):
                 to_address="contract_a",
                 fee_limit=decimal.Decimal(1000),
                 fee_price_per_unit=decimal.Decimal(20),
-                raw_tx="",
                 nonce=0,
                 index=0,
             )
 
     @patch("tilapia.lib.transaction.manager.provider_manager")
     @patch("tilapia.lib.transaction.manager.coin_manager")
-    @patch("tilapia.lib.transaction.manager.time")
-    def test_query_actions_by_address(self, fake_time, fake_coin_manager, fake_provider_manager):
+    def test_query_actions_by_address(self, fake_coin_manager, fake_provider_manager):
         fake_coin_manager.get_chain_info.return_value = Mock(chain_model=coin_data.ChainModel.ACCOUNT)
         fake_coin_manager.get_coin_info.return_value = Mock(code="eth")
         fake_coin_manager.query_coins_by_token_addresses.return_value = []
@@ -289,7 +471,6 @@ class TestTransactionManager(TestCase):
                 to_address="address_b",
                 fee_limit=decimal.Decimal(1000),
                 fee_price_per_unit=decimal.Decimal(20),
-                raw_tx="",
             )
             _data = pattern.copy()
             _data.update(kwargs)
@@ -357,66 +538,34 @@ class TestTransactionManager(TestCase):
             and (not paginate.end_block_number or i.block_header.block_number <= paginate.end_block_number)
         ][: paginate.items_per_page]
 
-        # 2. fetch the first page
-        fake_time.time.return_value = 1620000000
+        # 3. fetch the first page, the history is synced inline since the cursor is missing
         local_actions = manager.query_actions_by_address("eth", "eth", "address_a")
         self.assertEqual(
             txids[:20],
             [i.txid for i in local_actions],
         )
-        self.assertEqual(201, models.TxAction.select().count())
-        fake_time.time.assert_called_once()
-        fake_provider_manager.verify_address.assert_called_once_with("eth", "address_a")
-        fake_provider_manager.search_txs_by_address.assert_called_once_with(
-            "eth", "address_a", paginate=provider_data.TxPaginate(items_per_page=200)
-        )
-        fake_time.time.reset_mock()
-        fake_provider_manager.verify_address.reset_mock()
-        fake_provider_manager.search_txs_by_address.reset_mock()
-
-        # 3. fetch the following 9 pages without network
-        for page_number in range(2, 11):
-            local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=page_number))
-
-        self.assertEqual(201, models.TxAction.select().count())
-        self.assertEqual(200, len(local_actions))
-        self.assertEqual(txids[:200], [i.txid for i in local_actions])
-        self.assertEqual(9, fake_provider_manager.verify_address.call_count)
-        fake_time.time.assert_not_called()
-        fake_provider_manager.search_txs_by_address.assert_not_called()
-
-        # 4. fetch the remaining txs
-        local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=11))
-
         self.assertEqual(301, models.TxAction.select().count())
-        fake_time.time.assert_not_called()
-        fake_provider_manager.search_txs_by_address.assert_called_once_with(
-            "eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=100, items_per_page=200)
+        fake_provider_manager.verify_address.assert_called_once_with("eth", "address_a")
+        fake_provider_manager.search_txs_by_address.assert_has_calls(
+            [
+                call("eth", "address_a", paginate=provider_data.TxPaginate(items_per_page=200)),
+                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=100, items_per_page=200)),
+            ]
         )
+        self.assertEqual(2, fake_provider_manager.search_txs_by_address.call_count)
+        cursor = daos.get_sync_cursor("eth", "address_a")
+        self.assertEqual((299, txs[0].txid, None), (cursor.last_block_number, cursor.last_txid, cursor.page_token))
         fake_provider_manager.search_txs_by_address.reset_mock()
 
-        # 5. fetch the following 4 pages without network
-        for page_number in range(12, 16):
+        # 4. fetch the following pages without network
+        for page_number in range(2, 17):
             local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=page_number))
 
-        self.assertEqual(301, models.TxAction.select().count())
-        self.assertEqual(300, len(local_actions))
-        self.assertEqual(txids[:300], [i.txid for i in local_actions])
-        fake_time.time.assert_not_called()
-        fake_provider_manager.search_txs_by_address.assert_not_called()
-        fake_provider_manager.search_txs_by_address.reset_mock()
-
-        # 6. fetch the final page
-        local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=16))
         self.assertEqual(301, len(local_actions))
         self.assertEqual(txids, [i.txid for i in local_actions])
-        fake_time.time.assert_not_called()
-        fake_provider_manager.search_txs_by_address.assert_called_once_with(
-            "eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=0, items_per_page=200)
-        )
-        fake_provider_manager.search_txs_by_address.reset_mock()
+        fake_provider_manager.search_txs_by_address.assert_not_called()
 
-        # 7. suppose there are new data after a while, prepare new data
+        # 5. suppose there are new data after a while, prepare new data
         send_from_a = [
             provider_data.Transaction(
                 txid=f"txid_from_a_{i}",
@@ -457,124 +606,67 @@ class TestTransactionManager(TestCase):
         new_txids.remove("txid_from_a_100")
         txids = [*new_txids, *txids]
 
-        # 8. fetch the first page again
-        fake_time.time.return_value = 1640000000
-        local_actions = manager.query_actions_by_address("eth", "eth", "address_a")
-        self.assertEqual(
-            txids[:20],
-            [i.txid for i in local_actions],
-        )
-        self.assertEqual(501, models.TxAction.select().count())
-        fake_time.time.assert_called_once()
-        fake_provider_manager.search_txs_by_address.assert_called_once_with(
-            "eth", "address_a", paginate=provider_data.TxPaginate(start_block_number=298, items_per_page=200)
-        )
-        fake_time.time.reset_mock()
-        fake_provider_manager.verify_address.reset_mock()
-        fake_provider_manager.search_txs_by_address.reset_mock()
-
-        # 9. fetch the following 9 pages without network
-        for page_number in range(2, 11):
-            local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=page_number))
-
-        self.assertEqual(501, models.TxAction.select().count())
-        self.assertEqual(200, len(local_actions))
-        self.assertEqual(txids[:200], [i.txid for i in local_actions])
-        fake_time.time.assert_not_called()
+        # 6. the cursor is fresh enough, serve from the local database only
+        self.assertEqual(txids[299:319], [i.txid for i in manager.query_actions_by_address("eth", "eth", "address_a")])
         fake_provider_manager.search_txs_by_address.assert_not_called()
 
-        # 10. fetch the remaining txs between 298 to 400
-        local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=11))
-
+        # 7. the cursor is stale, sync from the last synced block incrementally
+        local_actions = manager.query_actions_by_address("eth", "eth", "address_a", max_staleness=0)
+        self.assertEqual(txids[:20], [i.txid for i in local_actions])
         self.assertEqual(600, models.TxAction.select().count())
-        self.assertEqual(txids[:220], [i.txid for i in local_actions])
-        fake_time.time.assert_not_called()
-        fake_provider_manager.search_txs_by_address.assert_called_once_with(
-            "eth",
-            "address_a",
-            paginate=provider_data.TxPaginate(start_block_number=298, end_block_number=400, items_per_page=200),
+        fake_provider_manager.search_txs_by_address.assert_has_calls(
+            [
+                call("eth", "address_a", paginate=provider_data.TxPaginate(start_block_number=298, items_per_page=200)),
+                call(
+                    "eth",
+                    "address_a",
+                    paginate=provider_data.TxPaginate(start_block_number=298, end_block_number=400, items_per_page=200),
+                ),
+            ]
         )
+        self.assertEqual(2, fake_provider_manager.search_txs_by_address.call_count)
+        self.assertEqual(599, daos.get_sync_cursor("eth", "address_a").last_block_number)
         fake_provider_manager.search_txs_by_address.reset_mock()
 
-        # 11. fetch the following all pages
-        for page_number in range(12, 31):
+        # 8. fetch the following all pages
+        for page_number in range(2, 31):
             local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=page_number))
 
         self.maxDiff = None
-        self.assertEqual(600, models.TxAction.select().count())
         self.assertEqual(600, len(local_actions))
         self.assertEqual(txids, [i.txid for i in local_actions])
-        fake_time.time.assert_not_called()
         fake_provider_manager.search_txs_by_address.assert_not_called()
 
-        # 12. nothing anymore
-        local_actions.extend(manager.query_actions_by_address("eth", "eth", "address_a", page_number=31))
-        self.assertEqual(600, models.TxAction.select().count())
-        self.assertEqual(600, len(local_actions))
-        fake_provider_manager.search_txs_by_address.assert_called_once_with(
-            "eth",
-            "address_a",
-            paginate=provider_data.TxPaginate(end_block_number=0, page_number=1, items_per_page=200),
-        )
-        fake_provider_manager.search_txs_by_address.reset_mock()
-
-        # 13. check searching_address_as argument
-        fake_time.time.return_value = 1650000000
+        # 9. check searching_address_as argument
         self.assertEqual(
             [i for i in txids if "from" in i],
             [
                 i.txid
                 for i in manager.query_actions_by_address(
-                    "eth", "eth", "address_a", searching_address_as="sender", items_per_page=600
+                    "eth", "eth", "address_a", searching_address_as="sender", items_per_page=600, max_staleness=None
                 )
             ],
         )
-        fake_provider_manager.search_txs_by_address.assert_has_calls(
-            [
-                call(
-                    "eth",
-                    "address_a",
-                    paginate=provider_data.TxPaginate(start_block_number=598, page_number=1, items_per_page=200),
-                ),
-                call(
-                    "eth",
-                    "address_a",
-                    paginate=provider_data.TxPaginate(end_block_number=0, page_number=1, items_per_page=400),
-                ),
-            ]
-        )
-        fake_provider_manager.search_txs_by_address.reset_mock()
-
-        fake_time.time.return_value = 1660000000
         self.assertEqual(
             [i for i in txids if "to" in i],
             [
                 i.txid
                 for i in manager.query_actions_by_address(
-                    "eth", "eth", "address_a", searching_address_as="receiver", items_per_page=600
+                    "eth", "eth", "address_a", searching_address_as="receiver", items_per_page=600, max_staleness=None
                 )
             ],
         )
-        fake_provider_manager.search_txs_by_address.assert_has_calls(
-            [
-                call(
-                    "eth",
-                    "address_a",
-                    paginate=provider_data.TxPaginate(start_block_number=598, page_number=1, items_per_page=200),
-                ),
-                call(
-                    "eth",
-                    "address_a",
-                    paginate=provider_data.TxPaginate(end_block_number=0, page_number=1, items_per_page=400),
-                ),
-            ]
-        )
+        fake_provider_manager.search_txs_by_address.assert_not_called()
+
+        # 10. never sync inline without max_staleness
+        self.assertEqual([], manager.query_actions_by_address("eth", "eth", "address_c", max_staleness=None))
+        self.assertIsNone(daos.get_sync_cursor("eth", "address_c"))
+        fake_provider_manager.search_txs_by_address.assert_not_called()
 
+    @patch("tilapia.lib.transaction.manager.SYNC_ITEMS_PER_PAGE", 3)
     @patch("tilapia.lib.transaction.manager.provider_manager")
     @patch("tilapia.lib.transaction.manager.coin_manager")
-    @patch("tilapia.lib.transaction.manager.time")
-    def test_query_actions_by_address_check_max_times(self, fake_time, fake_coin_manager, fake_provider_manager):
-        fake_time.time.return_value = 1610000000
+    def test_sync_actions_by_address__resume(self, fake_coin_manager, fake_provider_manager):
         fake_coin_manager.get_chain_info.return_value = Mock(chain_model=coin_data.ChainModel.ACCOUNT)
         fake_coin_manager.get_coin_info.return_value = Mock(code="eth")
         fake_coin_manager.query_coins_by_token_addresses.return_value = []
@@ -592,17 +684,608 @@ class TestTransactionManager(TestCase):
                 ),
                 nonce=i,
             )
-            for i in range(10)
+            for i in reversed(range(10))
         ]
-        fake_provider_manager.search_txs_by_address.side_effect = lambda *args, **kwargs: [txs.pop()] if txs else []
+        fake_provider_manager.search_txs_by_address.side_effect = lambda chain_code, address, paginate: [
+            i
+            for i in txs
+            if (paginate.start_block_number is None or i.block_header.block_number >= paginate.start_block_number)
+            and (paginate.end_block_number is None or i.block_header.block_number <= paginate.end_block_number)
+        ][: paginate.items_per_page]
 
-        local_actions = manager.query_actions_by_address("eth", "eth", "address_a")
-        self.assertEqual(["txid_from_a_9", "txid_from_a_8", "txid_from_a_7"], [i.txid for i in local_actions])
-        fake_time.time.assert_called_once()
+        # 1. run out of pages, the unfinished round is saved as the page token
+        self.assertEqual(3, manager.sync_actions_by_address("eth", "address_a", max_pages=1))
+        cursor = daos.get_sync_cursor("eth", "address_a")
+        self.assertEqual((None, "1009:1007:txid_from_a_9"), (cursor.last_block_number, cursor.page_token))
+        self.assertIsNotNone(cursor.synced_time)
+
+        # 2. the unfinished round is resumed on demand while reading
+        local_actions = manager.query_actions_by_address("eth", "eth", "address_a", items_per_page=5)
+        self.assertEqual([f"txid_from_a_{i}" for i in range(9, 4, -1)], [i.txid for i in local_actions])
+        self.assertEqual(10, models.TxAction.select().count())
         fake_provider_manager.search_txs_by_address.assert_has_calls(
             [
-                call("eth", "address_a", paginate=provider_data.TxPaginate(items_per_page=200)),
-                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=1009, items_per_page=400)),
-                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=1008, items_per_page=800)),
+                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=1007, items_per_page=3)),
+                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=1005, items_per_page=3)),
+                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=1003, items_per_page=3)),
+                call("eth", "address_a", paginate=provider_data.TxPaginate(end_block_number=1001, items_per_page=3)),
             ]
         )
+        cursor = daos.get_sync_cursor("eth", "address_a")
+        self.assertEqual((1009, "txid_from_a_9", None), (cursor.last_block_number, cursor.last_txid, cursor.page_token))
+
+        # 3. skip the address being synced by others
+        fake_provider_manager.search_txs_by_address.reset_mock()
+        with timeout_lock("transaction_manager.sync_actions_by_address:eth:address_a"):
+            self.assertEqual(0, manager.sync_actions_by_address("eth", "address_a", lock_timeout=0))
+        fake_provider_manager.search_txs_by_address.assert_not_called()
+
+    @patch("tilapia.lib.transaction.manager.sync_actions_by_address")
+    def test_sync_stale_cursors(self, fake_sync_actions_by_address):
+        fake_sync_actions_by_address.return_value = 1
+        now = datetime.datetime.now()
+        models.AddressSyncCursor.create(chain_code="eth", address="address_a", synced_time=now)
+        models.AddressSyncCursor.create(chain_code="eth", address="address_b")
+        models.AddressSyncCursor.create(
+            chain_code="eth", address="address_c", synced_time=now - datetime.timedelta(minutes=5)
+        )
+        models.AddressSyncCursor.create(chain_code="eth", address="address_d", synced_time=now, page_token="1:0:txid")
+
+        self.assertEqual({"cursors": 3, "expanded": 3, "expired": 0}, manager.sync_stale_cursors(max_workers=1))
+        fake_sync_actions_by_address.assert_has_calls(
+            [
+                call("eth", "address_b", lock_timeout=0),
+                call("eth", "address_c", lock_timeout=0),
+                call("eth", "address_d", lock_timeout=0),
+            ],
+            any_order=True,
+        )
+        self.assertEqual(3, fake_sync_actions_by_address.call_count)
+
+    @patch("tilapia.lib.transaction.manager.sync_actions_by_address")
+    def test_sync_stale_cursors__expire_unwatched(self, fake_sync_actions_by_address):
+        fake_sync_actions_by_address.return_value = 0
+        long_ago = datetime.datetime.now() - datetime.timedelta(seconds=manager.UNWATCHED_CURSOR_TTL + 60)
+        models.AddressSyncCursor.create(chain_code="eth", address="address_a", read_time=long_ago)  # watched
+        models.AddressSyncCursor.create(chain_code="eth", address="address_b", read_time=long_ago)
+        models.AddressSyncCursor.create(chain_code="eth", address="address_c", read_time=datetime.datetime.now())
+        models.AddressSyncCursor.create(chain_code="eth", address="address_d")  # not created by reading
+        manager.watch_addresses("eth", ["address_a"])
+        self.addCleanup(manager.unwatch_addresses, "eth", ["address_a"])
+
+        self.assertEqual({"cursors": 3, "expanded": 0, "expired": 1}, manager.sync_stale_cursors(max_workers=1))
+        self.assertEqual(
+            ["address_a", "address_c", "address_d"],
+            sorted(i.address for i in models.AddressSyncCursor.select()),
+        )
+        self.assertEqual(
+            ["address_a", "address_c", "address_d"],
+            sorted(i.args[1] for i in fake_sync_actions_by_address.call_args_list),
+        )
+
+        with self.subTest("The cursor is created again on the next read"), patch(
+            "tilapia.lib.transaction.manager.provider_manager"
+        ) as fake_provider_manager, patch("tilapia.lib.transaction.manager._get_action_factory") as fake_get_factory:
+            fake_provider_manager.verify_address.return_value = Mock(normalized_address="address_b")
+            fake_get_factory.return_value = Mock()
+            manager.query_actions_by_address("eth", "eth", "address_b")
+            self.assertIsNotNone(daos.get_sync_cursor("eth", "address_b").read_time)
+
+        with self.subTest("The read time is refreshed on reading"), patch(
+            "tilapia.lib.transaction.manager.provider_manager"
+        ) as fake_provider_manager, patch("tilapia.lib.transaction.manager._get_action_factory") as fake_get_factory:
+            fake_provider_manager.verify_address.return_value = Mock(normalized_address="address_d")
+            fake_get_factory.return_value = Mock()
+            manager.query_actions_by_address("eth", "eth", "address_d")
+            self.assertIsNotNone(daos.get_sync_cursor("eth", "address_d").read_time)
+
+    @patch("tilapia.lib.transaction.manager.utxo_manager")
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    def test_sync_actions_by_utxo_addresses(self, fake_coin_manager, fake_provider_manager, fake_utxo_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(chain_model=coin_data.ChainModel.UTXO)
+        fake_coin_manager.get_coin_info.return_value = Mock(code="btc")
+
+        def _input(txid: str, vout: int) -> provider_data.TransactionInput:
+            return provider_data.TransactionInput(
+                address="", value=0, utxo=provider_data.UTXO(txid=txid, vout=vout, value=0)
+            )
+
+        def _tx(txid: str, inputs: list, outputs: list, vsize: int, block_number: int = None):
+            return provider_data.Transaction(
+                txid=txid,
+                status=provider_data.TransactionStatus.CONFIRM_SUCCESS
+                if block_number is not None
+                else provider_data.TransactionStatus.PENDING,
+                inputs=inputs,
+                outputs=[provider_data.TransactionOutput(address=address, value=value) for address, value in outputs],
+                fee=provider_data.TransactionFee(limit=vsize, used=vsize, price_per_unit=0),
+                block_header=provider_data.BlockHeader(
+                    block_hash=f"block_{block_number}", block_number=0, block_time=1600000000 + block_number
+                )
+                if block_number is not None
+                else None,
+            )
+
+        txs = {
+            "prev_0": _tx("prev_0", [_input("coinbase", 0)], [("address_x", 6000)], 100, 50),
+            "txid_1": _tx("txid_1", [_input("prev_0", 0)], [("address_a", 5000)], 200, 100),
+            "txid_2": _tx("txid_2", [_input("txid_1", 0)], [("address_c", 3000), ("address_a", 1900)], 100, 101),
+            "txid_3": _tx("txid_3", [_input("txid_2", 1)], [("address_b", 1800), ("", 0)], 50),
+        }
+        fake_provider_manager.get_client_by_chain.return_value = Mock()
+        fake_provider_manager.batch_search_txids_by_addresses.return_value = {
+            "address_a": [("txid_1", 100), ("txid_2", 101), ("txid_3", 0)],
+            "address_b": [("txid_3", 0)],
+        }
+        fake_provider_manager.batch_get_transactions_without_prevouts.side_effect = lambda chain_code, txids: [
+            txs[i] for i in txids
+        ]
+
+        # 1. the prevouts of all the txs are resolved in one batch
+        self.assertEqual(3, manager.sync_actions_by_utxo_addresses("btc", ["address_a", "address_b"]))
+        fake_provider_manager.batch_get_transactions_without_prevouts.assert_has_calls(
+            [call("btc", ["txid_1", "txid_2", "txid_3"]), call("btc", ["prev_0"])]
+        )
+        self.assertEqual(2, fake_provider_manager.batch_get_transactions_without_prevouts.call_count)
+        self.assertEqual(6, models.TxOutput.select().count())
+
+        actions = models.TxAction.select().order_by(models.TxAction.txid)
+        self.assertEqual(
+            [
+                ("txid_1", "address_x", "address_a", 5000, 5, 100, data.TxActionStatus.CONFIRM_SUCCESS),
+                ("txid_2", "address_a", "address_c", 3000, 1, 101, data.TxActionStatus.CONFIRM_SUCCESS),
+                ("txid_3", "address_a", "address_b", 1800, 2, None, data.TxActionStatus.PENDING),
+            ],
+            [
+                (i.txid, i.from_address, i.to_address, i.value, i.fee_price_per_unit, i.block_number, i.status)
+                for i in actions
+            ],
+        )
+        self.assertEqual(
+            [("address_a", 101), ("address_b", None)],
+            [
+                (i.address, i.last_block_number)
+                for i in models.AddressSyncCursor.select().order_by(models.AddressSyncCursor.address)
+            ],
+        )
+
+        # 2. only the newly confirmed tx is requested, and its prevouts are resolved locally
+        fake_provider_manager.batch_get_transactions_without_prevouts.reset_mock()
+        fake_provider_manager.batch_search_txids_by_addresses.return_value = {
+            "address_a": [("txid_1", 100), ("txid_2", 101), ("txid_3", 102)],
+            "address_b": [("txid_3", 102)],
+        }
+        txs["txid_3"] = _tx("txid_3", [_input("txid_2", 1)], [("address_b", 1800), ("", 0)], 50, 102)
+        self.assertEqual(1, manager.sync_actions_by_utxo_addresses("btc", ["address_a", "address_b"]))
+        fake_provider_manager.batch_get_transactions_without_prevouts.assert_called_once_with("btc", ["txid_3"])
+        action = models.TxAction.get(models.TxAction.txid == "txid_3")
+        self.assertEqual((data.TxActionStatus.CONFIRM_SUCCESS, 102), (action.status, action.block_number))
+        fake_utxo_manager.mark_utxos_spent_by_txid.assert_called_once_with("btc", "txid_3")
+
+        # 3. syncing a single address goes the same way
+        self.assertEqual(0, manager.sync_actions_by_address("btc", "address_b"))
+        fake_provider_manager.batch_search_txids_by_addresses.assert_called_with("btc", ["address_b"])
+
+        # 4. the addresses synced by the others are skipped, the rest of the set goes on
+        held_key = throttle_manager.key_of("history_sync", "btc", "address_a")
+        throttle_manager.acquire([held_key], 60)
+        self.assertEqual(0, manager.sync_actions_by_utxo_addresses("btc", ["address_b", "address_a"]))
+        fake_provider_manager.batch_search_txids_by_addresses.assert_called_with("btc", ["address_b"])
+        self.assertEqual([held_key], [i.key for i in throttle_models.Throttle.select()])  # Released the others
+        throttle_manager.release([held_key])
+
+        # 5. the addresses locked in this process are skipped at once, instead of waiting for the lock timeout
+        with timeout_lock("transaction_manager.sync_actions_by_address:btc:address_a", timeout=0):
+            started_at = time.time()
+            self.assertEqual(
+                0, manager.sync_actions_by_utxo_addresses("btc", ["address_b", "address_a"], lock_timeout=10)
+            )
+            self.assertLess(time.time() - started_at, 5)
+            fake_provider_manager.batch_search_txids_by_addresses.assert_called_with("btc", ["address_b"])
+
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    def test_tx_action_factory__utxo_model(self, fake_coin_manager):
+        fake_coin_manager.get_coin_info.return_value = Mock(code="btc")
+        tx = provider_data.Transaction(
+            txid="txid_1",
+            status=provider_data.TransactionStatus.CONFIRM_SUCCESS,
+            inputs=[
+                provider_data.TransactionInput(address="address_x", value=1000),
+                provider_data.TransactionInput(address="address_b", value=2000),
+            ],
+            outputs=[
+                provider_data.TransactionOutput(address="address_c", value=2500),
+                provider_data.TransactionOutput(address="address_b", value=400),
+            ],
+            fee=provider_data.TransactionFee(limit=100, used=100, price_per_unit=1),
+        )
+
+        for addresses, expected_from_address in ((None, "address_x"), ({"address_b"}, "address_b")):
+            with self.subTest(addresses=addresses):
+                self.assertEqual(
+                    [("address_c", 2500, expected_from_address)],
+                    [
+                        (i.to_address, i.value, i.from_address)
+                        for i in manager._tx_action_factory__utxo_model("btc", [tx], addresses)
+                    ],
+                )
+
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    def test_query_actions_by_address__page_cursor(self, fake_provider_manager):
+        fake_provider_manager.verify_address.side_effect = lambda chain_code, address: Mock(normalized_address=address)
+        daos.bulk_create(
+            daos.new_action(
+                txid=f"txid_{i}",
+                status=data.TxActionStatus.CONFIRM_SUCCESS,
+                chain_code="eth",
+                coin_code="eth",
+                value=decimal.Decimal(10),
+                from_address="address_a" if i % 3 else "address_b",
+                to_address="address_a" if i % 2 else "address_c",
+                fee_limit=decimal.Decimal(1000),
+                created_time=datetime.datetime.utcfromtimestamp(1600000000 + i // 4),  # with the same created time
+            )
+            for i in range(50)
+        )
+
+        for searching_address_as in ("sender", "receiver", "both"):
+            with self.subTest(searching_address_as=searching_address_as):
+                expected_txids = [
+                    i.txid
+                    for i in manager.query_actions_by_address(
+                        "eth",
+                        "eth",
+                        "address_a",
+                        items_per_page=50,
+                        searching_address_as=searching_address_as,
+                        max_staleness=None,
+                    )
+                ]
+
+                txids, page_cursor = [], None
+                while True:
+                    actions = manager.query_actions_by_address(
+                        "eth",
+                        "eth",
+                        "address_a",
+                        items_per_page=7,
+                        searching_address_as=searching_address_as,
+                        page_cursor=page_cursor,
+                        max_staleness=None,
+                    )
+                    txids.extend(i.txid for i in actions)
+                    if len(actions) < 7:
+                        break
+
+                    page_cursor = manager.encode_page_cursor(actions[-1])
+
+                self.assertEqual(expected_txids, txids)
+
+        with self.assertRaises(exceptions.InvalidPageCursor):
+            manager.query_actions_by_address("eth", "eth", "address_a", page_cursor="illegal", max_staleness=None)
+
+    def test_query_actions_by_address__seek_on_index(self):
+        for address_field in ("from_address", "to_address"):
+            with self.subTest(address_field=address_field):
+                query = (
+                    models.TxAction.select()
+                    .where(
+                        models.TxAction.chain_code == "eth",
+                        models.TxAction.coin_code == "eth",
+                        getattr(models.TxAction, address_field) == "address_a",
+                        models.TxAction.created_time <= datetime.datetime.now(),
+                        (models.TxAction.created_time < datetime.datetime.now()) | (models.TxAction.id < 100),
+                    )
+                    .order_by(models.TxAction.created_time.desc(), models.TxAction.id.desc())
+                    .limit(20)
+                )
+                sql, params = query.sql()
+                plan = " ".join(
+                    str(i) for i in models.TxAction._meta.database.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params)
+                )
+
+                self.assertIn(f"txaction_chain_code_coin_code_{address_field}_created_time", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    def test_mark_actions_replaced(self, fake_coin_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(
+            chain_model=coin_data.ChainModel.ACCOUNT, nonce_supported=False
+        )
+        daos.bulk_create(
+            daos.new_action(
+                txid=txid,
+                status=data.TxActionStatus.PENDING,
+                chain_code="eth",
+                coin_code="eth",
+                value=decimal.Decimal(10),
+                from_address="address_a",
+                to_address="address_b",
+                fee_limit=decimal.Decimal(21000),
+            )
+            for txid in ("txid_a", "txid_b")
+        )
+
+        manager.mark_actions_replaced("eth", "txid_a", "txid_b")
+        self.assertEqual(
+            [("txid_a", data.TxActionStatus.REPLACED, "txid_b"), ("txid_b", data.TxActionStatus.PENDING, None)],
+            [(i.txid, i.status, i.replaced_by) for i in models.TxAction.select().order_by(models.TxAction.id)],
+        )
+        self.assertEqual(["txid_b"], [i.txid for i in daos.query_actions_by_status(data.TxActionStatus.PENDING)])
+
+        with self.assertRaisesRegex(Exception, "Can't be replaced by itself"):
+            manager.mark_actions_replaced("eth", "txid_a", "txid_a")
+
+        with self.subTest("The superseded tx is mined after all"):
+            manager._on_transaction_confirmed(
+                chain_code="eth",
+                txid="txid_a",
+                status=data.TxActionStatus.CONFIRM_SUCCESS,
+                fee_used=decimal.Decimal(21000),
+                block_number=1001,
+                block_hash="block_a",
+                block_time=1600000000,
+            )
+            self.assertEqual(
+                [
+                    ("txid_a", data.TxActionStatus.CONFIRM_SUCCESS, None),
+                    ("txid_b", data.TxActionStatus.REPLACED, "txid_a"),
+                ],
+                [(i.txid, i.status, i.replaced_by) for i in models.TxAction.select().order_by(models.TxAction.id)],
+            )
+
+    @patch("tilapia.lib.transaction.manager.price_manager")
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    def test_export_actions_by_address(self, fake_provider_manager, fake_coin_manager, fake_price_manager):
+        fake_provider_manager.verify_address.side_effect = lambda chain_code, address: Mock(normalized_address=address)
+        fake_coin_manager.get_chain_info.return_value = Mock(fee_coin="eth")
+        fake_coin_manager.get_coin_info.return_value = Mock(decimals=18)
+        fake_price_manager.get_last_price.return_value = decimal.Decimal("2000")
+        daos.bulk_create(
+            daos.new_action(
+                txid=f"txid_{i}",
+                status=data.TxActionStatus.CONFIRM_SUCCESS,
+                chain_code="eth",
+                coin_code="eth",
+                value=decimal.Decimal(10**17 * i),
+                from_address="address_a",
+                to_address="address_b",
+                fee_limit=decimal.Decimal(21000),
+                fee_price_per_unit=decimal.Decimal(10**9),
+                created_time=datetime.datetime.utcfromtimestamp(1600000000 + i),
+            )
+            for i in range(5)
+        )
+
+        with patch.object(manager, "EXPORT_ROWS_PER_CHUNK", 2):
+            with self.subTest("NDJSON"):
+                chunks = list(manager.export_actions_by_address("eth", "address_a", fiat_unit="export_unit"))
+                self.assertEqual(3, len(chunks))  # 2 + 2 + 1
+                rows = [json.loads(i) for i in b"".join(chunks).decode().splitlines()]
+                self.assertEqual([f"txid_{i}" for i in range(4, -1, -1)], [i["txid"] for i in rows])
+                self.assertEqual(
+                    {
+                        "txid": "txid_4",
+                        "status": "CONFIRM_SUCCESS",
+                        "coin_code": "eth",
+                        "value": "400000000000000000",
+                        "amount": "0.4",
+                        "from_address": "address_a",
+                        "to_address": "address_b",
+                        "fee": "21000000000000",
+                        "fee_amount": "0.000021",
+                        "block_number": None,
+                        "block_time": None,
+                        "created_time": 1600000004,
+                        "fiat_unit": "export_unit",
+                        "fiat_price": "2000",
+                        "fiat_value": "800",
+                        "fiat_fee": "0.042",
+                    },
+                    rows[0],
+                )
+                fake_price_manager.get_last_price.assert_called_once_with("eth", "export_unit")
+
+            with self.subTest("CSV"):
+                chunks = list(
+                    manager.export_actions_by_address("eth", "address_a", file_format="csv", fiat_unit="export_unit")
+                )
+                self.assertEqual(3, len(chunks))
+                rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+                self.assertEqual(list(manager.EXPORT_COLUMNS), list(rows[0].keys()))
+                self.assertEqual(5, len(rows))
+                self.assertEqual(
+                    ("txid_0", "0", "0", "", "0.042"),
+                    tuple(rows[-1][i] for i in ("txid", "amount", "fiat_value", "block_number", "fiat_fee")),
+                )
+
+            with self.subTest("Nothing to export"):
+                chunks = list(manager.export_actions_by_address("eth", "address_c", file_format="csv"))
+                self.assertEqual([(",".join(manager.EXPORT_COLUMNS) + "\r\n").encode()], chunks)
+                self.assertEqual([], list(manager.export_actions_by_address("eth", "address_c")))
+
+        with self.assertRaisesRegex(Exception, "Unsupported file format"):
+            manager.export_actions_by_address("eth", "address_a", file_format="xlsx")
+
+    def test_iterate_actions_by_address(self):
+        daos.bulk_create(
+            daos.new_action(
+                txid=f"txid_{i}",
+                status=data.TxActionStatus.CONFIRM_SUCCESS,
+                chain_code="eth",
+                coin_code="eth",
+                value=decimal.Decimal(10),
+                from_address="address_a" if i % 3 else "address_b",
+                to_address="address_a" if i % 2 else "address_c",
+                fee_limit=decimal.Decimal(1000),
+                created_time=datetime.datetime.utcfromtimestamp(1600000000 + i // 4),  # with the same created time
+            )
+            for i in range(20)
+        )
+
+        for searching_address_as in ("sender", "receiver", "both"):
+            with self.subTest(searching_address_as=searching_address_as):
+                expected_txids = [
+                    i.txid
+                    for i in daos.query_actions_by_address(
+                        "eth", "address_a", items_per_page=50, searching_address_as=searching_address_as
+                    )
+                ]
+                rows = list(
+                    daos.iterate_actions_by_address(
+                        "eth",
+                        "address_a",
+                        searching_address_as=searching_address_as,
+                        fields=(models.TxAction.txid,),
+                        rows_per_query=3,
+                    )
+                )
+                self.assertEqual(expected_txids, [i["txid"] for i in rows])
+
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    def test_scan_blocks(self, fake_coin_manager, fake_provider_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(
+            chain_model=coin_data.ChainModel.ACCOUNT, nonce_supported=False
+        )
+        fake_coin_manager.get_coin_info.return_value = Mock(code="eth")
+        fake_coin_manager.get_coins_by_chain.return_value = []
+        fake_coin_manager.query_coins_by_token_addresses.return_value = []
+        fake_client = Mock()
+        fake_provider_manager.get_client_by_chain.return_value = fake_client
+        manager.watch_addresses("eth", ["address_a"])
+        self.addCleanup(manager.unwatch_addresses, "eth", ["address_a"])
+
+        def _block(block_number: int, fork: str = "", txids: tuple = ()) -> provider_data.Block:
+            header = provider_data.BlockHeader(
+                block_hash=f"block_{block_number}{fork}",
+                block_number=block_number,
+                block_time=1600000000 + block_number,
+            )
+            return provider_data.Block(
+                header=header,
+                parent_hash=f"block_{block_number - 1}{fork if block_number > 102 else ''}",
+                transactions=[
+                    provider_data.Transaction(
+                        txid=txid,
+                        status=provider_data.TransactionStatus.CONFIRM_SUCCESS,
+                        inputs=[provider_data.TransactionInput(address="address_a", value=10)],
+                        outputs=[provider_data.TransactionOutput(address="address_b", value=10)],
+                        fee=provider_data.TransactionFee(limit=1000, used=900, price_per_unit=20),
+                        block_header=header,
+                    )
+                    for txid in txids
+                ],
+            )
+
+        with self.subTest("Start from the best block"):
+            fake_client.get_info.return_value = Mock(best_block_number=100)
+            fake_client.scan_blocks.return_value = [_block(100, txids=("txid_100",))]
+
+            self.assertEqual(
+                {"scanned": 1, "expanded": 1, "reorg": None, "best_block_number": 100, "lag": 0},
+                manager.scan_blocks("eth"),
+            )
+            fake_client.scan_blocks.assert_called_once_with([100], {"address_a"}, set())
+
+        with self.subTest("Continue from the last scanned block"):
+            fake_client.get_info.return_value = Mock(best_block_number=102)
+            fake_client.scan_blocks.reset_mock()
+            fake_client.scan_blocks.return_value = [_block(101), _block(102, txids=("txid_102",))]
+
+            self.assertEqual(
+                {"scanned": 2, "expanded": 1, "reorg": None, "best_block_number": 102, "lag": 0},
+                manager.scan_blocks("eth"),
+            )
+            fake_client.scan_blocks.assert_called_once_with([101, 102], {"address_a"}, set())
+            self.assertEqual(102, daos.query_actions_by_txid("eth", "txid_102")[0].block_number)
+
+        with self.subTest("Rollback on reorg"):
+            fake_client.get_info.return_value = Mock(best_block_number=103)
+            fake_client.scan_blocks.reset_mock()
+            fake_client.scan_blocks.side_effect = [
+                [_block(103, fork="_fork")],
+                [_block(100), _block(101), _block(102, fork="_fork")],
+            ]
+
+            self.assertEqual(
+                {
+                    "scanned": 0,
+                    "expanded": 0,
+                    "reorg": {"ancestor_block_number": 101, "reverted": 1},
+                    "best_block_number": 103,
+                    "lag": 2,
+                },
+                manager.scan_blocks("eth", reorg_depth=3),
+            )
+            fake_client.scan_blocks.assert_has_calls([call([103], {"address_a"}, set()), call([100, 101, 102])])
+            action = daos.query_actions_by_txid("eth", "txid_102")[0]
+            self.assertEqual((data.TxActionStatus.PENDING, None), (action.status, action.block_number))
+            self.assertEqual(
+                data.TxActionStatus.CONFIRM_SUCCESS, daos.query_actions_by_txid("eth", "txid_100")[0].status
+            )
+            self.assertEqual(101, daos.get_last_scanned_block("eth").block_number)
+
+    @patch("tilapia.lib.transaction.manager.provider_manager")
+    @patch("tilapia.lib.transaction.manager.coin_manager")
+    def test_sync_token_transfers_by_logs(self, fake_coin_manager, fake_provider_manager):
+        fake_coin_manager.get_chain_info.return_value = Mock(chain_model=coin_data.ChainModel.ACCOUNT)
+        fake_coin_manager.get_coin_info.return_value = Mock(code="eth")
+        fake_coin_manager.get_coins_by_chain.return_value = [Mock(token_address=None), Mock(token_address="token_a")]
+        fake_coin_manager.query_coins_by_token_addresses.return_value = [
+            Mock(code="eth_token_a", token_address="token_a")
+        ]
+        fake_provider_manager.search_token_transfers.return_value = [
+            provider_data.Transaction(
+                txid="txid_a",
+                status=provider_data.TransactionStatus.CONFIRM_SUCCESS,
+                inputs=[
+                    provider_data.TransactionInput(address="address_b", value=0),
+                    provider_data.TransactionInput(address="address_b", value=10, token_address="token_a"),
+                ],
+                outputs=[
+                    provider_data.TransactionOutput(address="token_a", value=0),
+                    provider_data.TransactionOutput(address="address_a", value=10, token_address="token_a"),
+                ],
+                fee=provider_data.TransactionFee(limit=1000, used=900, price_per_unit=20),
+                block_header=provider_data.BlockHeader(block_hash="block_a", block_number=10, block_time=1600000000),
+            )
+        ]
+
+        self.assertEqual(1, manager.sync_token_transfers_by_logs("eth", 0, 100, addresses=["address_a"]))
+        fake_provider_manager.search_token_transfers.assert_called_once_with(
+            "eth", ["address_a"], 0, 100, token_addresses=["token_a"]
+        )
+        self.assertEqual(
+            [("eth_token_a", "address_b", "address_a", decimal.Decimal(10), 1)],
+            [(i.coin_code, i.from_address, i.to_address, i.value, i.index) for i in models.TxAction.select()],
+        )
+
+        with self.subTest("Synced by address without any indexer"):
+
+            def _fake_get_client_by_chain(chain_code, instance_required=None):
+                if instance_required is provider_interfaces.SearchTransactionMixin:
+                    raise provider_exceptions.NoAvailableClient(chain_code, [], instance_required)
+                return Mock()
+
+            fake_provider_manager.get_client_by_chain.side_effect = _fake_get_client_by_chain
+            fake_provider_manager.get_best_block_number.return_value = 12000
+            fake_provider_manager.search_token_transfers.reset_mock()
+
+            with patch.object(manager, "SYNC_LOG_BLOCKS_PER_PAGE", 1000):
+                self.assertEqual(0, manager.sync_actions_by_address("eth", "address_a", max_pages=2))
+                self.assertEqual(12000, daos.get_sync_cursor("eth", "address_a").last_block_number)
+
+                fake_provider_manager.get_best_block_number.return_value = 12010
+                manager.sync_actions_by_address("eth", "address_a")
+                self.assertEqual(12010, daos.get_sync_cursor("eth", "address_a").last_block_number)
+
+            fake_provider_manager.search_token_transfers.assert_has_calls(
+                [
+                    call("eth", ["address_a"], 10999, 11998, token_addresses=["token_a"]),
+                    call("eth", ["address_a"], 11997, 12000, token_addresses=["token_a"]),
+                    call("eth", ["address_a"], 11999, 12010, token_addresses=["token_a"]),
+                ]
+            )
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from tilapia.lib.utxo import consolidation
+
+
+class TestConsolidation(TestCase):
+    def setUp(self) -> None:
+        self.params = consolidation.ConsolidationParams.for_btc("P2WPKH", fee_rate=1, long_term_fee_rate=10)
+
+    def test_params_for_btc(self):
+        self.assertEqual(
+            consolidation.ConsolidationParams(
+                fee_rate=1, long_term_fee_rate=10, not_input_vsize=42, output_spend_vsize=68, max_tx_vsize=10000
+            ),
+            self.params,
+        )
+
+    def test_plan_batches(self):
+        values = [1000, 50, 2000, 100000, 600]
+
+        # The one of 50 costs more to spend than it is worth
+        self.assertEqual(
+            [
+                consolidation.ConsolidationBatch(
+                    indexes=[4, 0, 2, 3], input_value=103600, vsize=314, fee=314, output_value=103286, saving=1726
+                )
+            ],
+            consolidation.plan_batches(values, [68] * 5, self.params),
+        )
+
+        with self.subTest("Bounded by max_tx_vsize"):
+            self.params.max_tx_vsize = 178
+            batches = consolidation.plan_batches(values, [68] * 5, self.params)
+            self.assertEqual([[4, 0], [2, 3]], [i.indexes for i in batches])
+            self.assertEqual([(178, 178, 502)] * 2, [(i.vsize, i.fee, i.saving) for i in batches])
+
+            self.assertEqual(
+                [[4, 0]], [i.indexes for i in consolidation.plan_batches(values, [68] * 5, self.params, 1)]
+            )
+
+        with self.subTest("Bounded by max_fee"):
+            self.params.max_tx_vsize = consolidation.MAX_TX_VSIZE
+            self.params.max_fee = 200
+            batches = consolidation.plan_batches(values, [68] * 5, self.params)
+            self.assertEqual([[4, 0], [2, 3]], [i.indexes for i in batches])
+
+    def test_plan_batches__not_worth_it(self):
+        self.assertEqual([], consolidation.plan_batches([1000] * 3, [68] * 3, self.params, max_batches=0))
+
+        with self.subTest("Fee rate isn't lower than the long-term one"):
+            self.params.fee_rate = 10
+            self.assertEqual([], consolidation.plan_batches([1000] * 3, [68] * 3, self.params))
+
+        with self.subTest("Saving nothing"):
+            self.params.fee_rate, self.params.long_term_fee_rate = 1, 2
+            self.assertEqual([], consolidation.plan_batches([1000] * 2, [68] * 2, self.params))
+            self.assertEqual([94], [i.saving for i in consolidation.plan_batches([1000] * 4, [68] * 4, self.params)])
+
+        with self.subTest("Single input"):
+            self.params.long_term_fee_rate = 10
+            self.assertEqual([], consolidation.plan_batches([1000], [68], self.params))
+
+        with self.subTest("Output lower than min_output"):
+            self.params.min_output = 546
+            self.assertEqual([], consolidation.plan_batches([300, 300], [68] * 2, self.params))
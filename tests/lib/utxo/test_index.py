@@ -0,0 +1,151 @@
+import datetime
+import random
+from unittest import TestCase
+from unittest.mock import patch
+
+from tilapia.lib.basic.orm import test_utils
+from tilapia.lib.utxo import daos, data, index, manager, models
+
+
+@test_utils.cls_test_database(models.UTXO, models.WhoSpent)
+class TestUTXOIndex(TestCase):
+    def setUp(self) -> None:
+        manager.invalidate_utxo_index()  # Ids are reused by the database of each test
+
+    def _create_utxos(self, count: int, rng: random.Random):
+        daos.bulk_create_utxos(
+            [
+                daos.new_utxo(
+                    "btc",
+                    "btc",
+                    f"address{rng.randint(0, 3)}",
+                    f"txid{i}",
+                    0,
+                    data.UTXOStatus.SPENDABLE,
+                    rng.choice((546, 1000, 2000, rng.randint(546, 10**6))),
+                    unconfirmed_depth=rng.choice((0, 0, 1, 2)),
+                )
+                for i in range(count)
+            ]
+        )
+
+    def _assert_consistent(self, the_index: index.UTXOIndex, rng: random.Random):
+        for _ in range(10):
+            conditions = dict(
+                coin_code="btc",
+                addresses=rng.sample([f"address{i}" for i in range(5)], rng.randint(1, 5)),
+                status=rng.choice((data.UTXOStatus.SPENDABLE, data.UTXOStatus.CHOSEN)),
+                min_value=rng.choice((None, 0, 1000, rng.randint(546, 10**6))),
+                max_value=rng.choice((None, 2000, rng.randint(546, 10**6))),
+                value_desc=rng.choice((True, False)),
+                exclude_ids=rng.choice((None, rng.sample(range(1, 200), 20))),
+                exclude_reserved=rng.choice((True, False)),
+                max_unconfirmed_depth=rng.choice((None, 0, 1)),
+            )
+
+            # Same values in the same order, the ids of the same value may be in any order
+            expected = daos.list_utxos_by_conditions(**conditions)
+            actual = the_index.list_utxos_by_conditions(**conditions)
+            self.assertEqual([int(i.value) for i in expected], [int(i.value) for i in actual], conditions)
+            self.assertEqual({i.id for i in expected}, {i.id for i in actual}, conditions)
+            self.assertEqual(
+                daos.sum_of_utxos_by_conditions(**conditions), the_index.sum_of_utxos_by_conditions(**conditions)
+            )
+
+            limit = rng.randint(1, 10)
+            expected = daos.list_utxos_by_conditions(**conditions, limit=limit)
+            actual = the_index.list_utxos_by_conditions(**conditions, limit=limit)
+            self.assertEqual([int(i.value) for i in expected], [int(i.value) for i in actual], conditions)
+
+    def test_consistent_with_sqlite(self):
+        rng = random.Random(0)
+        self._create_utxos(200, rng)
+        the_index = manager._UTXO_INDEX
+        self._assert_consistent(the_index, rng)
+
+        for step in range(30):
+            # Only the spendable ones not reserved are chosen by the sending
+            spendable_ids = [
+                i.id
+                for i in models.UTXO.select().where(
+                    models.UTXO.status == data.UTXOStatus.SPENDABLE, models.UTXO.reserved_by.is_null()
+                )
+            ]
+            utxo_ids = rng.sample(spendable_ids, min(len(spendable_ids), rng.randint(1, 10)))
+            operation = rng.choice(("chosen", "spent", "reserve", "release", "expire", "rollback"))
+
+            if operation == "chosen":
+                manager.mark_utxos_chosen_by_txid("btc", f"spent_txid{step}", utxo_ids)
+            elif operation == "spent":
+                manager.mark_utxos_chosen_by_txid("btc", f"spent_txid{step}", utxo_ids)
+                manager.mark_utxos_spent_by_txid("btc", f"spent_txid{step}")
+            elif operation == "reserve":
+                utxos = daos.query_utxos_by_ids(utxo_ids)
+                if manager.reserve_utxos("btc", f"owner{step % 3}", [(i.txid, i.vout) for i in utxos]):
+                    rng.random() < 0.5 and manager.commit_reserved_utxos("btc", f"owner{step % 3}", f"txid{step}")
+            elif operation == "release":
+                manager.release_utxos(f"owner{step % 3}")
+            elif operation == "expire":
+                utxos = daos.query_utxos_by_ids(utxo_ids)
+                manager.reserve_utxos("btc", f"expired_owner{step}", [(i.txid, i.vout) for i in utxos], ttl=-1)
+            else:
+                with self.assertRaises(ValueError):
+                    with models.UTXO._meta.database.atomic():
+                        manager.mark_utxos_chosen_by_txid("btc", f"spent_txid{step}", utxo_ids)
+                        raise ValueError()
+
+            self._assert_consistent(the_index, rng)
+
+        with self.subTest("Reloaded"):
+            manager.invalidate_utxo_index()
+            self._assert_consistent(the_index, rng)
+
+    def test_queries_without_hitting_sqlite(self):
+        self._create_utxos(50, random.Random(0))
+        the_index = manager._UTXO_INDEX
+        the_index.list_utxos_by_conditions("btc", ["address1", "address2"], data.UTXOStatus.SPENDABLE)
+
+        with patch.object(daos, "list_unspent_utxos_by_addresses") as fake_list_unspent_utxos_by_addresses:
+            the_index.list_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE, min_value=1000)
+            the_index.sum_of_utxos_by_conditions("btc", ["address2"], data.UTXOStatus.CHOSEN)
+            fake_list_unspent_utxos_by_addresses.assert_not_called()
+
+            the_index.list_utxos_by_conditions("btc", ["address1", "address3"], data.UTXOStatus.SPENDABLE)
+            fake_list_unspent_utxos_by_addresses.assert_called_once_with("btc", ["address3"])
+
+    def test_external_writes(self):
+        daos.bulk_create_utxos([daos.new_utxo("btc", "btc", "address1", "txid1", 0, data.UTXOStatus.SPENDABLE, 1000)])
+        the_index = index.UTXOIndex(ttl=60)
+        self.assertEqual(1000, the_index.sum_of_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE))
+
+        daos.update_utxos_status([1], data.UTXOStatus.SPENT)
+        self.assertEqual(1000, the_index.sum_of_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE))
+
+        with self.subTest("Invalidated"):
+            the_index.invalidate("btc", ["address1"])
+            self.assertEqual(0, the_index.sum_of_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE))
+
+        with self.subTest("Expired"):
+            daos.update_utxos_status([1], data.UTXOStatus.SPENDABLE)
+            later = datetime.datetime.now() + datetime.timedelta(seconds=61)
+            with patch("tilapia.lib.utxo.index.time.time", return_value=later.timestamp()):
+                self.assertEqual(
+                    1000, the_index.sum_of_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE)
+                )
+
+    def test_loading_raced_by_writes(self):
+        daos.bulk_create_utxos([daos.new_utxo("btc", "btc", "address1", "txid1", 0, data.UTXOStatus.SPENDABLE, 1000)])
+        the_index = index.UTXOIndex()
+        list_unspent_utxos_by_addresses = daos.list_unspent_utxos_by_addresses
+
+        def _list_then_write(*args):
+            utxos = list_unspent_utxos_by_addresses(*args)
+            the_index.update_status([1], data.UTXOStatus.CHOSEN)  # Committed by the other thread while querying
+            return utxos
+
+        with patch.object(daos, "list_unspent_utxos_by_addresses", side_effect=_list_then_write):
+            the_index.list_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE)
+
+        with patch.object(daos, "list_unspent_utxos_by_addresses", wraps=list_unspent_utxos_by_addresses) as fake:
+            the_index.list_utxos_by_conditions("btc", ["address1"], data.UTXOStatus.SPENDABLE)
+            fake.assert_called_once()  # The stale one loaded isn't stored
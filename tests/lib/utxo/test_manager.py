@@ -1,13 +1,23 @@
+import concurrent.futures
+import datetime
+import itertools
+import os
+import tempfile
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+from tilapia.lib.basic.orm import database as orm_database
 from tilapia.lib.basic.orm import test_utils
 from tilapia.lib.provider import data as provider_data
-from tilapia.lib.utxo import daos, data, manager, models
+from tilapia.lib.throttle import models as throttle_models
+from tilapia.lib.utxo import consolidation, daos, data, manager, models, selection
 
 
-@test_utils.cls_test_database(models.UTXO, models.WhoSpent)
+@test_utils.cls_test_database(models.UTXO, models.WhoSpent, throttle_models.Throttle)
 class TestUTXOManager(TestCase):
+    def setUp(self) -> None:
+        manager.invalidate_utxo_index()  # Ids are reused by the database of each test
+
     def test_choose_utxos(self):
         daos.bulk_create_utxos(
             [
@@ -31,15 +41,71 @@ class TestUTXOManager(TestCase):
         self.assertEqual([utxos[3]], manager.choose_utxos("btc", ["address1", "address2"], 2000))
         utxos[3].status = data.UTXOStatus.CHOSEN
         utxos[3].save()
+        manager.invalidate_utxo_index("btc", ["address2"])  # Written bypassing the manager
         self.assertEqual([utxos[4]], manager.choose_utxos("btc", ["address1", "address2"], 2000))
 
         utxos[4].status = data.UTXOStatus.SPENT
         utxos[4].save()
+        manager.invalidate_utxo_index("btc", ["address2"])
         self.assertEqual([utxos[1], utxos[2], utxos[0]], manager.choose_utxos("btc", ["address1", "address2"], 2000))
 
-    @patch("tilapia.lib.utxo.manager.provider_manager.search_utxos_by_address")
+    def test_select_utxos(self):
+        daos.bulk_create_utxos(
+            [
+                daos.new_utxo("btc", "btc", "address1", "txid1", 0, data.UTXOStatus.SPENDABLE, 50000),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 1, data.UTXOStatus.SPENDABLE, 11100),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 2, data.UTXOStatus.SPENDABLE, 500),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 3, data.UTXOStatus.CHOSEN, 10000),
+                daos.new_utxo("btc", "btc", "address2", "txid2", 0, data.UTXOStatus.SPENDABLE, 11900),
+            ]
+        )
+        utxos = list(models.UTXO.select())
+        params = selection.SelectionParams.for_btc("P2WPKH", ["P2WPKH"], fee_rate=10, long_term_fee_rate=5)
+        input_vsizes = {"address1": 68, "address2": 148}
+
+        # Both utxos[1] and utxos[4] pay exactly, but P2PKH of address2 wastes more
+        chosen, result = manager.select_utxos("btc", ["address1", "address2"], 10000, params, input_vsizes, 546)
+        self.assertEqual([utxos[1]], chosen)
+        self.assertEqual(("bnb", 0, 1100), (result.algorithm, result.change, result.fee))
+
+        with self.subTest("Reserved"):
+            manager.reserve_utxos("btc", "owner1", [("txid1", 1)])
+            chosen, result = manager.select_utxos("btc", ["address1", "address2"], 10000, params, input_vsizes, 546)
+            self.assertEqual([utxos[4]], chosen)
+            manager.release_utxos("owner1")
+
+        with self.subTest("Insufficient"):
+            chosen, result = manager.select_utxos("btc", ["address1", "address2"], 100000, params, input_vsizes, 546)
+            self.assertEqual([utxos[0], utxos[4], utxos[1]], chosen)
+            self.assertIsNone(result)
+
+    def test_plan_consolidation(self):
+        daos.bulk_create_utxos(
+            [
+                daos.new_utxo("btc", "btc", "address1", "txid1", 0, data.UTXOStatus.SPENDABLE, 1000),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 1, data.UTXOStatus.SPENDABLE, 2000),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 2, data.UTXOStatus.SPENDABLE, 3000),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 3, data.UTXOStatus.CHOSEN, 1000),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 4, data.UTXOStatus.SPENDABLE, 500000),
+            ]
+        )
+        utxos = list(models.UTXO.select())
+        params = consolidation.ConsolidationParams.for_btc("P2WPKH", fee_rate=1, long_term_fee_rate=10)
+
+        utxo_count, batches = manager.plan_consolidation("btc", ["address1"], params, {"address1": 68}, max_value=10000)
+        self.assertEqual(3, utxo_count)
+        self.assertEqual([utxos[0], utxos[1], utxos[2]], batches[0][0])
+        self.assertEqual((6000, 246, 1114), (batches[0][1].input_value, batches[0][1].fee, batches[0][1].saving))
+
+        with self.subTest("Reserved"):
+            manager.reserve_utxos("btc", "owner1", [("txid1", 1)])
+            _, batches = manager.plan_consolidation("btc", ["address1"], params, {"address1": 68}, max_value=10000)
+            self.assertEqual([utxos[0], utxos[2]], batches[0][0])
+            manager.release_utxos("owner1")
+
+    @patch("tilapia.lib.utxo.manager.provider_manager.batch_search_utxos_by_addresses")
     @patch("tilapia.lib.utxo.manager.coin_manager.get_chain_info")
-    def test_refresh_utxos_by_address(self, fake_get_chain_info, fake_search_utxos_by_address):
+    def test_refresh_utxos_by_address(self, fake_get_chain_info, fake_batch_search_utxos_by_addresses):
         daos.bulk_create_utxos(
             [
                 daos.new_utxo("btc", "btc", "address1", "txid1", 0, data.UTXOStatus.SPENDABLE, 1000),
@@ -54,15 +120,17 @@ class TestUTXOManager(TestCase):
         fake_get_chain_info.return_value = Mock(dust_threshold=546)
 
         with self.subTest("Search utxos by address1"):
-            fake_search_utxos_by_address.return_value = [
-                provider_data.UTXO(txid="txid1", vout=1, value=1500),
-                provider_data.UTXO(txid="txid2", vout=0, value=1000),
-                provider_data.UTXO(txid="txid2", vout=1, value=545),  # Lower than dust_threshold
-                provider_data.UTXO(txid="txid2", vout=4, value=546),
-            ]
+            fake_batch_search_utxos_by_addresses.return_value = {
+                "address1": [
+                    provider_data.UTXO(txid="txid1", vout=1, value=1500),
+                    provider_data.UTXO(txid="txid2", vout=0, value=1000),
+                    provider_data.UTXO(txid="txid2", vout=1, value=545),  # Lower than dust_threshold
+                    provider_data.UTXO(txid="txid2", vout=4, value=546),
+                ]
+            }
             self.assertEqual(3, manager.refresh_utxos_by_address("btc", "address1"))
             fake_get_chain_info.assert_called_once_with("btc")
-            fake_search_utxos_by_address.assert_called_once_with("btc", "address1")
+            fake_batch_search_utxos_by_addresses.assert_called_once_with("btc", ["address1"])
 
             self.assertEqual(6, models.UTXO.select().count())
             self.assertEqual(
@@ -79,20 +147,22 @@ class TestUTXOManager(TestCase):
 
         with self.subTest("Call throttled"):
             fake_get_chain_info.reset_mock()
-            fake_search_utxos_by_address.reset_mock()
+            fake_batch_search_utxos_by_addresses.reset_mock()
             self.assertEqual(0, manager.refresh_utxos_by_address("btc", "address1"))
             fake_get_chain_info.assert_not_called()
-            fake_search_utxos_by_address.assert_not_called()
+            fake_batch_search_utxos_by_addresses.assert_not_called()
 
         with self.subTest("Search utxos by address2"):
-            fake_search_utxos_by_address.return_value = [
-                provider_data.UTXO(txid="txid2", vout=2, value=2000),
-                provider_data.UTXO(txid="txid2", vout=3, value=5000),
-                provider_data.UTXO(txid="txid3", vout=1, value=1000),
-            ]
-            self.assertEqual(1, manager.refresh_utxos_by_address("btc", "address2"))
+            fake_batch_search_utxos_by_addresses.return_value = {
+                "address2": [
+                    provider_data.UTXO(txid="txid2", vout=2, value=2000),
+                    provider_data.UTXO(txid="txid2", vout=3, value=5000),
+                    provider_data.UTXO(txid="txid3", vout=1, value=1000),
+                ]
+            }
+            self.assertEqual(1, manager.refresh_utxos_by_addresses("btc", ["address1", "address2"]))
             fake_get_chain_info.assert_called_once_with("btc")
-            fake_search_utxos_by_address.assert_called_once_with("btc", "address2")
+            fake_batch_search_utxos_by_addresses.assert_called_once_with("btc", ["address2"])  # address1 throttled
 
             self.assertEqual(7, models.UTXO.select().count())
             self.assertEqual(
@@ -108,6 +178,56 @@ class TestUTXOManager(TestCase):
                 [(i.id, i.status) for i in models.UTXO.select()],
             )
 
+    @patch("tilapia.lib.utxo.manager.provider_manager.batch_search_utxos_by_addresses")
+    @patch("tilapia.lib.utxo.manager.coin_manager.get_chain_info")
+    def test_refresh_utxos_by_addresses(self, fake_get_chain_info, fake_batch_search_utxos_by_addresses):
+        daos.bulk_create_utxos(
+            [
+                daos.new_utxo("btc", "btc", f"address{i}", "txid0", i, data.UTXOStatus.SPENDABLE, 1000)
+                for i in range(100)
+            ]
+        )
+        fake_get_chain_info.return_value = Mock(dust_threshold=546)
+        fake_batch_search_utxos_by_addresses.return_value = {
+            f"address{i}": [provider_data.UTXO(txid="txid1", vout=i, value=2000)] for i in range(100, 150)
+        }
+        fake_batch_search_utxos_by_addresses.return_value.update(
+            (f"address{i}", [provider_data.UTXO(txid="txid0", vout=i, value=1000)] if i >= 50 else [])
+            for i in range(100)
+        )
+        addresses = [f"address{i}" for i in range(150)]
+
+        with self.subTest("Locked by the others"):
+            timeout_lock = manager.timeout_lock
+            with timeout_lock("utxo_manager.refresh_utxos_by_address.btc.address0"):
+                with patch.object(manager, "timeout_lock", side_effect=lambda i: timeout_lock(i, timeout=0.01)):
+                    # address0 skipped, address1-49 spent, address100-149 created
+                    self.assertEqual(99, manager.refresh_utxos_by_addresses("btc", addresses))
+
+        self.assertEqual(
+            [data.UTXOStatus.SPENDABLE] + [data.UTXOStatus.SPENT] * 49 + [data.UTXOStatus.SPENDABLE] * 100,
+            [i.status for i in models.UTXO.select().order_by(models.UTXO.id)],
+        )
+        fake_batch_search_utxos_by_addresses.assert_called_once_with("btc", addresses)
+
+        with self.subTest("Only address0 refreshed then"):
+            fake_batch_search_utxos_by_addresses.reset_mock()
+            fake_batch_search_utxos_by_addresses.return_value = {"address0": []}
+            self.assertEqual(1, manager.refresh_utxos_by_addresses("btc", addresses))
+            fake_batch_search_utxos_by_addresses.assert_called_once_with("btc", ["address0"])
+
+        with self.subTest("Spent ones revived"):
+            fake_batch_search_utxos_by_addresses.return_value = {
+                "address1": [provider_data.UTXO(txid="txid0", vout=1, value=1000)]
+            }
+            self.assertEqual(1, manager.refresh_utxos_by_addresses("btc", ["address1"], force_update=True))
+            self.assertEqual(150, models.UTXO.select().count())
+            self.assertEqual(data.UTXOStatus.SPENDABLE, models.UTXO.get_by_id(2).status)
+
+        with self.subTest("Error in searching"):
+            fake_batch_search_utxos_by_addresses.side_effect = IOError()
+            self.assertEqual(0, manager.refresh_utxos_by_addresses("btc", ["address2"], force_update=True))
+
     def test_query_utxo_ids_by_txid_vout_tuples(self):
         daos.bulk_create_utxos(
             [
@@ -201,6 +321,89 @@ class TestUTXOManager(TestCase):
             ):
                 manager.mark_utxos_chosen_by_txid("btc", "txid2", [1])
 
+    def test_reserve_utxos(self):
+        daos.bulk_create_utxos(
+            [
+                daos.new_utxo("btc", "btc", "address1", "txid1", 0, data.UTXOStatus.SPENDABLE, 100),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 1, data.UTXOStatus.SPENDABLE, 200),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 2, data.UTXOStatus.SPENDABLE, 300),
+                daos.new_utxo("btc", "btc", "address1", "txid1", 3, data.UTXOStatus.CHOSEN, 400),
+            ]
+        )
+
+        def _reserved_by():
+            return [i.reserved_by for i in models.UTXO.select().order_by(models.UTXO.id)]
+
+        self.assertTrue(manager.reserve_utxos("btc", "owner_a", [("txid1", 0), ("txid1", 1)]))
+        self.assertEqual(["owner_a", "owner_a", None, None], _reserved_by())
+        self.assertEqual([3], [i.id for i in manager.choose_utxos("btc", ["address1"], 250)])
+        self.assertTrue(manager.reserve_utxos("btc", "owner_a", [("txid1", 0)]))  # Renew by the same owner
+
+        with self.subTest("All or nothing"):
+            self.assertFalse(manager.reserve_utxos("btc", "owner_b", [("txid1", 1), ("txid1", 2)]))
+            self.assertFalse(manager.reserve_utxos("btc", "owner_b", [("txid1", 2), ("txid1", 3)]))  # Chosen already
+            self.assertFalse(manager.reserve_utxos("btc", "owner_b", [("txid1", 2), ("txid1", 4)]))  # Not found
+            self.assertEqual(["owner_a", "owner_a", None, None], _reserved_by())
+
+        with self.subTest("Reload the addresses of the conflicting ones"):
+            with patch.object(manager._UTXO_INDEX, "invalidate") as fake_invalidate:
+                self.assertFalse(manager.reserve_utxos("btc", "owner_b", [("txid1", 1), ("txid1", 2)]))
+                fake_invalidate.assert_called_once_with("btc", ["address1"])
+
+        with self.subTest("Expired"):
+            self.assertTrue(manager.reserve_utxos("btc", "owner_b", [("txid1", 2)], ttl=-1))
+            self.assertEqual([3], [i.id for i in manager.choose_utxos("btc", ["address1"], 250)])
+            self.assertTrue(manager.reserve_utxos("btc", "owner_c", [("txid1", 2)]))
+            self.assertEqual(["owner_a", "owner_a", "owner_c", None], _reserved_by())
+
+        with self.subTest("Release"):
+            self.assertEqual(1, manager.release_utxos("owner_c"))
+            self.assertEqual(["owner_a", "owner_a", None, None], _reserved_by())
+
+        with self.subTest("Commit"):
+            self.assertEqual([1, 2], manager.commit_reserved_utxos("btc", "owner_a", "txid2"))
+            self.assertEqual([None] * 4, _reserved_by())
+            self.assertEqual([1, 2], [i.id for i in manager.get_utxos_chosen_by_txid("btc", "txid2")])
+            self.assertEqual(
+                [data.UTXOStatus.CHOSEN, data.UTXOStatus.CHOSEN, data.UTXOStatus.SPENDABLE, data.UTXOStatus.CHOSEN],
+                [i.status for i in models.UTXO.select().order_by(models.UTXO.id)],
+            )
+
+    def test_reserve_utxos__concurrent_senders(self):
+        # The in-memory database is private to each connection, so the senders share a database file here
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = orm_database.SqliteDatabase(os.path.join(tmp_dir, "utxo.db"), pragmas={"journal_mode": "wal"})
+            with database.bind_ctx((models.UTXO, models.WhoSpent)):
+                database.create_tables((models.UTXO, models.WhoSpent))
+                daos.bulk_create_utxos(
+                    [
+                        daos.new_utxo("btc", "btc", "address1", "txid0", i, data.UTXOStatus.SPENDABLE, 100)
+                        for i in range(60)
+                    ]
+                )
+
+                def _send(sender: int):
+                    owner = f"owner_{sender}"
+                    for _ in range(100):
+                        utxos = manager.choose_utxos("btc", ["address1"], 150)
+                        if not utxos:
+                            return None
+                        if sum(i.value for i in utxos) < 150:
+                            continue  # Taken by the others while choosing, choose again
+                        if manager.reserve_utxos("btc", owner, [(i.txid, i.vout) for i in utxos]):
+                            return manager.commit_reserved_utxos("btc", owner, f"txid_{sender}")
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+                    results = list(executor.map(_send, range(40)))
+                database.close()
+
+                spent_utxo_ids = [i for i in itertools.chain(*(i for i in results if i))]
+                self.assertEqual(30, len([i for i in results if i]))  # Two utxos per sending, at most 30 sendings
+                self.assertEqual(len(spent_utxo_ids), len(set(spent_utxo_ids)))  # Zero conflicts
+                self.assertEqual(60, models.WhoSpent.select().count())
+                self.assertEqual(60, models.WhoSpent.select(models.WhoSpent.utxo_id).distinct().count())
+                self.assertEqual(0, models.UTXO.select().where(models.UTXO.reserved_by.is_null(False)).count())
+
     def test_mark_utxos_spent_by_txid(self):
         daos.bulk_create_utxos(
             [
@@ -234,6 +437,95 @@ class TestUTXOManager(TestCase):
             manager.mark_utxos_spent_by_txid("btc", "txid3")
             self.assertEqual(5, models.UTXO.select().where(models.UTXO.status == data.UTXOStatus.SPENT).count())
 
+    @patch("tilapia.lib.utxo.manager.provider_manager.batch_search_utxos_by_addresses")
+    @patch("tilapia.lib.utxo.manager.coin_manager.get_chain_info")
+    def test_unconfirmed_utxos(self, fake_get_chain_info, fake_batch_search_utxos_by_addresses):
+        daos.bulk_create_utxos([daos.new_utxo("btc", "btc", "address1", "txid0", 0, data.UTXOStatus.SPENDABLE, 10000)])
+
+        # txid1 spends the confirmed one, then txid2 spends the change of txid1
+        manager.mark_utxos_chosen_by_txid("btc", "txid1", [1])
+        manager.create_unconfirmed_utxos("btc", "txid1", [("address1", 1, 8000)], [1])
+        self.assertEqual([], manager.choose_utxos("btc", ["address1"], 1000))
+        (change1,) = manager.choose_utxos("btc", ["address1"], 1000, max_unconfirmed_depth=1)
+        self.assertEqual(("txid1", 1, 8000, 1), (change1.txid, change1.vout, change1.value, change1.unconfirmed_depth))
+
+        manager.mark_utxos_chosen_by_txid("btc", "txid2", [change1.id])
+        manager.create_unconfirmed_utxos("btc", "txid2", [("address1", 0, 6000)], [change1.id])
+        self.assertEqual([], manager.choose_utxos("btc", ["address1"], 1000, max_unconfirmed_depth=1))
+        (change2,) = manager.choose_utxos("btc", ["address1"], 1000, max_unconfirmed_depth=2)
+        self.assertEqual(2, change2.unconfirmed_depth)
+
+        with self.subTest("Confirmed txid1"):
+            manager.mark_utxos_confirmed_by_txid("btc", "txid1")
+            self.assertEqual(0, models.UTXO.get_by_id(change1.id).unconfirmed_depth)
+            self.assertEqual(2, models.UTXO.get_by_id(change2.id).unconfirmed_depth)
+
+        with self.subTest("Kept by the refreshing before expired"):
+            fake_get_chain_info.return_value = Mock(dust_threshold=546)
+            fake_batch_search_utxos_by_addresses.return_value = {
+                "address1": [provider_data.UTXO(txid="txid1", vout=1, value=8000)]
+            }
+            self.assertEqual(1, manager.refresh_utxos_by_address("btc", "address1", force_update=True))
+            self.assertEqual(data.UTXOStatus.SPENT, models.UTXO.get(txid="txid0").status)  # Spent by txid1 confirmed
+            self.assertEqual(data.UTXOStatus.SPENDABLE, models.UTXO.get_by_id(change2.id).status)
+
+        with self.subTest("Evicted with the descendants"):
+            manager.mark_utxos_chosen_by_txid("btc", "txid3", [change2.id])
+            manager.create_unconfirmed_utxos("btc", "txid3", [("address1", 0, 4000)], [change2.id])
+            self.assertEqual(3, models.UTXO.get(txid="txid3").unconfirmed_depth)
+
+            self.assertEqual(2, manager.evict_unconfirmed_utxos_by_txids("btc", ["txid2"]))
+            self.assertEqual([], manager.choose_utxos("btc", ["address1"], 1000, max_unconfirmed_depth=3))
+            self.assertEqual(
+                [data.UTXOStatus.SPENT] * 2,
+                [models.UTXO.get(txid=i).status for i in ("txid2", "txid3")],
+            )
+            self.assertEqual(0, manager.evict_unconfirmed_utxos_by_txids("btc", ["txid2"]))
+
+        with self.subTest("Expired by the refreshing"):
+            manager.create_unconfirmed_utxos("btc", "txid4", [("address2", 0, 1000)], [])
+            self.assertEqual(1, models.UTXO.get(txid="txid4").unconfirmed_depth)
+            fake_batch_search_utxos_by_addresses.return_value = {"address2": []}
+            with patch.dict(manager.settings.UTXO_CHAINING, {"unconfirmed_ttl": -1}):
+                self.assertEqual(1, manager.refresh_utxos_by_address("btc", "address2", force_update=True))
+            self.assertEqual(data.UTXOStatus.SPENT, models.UTXO.get(txid="txid4").status)
+
+        with self.subTest("Confirmed by the refreshing"):
+            manager.create_unconfirmed_utxos("btc", "txid5", [("address3", 0, 1000)], [])
+            fake_batch_search_utxos_by_addresses.return_value = {
+                "address3": [provider_data.UTXO(txid="txid5", vout=0, value=1000)]
+            }
+            self.assertEqual(1, manager.refresh_utxos_by_address("btc", "address3", force_update=True))
+            self.assertEqual(0, models.UTXO.get(txid="txid5").unconfirmed_depth)
+            self.assertEqual(1, len(manager.choose_utxos("btc", ["address3"], 1000)))
+
+    def test_prune_spent_utxos(self):
+        daos.bulk_create_utxos(
+            [
+                daos.new_utxo("btc", "btc", "address1", f"txid{i}", 0, status, 1000)
+                for i, status in enumerate(
+                    [data.UTXOStatus.SPENT] * 5 + [data.UTXOStatus.SPENDABLE, data.UTXOStatus.CHOSEN]
+                )
+            ]
+        )
+        daos.bulk_create_who_spent([daos.new_who_spent("btc", "txid_spending", i) for i in range(1, 8)])
+        models.UTXO.update(modified_time=datetime.datetime.now() - datetime.timedelta(days=31)).execute()
+        daos.update_utxos_status([2], data.UTXOStatus.SPENT)  # Modified just now
+
+        self.assertEqual(2, manager.prune_spent_utxos(30, chunk_size=2, max_chunks=1))
+        self.assertEqual(2, manager.prune_spent_utxos(30, chunk_size=2))
+        self.assertEqual(0, manager.prune_spent_utxos(30, chunk_size=2))
+        self.assertEqual([2, 6, 7], [i.id for i in models.UTXO.select().order_by(models.UTXO.id)])
+        self.assertEqual([2, 6, 7], [i.utxo_id for i in models.WhoSpent.select().order_by(models.WhoSpent.utxo_id)])
+
+        with self.subTest("Not spent in the meantime"):
+            models.UTXO.update(modified_time=datetime.datetime.now() - datetime.timedelta(days=31)).execute()
+            with patch.object(daos, "query_spent_utxo_ids", side_effect=[[2, 6], []]):
+                self.assertEqual(1, manager.prune_spent_utxos(30))
+
+            self.assertEqual([6, 7], [i.id for i in models.UTXO.select().order_by(models.UTXO.id)])
+            self.assertEqual([6, 7], [i.utxo_id for i in models.WhoSpent.select().order_by(models.WhoSpent.utxo_id)])
+
     def test_delete_utxos_by_addresses(self):
         daos.bulk_create_utxos(
             [
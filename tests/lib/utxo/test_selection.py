@@ -0,0 +1,130 @@
+import itertools
+import random
+from unittest import TestCase
+
+from tilapia.lib.utxo import selection
+
+
+class TestSelection(TestCase):
+    def setUp(self) -> None:
+        self.rng = random.Random(0)
+
+    def test_params_for_btc(self):
+        params = selection.SelectionParams.for_btc("P2WPKH", ["P2PKH"], fee_rate=10, long_term_fee_rate=5)
+        self.assertEqual(
+            selection.SelectionParams(
+                fee_rate=10, long_term_fee_rate=5, not_input_vsize=45, change_output_vsize=31, change_spend_vsize=68
+            ),
+            params,
+        )
+        self.assertEqual(310, params.change_fee)
+        self.assertEqual(650, params.cost_of_change)
+
+        params = selection.SelectionParams.for_btc(
+            "P2PKH", ["P2PKH"], fee_rate=10, long_term_fee_rate=5, change_encoding="P2WPKH-P2SH"
+        )
+        self.assertEqual((44, 32, 91), (params.not_input_vsize, params.change_output_vsize, params.change_spend_vsize))
+
+    def test_branch_and_bound(self):
+        self.assertEqual([2], selection.branch_and_bound([1, 2, 3, 4], 3, 0, [1] * 4))
+        self.assertEqual([0, 2], sorted(selection.branch_and_bound([1, 2, 4, 8], 5, 0, [0] * 4)))
+        self.assertIsNone(selection.branch_and_bound([2, 4, 8], 5, 0, [0] * 3))
+        self.assertIsNone(selection.branch_and_bound([1, 2], 5, 10, [0] * 2))
+        self.assertEqual([1, 2], sorted(selection.branch_and_bound([100, 4, 3], 6, 1, [0] * 3)))
+
+        with self.subTest("Least waste"):
+            # The excess is less than the waste of one more input
+            self.assertEqual([0], selection.branch_and_bound([12, 5, 5], 10, 5, [3] * 3))
+            # Spend more inputs while the fee rate is low
+            self.assertEqual([1, 2], sorted(selection.branch_and_bound([12, 5, 5], 10, 5, [-3] * 3)))
+
+        with self.subTest("Same as brute force"):
+            for _ in range(50):
+                values = [self.rng.randint(1, 100) for _ in range(10)]
+                wastes = [self.rng.randint(0, 5) for _ in range(10)]
+                target, cost_of_change = self.rng.randint(50, 300), self.rng.randint(0, 10)
+
+                expected = min(
+                    (
+                        sum(wastes[i] for i in indexes) + sum(values[i] for i in indexes) - target
+                        for count in range(1, len(values) + 1)
+                        for indexes in itertools.combinations(range(len(values)), count)
+                        if target <= sum(values[i] for i in indexes) <= target + cost_of_change
+                    ),
+                    default=None,
+                )
+                picked = selection.branch_and_bound(values, target, cost_of_change, wastes)
+
+                if expected is None:
+                    self.assertIsNone(picked)
+                else:
+                    self.assertEqual(len(set(picked)), len(picked))
+                    self.assertEqual(expected, sum(wastes[i] for i in picked) + sum(values[i] for i in picked) - target)
+
+        with self.subTest("Tries exhausted"):
+            self.assertIsNone(selection.branch_and_bound([2] * 30, 31, 0, [0] * 30, max_tries=1000))
+
+    def test_knapsack(self):
+        self.assertEqual([1], selection.knapsack([5, 10, 20], 10, 0, self.rng))
+        # The lowest larger one is closer than the combinations of the smaller ones
+        self.assertEqual([2], selection.knapsack([3, 3, 12, 20], 11, 0, self.rng))
+        self.assertEqual([0, 1], sorted(selection.knapsack([6, 5, 20], 11, 0, self.rng)))
+        self.assertEqual([0, 1, 2], sorted(selection.knapsack([1, 2, 3], 6, 0, self.rng)))
+        self.assertIsNone(selection.knapsack([1, 2, 3], 7, 0, self.rng))
+
+        with self.subTest("Aim for target + min_change"):
+            self.assertEqual([2], selection.knapsack([7, 6, 30], 11, 5, self.rng))
+
+    def test_single_random_draw(self):
+        values = list(range(1, 101))
+        picked = selection.single_random_draw(values, 1000, self.rng)
+        self.assertGreaterEqual(sum(values[i] for i in picked), 1000)
+        self.assertLess(sum(values[i] for i in picked[:-1]), 1000)
+        self.assertIsNone(selection.single_random_draw(values, 5051, self.rng))
+
+    def test_select_coins(self):
+        params = selection.SelectionParams.for_btc("P2WPKH", ["P2WPKH"], fee_rate=10, long_term_fee_rate=5)
+        not_input_fee = params.not_input_vsize * 10
+        values = [20000, 50000, 100000 + 680 + not_input_fee, 300000]
+        input_vsizes = [68] * len(values)
+
+        with self.subTest("Changeless"):
+            result = selection.select_coins(values, input_vsizes, 100000, params, rng=self.rng)
+            self.assertEqual(
+                selection.SelectionResult(
+                    indexes=[2],
+                    algorithm="bnb",
+                    input_value=100000 + 680 + not_input_fee,
+                    vsize=params.not_input_vsize + 68,
+                    fee=680 + not_input_fee,
+                    change=0,
+                    waste=68 * 5,
+                ),
+                result,
+            )
+
+        with self.subTest("With change"):
+            result = selection.select_coins(values, input_vsizes, 200000, params, rng=self.rng)
+            self.assertEqual([3], result.indexes)
+            self.assertEqual((params.not_input_vsize + 68 + 31) * 10, result.fee)
+            self.assertEqual(300000 - 200000 - result.fee, result.change)
+            self.assertEqual(68 * 5 + params.cost_of_change, result.waste)
+
+        with self.subTest("Dust change dropped to fee"):
+            params.min_change = 546
+            result = selection.select_coins([100000 + 1100 + not_input_fee], [68], 100000, params, rng=self.rng)
+            self.assertEqual(0, result.change)
+            self.assertEqual(1100 + not_input_fee, result.fee)
+
+        with self.subTest("Uneconomic utxos skipped"):
+            self.assertIsNone(selection.select_coins([680] * 100, [68] * 100, 1, params, rng=self.rng))
+
+        with self.subTest("Insufficient"):
+            self.assertIsNone(selection.select_coins(values, input_vsizes, 500000, params, rng=self.rng))
+
+        with self.subTest("Large wallet"):
+            values = [self.rng.randint(1000, 1000000) for _ in range(10000)]
+            result = selection.select_coins(values, [68] * len(values), 5000000, params, rng=self.rng)
+            self.assertEqual(sorted(set(result.indexes)), result.indexes)
+            self.assertEqual(sum(values[i] for i in result.indexes), 5000000 + result.fee + result.change)
+            self.assertGreaterEqual(result.fee, result.vsize * 10)
@@ -12,14 +12,17 @@ class TestAccountChainModelHandler(TestCase):
         patch_coin_manager = patch("tilapia.lib.wallet.handlers.account.coin_manager")
         patch_provider_manager = patch("tilapia.lib.wallet.handlers.account.provider_manager")
         patch_daos = patch("tilapia.lib.wallet.handlers.account.daos")
+        patch_transaction_manager = patch("tilapia.lib.wallet.handlers.account.transaction_manager")
 
         self.fake_coin_manager = patch_coin_manager.start()
         self.fake_provider_manager = patch_provider_manager.start()
         self.fake_daos = patch_daos.start()
+        self.fake_transaction_manager = patch_transaction_manager.start()
 
         self.addCleanup(patch_coin_manager.stop)
         self.addCleanup(patch_provider_manager.stop)
         self.addCleanup(patch_daos.stop)
+        self.addCleanup(patch_transaction_manager.stop)
 
         self.fake_coin_manager.get_related_coins.return_value = (
             Mock(code="eth"),
@@ -92,3 +95,49 @@ class TestAccountChainModelHandler(TestCase):
         self.fake_provider_manager.fill_unsigned_tx.assert_called_once_with(
             "eth", unsigned_tx.clone(fee_limit=None, fee_price_per_unit=None)
         )
+
+    def test_generate_replacement_tx(self):
+        self.fake_provider_manager.fill_unsigned_tx.side_effect = lambda chain_code, tx: tx
+        self.fake_provider_manager.get_payload_of_raw_tx.return_value = {}
+        self.fake_transaction_manager.get_raw_tx.return_value = "0xf86c"
+        action = Mock(
+            chain_code="eth",
+            coin_code="eth",
+            txid="txid1",
+            to_address="address2",
+            value=1000,
+            nonce=11,
+            fee_limit=21000,
+            fee_price_per_unit=100,
+        )
+
+        unsigned_tx = provider_data.UnsignedTx(
+            inputs=[provider_data.TransactionInput(address="address1", value=1000)],
+            outputs=[provider_data.TransactionOutput(address="address2", value=1000)],
+            nonce=11,
+            fee_limit=21000,
+            fee_price_per_unit=150,
+        )
+        self.assertEqual(unsigned_tx, self.handler.generate_replacement_tx(0, action, 1.5))
+        self.fake_transaction_manager.get_raw_tx.assert_called_once_with("eth", "txid1")
+        self.fake_provider_manager.get_payload_of_raw_tx.assert_called_once_with("eth", "0xf86c")
+
+        with self.subTest("Keep the calldata of the contract call"):
+            self.fake_provider_manager.get_payload_of_raw_tx.return_value = {"data": "0xa9059cbb"}
+            self.assertEqual(
+                unsigned_tx.clone(payload={"data": "0xa9059cbb"}),
+                self.handler.generate_replacement_tx(0, action, 1.5),
+            )
+            self.fake_provider_manager.get_payload_of_raw_tx.return_value = {}
+
+        with self.subTest("Bump 10% at least"):
+            self.assertEqual(110, self.handler.generate_replacement_tx(0, action, 1.01).fee_price_per_unit)
+
+        with self.subTest("Without nonce"):
+            with self.assertRaisesRegex(Exception, "Only the tx with nonce can be replaced"):
+                self.handler.generate_replacement_tx(0, Mock(nonce=-1), 1.5)
+
+        with self.subTest("Without the raw tx"):
+            self.fake_transaction_manager.get_raw_tx.return_value = None
+            with self.assertRaisesRegex(Exception, "its payload can't be kept"):
+                self.handler.generate_replacement_tx(0, action, 1.5)
@@ -1,8 +1,8 @@
 from unittest import TestCase
-from unittest.mock import Mock, call, patch
+from unittest.mock import Mock, patch
 
 from tilapia.lib.provider import data as provider_data
-from tilapia.lib.utxo import data as utxo_data
+from tilapia.lib.utxo import consolidation, selection
 from tilapia.lib.wallet.handlers import utxo
 
 
@@ -30,13 +30,20 @@ class TestUTXOChainModelHandler(TestCase):
             Mock(code="btc"),
             Mock(code="btc"),
         )
-        self.fake_coin_manager.get_chain_info.return_value = Mock(chain_code="btc", dust_threshold=546)
+        self.fake_coin_manager.get_chain_info.return_value = Mock(
+            chain_code="btc", dust_threshold=546, rbf_supported=True
+        )
 
         self.fake_account = Mock(address="address1", bip44_path="m/44'/60'/0'/0/0")
         self.fake_daos.account.query_first_account_by_wallet.return_value = self.fake_account
         self.fake_provider_manager.fill_unsigned_tx.side_effect = lambda chain_code, tx: tx.clone(
             fee_limit=200, fee_price_per_unit=1
         )
+        self.fake_provider_manager.get_prices_per_unit_of_fee.return_value = provider_data.PricesPerUnit(
+            normal=provider_data.EstimatedTimeOnPrice(price=2),
+            others=[provider_data.EstimatedTimeOnPrice(price=1), provider_data.EstimatedTimeOnPrice(price=5)],
+        )
+        self.fake_provider_manager.verify_address.return_value = Mock(is_valid=True, encoding="P2WPKH")
 
     def test_generate_unsigned_tx__dual_token_model(self):
         self.fake_coin_manager.get_related_coins.return_value = (
@@ -61,113 +68,252 @@ class TestUTXOChainModelHandler(TestCase):
         self.assertEqual(4, self.fake_provider_manager.fill_unsigned_tx.call_count)
 
     def test_generate_unsigned_tx__not_enough_utxos_for_fee(self):
-        self.fake_utxo_manager.choose_utxos.return_value = [Mock(address="address1", value=200, txid="txid1", vout=0)]
+        self.fake_utxo_manager.select_utxos.return_value = (
+            [Mock(address="address1", value=200, txid="txid1", vout=0)],
+            None,
+        )
 
         with self.assertRaisesRegex(Exception, "Not enough utxos for fee"):
             self.handler.generate_unsigned_tx(0, "btc", "address2", value=1000)
 
     def test_generate_unsigned_tx__single_token_model(self):
-        self.fake_utxo_manager.choose_utxos.return_value = [
-            Mock(address="address1", value=1000, txid="txid1", vout=0),
-            Mock(address="address1", value=1000, txid="txid1", vout=1),
-            Mock(address="address1", value=1000, txid="txid1", vout=2),
-        ]
+        self.fake_utxo_manager.select_utxos.return_value = (
+            [Mock(address="address1", value=10000, txid="txid1", vout=i) for i in range(3)],
+            selection.SelectionResult(
+                indexes=[0, 1, 2], algorithm="knapsack", input_value=30000, vsize=277, fee=554, change=7446, waste=1054
+            ),
+        )
 
         unsigned_tx = provider_data.UnsignedTx(
             inputs=[
                 provider_data.TransactionInput(
                     address="address1",
-                    value=1000,
-                    utxo=provider_data.UTXO(txid="txid1", vout=0, value=1000),
-                ),
-                provider_data.TransactionInput(
-                    address="address1",
-                    value=1000,
-                    utxo=provider_data.UTXO(txid="txid1", vout=1, value=1000),
-                ),
-                provider_data.TransactionInput(
-                    address="address1",
-                    value=1000,
-                    utxo=provider_data.UTXO(txid="txid1", vout=2, value=1000),
-                ),
+                    value=10000,
+                    utxo=provider_data.UTXO(txid="txid1", vout=i, value=10000),
+                )
+                for i in range(3)
             ],
             outputs=[
-                provider_data.TransactionOutput(address="address2", value=2200),
+                provider_data.TransactionOutput(address="address2", value=22000),
                 provider_data.TransactionOutput(
                     address="address1",
-                    value=600,
+                    value=7446,
                     payload={"is_change": True, "bip44_path": "m/44'/60'/0'/0/0"},
                 ),
             ],
-            fee_limit=200,
-            fee_price_per_unit=1,
+            fee_limit=277,
+            fee_price_per_unit=2,
+            payload={"rbf": True},
         )
 
-        self.assertEqual(unsigned_tx, self.handler.generate_unsigned_tx(0, "btc", "address2", value=2200))
-        self.fake_provider_manager.fill_unsigned_tx.assert_called_once_with(
+        self.assertEqual(unsigned_tx, self.handler.generate_unsigned_tx(0, "btc", "address2", value=22000))
+        self.fake_utxo_manager.select_utxos.assert_called_once_with(
             "btc",
-            unsigned_tx.clone(
-                outputs=[
-                    provider_data.TransactionOutput(address="address2", value=2200),
-                    provider_data.TransactionOutput(
+            ["address1"],
+            22000,
+            selection.SelectionParams(
+                fee_rate=2,
+                long_term_fee_rate=1,
+                not_input_vsize=42,
+                change_output_vsize=31,
+                change_spend_vsize=68,
+                min_change=546,
+            ),
+            {"address1": 68},
+            min_value=546,
+            max_unconfirmed_depth=0,
+        )
+        self.fake_provider_manager.get_prices_per_unit_of_fee.assert_called_once_with("btc")
+        self.fake_provider_manager.fill_unsigned_tx.assert_not_called()
+        self.fake_utxo_manager.refresh_utxos_by_addresses.assert_called_once_with("btc", ["address1"])
+        self.fake_daos.account.query_first_account_by_wallet.assert_called_once_with(0)
+
+        with self.subTest("Specified fee_price_per_unit"):
+            self.fake_utxo_manager.select_utxos.reset_mock()
+            self.handler.generate_unsigned_tx(0, "btc", "address2", value=22000, fee_price_per_unit=5)
+            self.assertEqual(5, self.fake_utxo_manager.select_utxos.call_args[0][3].fee_rate)
+            self.assertEqual(1, self.fake_utxo_manager.select_utxos.call_args[0][3].long_term_fee_rate)
+
+        with self.subTest("RBF not supported"):
+            self.fake_coin_manager.get_chain_info.return_value.rbf_supported = False
+            self.assertEqual(
+                unsigned_tx.clone(payload={}),
+                self.handler.generate_unsigned_tx(0, "btc", "address2", value=22000),
+            )
+            self.fake_coin_manager.get_chain_info.return_value.rbf_supported = True
+
+        with self.subTest("Invalid address"):
+            self.fake_provider_manager.verify_address.return_value = Mock(is_valid=False)
+            with self.assertRaisesRegex(Exception, "Invalid address"):
+                self.handler.generate_unsigned_tx(0, "btc", "address2", value=22000)
+
+    def test_generate_unsigned_tx__changeless(self):
+        self.fake_utxo_manager.select_utxos.return_value = (
+            [Mock(address="address1", value=23000, txid="txid1", vout=0)],
+            selection.SelectionResult(
+                indexes=[0], algorithm="bnb", input_value=23000, vsize=110, fee=1000, change=0, waste=780
+            ),
+        )
+
+        # The excess is above dust_threshold, but spent as fee rather than the change without fee paid
+        self.assertEqual(
+            provider_data.UnsignedTx(
+                inputs=[
+                    provider_data.TransactionInput(
                         address="address1",
-                        value=800,
-                        payload={"is_change": True, "bip44_path": "m/44'/60'/0'/0/0"},
+                        value=23000,
+                        utxo=provider_data.UTXO(txid="txid1", vout=0, value=23000),
                     ),
                 ],
-                fee_limit=0,
-                fee_price_per_unit=0,
+                outputs=[provider_data.TransactionOutput(address="address2", value=22000)],
+                fee_limit=110,
+                fee_price_per_unit=9,
+                payload={"rbf": True},
             ),
+            self.handler.generate_unsigned_tx(0, "btc", "address2", value=22000),
         )
-        self.fake_utxo_manager.choose_utxos.assert_called_once_with(
-            "btc", ["address1"], require_value=2200, status=utxo_data.UTXOStatus.SPENDABLE, min_value=546
-        )
-        self.fake_utxo_manager.refresh_utxos_by_address.assert_called_once_with("btc", "address1")
-        self.fake_daos.account.query_first_account_by_wallet.assert_called_once_with(0)
 
     def test_generate_unsigned_tx__insufficient_utxos(self):
-        self.fake_utxo_manager.choose_utxos.return_value = [
-            Mock(address="address1", value=1000, txid="txid1", vout=0),
-            Mock(address="address1", value=1000, txid="txid1", vout=1),
-            Mock(address="address1", value=1000, txid="txid1", vout=2),
-        ]
+        self.fake_utxo_manager.select_utxos.return_value = (
+            [Mock(address="address1", value=1000, txid="txid1", vout=i) for i in range(3)],
+            None,
+        )
 
         unsigned_tx = provider_data.UnsignedTx(
             inputs=[
                 provider_data.TransactionInput(
                     address="address1",
                     value=1000,
-                    utxo=provider_data.UTXO(txid="txid1", vout=0, value=1000),
-                ),
-                provider_data.TransactionInput(
-                    address="address1",
-                    value=1000,
-                    utxo=provider_data.UTXO(txid="txid1", vout=1, value=1000),
-                ),
-                provider_data.TransactionInput(
-                    address="address1",
-                    value=1000,
-                    utxo=provider_data.UTXO(txid="txid1", vout=2, value=1000),
-                ),
+                    utxo=provider_data.UTXO(txid="txid1", vout=i, value=1000),
+                )
+                for i in range(3)
             ],
-            outputs=[provider_data.TransactionOutput(address="address2", value=2800)],
-            fee_limit=200,
-            fee_price_per_unit=1,
+            # vsize of 3 P2WPKH inputs and 1 P2WPKH output is 42 + 68 * 3
+            outputs=[provider_data.TransactionOutput(address="address2", value=3000 - 246 * 2)],
+            fee_limit=246,
+            fee_price_per_unit=2,
+            payload={"rbf": True},
         )
 
         self.assertEqual(unsigned_tx, self.handler.generate_unsigned_tx(0, "btc", "address2", value=3000))
+        self.fake_utxo_manager.select_utxos.assert_called_once()
+
+    def test_generate_replacement_tx(self):
+        self.fake_utxo_manager.get_utxos_chosen_by_txid.return_value = [
+            Mock(address="address1", value=5000, txid="txid1", vout=0),
+            Mock(address="address1", value=5000, txid="txid1", vout=1),
+        ]
+        action = Mock(
+            chain_code="btc", txid="txid2", to_address="address2", value=3000, fee_limit=180, fee_price_per_unit=2
+        )
+        inputs = [
+            provider_data.TransactionInput(
+                address="address1",
+                value=5000,
+                utxo=provider_data.UTXO(txid="txid1", vout=i, value=5000),
+            )
+            for i in range(2)
+        ]
+
+        self.assertEqual(
+            provider_data.UnsignedTx(
+                inputs=inputs,
+                outputs=[
+                    provider_data.TransactionOutput(address="address2", value=3000),
+                    provider_data.TransactionOutput(
+                        address="address1",
+                        value=6400,
+                        payload={"is_change": True, "bip44_path": "m/44'/60'/0'/0/0"},
+                    ),
+                ],
+                fee_limit=200,
+                fee_price_per_unit=3,
+                payload={"rbf": True},
+            ),
+            self.handler.generate_replacement_tx(0, action, 1.5),
+        )
+        self.fake_utxo_manager.get_utxos_chosen_by_txid.assert_called_once_with("btc", "txid2")
+
+        with self.subTest("Spend change as fee if it is less than dust_threshold"):
+            action.configure_mock(value=9000)
+            self.assertEqual(
+                provider_data.UnsignedTx(
+                    inputs=inputs,
+                    outputs=[provider_data.TransactionOutput(address="address2", value=9000)],
+                    fee_limit=200,
+                    fee_price_per_unit=5,
+                    payload={"rbf": True},
+                ),
+                self.handler.generate_replacement_tx(0, action, 1.5),
+            )
 
-        self.fake_provider_manager.fill_unsigned_tx.assert_called_once_with(
+        with self.subTest("Not enough change"):
+            action.configure_mock(value=9500)
+            with self.assertRaisesRegex(Exception, "Not enough change to raise the fee"):
+                self.handler.generate_replacement_tx(0, action, 1.5)
+
+        with self.subTest("Not sent from here"):
+            self.fake_utxo_manager.get_utxos_chosen_by_txid.return_value = []
+            with self.assertRaisesRegex(Exception, "No UTXOs chosen by the tx found"):
+                self.handler.generate_replacement_tx(0, action, 1.5)
+
+    def test_plan_consolidation(self):
+        utxos = [Mock(address="address1", value=1000, txid="txid1", vout=i) for i in range(3)]
+        batch = consolidation.ConsolidationBatch(
+            indexes=[0, 1, 2], input_value=3000, vsize=246, fee=246, output_value=2754, saving=118
+        )
+        self.fake_utxo_manager.plan_consolidation.return_value = (5, [(utxos, batch)])
+
+        self.assertEqual(
+            utxo.ConsolidationPlan(
+                fee_price_per_unit=1, long_term_fee_price_per_unit=2, utxo_count=5, batches=[(utxos, batch)]
+            ),
+            self.handler.plan_consolidation(0, "btc", max_value=10000, max_fee=1000),
+        )
+        self.fake_utxo_manager.refresh_utxos_by_addresses.assert_called_once_with("btc", ["address1"])
+        self.fake_utxo_manager.plan_consolidation.assert_called_once_with(
             "btc",
-            unsigned_tx.clone(
-                outputs=[provider_data.TransactionOutput(address="address2", value=3000)],
-                fee_limit=0,
-                fee_price_per_unit=0,
+            ["address1"],
+            consolidation.ConsolidationParams(
+                fee_rate=1,
+                long_term_fee_rate=2,
+                not_input_vsize=42,
+                output_spend_vsize=68,
+                max_fee=1000,
+                min_output=546,
             ),
+            {"address1": 68},
+            min_value=546,
+            max_value=10000,
+            max_batches=None,
+        )
+
+    def test_generate_consolidation_tx(self):
+        utxos = [Mock(chain_code="btc", address="address1", value=1000, txid="txid1", vout=i) for i in range(3)]
+        batch = consolidation.ConsolidationBatch(
+            indexes=[0, 1, 2], input_value=3000, vsize=246, fee=246, output_value=2754, saving=118
         )
-        self.fake_utxo_manager.choose_utxos.assert_has_calls(
-            [
-                call("btc", ["address1"], require_value=3000, status=utxo_data.UTXOStatus.SPENDABLE, min_value=546),
-                call("btc", ["address1"], require_value=3520, status=utxo_data.UTXOStatus.SPENDABLE, min_value=546),
-            ]
+
+        self.assertEqual(
+            provider_data.UnsignedTx(
+                inputs=[
+                    provider_data.TransactionInput(
+                        address="address1",
+                        value=1000,
+                        utxo=provider_data.UTXO(txid="txid1", vout=i, value=1000),
+                    )
+                    for i in range(3)
+                ],
+                outputs=[
+                    provider_data.TransactionOutput(
+                        address="address1",
+                        value=2754,
+                        payload={"is_change": True, "bip44_path": "m/44'/60'/0'/0/0"},
+                    ),
+                ],
+                fee_limit=246,
+                fee_price_per_unit=1,
+                payload={"rbf": True},
+            ),
+            self.handler.generate_consolidation_tx(0, utxos, batch, 1),
         )
@@ -9,16 +9,24 @@ from tilapia.lib.coin import data as coin_data
 from tilapia.lib.coin import models as coin_models
 from tilapia.lib.provider import data as provider_data
 from tilapia.lib.secret import data as secret_data
+from tilapia.lib.secret import exceptions as secret_exceptions
+from tilapia.lib.secret import executor as secret_executor
 from tilapia.lib.secret import models as secret_models
+from tilapia.lib.throttle import models as throttle_models
 from tilapia.lib.transaction import data as transaction_data
 from tilapia.lib.transaction import manager as transaction_manager
 from tilapia.lib.transaction import models as transaction_models
+from tilapia.lib.utxo import consolidation as utxo_consolidation
+from tilapia.lib.utxo import daos as utxo_daos
+from tilapia.lib.utxo import data as utxo_data
+from tilapia.lib.utxo import manager as utxo_manager
 from tilapia.lib.utxo import models as utxo_models
 from tilapia.lib.wallet import daos as wallet_daos
 from tilapia.lib.wallet import data as wallet_data
 from tilapia.lib.wallet import exceptions as wallet_exceptions
 from tilapia.lib.wallet import manager as wallet_manager
 from tilapia.lib.wallet import models as wallet_models
+from tilapia.lib.wallet.handlers import utxo as utxo_handler
 
 
 @test_utils.cls_test_database(
@@ -27,7 +35,10 @@ from tilapia.lib.wallet import models as wallet_models
     wallet_models.AssetModel,
     secret_models.PubKeyModel,
     secret_models.SecretKeyModel,
+    throttle_models.Throttle,
     transaction_models.TxAction,
+    transaction_models.AddressSyncCursor,
+    transaction_models.RawTx,
     coin_models.CoinModel,
     utxo_models.UTXO,
     utxo_models.WhoSpent,
@@ -468,6 +479,14 @@ class TestWalletManager(TestCase):
             wallet_manager.search_existing_wallets(["btc", "eth"], self.mnemonic, passphrase=self.passphrase),
         )
 
+        with patch(
+            "tilapia.lib.secret.manager.executor.derive_prvkeys", wraps=secret_executor.derive_prvkeys
+        ) as fake_derive_prvkeys:
+            wallet_manager.search_existing_wallets(["btc", "eth"], self.mnemonic, passphrase=self.passphrase)
+            self.assertEqual(  # All the searching paths of a chain are derived in one job
+                [40, 20], [len(i.args[2]) for i in fake_derive_prvkeys.call_args_list]
+            )
+
     def test_update_wallet_password(self):
         wallet_info = wallet_manager.import_standalone_wallet_by_mnemonic(
             "ETH-1",
@@ -617,6 +636,200 @@ class TestWalletManager(TestCase):
                 raw_tx="fake_raw_tx",
             )
 
+    @patch("tilapia.lib.wallet.manager.handlers.get_handler_by_chain_model")
+    @patch("tilapia.lib.wallet.manager.provider_manager")
+    @patch("tilapia.lib.wallet.manager.secret_manager")
+    def test_speed_up(self, fake_secret_manager, fake_provider_manager, fake_get_handler_by_chain_model):
+        wallet = wallet_daos.wallet.create_wallet("testing", wallet_data.WalletType.SOFTWARE_PRIMARY, "eth")
+        wallet_daos.account.create_account(wallet.id, "eth", "my_address", pubkey_id=111)
+        transaction_manager.create_action(
+            txid="txid_a",
+            status=transaction_data.TxActionStatus.PENDING,
+            chain_code="eth",
+            coin_code="eth",
+            value=decimal.Decimal(10),
+            from_address="my_address",
+            to_address="address_b",
+            fee_limit=decimal.Decimal(21000),
+            fee_price_per_unit=decimal.Decimal(100),
+            nonce=3,
+            raw_tx="raw_tx_a",
+        )
+
+        fake_handler = Mock()
+        fake_unsigned_tx = provider_data.UnsignedTx(
+            inputs=[provider_data.TransactionInput(address="my_address", value=10)],
+            outputs=[provider_data.TransactionOutput(address="address_b", value=10)],
+            nonce=3,
+            fee_limit=21000,
+            fee_price_per_unit=150,
+        )
+        fake_handler.generate_replacement_tx.return_value = fake_unsigned_tx
+        fake_get_handler_by_chain_model.return_value = fake_handler
+        fake_provider_manager.verify_address.return_value = Mock(is_valid=True)
+        fake_provider_manager.sign_transaction.return_value = provider_data.SignedTx(txid="txid_b", raw_tx="raw_tx_b")
+        fake_provider_manager.broadcast_transaction.return_value = provider_data.TxBroadcastReceipt(
+            txid="txid_b", is_success=True, receipt_code=provider_data.TxBroadcastReceiptCode.SUCCESS
+        )
+
+        with self.subTest("Illegal fee_multiplier"):
+            with self.assertRaisesRegex(wallet_exceptions.IllegalWalletOperation, "Invalid fee_multiplier"):
+                wallet_manager.speed_up(wallet.id, "txid_a", 0.9, password="123")
+
+        with self.subTest("Not pending"):
+            with self.assertRaisesRegex(wallet_exceptions.IllegalWalletOperation, "Only the pending tx can be sped up"):
+                wallet_manager.speed_up(wallet.id, "txid_unknown", 1.5, password="123")
+
+        self.assertEqual(
+            provider_data.SignedTx(txid="txid_b", raw_tx="raw_tx_b"),
+            wallet_manager.speed_up(wallet.id, "txid_a", 1.5, password="123"),
+        )
+        (original,) = transaction_manager.query_actions_by_txid("eth", "txid_a")
+        self.assertEqual((transaction_data.TxActionStatus.REPLACED, "txid_b"), (original.status, original.replaced_by))
+        (replacement,) = transaction_manager.query_actions_by_txid("eth", "txid_b")
+        self.assertEqual(
+            (transaction_data.TxActionStatus.PENDING, 3, decimal.Decimal(150), "address_b", decimal.Decimal(10)),
+            (
+                replacement.status,
+                replacement.nonce,
+                replacement.fee_price_per_unit,
+                replacement.to_address,
+                replacement.value,
+            ),
+        )
+        self.assertEqual("raw_tx_b", transaction_manager.get_raw_tx("eth", "txid_b"))
+        self.assertEqual(original.id, fake_handler.generate_replacement_tx.call_args[0][1].id)
+        fake_provider_manager.broadcast_transaction.assert_called_once_with("eth", "raw_tx_b")
+
+        with self.subTest("Replaced already"):
+            with self.assertRaisesRegex(wallet_exceptions.IllegalWalletOperation, "Only the pending tx can be sped up"):
+                wallet_manager.speed_up(wallet.id, "txid_a", 1.5, password="123")
+
+        with self.subTest("RBF not supported"), patch(
+            "tilapia.lib.wallet.manager.coin_manager.get_chain_info",
+            return_value=Mock(chain_model=coin_data.ChainModel.UTXO, rbf_supported=False),
+        ):
+            fake_handler.generate_replacement_tx.reset_mock()
+            with self.assertRaisesRegex(wallet_exceptions.IllegalWalletOperation, "Replace-by-fee isn't supported"):
+                wallet_manager.speed_up(wallet.id, "txid_b", 1.5, password="123")
+
+            fake_handler.generate_replacement_tx.assert_not_called()
+
+    @patch("tilapia.lib.wallet.manager.handlers.get_handler_by_chain_model")
+    @patch("tilapia.lib.wallet.manager.provider_manager")
+    @patch("tilapia.lib.wallet.manager.secret_manager")
+    def test_consolidate_utxos(self, fake_secret_manager, fake_provider_manager, fake_get_handler_by_chain_model):
+        wallet = wallet_daos.wallet.create_wallet("testing", wallet_data.WalletType.SOFTWARE_PRIMARY, "btc")
+        wallet_daos.account.create_account(wallet.id, "btc", "my_address", pubkey_id=111)
+        utxo_manager.invalidate_utxo_index()
+        utxo_daos.bulk_create_utxos(
+            [
+                utxo_daos.new_utxo("btc", "btc", "my_address", "txid_a", i, utxo_data.UTXOStatus.SPENDABLE, 1000)
+                for i in range(3)
+            ]
+        )
+        utxos = list(utxo_models.UTXO.select())
+
+        fake_handler = Mock()
+        fake_handler.plan_consolidation.return_value = utxo_handler.ConsolidationPlan(
+            fee_price_per_unit=1,
+            long_term_fee_price_per_unit=2,
+            utxo_count=3,
+            batches=[
+                (
+                    utxos,
+                    utxo_consolidation.ConsolidationBatch(
+                        indexes=[0, 1, 2], input_value=3000, vsize=246, fee=246, output_value=2754, saving=118
+                    ),
+                )
+            ],
+        )
+        fake_handler.generate_consolidation_tx.return_value = provider_data.UnsignedTx(
+            inputs=[
+                provider_data.TransactionInput(
+                    address="my_address", value=1000, utxo=provider_data.UTXO(txid="txid_a", vout=i, value=1000)
+                )
+                for i in range(3)
+            ],
+            outputs=[provider_data.TransactionOutput(address="my_address", value=2754, payload={"is_change": True})],
+            fee_limit=246,
+            fee_price_per_unit=1,
+        )
+        fake_get_handler_by_chain_model.return_value = fake_handler
+        fake_provider_manager.verify_address.return_value = Mock(is_valid=True)
+        fake_provider_manager.sign_transaction.return_value = provider_data.SignedTx(txid="txid_b", raw_tx="raw_tx_b")
+        fake_provider_manager.broadcast_transaction.return_value = provider_data.TxBroadcastReceipt(
+            txid="txid_b", is_success=True, receipt_code=provider_data.TxBroadcastReceiptCode.SUCCESS
+        )
+
+        expected = {
+            "fee_price_per_unit": 1,
+            "long_term_fee_price_per_unit": 2,
+            "is_low_fee_window": True,
+            "utxo_count": 3,
+            "utxo_count_after": 1,
+            "total_fee": 246,
+            "projected_saving": 118,
+            "batches": [
+                {
+                    "input_count": 3,
+                    "input_value": 3000,
+                    "vsize": 246,
+                    "fee": 246,
+                    "output_value": 2754,
+                    "saving": 118,
+                    "txid": None,
+                }
+            ],
+        }
+
+        with self.subTest("Dry run"):
+            self.assertEqual(expected, wallet_manager.consolidate_utxos(wallet.id, max_fee_price_per_unit=1))
+            fake_handler.plan_consolidation.assert_called_once_with(
+                wallet.id, "btc", max_value=None, max_tx_vsize=10000, max_fee=None, max_batches=None
+            )
+            fake_handler.generate_consolidation_tx.assert_not_called()
+
+        with self.subTest("Require password"):
+            with self.assertRaisesRegex(wallet_exceptions.IllegalWalletOperation, "Require password"):
+                wallet_manager.consolidate_utxos(wallet.id, max_fee_price_per_unit=1, dry_run=False)
+
+        with self.subTest("Out of the low-fee window"):
+            self.assertEqual(
+                {**expected, "is_low_fee_window": False},
+                wallet_manager.consolidate_utxos(wallet.id, max_fee_price_per_unit=0, dry_run=False, password="123"),
+            )
+            fake_handler.generate_consolidation_tx.assert_not_called()
+
+        with patch.dict(wallet_manager.settings.UTXO_CHAINING, {"max_unconfirmed_depth": 2}):
+            self.assertEqual(
+                {**expected, "batches": [{**expected["batches"][0], "txid": "txid_b"}]},
+                wallet_manager.consolidate_utxos(wallet.id, max_fee_price_per_unit=1, dry_run=False, password="123"),
+            )
+        fake_handler.generate_consolidation_tx.assert_called_once_with(
+            wallet.id, utxos, fake_handler.plan_consolidation.return_value.batches[0][1], 1
+        )
+        fake_provider_manager.broadcast_transaction.assert_called_once_with("btc", "raw_tx_b")
+        (action,) = transaction_manager.query_actions_by_txid("btc", "txid_b")
+        self.assertEqual(
+            (transaction_data.TxActionStatus.PENDING, "my_address", "my_address", decimal.Decimal(2754)),
+            (action.status, action.from_address, action.to_address, action.value),
+        )
+        self.assertEqual(
+            [utxo_data.UTXOStatus.CHOSEN] * 3,
+            [i.status for i in utxo_manager.get_utxos_chosen_by_txid("btc", "txid_b")],
+        )
+        (change,) = utxo_models.UTXO.select().where(utxo_models.UTXO.txid == "txid_b")  # Spendable before confirmed
+        self.assertEqual(
+            ("my_address", 0, 2754, utxo_data.UTXOStatus.SPENDABLE, 1),
+            (change.address, change.vout, change.value, change.status, change.unconfirmed_depth),
+        )
+
+        with self.subTest("Illegal chain model"):
+            wallet = wallet_daos.wallet.create_wallet("testing", wallet_data.WalletType.SOFTWARE_PRIMARY, "eth")
+            with self.assertRaisesRegex(wallet_exceptions.IllegalWalletOperation, "Only the utxos can be consolidated"):
+                wallet_manager.consolidate_utxos(wallet.id, max_fee_price_per_unit=1)
+
     @patch("tilapia.lib.wallet.manager.provider_manager")
     @patch("tilapia.lib.wallet.manager.transaction_manager")
     def test_broadcast_transaction(self, fake_transaction_manager, fake_provider_manager):
@@ -808,6 +1021,7 @@ class TestWalletManager(TestCase):
         self.assertEqual(1, wallet_models.AccountModel.select().count())
         self.assertEqual(1, wallet_models.AssetModel.select().count())
         self.assertEqual(1, transaction_models.TxAction.select().count())
+        self.assertIn(wallet_info["address"], transaction_manager._get_watched_addresses("eth"))
 
         wallet_manager.cascade_delete_wallet_related_models(wallet_info["wallet_id"], self.password)
 
@@ -817,6 +1031,7 @@ class TestWalletManager(TestCase):
         self.assertEqual(0, wallet_models.AccountModel.select().count())
         self.assertEqual(0, wallet_models.AssetModel.select().count())
         self.assertEqual(0, transaction_models.TxAction.select().count())
+        self.assertNotIn(wallet_info["address"], transaction_manager._get_watched_addresses("eth"))
 
     @patch("tilapia.lib.wallet.manager.handlers.get_handler_by_chain_model")
     @patch("tilapia.lib.wallet.manager.provider_manager")
@@ -1112,6 +1327,88 @@ class TestWalletManager(TestCase):
             "eth", "Hello OneKey", fake_signer, address="my_address"
         )
 
+    @patch("tilapia.lib.wallet.manager.provider_manager")
+    def test_sign_message__session(self, fake_provider_manager):
+        wallet_info = wallet_manager.import_standalone_wallet_by_mnemonic(
+            "ETH-1",
+            "eth",
+            password=self.password,
+            mnemonic=self.mnemonic,
+            passphrase=self.passphrase,
+        )
+        wallet_id = wallet_info["wallet_id"]
+        fake_provider_manager.sign_message.return_value = "fake_signature"
+
+        with self.assertRaises(cipher.InvalidPassword):
+            wallet_manager.unlock(wallet_id, "hello world")
+
+        session_token = wallet_manager.unlock(wallet_id, self.password)
+        with patch("tilapia.lib.wallet.manager.secret_manager.get_signer") as fake_get_signer:
+            self.assertEqual(
+                "fake_signature", wallet_manager.sign_message(wallet_id, "Hello OneKey", session_token=session_token)
+            )
+            fake_get_signer.assert_not_called()
+
+        signer = fake_provider_manager.sign_message.call_args[0][2]
+        self.assertEqual(
+            wallet_manager.get_default_account_by_wallet(wallet_id).address,
+            fake_provider_manager.sign_message.call_args[1]["address"],
+        )
+        self.assertTrue(signer.has_prvkey())
+
+        self.assertFalse(wallet_manager.lock(wallet_id + 1, session_token))  # Not the owner
+        self.assertEqual(
+            "fake_signature", wallet_manager.sign_message(wallet_id, "Hello OneKey", session_token=session_token)
+        )
+
+        self.assertTrue(wallet_manager.lock(wallet_id, session_token))
+        with self.assertRaises(secret_exceptions.SigningSessionNotFound):
+            wallet_manager.sign_message(wallet_id, "Hello OneKey", session_token=session_token)
+
+    @patch("tilapia.lib.wallet.manager.VERIFY_MESSAGES_CHUNK_SIZE", 2)
+    @patch("tilapia.lib.wallet.manager.provider_manager")
+    def test_verify_messages(self, fake_provider_manager):
+        fake_provider_manager.verify_address.side_effect = lambda chain_code, address: Mock(
+            normalized_address=address.lower()
+        )
+        fake_provider_manager.verify_messages.side_effect = lambda chain_code, items: [
+            signature == f"{chain_code}_{address}" for address, _, signature in items
+        ]
+
+        items = [
+            {"chain_code": "eth", "address": "A", "message": "Hello OneKey", "signature": "eth_a"},
+            {"chain_code": "btc", "address": "B", "message": "Hello OneKey", "signature": "btc_b"},
+            {"chain_code": "eth", "address": "C", "message": "Hello OneKey", "signature": "eth_a"},
+            {"chain_code": "eth", "address": "D", "message": "Hello OneKey", "signature": "eth_d"},
+            {"chain_code": "btc", "address": "E", "message": "Hello OneKey", "signature": "eth_e"},
+        ]
+        self.assertEqual([True, True, False, True, False], wallet_manager.verify_messages(items))
+        self.assertEqual(3, fake_provider_manager.verify_messages.call_count)
+        fake_provider_manager.verify_messages.assert_any_call(
+            "eth", [("a", "Hello OneKey", "eth_a"), ("c", "Hello OneKey", "eth_a")]
+        )
+
+        with self.subTest("False for the ones failed to verify"):
+            items = [
+                {"chain_code": "eth", "address": "A", "message": "Hello OneKey", "signature": "eth_a"},
+                {"chain_code": "eth", "address": "bad", "message": "Hello OneKey", "signature": "eth_bad"},
+                {"chain_code": "unknown", "address": "F", "message": "Hello OneKey", "signature": "unknown_f"},
+            ]
+
+            def _fake_verify_address(chain_code, address):
+                if address == "bad":
+                    raise Exception("Invalid address")
+                return Mock(normalized_address=address.lower())
+
+            def _fake_verify_messages(chain_code, chunk):
+                if chain_code == "unknown":
+                    raise Exception("Unsupported chain")
+                return [signature == f"{chain_code}_{address}" for address, _, signature in chunk]
+
+            fake_provider_manager.verify_address.side_effect = _fake_verify_address
+            fake_provider_manager.verify_messages.side_effect = _fake_verify_messages
+            self.assertEqual([True, False, False], wallet_manager.verify_messages(items))
+
     @patch("tilapia.lib.wallet.manager.provider_manager")
     def test_verify_message__hardware(self, fake_provider_manager):
         fake_provider_manager.hardware_verify_message.return_value = True
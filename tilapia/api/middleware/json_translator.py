@@ -14,6 +14,9 @@ class Middleware(object):
             f"req: {req}, resp: {resp}, resource: {resource}, req_succeeded: {req_succeeded}"
         )
 
+        if req_succeeded and resp.stream is not None:
+            return  # Streaming in its own content type, and resp.text would take precedence over resp.stream
+
         context = {"version": version.__VERSION__}
 
         if not req_succeeded:
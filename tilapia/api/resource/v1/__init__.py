@@ -14,9 +14,14 @@ __RESOURCES__ = [
     wallet.Item,
     wallet.ShowAsset,
     wallet.HideAsset,
+    wallet.History,
+    wallet.HistoryExport,
     wallet.PreSend,
     wallet.Send,
+    wallet.SpeedUp,
     wallet.MessageSigner,
+    wallet.Unlock,
+    wallet.Lock,
     wallet.HardwareAddressConfirm,
     software_wallet.PrimaryCreator,
     software_wallet.StandaloneImporter,
@@ -28,5 +33,6 @@ __RESOURCES__ = [
     hardware_wallet.PrimaryCreator,
     hardware_wallet.StandaloneCreator,
     provider.MessageVerifier,
+    provider.MessagesVerifier,
     price.Price,
 ]
@@ -7,6 +7,35 @@ class _Provider:
     URI = "provider/{chain_code}"
 
 
+class MessagesVerifier:
+    URI = "provider/messages/verify"
+
+    @jsonschema.validate(
+        {
+            "type": "object",
+            "required": ["items"],
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "maxItems": wallet_manager.VERIFY_MESSAGES_MAX_ITEMS,
+                    "items": {
+                        "type": "object",
+                        "required": ["chain_code", "address", "message", "signature"],
+                        "properties": {
+                            "chain_code": {"type": "string"},
+                            "address": {"type": "string"},
+                            "message": {"type": "string"},
+                            "signature": {"type": "string"},
+                        },
+                    },
+                },
+            },
+        }
+    )
+    def on_post(self, req, resp):
+        resp.media = wallet_manager.verify_messages(req.media["items"])
+
+
 class MessageVerifier:
     URI = _Provider.URI + "/message/verify"
 
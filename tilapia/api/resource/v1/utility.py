@@ -4,6 +4,7 @@ from typing import Callable
 from tilapia.lib.basic.functional.wraps import timeout_lock
 from tilapia.lib.basic.orm import database as orm_database
 from tilapia.lib.basic.orm.migrate import manager as migrate_manager
+from tilapia.lib.maintenance import manager as maintenance_manager
 from tilapia.lib.price import manager as price_manager
 from tilapia.lib.transaction import manager as transaction_manager
 
@@ -21,6 +22,7 @@ class Ticker:
     TASKS = {
         "price": price_manager.on_ticker_signal,
         "transaction": transaction_manager.on_ticker_signal,
+        "maintenance": maintenance_manager.on_ticker_signal,
     }
 
     def on_post(self, req, resp, task_name):
@@ -74,6 +74,48 @@ class HideAsset:
         wallet_manager.hide_asset(wallet_id, coin_code)
 
 
+class History:
+    URI = _Asset.URI + "/history"
+
+    def on_get(self, req, resp, wallet_id, coin_code):
+        page_cursor = req.params.get("page_cursor")
+        items_per_page = req.get_param_as_int("items_per_page", min_value=1, max_value=100, default=20)
+        searching_address_as = req.params.get("searching_address_as", "both")
+        require(searching_address_as in ("sender", "receiver", "both"), "Illegal 'searching_address_as'")
+        include_raw_tx = req.get_param_as_bool("include_raw_tx", default=False)
+
+        resp.media = wallet_manager.query_history(
+            wallet_id,
+            coin_code,
+            page_cursor=page_cursor,
+            items_per_page=items_per_page,
+            searching_address_as=searching_address_as,
+            include_raw_tx=include_raw_tx,
+        )
+
+
+class HistoryExport:
+    URI = _Asset.URI + "/history/export"
+    CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+    def on_get(self, req, resp, wallet_id, coin_code):
+        file_format = req.params.get("format", "ndjson")
+        require(file_format in self.CONTENT_TYPES, "Illegal 'format'")
+        searching_address_as = req.params.get("searching_address_as", "both")
+        require(searching_address_as in ("sender", "receiver", "both"), "Illegal 'searching_address_as'")
+        fiat_unit = req.params.get("fiat_unit", "usd")
+
+        resp.content_type = self.CONTENT_TYPES[file_format]
+        resp.downloadable_as = f"{coin_code}_history.{file_format}"
+        resp.stream = wallet_manager.export_history(
+            wallet_id,
+            coin_code,
+            searching_address_as=searching_address_as,
+            file_format=file_format,
+            fiat_unit=fiat_unit,
+        )
+
+
 class PreSend:
     URI = _Asset.URI + "/pre_send"
 
@@ -136,12 +178,13 @@ class Send:
                 "payload": {"type": "object"},
                 "password": {"type": "string"},
                 "device_path": {"type": "string"},
+                "session_token": {"type": "string"},
             },
         }
     )
     def on_post(self, req, resp, wallet_id, coin_code):
         media = req.media
-        to_address, value, nonce, fee_limit, fee_price_per_unit, payload, password, device_path = (
+        to_address, value, nonce, fee_limit, fee_price_per_unit, payload, password, device_path, session_token = (
             media["to_address"],
             media["value"],
             media.get("nonce"),
@@ -150,6 +193,7 @@ class Send:
             media.get("payload"),
             media.get("password"),
             media.get("device_path"),
+            media.get("session_token"),
         )
 
         wallet_id = int(wallet_id)
@@ -169,10 +213,44 @@ class Send:
             payload=payload,
             password=password,
             hardware_device_path=device_path,
+            session_token=session_token,
         )
         resp.media = result
 
 
+class SpeedUp:
+    URI = Item.URI + "/txs/{txid}/speed_up"
+
+    @jsonschema.validate(
+        {
+            "type": "object",
+            "properties": {
+                "fee_multiplier": {"type": "string"},
+                "password": {"type": "string"},
+                "device_path": {"type": "string"},
+                "session_token": {"type": "string"},
+            },
+        }
+    )
+    def on_post(self, req, resp, wallet_id, txid):
+        media = req.media
+        fee_multiplier, password, device_path, session_token = (
+            media.get("fee_multiplier", "1.5"),
+            media.get("password"),
+            media.get("device_path"),
+            media.get("session_token"),
+        )
+
+        resp.media = wallet_manager.speed_up(
+            wallet_id=int(wallet_id),
+            txid=txid,
+            fee_multiplier=float(fee_multiplier),
+            password=password,
+            hardware_device_path=device_path,
+            session_token=session_token,
+        )
+
+
 class MessageSigner:
     URI = Item.URI + "/message/sign"
 
@@ -184,16 +262,56 @@ class MessageSigner:
                 "password": {"type": "string"},
                 "message": {"type": "string"},
                 "device_path": {"type": "string"},
+                "session_token": {"type": "string"},
             },
         }
     )
     def on_post(self, req, resp, wallet_id):
         message, password, device_path = req.media["message"], req.media.get("password"), req.media.get("device_path")
         resp.media = wallet_manager.sign_message(
-            wallet_id, message, password=password, hardware_device_path=device_path
+            wallet_id,
+            message,
+            password=password,
+            hardware_device_path=device_path,
+            session_token=req.media.get("session_token"),
         )
 
 
+class Unlock:
+    URI = Item.URI + "/unlock"
+
+    @jsonschema.validate(
+        {
+            "type": "object",
+            "required": ["password"],
+            "properties": {
+                "password": {"type": "string"},
+                "ttl": {"type": "integer"},
+            },
+        }
+    )
+    def on_post(self, req, resp, wallet_id):
+        password, ttl = req.media["password"], req.media.get("ttl")
+        kwargs = {} if ttl is None else {"ttl": ttl}
+        resp.media = {"session_token": wallet_manager.unlock(int(wallet_id), password, **kwargs)}
+
+
+class Lock:
+    URI = Item.URI + "/lock"
+
+    @jsonschema.validate(
+        {
+            "type": "object",
+            "required": ["session_token"],
+            "properties": {
+                "session_token": {"type": "string"},
+            },
+        }
+    )
+    def on_post(self, req, resp, wallet_id):
+        resp.media = wallet_manager.lock(int(wallet_id), req.media["session_token"])
+
+
 class HardwareAddressConfirm:
     URI = Item.URI + "/confirm_address_on_hardware"
 
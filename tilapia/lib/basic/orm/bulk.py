@@ -0,0 +1,139 @@
+import itertools
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Type, Union
+
+import peewee
+
+logger = logging.getLogger("app.orm")
+
+# The compiled-in default of SQLite, raised from 999 to 32766 since 3.32.0
+SQLITE_MAX_VARIABLE_NUMBER = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+# Larger statements make no more speedup but cost more memory
+MAX_ROWS_PER_STATEMENT = 500
+
+
+@dataclass
+class BulkWriteResult(object):
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+
+def batch_size_of(
+    model: Type[peewee.Model], columns_count: int = None, max_variables: int = SQLITE_MAX_VARIABLE_NUMBER
+) -> int:
+    """
+    The max number of rows in one statement without exceeding the variable limit of SQLite
+    :param columns_count: variables bound per row, all the columns of the model by default
+    """
+    columns_count = columns_count or len(model._meta.sorted_fields)
+    return max(1, max_variables // columns_count)
+
+
+def unique_key_of(model: Type[peewee.Model]) -> List[peewee.Field]:
+    for columns, unique in model._meta.indexes:
+        if unique:
+            return [model._meta.fields[i] for i in columns]
+
+    for field in model._meta.sorted_fields:
+        if field.unique and not field.primary_key:
+            return [field]
+
+    return [model._meta.primary_key]
+
+
+def bulk_insert(
+    model: Type[peewee.Model],
+    items: Iterable[Union[dict, peewee.Model]],
+    ignore_conflicts: bool = False,
+    preserve: Sequence[peewee.Field] = None,
+    conflict_target: Sequence[peewee.Field] = None,
+    batch_size: int = None,
+) -> BulkWriteResult:
+    """
+    Insert rows in as few statements as possible, all in one transaction
+    :param items: dicts or unsaved model instances, the columns missing in a row are filled by the field default
+    :param ignore_conflicts: skip the rows conflicting with the existing ones
+    :param preserve: upsert, overwrite these fields of the existing rows with the inserting ones
+    :param conflict_target: the unique key to detect conflicts, the first unique index of the model by default
+    """
+    pk_name = model._meta.primary_key.name
+    rows = [
+        {k: v for k, v in i.__data__.items() if k != pk_name or v is not None} if isinstance(i, peewee.Model) else i
+        for i in items
+    ]
+    if not rows:
+        return BulkWriteResult(rows=0, seconds=0)
+
+    columns = dict.fromkeys(k for row in rows for k in row)  # Union of the rows, in the order of appearance
+    fields = [model._meta.fields[i] for i in columns]
+    fields.extend(i for i in model._meta.sorted_fields if i.name not in columns and i.default is not None)
+    batch_size = batch_size or min(MAX_ROWS_PER_STATEMENT, batch_size_of(model, columns_count=len(fields)))
+
+    prefix = "INSERT OR IGNORE INTO" if ignore_conflicts and not preserve else "INSERT INTO"
+    prefix = f'{prefix} "{model._meta.table_name}" ({", ".join(_quote(i) for i in fields)}) VALUES '
+    placeholder = f"({', '.join('?' * len(fields))})"
+    suffix = ""
+    if preserve:
+        suffix = (
+            f" ON CONFLICT ({', '.join(_quote(i) for i in conflict_target or unique_key_of(model))})"
+            f" DO UPDATE SET {', '.join(f'{_quote(i)} = excluded.{_quote(i)}' for i in preserve)}"
+        )
+
+    database = model._meta.database
+    count = 0
+    start_time = time.time()
+
+    with database.atomic():
+        for batch in peewee.chunked(rows, batch_size):
+            # The statement is compiled once by SQLite per batch, the values are bound natively
+            sql = f"{prefix}{', '.join(itertools.repeat(placeholder, len(batch)))}{suffix}"
+            params = [_db_value(field, row) for row in batch for field in fields]
+            database.execute_sql(sql, params)
+            count += len(batch)
+
+    result = BulkWriteResult(rows=count, seconds=time.time() - start_time)
+    logger.debug(
+        f"Bulk insert into {model._meta.table_name}. rows: {result.rows}, "
+        f"seconds: {result.seconds:.4f}, rows/s: {result.rows_per_second:.0f}"
+    )
+    return result
+
+
+def _quote(field: peewee.Field) -> str:
+    return f'"{field.column_name}"'
+
+
+def _db_value(field: peewee.Field, row: dict):
+    if field.name in row:
+        value = row[field.name]
+    else:
+        value = field.default() if callable(field.default) else field.default
+
+    return field.db_value(value)
+
+
+def bulk_update(
+    model: Type[peewee.Model], items: List[peewee.Model], fields: Sequence[peewee.Field]
+) -> BulkWriteResult:
+    """
+    Update the fields of the saved model instances by their primary keys, all in one transaction
+    """
+    start_time = time.time()
+
+    with model._meta.database.atomic():
+        # Each field binds a pair of (pk, value) per row, plus the pk in the where clause
+        model.bulk_update(items, fields, batch_size=batch_size_of(model, columns_count=len(fields) * 2 + 1))
+
+    result = BulkWriteResult(rows=len(items), seconds=time.time() - start_time)
+    logger.debug(
+        f"Bulk update {model._meta.table_name}. rows: {result.rows}, "
+        f"seconds: {result.seconds:.4f}, rows/s: {result.rows_per_second:.0f}"
+    )
+    return result
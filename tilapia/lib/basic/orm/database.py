@@ -1,5 +1,78 @@
-from peewee import SqliteDatabase
+import logging
+import threading
+from typing import Callable
+
+import peewee
 
 from tilapia.lib.conf import settings
 
-db = SqliteDatabase(settings.DATABASE["default"]["name"])
+logger = logging.getLogger("app.orm")
+
+
+class SqliteDatabase(peewee.SqliteDatabase):
+    """
+    SqliteDatabase plus the callbacks after commit, likes on_commit of django.
+    Used to keep the in-process caches of the tables up to date, only with the changes committed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Thread local as the transactions, the connection is per thread
+        self._commit_hooks = threading.local()
+
+    def _hooks(self) -> threading.local:
+        if not hasattr(self._commit_hooks, "callbacks"):
+            self._commit_hooks.callbacks = []
+            self._commit_hooks.marks = []  # Length of the callbacks on entering each atomic block
+
+        return self._commit_hooks
+
+    def on_commit(self, callback: Callable[[], None]):
+        """
+        Run callback after the outermost transaction committed, or right now if not in any transaction.
+        The callback is discarded if the atomic block registering it is rolled back.
+        """
+        if self.in_transaction():
+            self._hooks().callbacks.append(callback)
+        else:
+            callback()
+
+    def atomic(self, *args, **kwargs):
+        return _atomic(self, *args, **kwargs)
+
+    def commit(self):
+        result = super().commit()
+
+        hooks = self._hooks()
+        callbacks, hooks.callbacks = hooks.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.exception(f"Error in the callback after commit. callback: {callback}, error: {e}")
+
+        return result
+
+    def rollback(self):
+        self._hooks().callbacks = []
+        return super().rollback()
+
+
+class _atomic(peewee._atomic):
+    # The state is kept by the database rather than self, which is shared between threads if used as a decorator
+
+    def __enter__(self):
+        hooks = self.db._hooks()
+        hooks.marks.append(len(hooks.callbacks))
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        hooks = self.db._hooks()
+        mark = hooks.marks.pop()
+        if exc_type:
+            del hooks.callbacks[mark:]  # Rolled back to the savepoint
+
+        return super().__exit__(exc_type, exc_val, exc_tb)
+
+
+db = SqliteDatabase(settings.DATABASE["default"]["name"], pragmas=settings.DATABASE["default"].get("pragmas"))
@@ -0,0 +1,94 @@
+"""
+Lookups by many keys in as few statements as the variable limit of SQLite allows.
+The keys of multiple columns, likes (txid, vout), are matched by the row values: (a, b) IN (SELECT * FROM (VALUES ...))
+"""
+import functools
+import itertools
+import operator
+import sqlite3
+from typing import Any, Iterable, Iterator, List, Sequence
+
+import peewee
+
+from tilapia.lib.basic.orm import bulk
+
+# Row values are supported since SQLite 3.15.0
+ROW_VALUES_SUPPORTED = sqlite3.sqlite_version_info >= (3, 15, 0)
+
+
+def keys_in(columns: Sequence[peewee.Field], keys: Sequence[Any]) -> peewee.ColumnBase:
+    """
+    :param keys: values of the single column, or tuples of the multiple columns
+    """
+    # Built as the raw SQL, compiling a node per value by peewee costs much more than querying at thousands of keys
+    if len(columns) == 1:
+        column = columns[0]
+        return column.in_(peewee.SQL(_placeholders_of(len(keys)), [column.db_value(i) for i in keys]))
+    elif ROW_VALUES_SUPPORTED:
+        # Selected from the values rather than listed, then SQLite seeks the index by the leading column
+        row = _placeholders_of(len(columns))
+        sql = f"(SELECT * FROM (VALUES {', '.join(itertools.repeat(row, len(keys)))}))"
+        params = [column.db_value(value) for key in keys for column, value in zip(columns, key)]
+        return peewee.Tuple(*columns).in_(peewee.SQL(sql, params))
+    else:
+        # Joined flatly, the nested ones by peewee overflow the parser stack of SQLite at about 100 terms
+        return peewee.NodeList(
+            [functools.reduce(operator.and_, (c == v for c, v in zip(columns, key))) for key in keys],
+            glue=" OR ",
+            parens=True,
+        )
+
+
+def _placeholders_of(count: int) -> str:
+    return f"({', '.join(itertools.repeat('?', count))})"
+
+
+def batch_size_of_keys(
+    columns_count: int, reserved_variables: int = 0, max_variables: int = bulk.SQLITE_MAX_VARIABLE_NUMBER
+) -> int:
+    """
+    The max number of keys in one statement without exceeding the variable limit of SQLite
+    :param reserved_variables: variables bound by the rest of the statement
+    """
+    return max(1, (max_variables - reserved_variables) // columns_count)
+
+
+def select_by_keys(
+    query: peewee.Select, columns: Sequence[peewee.Field], keys: Iterable[Any], batch_size: int = None
+) -> Iterator[Any]:
+    """
+    Iterate the rows of the query filtered by the keys, a statement per batch of keys
+    :param keys: values of the single column, or tuples of the multiple columns, the duplicated ones are skipped
+    """
+    for batch in _chunked_keys(query, columns, keys, batch_size):
+        yield from query.where(keys_in(columns, batch))
+
+
+def execute_by_keys(
+    query: peewee.Query, columns: Sequence[peewee.Field], keys: Iterable[Any], batch_size: int = None
+) -> int:
+    """
+    Execute the update or delete query filtered by the keys, a statement per batch of keys, all in one transaction
+    :return: count of the rows affected
+    """
+    count = 0
+
+    with query.model._meta.database.atomic():
+        for batch in _chunked_keys(query, columns, keys, batch_size):
+            count += query.where(keys_in(columns, batch)).execute()
+
+    return count
+
+
+def _chunked_keys(
+    query: peewee.Query, columns: Sequence[peewee.Field], keys: Iterable[Any], batch_size: int = None
+) -> Iterator[List[Any]]:
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+
+    if batch_size is None:
+        _, params = query.sql()
+        batch_size = batch_size_of_keys(len(columns), reserved_variables=len(params))
+
+    yield from peewee.chunked(keys, batch_size)
@@ -0,0 +1,70 @@
+"""
+Upkeep of the SQLite file: statistics for the query planner, and the free pages given back to the file system.
+Each step is a short statement or transaction, then the writers of the other threads wait no longer than one step.
+"""
+import sqlite3
+import time
+
+import peewee
+
+# Rows sampled per index by ANALYZE, bounds its time on the large tables. Supported since SQLite 3.32.0
+ANALYSIS_LIMIT = 1000
+ANALYSIS_LIMIT_SUPPORTED = sqlite3.sqlite_version_info >= (3, 32, 0)
+
+_AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def _pragma(database: peewee.Database, name: str):
+    return database.execute_sql(f"PRAGMA {name}").fetchone()[0]
+
+
+def analyze(database: peewee.Database, analysis_limit: int = ANALYSIS_LIMIT) -> dict:
+    """
+    ANALYZE at the first time, then PRAGMA optimize which analyzes only the tables changed a lot since then
+    """
+    if ANALYSIS_LIMIT_SUPPORTED:
+        database.execute_sql(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+
+    analyzed = database.table_exists("sqlite_stat1")
+    database.execute_sql("PRAGMA optimize" if analyzed else "ANALYZE")
+    return {"statement": "optimize" if analyzed else "analyze"}
+
+
+def incremental_vacuum(database: peewee.Database, pages_per_step: int, max_steps: int) -> dict:
+    """
+    Give the free pages back to the file system, pages_per_step in each statement.
+    Only works with auto_vacuum = incremental, see enable_incremental_vacuum
+    """
+    mode = _AUTO_VACUUM_MODES.get(_pragma(database, "auto_vacuum"))
+    page_size = _pragma(database, "page_size")
+    freelist_count = before = _pragma(database, "freelist_count")
+
+    steps = 0
+    while mode == "incremental" and freelist_count > 0 and steps < max_steps:
+        # The pages are freed one per step of the statement, executescript steps it till done
+        database.connection().executescript(f"PRAGMA incremental_vacuum({int(pages_per_step)})")
+        freelist_count = _pragma(database, "freelist_count")
+        steps += 1
+
+    return {
+        "auto_vacuum": mode,
+        "page_size": page_size,
+        "freelist_pages": freelist_count,
+        "reclaimed_pages": before - freelist_count,
+        "steps": steps,
+    }
+
+
+def enable_incremental_vacuum(database: peewee.Database) -> dict:
+    """
+    Switch the existing file to auto_vacuum = incremental, the new files are created so by DATABASE pragmas.
+    It rewrites the whole file by VACUUM and blocks all the others meanwhile, so run it offline once
+    """
+    started_at = time.perf_counter()
+    database.execute_sql("PRAGMA auto_vacuum = incremental")
+    database.execute_sql("VACUUM")
+    return {
+        "auto_vacuum": _AUTO_VACUUM_MODES.get(_pragma(database, "auto_vacuum")),
+        "page_count": _pragma(database, "page_count"),
+        "seconds": round(time.perf_counter() - started_at, 3),
+    }
@@ -3,10 +3,12 @@ from typing import Type
 
 import peewee
 
+from tilapia.lib.basic.orm.database import SqliteDatabase
+
 
 @contextmanager
 def test_database(*models: Type[peewee.Model]):
-    test_db = peewee.SqliteDatabase(":memory:")
+    test_db = SqliteDatabase(":memory:")
 
     with test_db.bind_ctx(models):
         test_db.create_tables(models)
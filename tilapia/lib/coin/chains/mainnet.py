@@ -17,6 +17,7 @@ CHAINS = [
         "bip44_purpose_options": {"P2PKH": 44, "P2WPKH-P2SH": 49, "P2WPKH": 84},
         "fee_price_decimals_for_legibility": 0,
         "nonce_supported": False,
+        "rbf_supported": True,
         "dust_threshold": 546,
         "blocktime_seconds": 600,
         "coins": [
@@ -91,6 +92,7 @@ CHAINS = [
         "bip44_purpose_options": {"P2PKH": 44, "P2WPKH-P2SH": 49, "P2WPKH": 84},
         "fee_price_decimals_for_legibility": 0,
         "nonce_supported": False,
+        "rbf_supported": True,
         "dust_threshold": 546,
         "blocktime_seconds": 150,
         "coins": [
@@ -1,14 +1,13 @@
 from typing import List, Optional, Set
 
-from tilapia.lib.basic.orm.database import db
+from tilapia.lib.basic.orm import bulk
 from tilapia.lib.coin.data import CoinInfo
 from tilapia.lib.coin.models import CoinModel
 
 
 def add_coin(*coins: CoinInfo):
     models = (CoinModel(**i.to_dict()) for i in coins)
-    with db.atomic():
-        CoinModel.bulk_create(models, 10)
+    bulk.bulk_insert(CoinModel, models)
 
 
 def get_coin_info(coin_code: str) -> Optional[CoinInfo]:
@@ -35,6 +35,7 @@ class ChainInfo(DataClassMixin):
     )  # Derive to 'ADDRESS_INDEX' as default (options: ACCOUNT, CHANGE, ADDRESS_INDEX)
     default_address_encoding: Optional[str] = None
     nonce_supported: bool = False
+    rbf_supported: bool = False  # whether the stuck tx can be replaced by BIP125 on the utxo chains
     chain_id: Optional[str] = None  # optional, identify multi forked chains by chain_id (use by eth etc.)
     bip44_purpose_options: dict = field(default_factory=dict)
     fee_price_decimals_for_legibility: int = 0  # (gwei in eth etc.)
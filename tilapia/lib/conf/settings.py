@@ -32,6 +32,8 @@ LOGGING = {
 DATABASE = {
     "default": {
         "name": f"{DATA_DIR}/database.sqlite",
+        # Only takes effect on the new file, see basic.orm.maintenance.enable_incremental_vacuum for the existing one
+        "pragmas": {"auto_vacuum": "incremental"},
     },
 }
 
@@ -42,8 +44,43 @@ DB_MODULES = [
     "tilapia.lib.secret",
     "tilapia.lib.wallet",
     "tilapia.lib.utxo",
+    "tilapia.lib.throttle",
 ]
 
+CRYPTO_EXECUTOR = {
+    "in_process": runtime != "host",  # offload CPU-bound crypto to a process pool when hosting the api
+    "max_workers": None,  # default to the number of processors
+    "timeout": 60,  # in seconds
+}
+
+BLOCK_SCANNER = {
+    "chains": [],  # chain codes of the account model to be scanned block by block, e.g. ["eth", "bsc", "heco"]
+    "reorg_depth": 12,  # in blocks
+    "max_blocks_per_round": 20,
+}
+
+RAW_TX_ARCHIVE = {
+    "path": None,  # sqlite file to keep the raw txs of old confirmed actions, e.g. f"{DATA_DIR}/raw_tx_archive.sqlite"
+    "min_age_days": 30,
+}
+
+UTXO_CHAINING = {
+    # Spend the own change before its tx confirmed, up to this depth of the unconfirmed ancestors, 0 to disable it.
+    # Bitcoin Core relays the tx with 25 unconfirmed ancestors at most by default
+    "max_unconfirmed_depth": 0,
+    "unconfirmed_ttl": 24 * 60 * 60,  # in seconds, the change not confirmed after it is evicted by the refreshing
+}
+
+MAINTENANCE = {
+    "interval": 24 * 60 * 60,  # in seconds, run once per interval by any of the workers sharing the database
+    "spent_utxo_retention_days": 30,
+    "superseded_price_retention_days": 7,
+    "chunk_size": 1000,  # rows deleted per transaction, short enough not to block the writers
+    "max_chunks": 100,
+    "vacuum_pages_per_step": 1000,
+    "vacuum_max_steps": 100,
+}
+
 PRICE = {
     "coingecko_mappings": {
         "binancecoin": ["bsc"],
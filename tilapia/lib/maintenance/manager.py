@@ -0,0 +1,73 @@
+import functools
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from tilapia.lib.basic.functional.timing import timing_logger
+from tilapia.lib.basic.orm import database as orm_database
+from tilapia.lib.basic.orm import maintenance as orm_maintenance
+from tilapia.lib.conf import settings
+from tilapia.lib.price import manager as price_manager
+from tilapia.lib.throttle import manager as throttle_manager
+from tilapia.lib.utxo import manager as utxo_manager
+
+logger = logging.getLogger("app.maintenance")
+
+
+def _steps() -> List[Tuple[str, Callable]]:
+    config = settings.MAINTENANCE
+    return [
+        (
+            "spent_utxos",
+            functools.partial(
+                utxo_manager.prune_spent_utxos,
+                config["spent_utxo_retention_days"],
+                chunk_size=config["chunk_size"],
+                max_chunks=config["max_chunks"],
+            ),
+        ),
+        ("superseded_prices", functools.partial(price_manager.compact_prices, config["superseded_price_retention_days"])),
+        ("expired_throttles", throttle_manager.purge_expired),
+        # After the pruning, then the statistics and the free pages are of the rows left
+        ("analyze", functools.partial(orm_maintenance.analyze, orm_database.db)),
+        (
+            "vacuum",
+            functools.partial(
+                orm_maintenance.incremental_vacuum,
+                orm_database.db,
+                config["vacuum_pages_per_step"],
+                config["vacuum_max_steps"],
+            ),
+        ),
+    ]
+
+
+@timing_logger("maintenance_manager.run_maintenance")
+def run_maintenance(force: bool = False) -> dict:
+    """
+    Prune the rows out of retention, then refresh the statistics and give the free pages back.
+    Run once per interval by any of the workers sharing the database, unless force.
+    :return: receipt and seconds used of each step
+    """
+    key = throttle_manager.key_of("maintenance")
+    if not throttle_manager.acquire([key], settings.MAINTENANCE["interval"], force=force):
+        return {}
+
+    report = {}
+    for name, step in _steps():
+        started_at = time.perf_counter()
+        try:
+            report[name] = {"receipt": step()}
+        except Exception as e:
+            logger.exception(f"Error in maintenance. step: {name}, error: {repr(e)}")
+            report[name] = {"error": repr(e)}
+
+        report[name]["seconds"] = round(time.perf_counter() - started_at, 3)
+
+    logger.info(f"Maintenance finished. report: {report}")
+    return report
+
+
+@timing_logger("maintenance_manager.on_ticker_signal")
+def on_ticker_signal():
+    return run_maintenance()
@@ -1,8 +1,8 @@
 import datetime
-import functools
 from decimal import Decimal
-from typing import Dict, Set, Tuple
+from typing import Dict, Iterable, List, Set, Tuple
 
+from tilapia.lib.basic.orm import bulk, lookup
 from tilapia.lib.price import data, models
 
 
@@ -12,18 +12,19 @@ def create_or_update(
     channel: data.Channel,
     price: Decimal,
 ):
-    model, is_newborn = models.Price.get_or_create(
-        coin_code=coin_code,
-        unit=unit,
-        channel=channel,
-        defaults=dict(price=price),
-    )
+    bulk_create_or_update([(coin_code, unit, channel, price)])
+
 
-    if not is_newborn:
-        models.Price.update(
-            price=price,
-            modified_time=datetime.datetime.now(),
-        ).where(models.Price.id == model.id).execute()
+def bulk_create_or_update(items: Iterable[Tuple[str, str, data.Channel, Decimal]]) -> int:
+    """
+    :param items: Iterable[(coin_code, unit, channel, price)]
+    """
+    now = datetime.datetime.now()
+    rows = (
+        dict(coin_code=coin_code, unit=unit, channel=channel, price=price, modified_time=now)
+        for coin_code, unit, channel, price in items
+    )
+    return bulk.bulk_insert(models.Price, rows, preserve=[models.Price.price, models.Price.modified_time]).rows
 
 
 def get_last_price(
@@ -41,13 +42,37 @@ def get_last_price(
 
 
 def load_price_by_pairs(pairs: Set[Tuple[str, str]]) -> Dict[Tuple[str, str], Decimal]:
-    expression = [(models.Price.coin_code == pair[0]) & (models.Price.unit == pair[1]) for pair in pairs]
-    expression = functools.reduce(lambda a, b: a | b, expression)
-
     pair_prices = {}
-    items = models.Price.select().where(expression).order_by(models.Price.modified_time.asc())
+    query = models.Price.select().order_by(models.Price.modified_time.asc())
+    items = lookup.select_by_keys(query, [models.Price.coin_code, models.Price.unit], pairs)
 
     for i in items:
         pair_prices[(i.coin_code, i.unit)] = i.price
 
     return pair_prices
+
+
+def query_superseded_price_ids(modified_before: datetime.datetime) -> List[int]:
+    """
+    The ones not updated since modified_before while the same pair is updated later by the other channels
+    """
+    newer = models.Price.alias()
+    query = (
+        models.Price.select(models.Price.id)
+        .join(
+            newer,
+            on=(
+                (newer.coin_code == models.Price.coin_code)
+                & (newer.unit == models.Price.unit)
+                & (newer.modified_time > models.Price.modified_time)
+            ),
+        )
+        .where(models.Price.modified_time < modified_before)
+        .distinct()
+        .tuples()
+    )
+    return [i[0] for i in query]
+
+
+def delete_prices_by_ids(price_ids: List[int]) -> int:
+    return lookup.execute_by_keys(models.Price.delete(), [models.Price.id], price_ids)
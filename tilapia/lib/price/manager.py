@@ -1,3 +1,4 @@
+import datetime
 import logging
 from decimal import Decimal
 from typing import Callable, Dict, Iterable, List, Sequence, Set, Tuple
@@ -32,14 +33,8 @@ def pricing(coin_codes: List[str] = None):
     for channel_type, channel_creator in _registry.items():
         try:
             channel = channel_creator()
-
-            for price in channel.pricing(coins):
-                daos.create_or_update(
-                    coin_code=price.coin_code,
-                    unit=price.unit,
-                    channel=channel_type,
-                    price=price.price,
-                )
+            prices = [(i.coin_code, i.unit, channel_type, i.price) for i in channel.pricing(coins)]
+            daos.bulk_create_or_update(prices)
         except Exception as e:
             logger.exception(f"Error in running channel. channel_type: {channel_type}, error: {e}")
 
@@ -107,6 +102,18 @@ def _split_paths_to_pairs(paths: List[Sequence[str]]) -> Set[Tuple[str, str]]:
     return pairs
 
 
+def compact_prices(retention_days: int) -> int:
+    """
+    Delete the prices superseded by the other channels for retention_days, likes the ones of a channel dropped.
+    The latest one of each pair is always kept, see get_last_price
+    :return: count of the prices deleted
+    """
+    modified_before = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    count = daos.delete_prices_by_ids(daos.query_superseded_price_ids(modified_before))
+    logger.info(f"Superseded prices compacted. count: {count}, modified_before: {modified_before}")
+    return count
+
+
 @timing_logger("price_manager.on_ticker_signal")
 def on_ticker_signal():
     pricing()
@@ -1,7 +1,7 @@
 import hashlib
 import socket
 from decimal import Decimal
-from typing import List, Set
+from typing import Dict, Iterable, List, Optional, Tuple
 from urllib import parse as urllib_parse
 
 import peewee
@@ -50,6 +50,33 @@ class _Adapter(object):
         return bytes(buffer)
 
 
+def _to_sat(value) -> int:
+    return int(Decimal(str(value)) * BTC__TO__SAT)
+
+
+def _populate_utxos(resp) -> List[data.UTXO]:
+    result = []
+
+    if isinstance(resp, list):
+        resp = (i for i in resp if i.get("height", 0) > 0)  # todo coinbase?
+        result.extend(data.UTXO(value=i["value"], txid=i["tx_hash"], vout=i["tx_pos"]) for i in resp)
+
+    return result
+
+
+def _populate_block_header(tx: dict) -> Optional[data.BlockHeader]:
+    return (
+        data.BlockHeader(
+            block_hash=tx["blockhash"],
+            block_number=0,  # todo
+            block_time=tx["blocktime"],
+            confirmations=tx["confirmations"],
+        )
+        if tx.get("blockhash")
+        else None
+    )
+
+
 def _populate_transaction(tx: dict, prev_txs_lookup: dict) -> data.Transaction:
     inputs = []
 
@@ -62,7 +89,7 @@ def _populate_transaction(tx: dict, prev_txs_lookup: dict) -> data.Transaction:
             continue
 
         address = prev_tx["vout"][vout]["scriptPubKey"].get("address", "")
-        value = int(Decimal(str(prev_tx["vout"][vout].get("value", 0))) * BTC__TO__SAT)
+        value = _to_sat(prev_tx["vout"][vout].get("value", 0))
         inputs.append(
             data.TransactionInput(
                 address=address, value=value, utxo=data.UTXO(txid=prev_txid, vout=int(i.get("vout", -1)), value=value)
@@ -70,21 +97,12 @@ def _populate_transaction(tx: dict, prev_txs_lookup: dict) -> data.Transaction:
         )
 
     outputs = [
-        data.TransactionOutput(address=i["scriptPubKey"]["address"], value=int(Decimal(str(i["value"])) * BTC__TO__SAT))
+        data.TransactionOutput(address=i["scriptPubKey"]["address"], value=_to_sat(i["value"]))
         for i in tx.get("vout", ())
         if i.get("scriptPubKey", {}).get("address")
     ]
 
-    block_header = (
-        data.BlockHeader(
-            block_hash=tx["blockhash"],
-            block_number=0,  # todo
-            block_time=tx["blocktime"],
-            confirmations=tx["confirmations"],
-        )
-        if tx.get("blockhash")
-        else None
-    )
+    block_header = _populate_block_header(tx)
 
     total_input = sum(i.value for i in inputs)
     total_output = sum(i.value for i in outputs)
@@ -104,12 +122,41 @@ def _populate_transaction(tx: dict, prev_txs_lookup: dict) -> data.Transaction:
     )
 
 
+def _populate_transaction_without_prevouts(tx: dict) -> data.Transaction:
+    inputs = [
+        data.TransactionInput(address="", value=0, utxo=data.UTXO(txid=i["txid"], vout=int(i["vout"]), value=0))
+        for i in tx.get("vin", ())
+        if i.get("txid") and int(i.get("vout", -1)) >= 0  # Coinbase input is ignored
+    ]
+    outputs = [
+        data.TransactionOutput(address=i.get("scriptPubKey", {}).get("address") or "", value=_to_sat(i.get("value", 0)))
+        for i in sorted(tx.get("vout", ()), key=lambda i: i.get("n", 0))
+    ]
+    block_header = _populate_block_header(tx)
+    fee_limit = tx.get("vsize", 0)
+
+    return data.Transaction(
+        txid=tx.get("txid") or "",
+        inputs=inputs,
+        outputs=outputs,
+        status=data.TransactionStatus.CONFIRM_SUCCESS if block_header is not None else data.TransactionStatus.PENDING,
+        fee=data.TransactionFee(limit=fee_limit, used=fee_limit, price_per_unit=0),  # Unknown until inputs resolved
+        block_header=block_header,
+        raw_tx=tx.get("hex") or "",
+    )
+
+
 class ElectrumX(
     interfaces.ClientChainBinding,
     interfaces.ClientInterface,
     interfaces.BatchGetAddressMixin,
     interfaces.SearchUTXOMixin,
+    interfaces.BatchSearchUTXOMixin,
+    interfaces.UTXOHistoryMixin,
 ):
+    __BATCH_MAX_ADDRESSES__ = 50
+    __BATCH_MAX_TXIDS__ = 50
+
     def __init__(self, url: str):
         super().__init__()
         self.rpc = json_rpc.JsonRPCRequest(
@@ -192,11 +239,15 @@ class ElectrumX(
     def search_utxos_by_address(self, address: str) -> List[data.UTXO]:
         script_hash = self._electrum_script_hash_of_address(address)
         resp = self.rpc.call("blockchain.scripthash.listunspent", [script_hash])
-        result = []
+        return _populate_utxos(resp)
 
-        if isinstance(resp, list):
-            resp = (i for i in resp if i.get("height", 0) > 0)  # todo coinbase?
-            result.extend(data.UTXO(value=i["value"], txid=i["tx_hash"], vout=i["tx_pos"]) for i in resp)
+    def batch_search_utxos_by_addresses(self, addresses: List[str]) -> Dict[str, List[data.UTXO]]:
+        result = {}
+
+        for batch in peewee.chunked(addresses, self.__BATCH_MAX_ADDRESSES__):
+            calls = [("blockchain.scripthash.listunspent", [self._electrum_script_hash_of_address(i)]) for i in batch]
+            resp = self.rpc.batch_call(calls)
+            result.update((address, _populate_utxos(utxos)) for address, utxos in zip(batch, resp))
 
         return result
 
@@ -226,10 +277,10 @@ class ElectrumX(
         prev_txs_lookup = self._batch_get_transaction_by_txids(prev_txids)
         return _populate_transaction(tx, prev_txs_lookup)
 
-    def _batch_get_transaction_by_txids(self, txids: Set[str]) -> dict:
+    def _batch_get_transaction_by_txids(self, txids: Iterable[str]) -> dict:
         result = {}
 
-        for batch in peewee.chunked(txids, 10):
+        for batch in peewee.chunked(txids, self.__BATCH_MAX_TXIDS__):
             calls = [("blockchain.transaction.get", [i, True]) for i in batch]
             txs: List[dict] = self.rpc.batch_call(calls, ignore_errors=True)
 
@@ -238,3 +289,22 @@ class ElectrumX(
                     result[tx["txid"]] = tx
 
         return result
+
+    def batch_search_txids_by_addresses(self, addresses: List[str]) -> Dict[str, List[Tuple[str, int]]]:
+        result = {}
+
+        for batch in peewee.chunked(addresses, self.__BATCH_MAX_ADDRESSES__):
+            calls = [("blockchain.scripthash.get_history", [self._electrum_script_hash_of_address(i)]) for i in batch]
+            resp = self.rpc.batch_call(calls)
+
+            for address, history in zip(batch, resp):
+                result[address] = [
+                    (i["tx_hash"], max(int(i.get("height") or 0), 0))  # Height of mempool txs is 0 or -1
+                    for i in (history if isinstance(history, list) else ())
+                ]
+
+        return result
+
+    def batch_get_transactions_without_prevouts(self, txids: List[str]) -> List[data.Transaction]:
+        txs = self._batch_get_transaction_by_txids(txids)
+        return [_populate_transaction_without_prevouts(txs[i]) for i in txids if i in txs]
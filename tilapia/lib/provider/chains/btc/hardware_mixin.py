@@ -92,7 +92,9 @@ class BTCHardwareMixin(interfaces.HardwareSupportingMixin, abc.ABC):
         prev_raw_txs = self._collect_raw_txs(prev_txids)
         prev_txs = {bytes.fromhex(txid): _build_prev_tx(self.network, raw_tx) for txid, raw_tx in prev_raw_txs.items()}
 
-        inputs = _build_hardware_inputs(unsigned_tx.inputs, bip44_path_of_signers)
+        inputs = _build_hardware_inputs(
+            unsigned_tx.inputs, bip44_path_of_signers, sequence=transaction.sequence_of(unsigned_tx.payload)
+        )
         outputs = _build_hardware_outputs(unsigned_tx.outputs, unsigned_tx.payload, self.tx_op_return_size_limit)
 
         # noinspection PyTypeChecker
@@ -146,7 +148,9 @@ class BTCHardwareMixin(interfaces.HardwareSupportingMixin, abc.ABC):
 
 
 def _build_hardware_inputs(
-    inputs: List[data.TransactionInput], bip44_path_of_signers: Dict[str, bip44.BIP44Path]
+    inputs: List[data.TransactionInput],
+    bip44_path_of_signers: Dict[str, bip44.BIP44Path],
+    sequence: int = transaction.DEFAULT_SEQUENCE,
 ) -> List[trezor_messages.TxInputType]:
     hardware_inputs = []
 
@@ -160,6 +164,8 @@ def _build_hardware_inputs(
             prev_index=int(i.utxo.vout),
             amount=int(i.utxo.value),
         )
+        if sequence != transaction.DEFAULT_SEQUENCE:
+            hardware_input["sequence"] = sequence
         hardware_inputs.append(trezor_messages.TxInputType(**hardware_input))
 
     return hardware_inputs
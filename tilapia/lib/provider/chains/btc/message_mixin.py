@@ -1,5 +1,6 @@
 import abc
 import binascii
+import functools
 import logging
 from typing import Any
 
@@ -40,7 +41,7 @@ class BTCMessageMixin(interfaces.MessageSupportingMixin, abc.ABC):
         validation = self.verify_address(address)
         require(validation.is_valid, f"Invalid address: {address}")
 
-        message_hash = pycoin_bytes32.to_bytes_32(self.network.msg.hash_for_signing(message))
+        message_hash = pycoin_bytes32.to_bytes_32(_hash_for_signing(self.network, message))
         sig, rec_id = signer.sign(message_hash)
         flag = 27 + rec_id
 
@@ -66,7 +67,7 @@ class BTCMessageMixin(interfaces.MessageSupportingMixin, abc.ABC):
         elif address_encoding != validation.encoding:
             raise ValueError("Address encoding not match")
 
-        message_hash = self.network.msg.hash_for_signing(message)
+        message_hash = _hash_for_signing(self.network, message)
         pubkey_pair = _pair_for_message_hash(self.network, message_hash, rec_id, sig)
         pubkey_bytes = pycoin_sec.public_pair_to_sec(pubkey_pair)
 
@@ -78,6 +79,12 @@ class BTCMessageMixin(interfaces.MessageSupportingMixin, abc.ABC):
         return recovered_address == address
 
 
+@functools.lru_cache(maxsize=1024)
+def _hash_for_signing(network, message: str) -> int:
+    # challenge texts are usually repeated in login and proof-of-reserve flows
+    return network.msg.hash_for_signing(message)
+
+
 def _decode_signature(signature: str):
     # Refer to bitcoinjs-message/index.js/decodeSignature
 
@@ -141,10 +141,14 @@ class BTCProvider(interfaces.ProviderInterface, hardware_mixin.BTCHardwareMixin,
         )
         tx.check()
 
-        tx.sign(
-            hash160_lookup=transaction.build_hash160_lookup(self.network, signers.values()),
-            p2sh_lookup=transaction.build_p2sh_lookup(self.network, signers.values()),
+        fast_signed = transaction.is_fast_signing_supported(self.network) and transaction.fast_sign_tx(
+            self.network, tx, signers.values()
         )
+        if not fast_signed:
+            tx.sign(
+                hash160_lookup=transaction.build_hash160_lookup(self.network, signers.values()),
+                p2sh_lookup=transaction.build_p2sh_lookup(self.network, signers.values()),
+            )
         self._check_tx_after_signed(tx)
 
         return data.SignedTx(
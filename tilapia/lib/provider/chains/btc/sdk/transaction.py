@@ -1,12 +1,17 @@
+import hashlib
 import logging
 import math
-from typing import Any, Iterable, List, Tuple
+import struct
+from typing import Any, Iterable, List, Optional, Tuple
 
 from pycoin.cmds import dump as pycoin_dump
 from pycoin.coins import tx_utils as pycoin_tx_utils
 from pycoin.coins.bitcoin import Tx as pycoin_tx
+from pycoin.coins.bitcoin.SolutionChecker import BitcoinSolutionChecker as pycoin_bitcoin_solution_checker
 from pycoin.encoding import bytes32 as pycoin_bytes32
+from pycoin.encoding import hash as pycoin_hash
 from pycoin.encoding import sec as pycoin_sec
+from pycoin.satoshi import der as pycoin_der
 
 from tilapia.lib.basic.functional.require import require
 from tilapia.lib.provider import data
@@ -35,6 +40,13 @@ OP_RETURN_OUTPUT_PREFIX_VSIZE = (
 PLACEHOLDER_VSIZE = 79  # calculate_vsize(["P2WPKH"], [])
 TX_VERSION = 1
 TX_OP_RETURN_SIZE_LIMIT = 80
+# Opt-in replaceable if any input has a sequence below 0xfffffffe, see BIP125
+RBF_SEQUENCE = 0xFFFFFFFD
+DEFAULT_SEQUENCE = 0xFFFFFFFF
+
+
+def sequence_of(payload: Optional[dict]) -> int:
+    return RBF_SEQUENCE if payload and payload.get("rbf") else DEFAULT_SEQUENCE
 
 
 def op_return_as_buffer(op_return: str) -> bytes:
@@ -106,6 +118,9 @@ def create_pycoin_tx(
         )
 
     tx = pycoin_tx_utils.create_tx(network, spendables, payables, fee=actual_fee, version=version)
+    sequence = sequence_of(unsigned_tx.payload)
+    for tx_in in tx.txs_in:
+        tx_in.sequence = sequence
 
     if unsigned_tx.payload and unsigned_tx.payload.get("op_return"):
         op_return: bytes = unsigned_tx.payload["op_return"].encode()
@@ -175,6 +190,136 @@ def build_p2sh_lookup(network: any, signers: Iterable[secret_interfaces.SignerIn
     return network.tx.solve.build_p2sh_lookup(scripts)
 
 
+SIGHASH_ALL = 1
+
+
+def _double_sha256(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _var_bytes(data: bytes) -> bytes:
+    length = len(data)
+    if length < 0xFD:
+        prefix = struct.pack("<B", length)
+    elif length <= 0xFFFF:
+        prefix = b"\xfd" + struct.pack("<H", length)
+    else:
+        prefix = b"\xfe" + struct.pack("<L", length)
+
+    return prefix + data
+
+
+class BIP143Sighasher(object):
+    """
+    Compute BIP143 sighash (SIGHASH_ALL only) of all inputs in one linear pass.
+    hashPrevouts, hashSequence and hashOutputs are shared by all inputs, so they are computed only once,
+    and the sha256 state after absorbing them (midstate) is copied for each input.
+    """
+
+    def __init__(self, tx: pycoin_tx.Tx):
+        self.tx = tx
+
+        hash_prevouts = _double_sha256(
+            b"".join(i.previous_hash + struct.pack("<L", i.previous_index) for i in tx.txs_in)
+        )
+        hash_sequence = _double_sha256(b"".join(struct.pack("<L", i.sequence) for i in tx.txs_in))
+        hash_outputs = _double_sha256(
+            b"".join(struct.pack("<Q", i.coin_value) + _var_bytes(i.script) for i in tx.txs_out)
+        )
+
+        self._midstate = hashlib.sha256(struct.pack("<L", tx.version) + hash_prevouts + hash_sequence)
+        self._suffix = hash_outputs + struct.pack("<LL", tx.lock_time, SIGHASH_ALL)
+
+    def sighash(self, tx_in_idx: int, script_code: bytes, value: int) -> bytes:
+        tx_in = self.tx.txs_in[tx_in_idx]
+        hasher = self._midstate.copy()
+        hasher.update(tx_in.previous_hash)
+        hasher.update(struct.pack("<L", tx_in.previous_index))
+        hasher.update(_var_bytes(script_code))
+        hasher.update(struct.pack("<QL", value, tx_in.sequence))
+        hasher.update(self._suffix)
+        return hashlib.sha256(hasher.digest()).digest()
+
+
+def _p2pkh_script(pubkey_hash: bytes) -> bytes:
+    return b"\x76\xa9\x14" + pubkey_hash + b"\x88\xac"
+
+
+def _p2wpkh_script(pubkey_hash: bytes) -> bytes:
+    return b"\x00\x14" + pubkey_hash
+
+
+def _parse_input_script(script: bytes) -> Optional[Tuple[str, bytes]]:
+    if len(script) == 25 and script[:3] == b"\x76\xa9\x14" and script[23:] == b"\x88\xac":
+        return "P2PKH", script[3:23]
+    elif len(script) == 22 and script[:2] == b"\x00\x14":
+        return "P2WPKH", script[2:]
+    elif len(script) == 23 and script[:2] == b"\xa9\x14" and script[22:] == b"\x87":
+        return "P2WPKH-P2SH", script[2:22]  # hash160 of the redeem script
+    else:
+        return None
+
+
+def _der_signature(signer: secret_interfaces.SignerInterface, digest: bytes, order: int) -> bytes:
+    sig, _ = signer.sign(digest)
+    r, s = pycoin_bytes32.from_bytes_32(sig[:32]), pycoin_bytes32.from_bytes_32(sig[32:])
+    if s + s > order:
+        s = order - s  # low-s, see bip-0062
+
+    return pycoin_der.sigencode_der(r, s) + bytes([SIGHASH_ALL])
+
+
+def is_fast_signing_supported(network: Any) -> bool:
+    # forks with replay protection (e.g. SIGHASH_FORKID of bch) have different sighash algorithms
+    return network.tx.SolutionChecker is pycoin_bitcoin_solution_checker
+
+
+def fast_sign_tx(network: Any, tx: pycoin_tx.Tx, signers: Iterable[secret_interfaces.SignerInterface]) -> bool:
+    """
+    Sign P2PKH, P2WPKH and P2WPKH-P2SH inputs directly, without the generic pycoin solver
+    :return: False if there is any unsupported input, then nothing is signed
+    """
+    lookup = {}
+    for signer in signers:
+        pubkey = signer.get_pubkey(compressed=True)
+        pubkey_hash = pycoin_hash.hash160(pubkey)
+        lookup[("P2PKH", pubkey_hash)] = (signer, pubkey)
+        lookup[("P2WPKH", pubkey_hash)] = (signer, pubkey)
+        lookup[("P2WPKH-P2SH", pycoin_hash.hash160(_p2wpkh_script(pubkey_hash)))] = (signer, pubkey)
+
+    solutions = []
+    for unspent in tx.unspents:
+        parsed = _parse_input_script(unspent.script)
+        if parsed is None or parsed not in lookup:
+            return False
+
+        solutions.append((parsed[0], *lookup[parsed]))
+
+    order = network.generator.order()
+    bip143_sighasher = None
+    legacy_checker = None
+
+    for index, (encoding, signer, pubkey) in enumerate(solutions):
+        tx_in, unspent = tx.txs_in[index], tx.unspents[index]
+        pubkey_hash = pycoin_hash.hash160(pubkey)
+
+        if encoding == "P2PKH":
+            legacy_checker = legacy_checker or network.tx.SolutionChecker(tx)
+            # noinspection PyProtectedMember
+            digest_int = legacy_checker._signature_hash(unspent.script, index, SIGHASH_ALL)
+            signature = _der_signature(signer, pycoin_bytes32.to_bytes_32(digest_int), order)
+            tx_in.script = _var_bytes(signature) + _var_bytes(pubkey)
+            tx_in.witness = []
+        else:
+            bip143_sighasher = bip143_sighasher or BIP143Sighasher(tx)
+            digest = bip143_sighasher.sighash(index, _p2pkh_script(pubkey_hash), unspent.coin_value)
+            signature = _der_signature(signer, digest, order)
+            tx_in.script = b"" if encoding == "P2WPKH" else _var_bytes(_p2wpkh_script(pubkey_hash))
+            tx_in.witness = [signature, pubkey]
+
+    return True
+
+
 def debug_dump_tx(network: any, tx: pycoin_tx.Tx) -> str:
     output = []
     pycoin_dump.dump_tx(
@@ -1,7 +1,8 @@
 import functools
+import itertools
 import math
 import time
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, List, Optional, Set, Tuple, Union
 
 from tilapia.lib.basic.functional.require import require
 from tilapia.lib.basic.request.exceptions import JsonRPCException
@@ -12,6 +13,39 @@ from tilapia.lib.provider.chains.eth.sdk import utils
 
 _hex2int = functools.partial(int, base=16)
 
+# >>> utils.keccak("Transfer(address,address,uint256)".encode()).hex()
+TRANSFER_EVENT_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def _topic_to_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+def _parse_transfer_log(log: dict) -> Optional[Tuple[str, str, int, str]]:
+    """
+    Parse the Transfer event log of ERC20
+    :return: (from_address, to_address, value, token_address) or None if not an ERC20 Transfer log
+    """
+    topics = log.get("topics") or ()
+    if len(topics) != 3 or topics[0] != TRANSFER_EVENT_TOPIC:  # ERC721 Transfer has 4 topics
+        return None
+
+    value = log.get("data") or "0x"
+    return (
+        _topic_to_address(topics[1]),
+        _topic_to_address(topics[2]),
+        _hex2int(value) if value != "0x" else 0,
+        log.get("address", "").lower(),
+    )
+
+
+def _parse_token_transfers(receipt: Optional[dict]) -> List[Tuple[str, str, int, str]]:
+    """
+    All the ERC20 transfers of the receipt in the log order, whatever the addresses or tokens are watched,
+    so the index of the token transfer stays the same wherever the tx is seen
+    """
+    return [i for i in (_parse_transfer_log(log) for log in (receipt or {}).get("logs") or ()) if i]
+
 
 def _extract_eth_call_str_result(_data: bytes) -> str:
     payload_offset = int.from_bytes(_data[:32], "big")
@@ -21,14 +55,31 @@ def _extract_eth_call_str_result(_data: bytes) -> str:
     return str_result
 
 
+_TOO_MANY_LOGS_HINTS = ("more than", "too many", "range is too large", "limit exceeded", "response size")
+
+
+def _is_too_many_logs_error(e: JsonRPCException) -> bool:
+    json_response = e.json_response
+    error = json_response.get("error") if isinstance(json_response, dict) else None
+    message = ((error.get("message") if isinstance(error, dict) else None) or "").lower()
+    return any(i in message for i in _TOO_MANY_LOGS_HINTS)
+
+
 class InvalidContractAddress(ValueError):
     # TODO: organize exceptions better
     def __init__(self, address):
         super(InvalidContractAddress, self).__init__(f"Invalid contract address {address}.")
 
 
-class Geth(interfaces.ClientInterface, interfaces.BatchGetAddressMixin):
+class Geth(
+    interfaces.ClientInterface,
+    interfaces.BatchGetAddressMixin,
+    interfaces.BatchGetTransactionMixin,
+    interfaces.BlockScanMixin,
+    interfaces.SearchTokenTransferMixin,
+):
     __LAST_BLOCK__ = "latest"
+    __BATCH_MAX_TXIDS__ = 100
 
     def __init__(self, url: str, expire_interval: int = 120):
         self.rpc = JsonRPCRequest(url)
@@ -106,13 +157,197 @@ class Geth(interfaces.ClientInterface, interfaces.BatchGetAddressMixin):
         else:
             require(txid == tx.get("hash"))
 
-        if receipt:
-            block_info = self.rpc.call("eth_getBlockByNumber", [receipt["blockNumber"], False])
-            block_header = data.BlockHeader(
-                block_hash=block_info["hash"],
-                block_number=_hex2int(block_info["number"]),
-                block_time=_hex2int(block_info["timestamp"]),
+        block_info = self.rpc.call("eth_getBlockByNumber", [receipt["blockNumber"], False]) if receipt else None
+        return self._build_transaction(txid, tx, receipt, block_info)
+
+    def batch_get_transaction_by_txids(self, txids: List[str]) -> List[data.Transaction]:
+        return self._batch_get_transactions(txids)
+
+    def _batch_get_transactions(self, txids: List[str], with_token_transfers: bool = False) -> List[data.Transaction]:
+        if not txids:
+            return []
+
+        _call_body = []
+        for txid in txids:
+            _call_body.extend(
+                [
+                    ("eth_getTransactionByHash", [txid]),
+                    ("eth_getTransactionReceipt", [txid]),
+                ]
+            )
+        result = self.rpc.batch_call(_call_body, ignore_errors=True, timeout=10)
+
+        found = []
+        result_iterator = iter(result)
+        for txid, tx, receipt in zip(txids, result_iterator, result_iterator):
+            if tx and tx.get("hash") == txid:
+                found.append((txid, tx, receipt))
+
+        block_numbers = list({receipt["blockNumber"] for _, _, receipt in found if receipt})
+        blocks = (
+            self.rpc.batch_call(
+                [("eth_getBlockByNumber", [block_number, False]) for block_number in block_numbers], timeout=10
+            )
+            if block_numbers
+            else []
+        )
+        blocks = dict(zip(block_numbers, blocks))
+
+        return [
+            self._build_transaction(
+                txid,
+                tx,
+                receipt,
+                blocks.get(receipt["blockNumber"]) if receipt else None,
+                _parse_token_transfers(receipt) if with_token_transfers else None,
             )
+            for txid, tx, receipt in found
+        ]
+
+    def scan_blocks(
+        self, block_numbers: List[int], addresses: Set[str] = None, token_addresses: Set[str] = None
+    ) -> List[data.Block]:
+        addresses, token_addresses = addresses or set(), token_addresses or set()
+        full_transactions = bool(addresses or token_addresses)
+
+        raw_blocks = self.rpc.batch_call(
+            [("eth_getBlockByNumber", [hex(i), full_transactions]) for i in block_numbers],
+            ignore_errors=True,
+            timeout=30,
+        )
+        raw_blocks = list(itertools.takewhile(bool, raw_blocks))  # Stop at the first block not available yet
+
+        # The token transfers through the other contracts, likes routers or multisend, are found by the logs
+        transfer_txids = (
+            self._search_transfer_txids(
+                addresses,
+                _hex2int(raw_blocks[0]["number"]),
+                _hex2int(raw_blocks[-1]["number"]),
+                sorted(token_addresses),
+            )
+            if raw_blocks and addresses and token_addresses
+            else set()
+        )
+
+        candidates = []
+        for raw_block in raw_blocks if full_transactions else ():
+            for tx in raw_block.get("transactions") or ():
+                sender, receiver = tx.get("from", "").lower(), (tx.get("to") or "").lower()
+                if sender in addresses or receiver in addresses or tx["hash"] in transfer_txids:
+                    candidates.append(tx)
+
+        receipts = (
+            self.rpc.batch_call(
+                [("eth_getTransactionReceipt", [tx["hash"]]) for tx in candidates], ignore_errors=True, timeout=30
+            )
+            if candidates
+            else []
+        )
+        receipts = {tx["hash"]: receipt for tx, receipt in zip(candidates, receipts)}
+
+        blocks = []
+        for raw_block in raw_blocks:
+            transactions = []
+            for tx in (raw_block.get("transactions") or ()) if full_transactions else ():
+                if tx["hash"] in receipts:
+                    receipt = receipts[tx["hash"]]
+                    transactions.append(
+                        self._build_transaction(tx["hash"], tx, receipt, raw_block, _parse_token_transfers(receipt))
+                    )
+
+            header = self._build_block_header(raw_block)
+            blocks.append(data.Block(header=header, parent_hash=raw_block["parentHash"], transactions=transactions))
+
+        return blocks
+
+    def search_token_transfers(
+        self,
+        addresses: List[str],
+        from_block_number: int,
+        to_block_number: int,
+        token_addresses: List[str] = None,
+    ) -> List[data.Transaction]:
+        address_set = {i.lower() for i in addresses}
+        token_addresses = sorted({i.lower() for i in token_addresses}) if token_addresses else None
+
+        txids = sorted(self._search_transfer_txids(address_set, from_block_number, to_block_number, token_addresses))
+        transactions = []
+        for i in range(0, len(txids), self.__BATCH_MAX_TXIDS__):
+            transactions.extend(
+                self._batch_get_transactions(txids[i : i + self.__BATCH_MAX_TXIDS__], with_token_transfers=True)
+            )
+
+        transactions.sort(key=lambda i: i.block_header.block_number if i.block_header else -1, reverse=True)
+        return transactions
+
+    def _search_transfer_txids(
+        self,
+        addresses: Set[str],
+        from_block_number: int,
+        to_block_number: int,
+        token_addresses: Optional[List[str]],
+    ) -> Set[str]:
+        """
+        The txids having any transfer from or to the addresses.
+        Only the event topic is sent to the node, the addresses are matched here,
+        so the number of queries doesn't grow with the number of addresses.
+        """
+        txids = set()
+        for log in self._get_logs(from_block_number, to_block_number, [TRANSFER_EVENT_TOPIC], token_addresses):
+            transfer = None if log.get("removed") else _parse_transfer_log(log)
+            if transfer and (transfer[0] in addresses or transfer[1] in addresses):
+                txids.add(log["transactionHash"])
+
+        return txids
+
+    def _get_logs(
+        self, from_block_number: int, to_block_number: int, topics: list, token_addresses: Optional[List[str]]
+    ) -> List[dict]:
+        """
+        Get logs of the block range, the range is split adaptively if the node complains too many results.
+        """
+        logs = []
+        span = to_block_number - from_block_number + 1
+        start_block_number = from_block_number
+
+        while start_block_number <= to_block_number:
+            end_block_number = min(to_block_number, start_block_number + span - 1)
+            log_filter = {"fromBlock": hex(start_block_number), "toBlock": hex(end_block_number), "topics": topics}
+            if token_addresses:
+                log_filter["address"] = token_addresses
+
+            try:
+                logs.extend(self.rpc.call("eth_getLogs", [log_filter]) or ())
+            except JsonRPCException as e:
+                if span <= 1 or not _is_too_many_logs_error(e):
+                    raise e
+
+                span = max(1, span // 2)
+                continue
+
+            start_block_number = end_block_number + 1
+
+        return logs
+
+    @staticmethod
+    def _build_block_header(block_info: dict) -> data.BlockHeader:
+        return data.BlockHeader(
+            block_hash=block_info["hash"],
+            block_number=_hex2int(block_info["number"]),
+            block_time=_hex2int(block_info["timestamp"]),
+        )
+
+    @classmethod
+    def _build_transaction(
+        cls,
+        txid: str,
+        tx: dict,
+        receipt: Optional[dict],
+        block_info: Optional[dict],
+        token_transfers: List[Tuple[str, str, int, str]] = None,
+    ) -> data.Transaction:
+        if receipt and block_info:
+            block_header = cls._build_block_header(block_info)
             status = (
                 data.TransactionStatus.CONFIRM_SUCCESS
                 if receipt.get("status") == "0x1"
@@ -131,13 +366,26 @@ class Geth(interfaces.ClientInterface, interfaces.BatchGetAddressMixin):
             price_per_unit=_hex2int(tx.get("gasPrice", "0x0")),
         )
         sender = tx.get("from", "").lower()
-        receiver = tx.get("to", "").lower()
+        receiver = (tx.get("to") or "").lower()  # Null on the contract creation
         value = _hex2int(tx.get("value", "0x0"))
+        token_transfers = token_transfers or ()
 
         return data.Transaction(
             txid=txid,
-            inputs=[data.TransactionInput(address=sender, value=value)],
-            outputs=[data.TransactionOutput(address=receiver, value=value)],
+            inputs=[
+                data.TransactionInput(address=sender, value=value),
+                *(
+                    data.TransactionInput(address=from_address, value=amount, token_address=token_address)
+                    for from_address, _, amount, token_address in token_transfers
+                ),
+            ],
+            outputs=[
+                data.TransactionOutput(address=receiver, value=value),
+                *(
+                    data.TransactionOutput(address=to_address, value=amount, token_address=token_address)
+                    for _, to_address, amount, token_address in token_transfers
+                ),
+            ],
             status=status,
             block_header=block_header,
             fee=fee,
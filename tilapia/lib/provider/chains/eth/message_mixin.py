@@ -1,7 +1,10 @@
 import abc
+import functools
 
 import ecdsa.keys
+from pycoin.ecdsa.secp256k1 import secp256k1_generator
 from pycoin.encoding import bytes32 as pycoin_bytes32
+from pycoin.encoding import sec as pycoin_sec
 
 from tilapia.lib.provider import interfaces
 from tilapia.lib.provider.chains.eth.sdk import message as message_sdk
@@ -18,7 +21,7 @@ class ETHMessageMixin(interfaces.MessageSupportingMixin, abc.ABC):
         pass
 
     def sign_message(self, message: str, signer: secret_interfaces.SignerInterface, **kwargs) -> str:
-        message_hash = message_sdk.hash_message(message)
+        message_hash = _hash_message(message)
         sig, rec_id = signer.sign(message_hash)
         v = rec_id + 27
         sig += bytes([v])
@@ -29,7 +32,7 @@ class ETHMessageMixin(interfaces.MessageSupportingMixin, abc.ABC):
         return recovered_address == address
 
     def ec_recover(self, message: str, signature: str) -> str:
-        digest = message_sdk.hash_message(message)
+        digest = _hash_message(message)
         signature = bytes.fromhex(utils.remove_0x_prefix(signature))
         r, s, v = signature[:32], signature[32:64], signature[64]
 
@@ -46,7 +49,21 @@ class ETHMessageMixin(interfaces.MessageSupportingMixin, abc.ABC):
         return self.pubkey_to_address(verifier)
 
 
+@functools.lru_cache(maxsize=1024)
+def _hash_message(message: str) -> bytes:
+    # challenge texts are usually repeated in login and proof-of-reserve flows
+    return message_sdk.hash_message(message)
+
+
 def _recover_public_key(digest: int, r: int, s: int, recid: int) -> bytes:
+    if recid < 2:
+        # pycoin generator is backed by libsecp256k1 or openssl if available
+        pairs = secp256k1_generator.possible_public_pairs_for_signature(digest, (r, s), y_parity=recid)
+        if not pairs:
+            raise ValueError("Invalid signature")
+
+        return pycoin_sec.public_pair_to_sec(pairs[0], compressed=True)
+
     curve = ecdsa.curves.SECP256k1
     curve_fp = curve.curve
     n = curve.order
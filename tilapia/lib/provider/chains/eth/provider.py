@@ -3,6 +3,7 @@ from typing import Dict, Tuple
 import eth_abi
 import eth_account
 import eth_keys
+import rlp
 
 from tilapia.lib.basic.functional.require import require
 from tilapia.lib.provider import data, interfaces
@@ -10,6 +11,9 @@ from tilapia.lib.provider.chains.eth import Geth, hardware_mixin, message_mixin
 from tilapia.lib.provider.chains.eth.sdk import utils
 from tilapia.lib.secret import interfaces as secret_interfaces
 
+# Index of the data field in the rlp list, by the tx type of EIP-2718, 0 for the legacy tx
+_DATA_INDEX_BY_TX_TYPE = {0: 5, 1: 6, 2: 7}
+
 
 class _EthKey(object):
     def __init__(self, signer: secret_interfaces.SignerInterface):
@@ -109,6 +113,15 @@ class ETHProvider(interfaces.ProviderInterface, hardware_mixin.ETHHardwareMixin,
     def get_token_info_by_address(self, token_address: str) -> Tuple[str, str, int]:
         return self.geth.get_token_info_by_address(token_address)
 
+    def get_payload_of_raw_tx(self, raw_tx: str) -> dict:
+        encoded_tx = bytes.fromhex(utils.remove_0x_prefix(raw_tx))
+        tx_type = encoded_tx[0] if encoded_tx and encoded_tx[0] <= 0x7F else 0
+        require(tx_type in _DATA_INDEX_BY_TX_TYPE, f"Unsupported tx type: {tx_type}")
+
+        fields = rlp.decode(encoded_tx[1:] if tx_type else encoded_tx)
+        calldata = fields[_DATA_INDEX_BY_TX_TYPE[tx_type]]
+        return {"data": utils.add_0x_prefix(calldata.hex())} if calldata else {}
+
     def _build_unsigned_tx_dict(self, unsigned_tx: data.UnsignedTx) -> dict:
         output = unsigned_tx.outputs[0]
         is_erc20_transfer = bool(output.token_address)
@@ -1,4 +1,8 @@
+import functools
+import hashlib
 import json
+import threading
+from collections import OrderedDict
 from enum import IntEnum
 from typing import Any, Callable, Iterable, Sequence, Tuple
 
@@ -59,11 +63,6 @@ def _hash_legacy_typed_data_message(data: list) -> bytes:
     )
 
 
-def _encode_and_hash_data(primary_type: str, data: dict, types: dict, type_value_pair_generator: Callable) -> bytes:
-    data_types, data_values = zip(*type_value_pair_generator(primary_type, data, types))
-    return utils.keccak(eth_abi.encode_abi(data_types, data_values))
-
-
 def _normalized_value(field_type: str, value: Any) -> Any:
     if not field_type or not value:
         return value
@@ -76,54 +75,141 @@ def _normalized_value(field_type: str, value: Any) -> Any:
     return value
 
 
-def _generate_v3_type_value_pair(primary_type: str, data: dict, types: dict) -> Iterable[Tuple[str, Any]]:
-    yield "bytes32", utils.keccak(text=encode_primary_type(primary_type, types))
+class _EIP712Plan(object):
+    """
+    Encoding plan of an EIP712 types schema, type hashes and field encoders are compiled once on demand,
+    then hashing a message only encodes values
+    """
 
-    for field in types[primary_type]:
-        field_name, field_type = field.get("name"), field.get("type")
-        value = data.get(field_name)
-        value = _normalized_value(field_type, value)
+    def __init__(self, types: dict, version: int):
+        self.types = types
+        self.version = version
+        self._type_hashes = {}
+        self._struct_encoders = {}
 
-        if value is None:
-            continue
-        elif solidity.is_array_type(field_type):
-            raise Exception("Arrays are unimplemented in V3, use V4 extension")
-        elif types.get(field_type) is not None:
-            yield "bytes32", _encode_and_hash_data(field_type, value, types, _generate_v3_type_value_pair)
-        elif field_type in ("bytes", "string"):
-            value = utils.keccak(solidity.solidity_encode_value(field_type, value))
-            yield "bytes32", value
+    def type_hash(self, struct_type: str) -> bytes:
+        type_hash = self._type_hashes.get(struct_type)
+        if type_hash is None:
+            type_hash = utils.keccak(text=encode_primary_type(struct_type, self.types))
+            self._type_hashes[struct_type] = type_hash
+
+        return type_hash
+
+    def hash_struct(self, struct_type: str, data: dict) -> bytes:
+        if self.version == 3:
+            data_types, data_values = zip(*self._generate_v3_type_value_pair(struct_type, data))
         else:
-            yield field_type, value
+            abi_types, field_encoders = self._get_v4_struct_encoder(struct_type)
+            data_types = abi_types
+            data_values = [self.type_hash(struct_type)]
+            data_values.extend(encoder(data.get(name)) for name, encoder in field_encoders)
+
+        return utils.keccak(eth_abi.encode_abi(data_types, data_values))
+
+    def _generate_v3_type_value_pair(self, struct_type: str, data: dict) -> Iterable[Tuple[str, Any]]:
+        yield "bytes32", self.type_hash(struct_type)
+
+        for field in self.types[struct_type]:
+            field_name, field_type = field.get("name"), field.get("type")
+            value = data.get(field_name)
+            value = _normalized_value(field_type, value)
+
+            if value is None:
+                continue
+            elif solidity.is_array_type(field_type):
+                raise Exception("Arrays are unimplemented in V3, use V4 extension")
+            elif self.types.get(field_type) is not None:
+                yield "bytes32", self.hash_struct(field_type, value)
+            elif field_type in ("bytes", "string"):
+                value = utils.keccak(solidity.solidity_encode_value(field_type, value))
+                yield "bytes32", value
+            else:
+                yield field_type, value
 
+    def _get_v4_struct_encoder(self, struct_type: str) -> Tuple[tuple, list]:
+        struct_encoder = self._struct_encoders.get(struct_type)
 
-def _generate_v4_type_value_pair(primary_type: str, data: dict, types: dict) -> Iterable[Tuple[str, Any]]:
-    yield "bytes32", utils.keccak(text=encode_primary_type(primary_type, types))
+        if struct_encoder is None:
+            abi_types, field_encoders = ["bytes32"], []
+            for field in self.types[struct_type]:
+                field_name, field_type = field.get("name"), field.get("type")
+                abi_type, encoder = self._compile_v4_field(field_name, field_type)
+                abi_types.append(abi_type)
+                field_encoders.append((field_name, encoder))
 
-    def _encode_field(field_name: str, field_type: str, value: Any) -> Tuple[str, Any]:
-        value = _normalized_value(field_type, value)
+            struct_encoder = (tuple(abi_types), field_encoders)
+            self._struct_encoders[struct_type] = struct_encoder
 
-        if types.get(field_type) is not None:
-            return "bytes32", (
-                bytes(32)
-                if value is None
-                else _encode_and_hash_data(field_type, value, types, _generate_v4_type_value_pair)
-            )
-        elif value is None:
-            raise Exception(f"Missing value for field {field_name} of type {field_type}")
+        return struct_encoder
+
+    def _compile_v4_field(self, field_name: str, field_type: str) -> Tuple[str, Callable[[Any], Any]]:
+        def _require_value(value: Any) -> Any:
+            value = _normalized_value(field_type, value)
+            if value is None:
+                raise Exception(f"Missing value for field {field_name} of type {field_type}")
+
+            return value
+
+        if self.types.get(field_type) is not None:
+
+            def _encode_struct(value: Any) -> bytes:
+                value = _normalized_value(field_type, value)
+                return bytes(32) if value is None else self.hash_struct(field_type, value)
+
+            return "bytes32", _encode_struct
         elif solidity.is_array_type(field_type):
-            require(isinstance(value, Sequence), f"Invalid {field_type}: {repr(value)}")
             sub_type = solidity.parse_sub_type_of_array_type(field_type)
-            sub_types, sub_values = zip(*(_encode_field(field_name, sub_type, i) for i in value))
-            return "bytes32", utils.keccak(eth_abi.encode_abi(sub_types, sub_values))
+            sub_abi_type, sub_encoder = self._compile_v4_field(field_name, sub_type)
+
+            def _encode_array(value: Any) -> bytes:
+                value = _require_value(value)
+                require(isinstance(value, Sequence), f"Invalid {field_type}: {repr(value)}")
+                sub_values = [sub_encoder(i) for i in value]
+                return utils.keccak(eth_abi.encode_abi((sub_abi_type,) * len(sub_values), sub_values))
+
+            return "bytes32", _encode_array
         elif field_type in ("bytes", "string"):
-            value = utils.keccak(solidity.solidity_encode_value(field_type, value))
-            return "bytes32", value
+
+            def _encode_dynamic(value: Any) -> bytes:
+                return utils.keccak(solidity.solidity_encode_value(field_type, _require_value(value)))
+
+            return "bytes32", _encode_dynamic
+        elif field_type == "address":
+            return "bytes32", lambda value: _encode_address(_require_value(value))
         else:
-            return field_type, value
+            return field_type, _require_value
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_address(address: Any) -> bytes:
+    # checksum validation of eth_abi is expensive, and addresses are usually repeated among messages
+    return eth_abi.encode_single("address", address)
+
+
+_EIP712_PLANS: "OrderedDict[Tuple[str, int], _EIP712Plan]" = OrderedDict()
+_EIP712_PLANS_LOCK = threading.Lock()
+_EIP712_PLANS_MAX_SIZE = 128
+
 
-    for field in types[primary_type]:
-        yield _encode_field(field.get("name"), field.get("type"), data.get(field.get("name")))
+def _canonical_types_hash(types: dict) -> str:
+    return hashlib.sha256(json.dumps(types, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _get_eip712_plan(types: dict, version: int) -> _EIP712Plan:
+    key = (_canonical_types_hash(types), version)
+
+    with _EIP712_PLANS_LOCK:
+        plan = _EIP712_PLANS.get(key)
+        if plan is not None:
+            _EIP712_PLANS.move_to_end(key)
+            return plan
+
+        plan = _EIP712Plan(types, version)
+        _EIP712_PLANS[key] = plan
+        if len(_EIP712_PLANS) > _EIP712_PLANS_MAX_SIZE:
+            _EIP712_PLANS.popitem(last=False)
+
+        return plan
 
 
 def _hash_eip712_message(data: dict) -> bytes:
@@ -138,16 +224,11 @@ def _hash_eip712_message(data: dict) -> bytes:
 
 def _eip712_encode(data: dict) -> Tuple[bytes, bytes]:
     version = data.pop("__version__", 4)  # Non-standard field
-    if version == 3:
-        type_value_pair_generator = _generate_v3_type_value_pair
-    else:
-        type_value_pair_generator = _generate_v4_type_value_pair
-    domain_hash = _encode_and_hash_data("EIP712Domain", data["domain"], data["types"], type_value_pair_generator)
+    plan = _get_eip712_plan(data["types"], 3 if version == 3 else 4)
+    domain_hash = plan.hash_struct("EIP712Domain", data["domain"])
     message_hash = None
     if data["primaryType"] != "EIP712Domain":
-        message_hash = _encode_and_hash_data(
-            data["primaryType"], data["message"], data["types"], type_value_pair_generator
-        )
+        message_hash = plan.hash_struct(data["primaryType"], data["message"])
     return domain_hash, message_hash
 
 
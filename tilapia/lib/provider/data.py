@@ -84,6 +84,13 @@ class Transaction(DataClassMixin):
     nonce: int = -1
 
 
+@dataclass
+class Block(DataClassMixin):
+    header: BlockHeader
+    parent_hash: str
+    transactions: List[Transaction] = field(default_factory=list)
+
+
 @dataclass
 class TxPaginate(DataClassMixin):
     start_block_number: int = None
@@ -1,5 +1,5 @@
 import abc
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from tilapia.lib.basic import bip44
 from tilapia.lib.coin import data as coin_data
@@ -95,6 +95,51 @@ class BatchGetAddressMixin(abc.ABC):
         """
 
 
+class BatchGetTransactionMixin(abc.ABC):
+    @abc.abstractmethod
+    def batch_get_transaction_by_txids(self, txids: List[str]) -> List[data.Transaction]:
+        """
+        Batch to get transactions by txid list
+        :param txids: List[txid]
+        :return: List[Transaction], txs not found are omitted
+        """
+
+
+class BlockScanMixin(abc.ABC):
+    @abc.abstractmethod
+    def scan_blocks(
+        self, block_numbers: List[int], addresses: Set[str] = None, token_addresses: Set[str] = None
+    ) -> List[data.Block]:
+        """
+        Scan blocks for the transactions related to the watched addresses
+        :param block_numbers: consecutive block numbers in ascending order
+        :param addresses: watched addresses, normalized
+        :param token_addresses: watched token contracts, normalized, the transfers of them from or to the addresses
+        are found wherever they come from, likes through the routers
+        :return: List[Block], stop at the first block not available yet,
+        only headers are returned if neither addresses nor token_addresses specified
+        """
+
+
+class SearchTokenTransferMixin(abc.ABC):
+    @abc.abstractmethod
+    def search_token_transfers(
+        self,
+        addresses: List[str],
+        from_block_number: int,
+        to_block_number: int,
+        token_addresses: List[str] = None,
+    ) -> List[data.Transaction]:
+        """
+        Search the token transfers of many addresses at once
+        :param addresses: addresses as the sender or the receiver
+        :param from_block_number: inclusive
+        :param to_block_number: inclusive
+        :param token_addresses: token contracts, optional, all tokens if None
+        :return: list of Transaction, with the token transfers appended to the inputs and outputs
+        """
+
+
 class SearchTransactionMixin(abc.ABC):
     def search_txs_by_address(
         self,
@@ -138,6 +183,36 @@ class SearchUTXOMixin(abc.ABC):
         """
 
 
+class BatchSearchUTXOMixin(abc.ABC):
+    @abc.abstractmethod
+    def batch_search_utxos_by_addresses(self, addresses: List[str]) -> Dict[str, List[data.UTXO]]:
+        """
+        Batch to search the UTXOs of many addresses at once
+        :param addresses: List[address]
+        :return: Dict[address, List[UTXO]]
+        """
+
+
+class UTXOHistoryMixin(abc.ABC):
+    @abc.abstractmethod
+    def batch_search_txids_by_addresses(self, addresses: List[str]) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Batch to search the history of many addresses at once
+        :param addresses: List[address]
+        :return: Dict[address, List[(txid, block_number)]], block_number is 0 if the tx is still pending
+        """
+
+    @abc.abstractmethod
+    def batch_get_transactions_without_prevouts(self, txids: List[str]) -> List[data.Transaction]:
+        """
+        Batch to get transactions by txid list, without requesting the previous transactions of the inputs
+        :param txids: List[txid]
+        :return: List[Transaction], txs not found are omitted,
+        the address and value of the inputs are left empty, only input.utxo.txid and input.utxo.vout are filled,
+        the outputs are in the order of vout, including the ones without address
+        """
+
+
 class ProviderInterface(abc.ABC):
     def __init__(
         self,
@@ -205,6 +280,14 @@ class ProviderInterface(abc.ABC):
         :return: Tuple[str, str, int], token symbol, token name, token decimals
         """
 
+    def get_payload_of_raw_tx(self, raw_tx: str) -> dict:
+        """
+        Recover the payload filled into the UnsignedTx from the signed raw tx, likes the calldata on eth
+        :param raw_tx: signed raw tx
+        :return: payload, empty if nothing beyond the transfer
+        """
+        return {}
+
 
 class HardwareSupportingMixin(abc.ABC):
     @abc.abstractmethod
@@ -269,6 +352,21 @@ class MessageSupportingMixin(abc.ABC):
     def verify_message(self, address: str, message: str, signature: str) -> bool:
         pass
 
+    def verify_messages(self, items: List[Tuple[str, str, str]]) -> List[bool]:
+        """
+        Verify messages in batch
+        :param items: list of (address, message, signature)
+        :return: list of verification result, in the same order of items
+        """
+        results = []
+        for address, message, signature in items:
+            try:
+                results.append(self.verify_message(address, message, signature))
+            except Exception:
+                results.append(False)
+
+        return results
+
 
 class ClientChainBinding(abc.ABC):
     chain_info: coin_data.ChainInfo
@@ -1,3 +1,4 @@
+import concurrent.futures
 from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
 import requests
@@ -9,6 +10,9 @@ from tilapia.lib.hardware import manager as hardware_manager
 from tilapia.lib.provider import data, exceptions, interfaces, loader
 from tilapia.lib.secret import interfaces as secret_interfaces
 
+# Bound the concurrent requests to the client without the batch api
+SEARCH_UTXOS_MAX_WORKERS = 8
+
 
 def get_best_block_number(chain_code: str) -> int:
     return loader.get_client_by_chain(chain_code).get_info().best_block_number
@@ -37,6 +41,46 @@ def get_transaction_by_txid(chain_code: str, txid: str) -> data.Transaction:
     return loader.get_client_by_chain(chain_code).get_transaction_by_txid(txid)
 
 
+def batch_get_transaction_by_txids(chain_code: str, txids: List[str]) -> List[data.Transaction]:
+    try:
+        client = loader.get_client_by_chain(chain_code, instance_required=interfaces.BatchGetTransactionMixin)
+        return client.batch_get_transaction_by_txids(txids)
+    except exceptions.NoAvailableClient:
+        client = loader.get_client_by_chain(chain_code)
+        transactions = []
+        for txid in txids:
+            try:
+                transactions.append(client.get_transaction_by_txid(txid))
+            except exceptions.TransactionNotFound:
+                pass
+
+        return transactions
+
+
+def search_token_transfers(
+    chain_code: str,
+    addresses: List[str],
+    from_block_number: int,
+    to_block_number: int,
+    token_addresses: List[str] = None,
+) -> List[data.Transaction]:
+    return loader.get_client_by_chain(
+        chain_code, instance_required=interfaces.SearchTokenTransferMixin
+    ).search_token_transfers(addresses, from_block_number, to_block_number, token_addresses=token_addresses)
+
+
+def batch_search_txids_by_addresses(chain_code: str, addresses: List[str]) -> Dict[str, List[Tuple[str, int]]]:
+    return loader.get_client_by_chain(
+        chain_code, instance_required=interfaces.UTXOHistoryMixin
+    ).batch_search_txids_by_addresses(addresses)
+
+
+def batch_get_transactions_without_prevouts(chain_code: str, txids: List[str]) -> List[data.Transaction]:
+    return loader.get_client_by_chain(
+        chain_code, instance_required=interfaces.UTXOHistoryMixin
+    ).batch_get_transactions_without_prevouts(txids)
+
+
 def get_transaction_status(chain_code: str, txid: str) -> data.TransactionStatus:
     return loader.get_client_by_chain(chain_code).get_transaction_status(txid)
 
@@ -109,6 +153,10 @@ def fill_unsigned_tx(chain_code: str, unsigned_tx: data.UnsignedTx) -> data.Unsi
     return loader.get_provider_by_chain(chain_code).fill_unsigned_tx(unsigned_tx)
 
 
+def get_payload_of_raw_tx(chain_code: str, raw_tx: str) -> dict:
+    return loader.get_provider_by_chain(chain_code).get_payload_of_raw_tx(raw_tx)
+
+
 def sign_transaction(
     chain_code: str, unsigned_tx: data.UnsignedTx, signers: Dict[str, secret_interfaces.SignerInterface]
 ) -> data.SignedTx:
@@ -125,6 +173,21 @@ def search_utxos_by_address(chain_code: str, address: str) -> List[data.UTXO]:
     )
 
 
+def batch_search_utxos_by_addresses(chain_code: str, addresses: List[str]) -> Dict[str, List[data.UTXO]]:
+    try:
+        client = loader.get_client_by_chain(chain_code, instance_required=interfaces.BatchSearchUTXOMixin)
+        return client.batch_search_utxos_by_addresses(addresses)
+    except exceptions.NoAvailableClient:
+        client = loader.get_client_by_chain(chain_code, instance_required=interfaces.SearchUTXOMixin)
+        if len(addresses) <= 1:
+            return {i: client.search_utxos_by_address(i) for i in addresses}
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(SEARCH_UTXOS_MAX_WORKERS, len(addresses))
+        ) as executor:
+            return dict(zip(addresses, executor.map(client.search_utxos_by_address, addresses)))
+
+
 def get_token_info_by_address(chain_code: str, token_address: str) -> Tuple[str, str, int]:
     return loader.get_provider_by_chain(chain_code).get_token_info_by_address(token_address)
 
@@ -225,3 +288,10 @@ def verify_message(chain_code: str, address: str, message: str, signature: str)
         chain_code, interfaces.MessageSupportingMixin
     )
     return provider.verify_message(address, message, signature)
+
+
+def verify_messages(chain_code: str, items: List[Tuple[str, str, str]]) -> List[bool]:
+    provider: interfaces.MessageSupportingMixin = _require_special_provider(
+        chain_code, interfaces.MessageSupportingMixin
+    )
+    return provider.verify_messages(items)
@@ -0,0 +1,16 @@
+class CryptoJobTimeout(Exception):
+    def __init__(self, job_name: str, timeout: float):
+        super(CryptoJobTimeout, self).__init__(f"job_name: {job_name}, timeout: {timeout}")
+        self.job_name = job_name
+        self.timeout = timeout
+
+
+class SigningSessionNotFound(Exception):
+    def __init__(self):
+        super(SigningSessionNotFound, self).__init__("Signing session not found or expired")
+
+
+class TooManySigningSessions(Exception):
+    def __init__(self, max_sessions: int):
+        super(TooManySigningSessions, self).__init__(f"max_sessions: {max_sessions}")
+        self.max_sessions = max_sessions
@@ -0,0 +1,186 @@
+import concurrent.futures
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from tilapia.lib.basic.dataclass.dataclass import DataClassMixin
+from tilapia.lib.conf import settings
+from tilapia.lib.secret import exceptions
+
+logger = logging.getLogger("app.secret")
+
+
+@dataclass
+class MnemonicToSeedRequest(DataClassMixin):
+    mnemonic: str
+    passphrase: str = None
+
+
+@dataclass
+class DeriveKeysRequest(DataClassMixin):
+    curve: int
+    master_seed: bytes
+    paths: List[str]
+
+
+@dataclass
+class DeriveKeysResponse(DataClassMixin):
+    prvkeys: List[bytes]  # in the same order of request.paths
+
+
+@dataclass
+class KeystoreDecryptRequest(DataClassMixin):
+    keyfile_json: str
+    password: str
+
+
+@dataclass
+class KeystoreEncryptRequest(DataClassMixin):
+    prvkey: bytes
+    password: str
+
+
+# Job functions are executed in worker processes, so they have to be module-level (pickleable),
+# and should only depend on pure computation, never on database or network.
+
+
+def _job_mnemonic_to_seed(request: MnemonicToSeedRequest) -> bytes:
+    from tilapia.lib.secret import utils
+
+    return utils.mnemonic_to_seed(request.mnemonic, request.passphrase)
+
+
+def _job_derive_keys(request: DeriveKeysRequest) -> DeriveKeysResponse:
+    from tilapia.lib.secret import registry
+
+    root = registry.bip32_class_on_curve(request.curve).from_master_seed(request.master_seed)
+    # derived nodes are cached in the root tree, shared parents are only derived once
+    prvkeys = [root.derive_path(path).prvkey_interface.get_prvkey() for path in request.paths]
+    return DeriveKeysResponse(prvkeys=prvkeys)
+
+
+def _job_keystore_decrypt(request: KeystoreDecryptRequest) -> bytes:
+    import eth_account
+
+    return bytes(eth_account.account.Account.decrypt(request.keyfile_json, request.password))
+
+
+def _job_keystore_encrypt(request: KeystoreEncryptRequest) -> dict:
+    import eth_account
+
+    return eth_account.account.Account.encrypt(request.prvkey, request.password)
+
+
+class CryptoExecutor(object):
+    def __init__(self, max_workers: int = None, in_process: bool = False, default_timeout: float = 60):
+        self.in_process = in_process
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            "pending": 0,
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "timeout": 0,
+            "total_seconds": 0.0,
+        }
+
+    def _get_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+
+            return self._pool
+
+    def _update_metrics(self, **kwargs):
+        with self._lock:
+            for key, delta in kwargs.items():
+                self._metrics[key] += delta
+
+    def submit(self, fn: Callable[[Any], Any], request: Any) -> concurrent.futures.Future:
+        self._update_metrics(submitted=1, pending=1)
+        started_at = time.time()
+
+        def _on_done(f: concurrent.futures.Future):
+            succeeded = not f.cancelled() and f.exception() is None
+            self._update_metrics(
+                pending=-1,
+                succeeded=int(succeeded),
+                failed=int(not succeeded),
+                total_seconds=time.time() - started_at,
+            )
+
+        if self.in_process:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(fn(request))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = self._get_pool().submit(fn, request)
+
+        future.add_done_callback(_on_done)
+        return future
+
+    def run(self, fn: Callable[[Any], Any], request: Any, timeout: float = None) -> Any:
+        timeout = self.default_timeout if timeout is None else timeout
+        future = self.submit(fn, request)
+
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # only takes effect if the job is still queued
+            self._update_metrics(timeout=1)
+            raise exceptions.CryptoJobTimeout(fn.__name__, timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._metrics, in_process=self.in_process, max_workers=self.max_workers)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+_EXECUTOR: Optional[CryptoExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor() -> CryptoExecutor:
+    global _EXECUTOR
+
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            config = settings.CRYPTO_EXECUTOR
+            _EXECUTOR = CryptoExecutor(
+                max_workers=config.get("max_workers"),
+                in_process=config.get("in_process", True),
+                default_timeout=config.get("timeout", 60),
+            )
+
+        return _EXECUTOR
+
+
+def mnemonic_to_seed(mnemonic: str, passphrase: str = None, timeout: float = None) -> bytes:
+    return get_executor().run(_job_mnemonic_to_seed, MnemonicToSeedRequest(mnemonic, passphrase), timeout=timeout)
+
+
+def derive_prvkeys(curve: int, master_seed: bytes, paths: List[str], timeout: float = None) -> List[bytes]:
+    response = get_executor().run(_job_derive_keys, DeriveKeysRequest(curve, master_seed, paths), timeout=timeout)
+    return response.prvkeys
+
+
+def decrypt_eth_keystore(keyfile_json: str, password: str, timeout: float = None) -> bytes:
+    return get_executor().run(_job_keystore_decrypt, KeystoreDecryptRequest(keyfile_json, password), timeout=timeout)
+
+
+def encrypt_eth_keystore(prvkey: bytes, password: str, timeout: float = None) -> dict:
+    return get_executor().run(_job_keystore_encrypt, KeystoreEncryptRequest(prvkey, password), timeout=timeout)
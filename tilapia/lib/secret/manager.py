@@ -1,10 +1,10 @@
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 from tilapia.lib.basic import cipher
 from tilapia.lib.basic.functional.require import require
 from tilapia.lib.basic.orm.database import db
-from tilapia.lib.secret import daos, encrypt, registry, utils
+from tilapia.lib.secret import daos, encrypt, executor, registry, utils
 from tilapia.lib.secret.data import CurveEnum, PubKeyType, SecretKeyType
 from tilapia.lib.secret.interfaces import KeyInterface, SignerInterface, VerifierInterface
 from tilapia.lib.secret.models import PubKeyModel, SecretKeyModel
@@ -280,7 +280,44 @@ def get_signer(password: str, pubkey_id: int) -> SignerInterface:
     require(pubkey_model.secret_key_id is not None)
     secret_key = daos.get_secret_key_model_by_id(pubkey_model.secret_key_id)
     raw_secret_key = encrypt.decrypt_data(password, secret_key.encrypted_secret_key)
+    return _create_signer(pubkey_model, secret_key, raw_secret_key)
 
+
+def get_signers(password: str, pubkey_ids: List[int]) -> Dict[int, SignerInterface]:
+    require(bool(password))
+    pubkey_models = daos.query_pubkey_models_by_ids(pubkey_ids)
+    require(len(pubkey_models) == len(set(pubkey_ids)), "Some pubkeys not found")
+    require(all(i.secret_key_id is not None for i in pubkey_models))
+
+    decrypted_cache = {}  # decrypt each secret key only once
+    seed_derivations = {}
+    signers = {}
+    for pubkey_model in pubkey_models:
+        secret_key_id = pubkey_model.secret_key_id
+        if secret_key_id not in decrypted_cache:
+            secret_key = daos.get_secret_key_model_by_id(secret_key_id)
+            decrypted_cache[secret_key_id] = (
+                secret_key,
+                encrypt.decrypt_data(password, secret_key.encrypted_secret_key),
+            )
+
+        secret_key, raw_secret_key = decrypted_cache[secret_key_id]
+        if secret_key.secret_key_type == SecretKeyType.SEED and pubkey_model.path:
+            seed_derivations.setdefault((secret_key_id, pubkey_model.curve), []).append(pubkey_model)
+        else:
+            signers[pubkey_model.id] = _create_signer(pubkey_model, secret_key, raw_secret_key)
+
+    # derive all paths of the same master seed in one job
+    for (secret_key_id, curve), models in seed_derivations.items():
+        _, raw_secret_key = decrypted_cache[secret_key_id]
+        keys = raw_create_keys_by_master_seed(curve, bytes.fromhex(raw_secret_key), [i.path for i in models])
+        signers.update({model.id: key for model, key in zip(models, keys)})
+
+    decrypted_cache.clear()
+    return signers
+
+
+def _create_signer(pubkey_model: PubKeyModel, secret_key: SecretKeyModel, raw_secret_key: str) -> SignerInterface:
     if secret_key.secret_key_type == SecretKeyType.PRVKEY:
         return raw_create_key_by_prvkey(pubkey_model.curve, bytes.fromhex(raw_secret_key))
     elif secret_key.secret_key_type == SecretKeyType.XPRV:
@@ -315,7 +352,7 @@ def generate_mnemonic(strength: int) -> str:
 
 def mnemonic_to_seed(mnemonic: str, passphrase: str = None) -> bytes:
     _verify_mnemonic(mnemonic)
-    return utils.mnemonic_to_seed(mnemonic, passphrase)
+    return executor.mnemonic_to_seed(mnemonic, passphrase)
 
 
 def raw_create_key_by_prvkey(curve: CurveEnum, prvkey: bytes) -> KeyInterface:
@@ -345,6 +382,21 @@ def raw_create_key_by_master_seed(curve: CurveEnum, master_seed: bytes, path: st
     return node.prvkey_interface
 
 
+def raw_create_keys_by_master_seed(curve: CurveEnum, master_seed: bytes, paths: List[str]) -> List[KeyInterface]:
+    """
+    Derive the keys of many paths by the crypto executor in one job, in the same order of paths
+    """
+    if not paths:
+        return []
+
+    _verify_master_seed(master_seed)
+    for path in paths:
+        _verify_bip32_path(path)
+
+    key_class = registry.key_class_on_curve(curve)
+    return [key_class.from_key(prvkey=i) for i in executor.derive_prvkeys(curve, master_seed, paths)]
+
+
 def export_prvkey(password: str, pubkey_id: int) -> str:
     return get_signer(password, pubkey_id).get_prvkey().hex()
 
@@ -0,0 +1,168 @@
+import contextlib
+import logging
+import secrets
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from tilapia.lib.basic.functional.require import require
+from tilapia.lib.secret import exceptions
+from tilapia.lib.secret.interfaces import SignerInterface
+
+logger = logging.getLogger("app.secret")
+
+DEFAULT_TTL = 300  # in seconds
+MAX_TTL = 3600  # in seconds
+MAX_SESSIONS = 16
+
+
+class _Session(object):
+    def __init__(self, owner: str, signers: Dict[int, SignerInterface], expired_at: float):
+        self.owner = owner
+        self.signers = signers
+        self.expired_at = expired_at
+        self.users = 0  # The signing calls holding the signers
+        self.closed = False
+
+    def is_expired(self, now: float) -> bool:
+        return self.expired_at <= now
+
+    def zeroize(self):
+        for signer in self.signers.values():
+            _zeroize_signer(signer)
+
+        self.signers.clear()
+
+
+def _zeroize_signer(signer: SignerInterface):
+    # Python can't wipe immutable ints/bytes in place, so drop every reference
+    # held by the signer and let them be collected as soon as possible
+    for attr in ("_signing_key", "_verifying_key", "prvkey", "_prvkey"):
+        if hasattr(signer, attr):
+            try:
+                setattr(signer, attr, None)
+            except AttributeError:
+                pass
+
+
+_SESSIONS: Dict[str, _Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _retire_session(token: str) -> _Session:
+    # Under _SESSIONS_LOCK. The signers still used by the signing calls are zeroized by the last one of them
+    session = _SESSIONS.pop(token)
+    session.closed = True
+    if session.users == 0:
+        session.zeroize()
+
+    return session
+
+
+def _purge_expired_sessions(now: float):
+    expired_tokens = [token for token, session in _SESSIONS.items() if session.is_expired(now)]
+    for token in expired_tokens:
+        _retire_session(token)
+
+    if expired_tokens:
+        logger.info(f"Expired signing sessions purged. count: {len(expired_tokens)}")
+
+
+def open_session(owner: str, signers: Dict[int, SignerInterface], ttl: int = DEFAULT_TTL) -> str:
+    require(0 < ttl <= MAX_TTL, f"ttl should be in range (0, {MAX_TTL}], but now is {ttl}")
+    require(bool(signers), "Require at least one signer")
+
+    now = time.time()
+    with _SESSIONS_LOCK:
+        _purge_expired_sessions(now)
+
+        if len(_SESSIONS) >= MAX_SESSIONS:
+            for signer in signers.values():
+                _zeroize_signer(signer)
+            raise exceptions.TooManySigningSessions(MAX_SESSIONS)
+
+        token = secrets.token_hex(32)
+        _SESSIONS[token] = _Session(owner, dict(signers), now + ttl)
+
+    return token
+
+
+def close_session(token: str, owner: str = None) -> bool:
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(token)
+        if session is None or (owner is not None and session.owner != owner):
+            return False  # Never close the sessions of the others
+
+        _retire_session(token)
+
+    return True
+
+
+def close_sessions_by_owner(owner: str) -> int:
+    with _SESSIONS_LOCK:
+        tokens = [token for token, session in _SESSIONS.items() if session.owner == owner]
+        for token in tokens:
+            _retire_session(token)
+
+    return len(tokens)
+
+
+def add_signers(owner: str, create_signers: Callable[[], Dict[int, SignerInterface]]) -> int:
+    """
+    Add the signers to the live sessions of the owner, likes the ones of the accounts created after unlocking.
+    Each session owns the signers created for it, since they are zeroized along with the session.
+    :return: count of the sessions added to
+    """
+    with _SESSIONS_LOCK:
+        tokens = [token for token, session in _SESSIONS.items() if session.owner == owner]
+
+    added_count = 0
+    for token in tokens:
+        signers = create_signers()
+        with _SESSIONS_LOCK:
+            session = _SESSIONS.get(token)
+            if session is not None and not session.is_expired(time.time()):
+                session.signers.update(signers)
+                signers, added_count = {}, added_count + 1
+
+        for signer in signers.values():  # The session is gone meanwhile
+            _zeroize_signer(signer)
+
+    return added_count
+
+
+@contextlib.contextmanager
+def use_signers(token: str, owner: str, pubkey_ids: List[int]) -> Iterator[Dict[int, SignerInterface]]:
+    """
+    Hold the signers of the session during signing, they are never zeroized by closing or expiring meanwhile
+    """
+    now = time.time()
+    with _SESSIONS_LOCK:
+        session: Optional[_Session] = _SESSIONS.get(token)
+
+        if session is not None and session.is_expired(now):
+            _retire_session(token)
+            session = None
+
+        if session is None or session.owner != owner:
+            raise exceptions.SigningSessionNotFound()
+
+        missing_pubkey_ids = [i for i in pubkey_ids if i not in session.signers]
+        require(not missing_pubkey_ids, f"Signers of pubkey_ids {missing_pubkey_ids} not found in session")
+
+        session.users += 1
+        signers = {i: session.signers[i] for i in pubkey_ids}
+
+    try:
+        yield signers
+    finally:
+        with _SESSIONS_LOCK:
+            session.users -= 1
+            if session.closed and session.users == 0:
+                session.zeroize()
+
+
+def count_sessions() -> int:
+    with _SESSIONS_LOCK:
+        _purge_expired_sessions(time.time())
+        return len(_SESSIONS)
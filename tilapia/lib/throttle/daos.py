@@ -0,0 +1,50 @@
+import datetime
+from typing import List
+
+import peewee
+
+from tilapia.lib.basic.orm import bulk
+from tilapia.lib.throttle import models
+
+
+def filter_acquired_keys(keys: List[str], now: datetime.datetime) -> List[str]:
+    result = []
+    for batch in peewee.chunked(keys, 500):
+        query = models.Throttle.select(models.Throttle.key).where(
+            models.Throttle.key.in_(batch), models.Throttle.expired_at > now
+        )
+        result.extend(i.key for i in query)
+
+    return result
+
+
+def bulk_create_or_update(keys: List[str], expired_at: datetime.datetime) -> int:
+    now = datetime.datetime.now()
+    rows = (dict(key=i, expired_at=expired_at, modified_time=now) for i in keys)
+    return bulk.bulk_insert(
+        models.Throttle, rows, preserve=[models.Throttle.expired_at, models.Throttle.modified_time]
+    ).rows
+
+
+def delete_by_keys(keys: List[str]) -> int:
+    count = 0
+    for batch in peewee.chunked(keys, 500):
+        count += models.Throttle.delete().where(models.Throttle.key.in_(batch)).execute()
+
+    return count
+
+
+def delete_expired(now: datetime.datetime) -> int:
+    return models.Throttle.delete().where(models.Throttle.expired_at <= now).execute()
+
+
+def delete_beyond(max_keys: int) -> int:
+    """
+    Delete the ones expiring soonest until at most max_keys left
+    """
+    count = models.Throttle.select().count()
+    if count <= max_keys:
+        return 0
+
+    soonest = models.Throttle.select(models.Throttle.id).order_by(models.Throttle.expired_at.asc()).limit(count - max_keys)
+    return models.Throttle.delete().where(models.Throttle.id.in_(soonest)).execute()
@@ -0,0 +1,67 @@
+import contextlib
+import datetime
+from typing import Iterator, List
+
+from tilapia.lib.throttle import daos, models
+
+# Hard cap of the keys recorded, the ones expiring soonest are evicted beyond it
+MAX_KEYS = 10000
+
+
+def key_of(*parts) -> str:
+    return ":".join(str(i) for i in parts)
+
+
+def acquire(keys: List[str], ttl: float, force: bool = False) -> List[str]:
+    """
+    Acquire the keys for ttl seconds, shared by all the workers on the same database.
+    The ones acquired by the others and not expired yet are skipped, unless force.
+    :return: the keys acquired, in the given order
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return []
+
+    now = datetime.datetime.now()
+
+    # Take the write lock at first, otherwise the workers acquiring the same keys may all see them free.
+    # By the database Throttle bound to, which differs from orm_database.db in tests
+    with models.Throttle._meta.database.atomic("IMMEDIATE"):
+        if not force:
+            acquired_keys = set(daos.filter_acquired_keys(keys, now))
+            keys = [i for i in keys if i not in acquired_keys]
+
+        if keys:
+            daos.bulk_create_or_update(keys, now + datetime.timedelta(seconds=ttl))
+            daos.delete_expired(now)
+            daos.delete_beyond(MAX_KEYS)
+
+    return keys
+
+
+def release(keys: List[str]) -> int:
+    """
+    Free the keys before expired, likes the work failed or finished early
+    """
+    return daos.delete_by_keys(list(keys)) if keys else 0
+
+
+@contextlib.contextmanager
+def lease(key: str, ttl: float) -> Iterator[bool]:
+    """
+    Hold the key during the block, then free it. The ttl bounds how long it is held if the worker dies halfway
+    :return: False if held by the others
+    """
+    acquired = bool(acquire([key], ttl))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            release([key])
+
+
+def purge_expired() -> int:
+    """
+    The expired keys are purged by acquiring too, but only when any key is acquired
+    """
+    return daos.delete_expired(datetime.datetime.now())
@@ -0,0 +1,14 @@
+import peewee
+
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+
+
+def update(db, migrator, migrate):
+    class Throttle(BaseModel):
+        id = peewee.IntegerField(primary_key=True)
+        key = peewee.CharField(unique=True)
+        expired_at = peewee.DateTimeField(index=True)
+        created_time = AutoDateTimeField()
+        modified_time = AutoDateTimeField()
+
+    db.create_tables((Throttle,))
@@ -0,0 +1,14 @@
+import peewee
+
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+
+
+class Throttle(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    key = peewee.CharField(unique=True)
+    expired_at = peewee.DateTimeField(index=True, help_text="the key is free to acquire again after it")
+    created_time = AutoDateTimeField()
+    modified_time = AutoDateTimeField()
+
+    def __str__(self):
+        return f"id: {self.id}, key: {self.key}, expired_at: {self.expired_at}"
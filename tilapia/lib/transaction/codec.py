@@ -0,0 +1,37 @@
+import zlib
+from typing import Tuple
+
+from tilapia.lib.transaction.data import RawTxCodec
+
+
+def encode_raw_tx(raw_tx: str) -> Tuple[RawTxCodec, bytes]:
+    """
+    Compress the raw tx, the hex ones are decoded to bytes first, which halves the size before compressing
+    """
+    codec, body = RawTxCodec.TEXT, raw_tx
+    if raw_tx.startswith("0x"):
+        codec, body = RawTxCodec.PREFIXED_HEX, raw_tx[2:]
+    elif raw_tx:
+        codec = RawTxCodec.HEX
+
+    if codec != RawTxCodec.TEXT:
+        try:
+            data = bytes.fromhex(body)
+        except ValueError:
+            data = None
+
+        if data is not None and data.hex() == body:  # Round trip required, uppercase hex is kept as text
+            return codec, zlib.compress(data)
+
+    return RawTxCodec.TEXT, zlib.compress(raw_tx.encode())
+
+
+def decode_raw_tx(codec: RawTxCodec, payload: bytes) -> str:
+    data = zlib.decompress(payload)
+
+    if codec == RawTxCodec.HEX:
+        return data.hex()
+    elif codec == RawTxCodec.PREFIXED_HEX:
+        return "0x" + data.hex()
+    else:
+        return data.decode()
@@ -1,10 +1,24 @@
 import datetime
-import functools
+import operator
 from decimal import Decimal
-from typing import Iterable, List, Literal, Optional, Set
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Set, Tuple
 
+import peewee
+
+from tilapia.lib.basic.orm import bulk
+from tilapia.lib.basic.orm.database import db
+from tilapia.lib.conf import settings
+from tilapia.lib.transaction import codec
 from tilapia.lib.transaction.data import TxActionStatus
-from tilapia.lib.transaction.models import TxAction
+from tilapia.lib.transaction.models import (
+    AddressSyncCursor,
+    ArchivedRawTx,
+    RawTx,
+    ScannedBlock,
+    TxAction,
+    TxOutput,
+    archive_database,
+)
 
 
 def new_action(
@@ -16,7 +30,6 @@ def new_action(
     from_address: str,
     to_address: str,
     fee_limit: Decimal,
-    raw_tx: str,
     fee_used: Decimal = 0,
     fee_price_per_unit: Decimal = 1,
     block_number: int = None,
@@ -35,7 +48,6 @@ def new_action(
         from_address=from_address,
         to_address=to_address,
         fee_limit=fee_limit,
-        raw_tx=raw_tx,
         fee_used=fee_used,
         fee_price_per_unit=fee_price_per_unit,
         block_number=block_number,
@@ -51,7 +63,7 @@ def new_action(
 
 
 def bulk_create(actions: Iterable[TxAction]):
-    return TxAction.bulk_create(actions, 10)
+    return bulk.bulk_insert(TxAction, actions)
 
 
 def on_transaction_confirmed(
@@ -62,7 +74,6 @@ def on_transaction_confirmed(
     block_number: int,
     block_hash: str,
     block_time: int,
-    archived_id: int = None,
 ):
     return (
         TxAction.update(
@@ -71,7 +82,7 @@ def on_transaction_confirmed(
             block_number=block_number,
             block_hash=block_hash,
             block_time=block_time,
-            archived_id=archived_id,
+            replaced_by=None,
             modified_time=datetime.datetime.now(),
         )
         .where(TxAction.chain_code == chain_code, TxAction.txid == txid)
@@ -108,105 +119,118 @@ def update_actions_status(
     )
 
 
+def mark_actions_replaced(chain_code: str, txids: Iterable[str], replaced_by: str) -> int:
+    return (
+        TxAction.update(
+            status=TxActionStatus.REPLACED,
+            replaced_by=replaced_by,
+            modified_time=datetime.datetime.now(),
+        )
+        .where(TxAction.chain_code == chain_code, TxAction.txid.in_(list(txids)))
+        .execute()
+    )
+
+
 def query_actions_by_address(
     chain_code: str,
     address: str,
     coin_code: str = None,
-    page_number: int = 1,
     items_per_page: int = 20,
-    archived_ids: List[int] = None,
     searching_address_as: Literal["sender", "receiver", "both"] = "both",
+    after: Tuple[datetime.datetime, int] = None,
 ) -> List[TxAction]:
-    address_query_expression_options = (
-        TxAction.from_address == address,
-        TxAction.to_address == address,
-    )
-
-    if searching_address_as == "sender":
-        address_query_expression = address_query_expression_options[0]
-    elif searching_address_as == "receiver":
-        address_query_expression = address_query_expression_options[1]
-    else:
-        address_query_expression = address_query_expression_options[0] | address_query_expression_options[1]
-
-    expressions = [
-        TxAction.chain_code == chain_code,
-        address_query_expression,
-    ]
-
-    coin_code is None or expressions.append(TxAction.coin_code == coin_code)
-    not archived_ids or expressions.append(
-        functools.reduce(lambda a, b: a | b, (TxAction.archived_id == i for i in archived_ids))
-    )
-
-    actions = TxAction.select().where(*expressions).order_by(TxAction.created_time.desc())
-    if page_number is not None and items_per_page is not None:
-        actions = actions.paginate(page_number, items_per_page)
+    """
+    Query actions in the order of (created_time desc, id desc).
+    :param after: keyset of the last action of the previous page, start from the newest one if None
+    """
+    return _query_actions_by_address_after(chain_code, address, coin_code, items_per_page, searching_address_as, after)
 
-    return list(actions)
 
-
-def get_first_confirmed_action_at_the_same_archived_id(
-    chain_code: str, address: str, archived_id: int
-) -> Optional[TxAction]:
-    return (
-        TxAction.select()
-        .where(
-            TxAction.chain_code == chain_code,
-            (TxAction.from_address == address) | (TxAction.to_address == address),
-            TxAction.block_number != None,  # noqa
-            TxAction.archived_id == archived_id,
+def iterate_actions_by_address(
+    chain_code: str,
+    address: str,
+    coin_code: str = None,
+    searching_address_as: Literal["sender", "receiver", "both"] = "both",
+    fields: Iterable[peewee.Field] = None,
+    rows_per_query: int = 500,
+) -> Iterator[dict]:
+    """
+    Iterate all the actions in the order of (created_time desc, id desc) as dicts,
+    fetched by keyset chunk by chunk, so the memory usage is independent of the history size,
+    and the database isn't kept locked by an open cursor while the caller consumes the rows slowly
+    """
+    after = None
+    while True:
+        rows = _query_actions_by_address_after(
+            chain_code, address, coin_code, rows_per_query, searching_address_as, after, fields=fields, dicts=True
         )
-        .order_by(TxAction.block_number.asc())
-        .first()
-    )
+        yield from rows
 
+        if len(rows) < rows_per_query:
+            break
 
-def get_last_confirmed_action_before_archived_id(chain_code: str, address: str, archived_id: int) -> Optional[TxAction]:
-    return (
-        TxAction.select()
-        .where(
-            TxAction.chain_code == chain_code,
-            (TxAction.from_address == address) | (TxAction.to_address == address),
-            TxAction.block_number != None,  # noqa
-            TxAction.archived_id < archived_id,
-        )
-        .order_by(TxAction.archived_id.desc(), TxAction.block_number.desc())
-        .first()
-    )
+        after = (rows[-1]["created_time"], rows[-1]["id"])
 
 
-def query_existing_archived_ids(chain_code: str, txids: List[str]) -> Set[int]:
-    items = (
-        TxAction.select(TxAction.archived_id.distinct())
-        .where(
-            TxAction.chain_code == chain_code,
-            TxAction.txid.in_(txids),
-            TxAction.archived_id != None,  # noqa
+def _query_actions_by_address_after(
+    chain_code: str,
+    address: str,
+    coin_code: Optional[str],
+    items_per_page: int,
+    searching_address_as: Literal["sender", "receiver", "both"],
+    after: Optional[Tuple[datetime.datetime, int]],
+    fields: Iterable[peewee.Field] = None,
+    dicts: bool = False,
+) -> list:
+    """
+    :param after: keyset of the last action of the previous page, start from the newest one if None
+    :param fields: all the fields by default, the keyset fields are always selected
+    :param dicts: return the rows as dicts instead of the models
+    """
+    address_fields = {
+        "sender": (TxAction.from_address,),
+        "receiver": (TxAction.to_address,),
+    }.get(searching_address_as, (TxAction.from_address, TxAction.to_address))
+    fields = (*fields, TxAction.created_time, TxAction.id) if fields else ()
+    keyset_of = operator.itemgetter("created_time", "id") if dicts else operator.attrgetter("created_time", "id")
+
+    rows = {}
+    # Query senders and receivers separately, so that each one seeks on its own composite index,
+    # instead of scanning all actions of the address for the OR expression
+    for address_field in address_fields:
+        expressions = [TxAction.chain_code == chain_code, address_field == address]
+        if after is not None:
+            created_time, action_id = after
+            expressions.extend(
+                [
+                    TxAction.created_time <= created_time,  # the range of the index
+                    (TxAction.created_time < created_time) | (TxAction.id < action_id),
+                ]
+            )
+        coin_code is None or expressions.append(TxAction.coin_code == coin_code)
+
+        query = (
+            TxAction.select(*fields)
+            .where(*expressions)
+            .order_by(TxAction.created_time.desc(), TxAction.id.desc())
+            .limit(items_per_page)
         )
-        .tuples()
-    )
-    return {i[0] for i in items}
+        rows.update((keyset_of(i)[1], i) for i in (query.dicts() if dicts else query))
 
+    rows = sorted(rows.values(), key=keyset_of, reverse=True)
+    return rows[:items_per_page]
 
-def filter_existing_txids(chain_code: str, txids: List[str], status: TxActionStatus = None) -> Set[str]:
+
+def filter_existing_txids(chain_code: str, txids: List[str], statuses: Iterable[TxActionStatus] = None) -> Set[str]:
     expressions = [TxAction.chain_code == chain_code, TxAction.txid.in_(txids)]
 
-    if status is not None:
-        expressions.append(TxAction.status == status)
+    if statuses is not None:
+        expressions.append(TxAction.status.in_(list(statuses)))
 
     items = TxAction.select(TxAction.txid.distinct()).where(*expressions).tuples()
     return {i[0] for i in items}
 
 
-def update_archived_id(from_archived_ids: List[int], archived_id: int) -> int:
-    return (
-        TxAction.update(archived_id=archived_id, modified_time=datetime.datetime.now())
-        .where(TxAction.archived_id.in_(from_archived_ids))
-        .execute()
-    )
-
-
 def get_action_by_id(action_id: int) -> Optional[TxAction]:
     return TxAction.get_or_none(TxAction.id == action_id)
 
@@ -227,8 +251,34 @@ def query_actions_by_status(
     return list(models)
 
 
+def query_superseded_actions(chain_code: str = None, address: str = None, txid: str = None) -> List[TxAction]:
+    """
+    Query the replaced actions whose replacement is still pending, either of them may be mined at last
+    """
+    Replacement = TxAction.alias()
+    pending_replacement = Replacement.select(Replacement.id).where(
+        Replacement.chain_code == TxAction.chain_code,
+        Replacement.txid == TxAction.replaced_by,
+        Replacement.status == TxActionStatus.PENDING,
+    )
+    expressions = [
+        TxAction.status == TxActionStatus.REPLACED,
+        peewee.fn.EXISTS(pending_replacement),
+    ]
+
+    chain_code is None or expressions.append(TxAction.chain_code == chain_code)
+    address is None or expressions.append((TxAction.from_address == address) | (TxAction.to_address == address))
+    txid is None or expressions.append(TxAction.txid == txid)
+
+    models = TxAction.select().where(*expressions)
+    return list(models)
+
+
 def delete_actions_by_addresses(chain_code: str, addresses: List[str]) -> int:
-    return (
+    AddressSyncCursor.delete().where(
+        AddressSyncCursor.chain_code == chain_code, AddressSyncCursor.address.in_(addresses)
+    ).execute()
+    count = (
         TxAction.delete()
         .where(
             TxAction.chain_code == chain_code,
@@ -236,7 +286,226 @@ def delete_actions_by_addresses(chain_code: str, addresses: List[str]) -> int:
         )
         .execute()
     )
+    RawTx.delete().where(
+        RawTx.chain_code == chain_code,
+        ~peewee.fn.EXISTS(TxAction.select().where(TxAction.chain_code == chain_code, TxAction.txid == RawTx.txid)),
+    ).execute()
+    return count
 
 
 def has_actions_by_txid(chain_code: str, txid: str) -> bool:
     return TxAction.select().where(TxAction.chain_code == chain_code, TxAction.txid == txid).count() > 0
+
+
+def get_or_create_sync_cursor(chain_code: str, address: str) -> Tuple[AddressSyncCursor, bool]:
+    return AddressSyncCursor.get_or_create(
+        chain_code=chain_code, address=address, defaults={"read_time": datetime.datetime.now()}
+    )
+
+
+def get_sync_cursor(chain_code: str, address: str) -> Optional[AddressSyncCursor]:
+    return AddressSyncCursor.get_or_none(
+        AddressSyncCursor.chain_code == chain_code, AddressSyncCursor.address == address
+    )
+
+
+def update_sync_cursor(cursor_id: int, **kwargs) -> int:
+    return (
+        AddressSyncCursor.update(modified_time=datetime.datetime.now(), **kwargs)
+        .where(AddressSyncCursor.id == cursor_id)
+        .execute()
+    )
+
+
+def bulk_mark_sync_cursors_synced(chain_code: str, last_block_numbers: Dict[str, Optional[int]]):
+    """
+    Create or update the cursors of the addresses as fully synced
+    :param last_block_numbers: Dict[address, last_block_number], left unchanged if None
+    """
+    now = datetime.datetime.now()
+    rows = [
+        dict(
+            chain_code=chain_code,
+            address=address,
+            last_block_number=last_block_number,
+            page_token=None,
+            synced_time=now,
+            modified_time=now,
+        )
+        for address, last_block_number in last_block_numbers.items()
+    ]
+    preserve = [AddressSyncCursor.page_token, AddressSyncCursor.synced_time, AddressSyncCursor.modified_time]
+
+    with db.atomic():
+        bulk.bulk_insert(
+            AddressSyncCursor,
+            [i for i in rows if i["last_block_number"] is not None],
+            preserve=preserve + [AddressSyncCursor.last_block_number],
+        )
+        bulk.bulk_insert(
+            AddressSyncCursor,
+            [{k: v for k, v in i.items() if k != "last_block_number"} for i in rows if i["last_block_number"] is None],
+            preserve=preserve,
+        )
+
+
+def query_stale_sync_cursors(synced_before: datetime.datetime, limit: int = None) -> List[AddressSyncCursor]:
+    models = (
+        AddressSyncCursor.select()
+        .where(
+            (AddressSyncCursor.synced_time == None)  # noqa
+            | (AddressSyncCursor.synced_time < synced_before)
+            | (AddressSyncCursor.page_token != None)  # noqa
+        )
+        .order_by(AddressSyncCursor.synced_time.asc(nulls="first"))
+    )
+    if limit is not None:
+        models = models.limit(limit)
+
+    return list(models)
+
+
+def query_unread_sync_cursors(read_before: datetime.datetime) -> List[AddressSyncCursor]:
+    return list(AddressSyncCursor.select().where(AddressSyncCursor.read_time < read_before))
+
+
+def delete_sync_cursors_by_ids(cursor_ids: List[int]) -> int:
+    return AddressSyncCursor.delete().where(AddressSyncCursor.id.in_(cursor_ids)).execute()
+
+
+def query_sync_cursor_addresses(chain_code: str) -> List[str]:
+    items = AddressSyncCursor.select(AddressSyncCursor.address).where(AddressSyncCursor.chain_code == chain_code)
+    return [i.address for i in items]
+
+
+def get_last_scanned_block(chain_code: str) -> Optional[ScannedBlock]:
+    return (
+        ScannedBlock.select()
+        .where(ScannedBlock.chain_code == chain_code)
+        .order_by(ScannedBlock.block_number.desc())
+        .first()
+    )
+
+
+def query_scanned_blocks(chain_code: str, limit: int) -> List[ScannedBlock]:
+    models = (
+        ScannedBlock.select()
+        .where(ScannedBlock.chain_code == chain_code)
+        .order_by(ScannedBlock.block_number.desc())
+        .limit(limit)
+    )
+    return list(models)
+
+
+def create_scanned_block(chain_code: str, block_number: int, block_hash: str) -> ScannedBlock:
+    return ScannedBlock.create(chain_code=chain_code, block_number=block_number, block_hash=block_hash)
+
+
+def delete_scanned_blocks(chain_code: str, after_block_number: int = None, before_block_number: int = None) -> int:
+    expressions = [ScannedBlock.chain_code == chain_code]
+    after_block_number is None or expressions.append(ScannedBlock.block_number > after_block_number)
+    before_block_number is None or expressions.append(ScannedBlock.block_number < before_block_number)
+    return ScannedBlock.delete().where(*expressions).execute()
+
+
+def revert_confirmed_actions(chain_code: str, after_block_number: int) -> int:
+    return (
+        TxAction.update(
+            status=TxActionStatus.PENDING,
+            fee_used=0,
+            block_number=None,
+            block_hash=None,
+            block_time=None,
+            modified_time=datetime.datetime.now(),
+        )
+        .where(TxAction.chain_code == chain_code, TxAction.block_number > after_block_number)
+        .execute()
+    )
+
+
+def query_tx_outputs_by_txids(chain_code: str, txids: Iterable[str]) -> List[TxOutput]:
+    result = []
+
+    for batch in peewee.chunked(txids, 100):
+        result.extend(TxOutput.select().where(TxOutput.chain_code == chain_code, TxOutput.txid.in_(batch)))
+
+    return result
+
+
+def bulk_create_tx_outputs(chain_code: str, outputs: Iterable[Tuple[str, int, str, Decimal]]):
+    """
+    :param outputs: Iterable[(txid, vout, address, value)], the existing ones are ignored
+    """
+    rows = (
+        dict(chain_code=chain_code, txid=txid, vout=vout, address=address, value=value)
+        for txid, vout, address, value in outputs
+    )
+    return bulk.bulk_insert(TxOutput, rows, ignore_conflicts=True)
+
+
+def bulk_save_raw_txs(chain_code: str, raw_txs: Dict[str, str]):
+    """
+    :param raw_txs: Dict[txid, raw_tx], the empty ones and the existing ones are ignored
+    """
+    rows = (
+        dict(zip(("chain_code", "txid", "codec", "payload"), (chain_code, txid, *codec.encode_raw_tx(raw_tx))))
+        for txid, raw_tx in raw_txs.items()
+        if raw_tx
+    )
+    return bulk.bulk_insert(RawTx, rows, ignore_conflicts=True)
+
+
+def query_raw_txs(chain_code: str, txids: Iterable[str]) -> Dict[str, str]:
+    """
+    Load the raw txs from the local database, then from the archive file for the missing ones
+    """
+    txids = set(txids)
+    result = {}
+
+    for model in (RawTx, ArchivedRawTx):
+        if model is ArchivedRawTx and get_archive_database() is None:
+            break
+
+        for batch in peewee.chunked(txids - result.keys(), 100):
+            items = model.select(model.txid, model.codec, model.payload).where(
+                model.chain_code == chain_code, model.txid.in_(batch)
+            )
+            result.update((i.txid, codec.decode_raw_tx(i.codec, i.payload)) for i in items)
+
+    return result
+
+
+def query_archivable_raw_txs(confirmed_before: datetime.datetime, limit: int) -> List[RawTx]:
+    """
+    Raw txs whose actions are all confirmed before the specified time
+    """
+    unarchivable = TxAction.select().where(
+        TxAction.chain_code == RawTx.chain_code,
+        TxAction.txid == RawTx.txid,
+        (TxAction.block_number.is_null()) | (TxAction.created_time >= confirmed_before),
+    )
+    return list(RawTx.select().where(~peewee.fn.EXISTS(unarchivable)).order_by(RawTx.id.asc()).limit(limit))
+
+
+def archive_raw_txs(raw_txs: List[RawTx]) -> int:
+    with ArchivedRawTx._meta.database.atomic():
+        bulk.bulk_insert(
+            ArchivedRawTx,
+            (dict(chain_code=i.chain_code, txid=i.txid, codec=i.codec, payload=i.payload) for i in raw_txs),
+            ignore_conflicts=True,
+        )
+
+    # Deleted after being written to the archive file, so that nothing is lost if interrupted in between
+    return RawTx.delete().where(RawTx.id.in_([i.id for i in raw_txs])).execute()
+
+
+def get_archive_database() -> Optional[peewee.Database]:
+    if archive_database.obj is None:
+        path = settings.RAW_TX_ARCHIVE.get("path")
+        if not path:
+            return None
+
+        archive_database.initialize(peewee.SqliteDatabase(path))
+        archive_database.create_tables((ArchivedRawTx,))
+
+    return archive_database.obj
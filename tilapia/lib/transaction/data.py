@@ -25,6 +25,21 @@ class TxActionStatus(IntEnum):
         )
 
 
+@unique
+class RawTxCodec(IntEnum):
+    TEXT = 0
+    HEX = 1
+    PREFIXED_HEX = 2  # likes 0x...
+
+    @classmethod
+    def to_choices(cls):
+        return (
+            (cls.TEXT, "Text"),
+            (cls.HEX, "Hex"),
+            (cls.PREFIXED_HEX, "Prefixed Hex"),
+        )
+
+
 TX_TO_ACTION_STATUS_DIRECT_MAPPING = {
     provider_data.TransactionStatus.PENDING: TxActionStatus.PENDING,
     provider_data.TransactionStatus.CONFIRM_SUCCESS: TxActionStatus.CONFIRM_SUCCESS,
@@ -0,0 +1,4 @@
+class InvalidPageCursor(Exception):
+    def __init__(self, cursor: str):
+        super(InvalidPageCursor, self).__init__(f"Invalid page cursor: {repr(cursor)}")
+        self.cursor = cursor
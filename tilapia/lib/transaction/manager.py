@@ -1,21 +1,35 @@
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import csv
 import datetime
+import functools
+import io
 import itertools
 import logging
+import threading
 import time
 from decimal import Decimal
-from typing import Iterable, List, Literal, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Set, Tuple
 
+from tilapia.lib.basic.functional.json import json_stringify
 from tilapia.lib.basic.functional.require import require
 from tilapia.lib.basic.functional.timing import timing_logger
-from tilapia.lib.basic.functional.wraps import error_interrupter, timeout_lock
+from tilapia.lib.basic.functional.wraps import cache_it, error_interrupter, timeout_lock
 from tilapia.lib.basic.orm.database import db
 from tilapia.lib.coin import data as coin_data
 from tilapia.lib.coin import manager as coin_manager
+from tilapia.lib.conf import settings
+from tilapia.lib.price import manager as price_manager
 from tilapia.lib.provider import data as provider_data
+from tilapia.lib.provider import exceptions as provider_exceptions
+from tilapia.lib.provider import interfaces as provider_interfaces
 from tilapia.lib.provider import manager as provider_manager
-from tilapia.lib.transaction import daos
+from tilapia.lib.throttle import manager as throttle_manager
+from tilapia.lib.transaction import daos, exceptions, tracker
 from tilapia.lib.transaction.data import TX_TO_ACTION_STATUS_DIRECT_MAPPING, TxActionStatus
-from tilapia.lib.transaction.models import TxAction
+from tilapia.lib.transaction.models import AddressSyncCursor, TxAction
 from tilapia.lib.utxo import manager as utxo_manager
 
 logger = logging.getLogger("app.transaction")
@@ -33,18 +47,19 @@ def create_action(
     raw_tx: str,
     **kwargs,
 ) -> TxAction:
-    return daos.new_action(
-        txid=txid,
-        status=status,
-        chain_code=chain_code,
-        coin_code=coin_code,
-        value=value,
-        from_address=from_address,
-        to_address=to_address,
-        fee_limit=fee_limit,
-        raw_tx=raw_tx,
-        **kwargs,
-    ).save()
+    with db.atomic():
+        daos.bulk_save_raw_txs(chain_code, {txid: raw_tx})
+        return daos.new_action(
+            txid=txid,
+            status=status,
+            chain_code=chain_code,
+            coin_code=coin_code,
+            value=value,
+            from_address=from_address,
+            to_address=to_address,
+            fee_limit=fee_limit,
+            **kwargs,
+        ).save()
 
 
 def get_action_by_id(action_id: int) -> TxAction:
@@ -59,6 +74,22 @@ def update_action_status(
     daos.update_actions_status(chain_code, txid, status)
 
 
+def mark_actions_replaced(chain_code: str, txid: str, replaced_by: str):
+    """
+    Link the superseded tx to its replacement, then it is out of the pending ones and won't be polled anymore
+    """
+    require(txid != replaced_by, "Can't be replaced by itself")
+    daos.mark_actions_replaced(chain_code, (txid,), replaced_by)
+    _evict_unconfirmed_utxos(chain_code, txid)
+    logger.info(f"TxAction replaced. chain_code: {chain_code}, txid: {txid}, replaced_by: {replaced_by}")
+
+
+def _evict_unconfirmed_utxos(chain_code: str, txid: str):
+    # The change of the tx never confirmed is unspendable, so is the one of its descendants
+    if coin_manager.get_chain_info(chain_code).chain_model == coin_data.ChainModel.UTXO:
+        utxo_manager.evict_unconfirmed_utxos_by_txids(chain_code, [txid])
+
+
 def has_actions_by_txid(chain_code: str, txid: str) -> bool:
     return daos.has_actions_by_txid(chain_code, txid)
 
@@ -67,6 +98,15 @@ def query_actions_by_txid(chain_code: str, txid: str) -> List[TxAction]:
     return daos.query_actions_by_txid(chain_code, txid)
 
 
+PENDING_TX_BATCH_SIZE = 50
+PENDING_TX_MAX_WORKERS = 4
+
+_PENDING_TX_TRACKER = tracker.PendingTxTracker()
+
+# The superseded tx may be mined instead of its replacement, so is confirmed as well as the pending one
+_CONFIRMABLE_STATUSES = (TxActionStatus.PENDING, TxActionStatus.REPLACED)
+
+
 def update_pending_actions(
     chain_code: Optional[str] = None,
     address: Optional[str] = None,
@@ -78,60 +118,108 @@ def update_pending_actions(
         address=address,
         txid=txid,
     )
+    # Keep polling the superseded txs until the replacement is settled, the superseded one may be mined after all
+    pending_actions.extend(daos.query_superseded_actions(chain_code=chain_code, address=address, txid=txid))
+
+    now = time.time()
+    pending_txs = {}
+    for i in pending_actions:
+        key = (i.chain_code, i.txid)
+        pending_txs[key] = min(pending_txs.get(key, now), i.created_time.timestamp())
+
+    if chain_code is None and address is None and txid is None:
+        _PENDING_TX_TRACKER.retain(pending_txs.keys())  # Forget the txs which are not pending anymore
 
     if not pending_actions:
         return
 
-    txids_of_chain = {(i.chain_code, i.txid) for i in pending_actions}
-    confirmed_txids = set()
+    txids_of_chain = _PENDING_TX_TRACKER.pick_due(pending_txs, now)
+    if txid is not None:
+        txids_of_chain = list(pending_txs.keys())  # Check the specified tx anyway
 
-    for chain_code, tx in _query_transactions_of_chain(txids_of_chain):
-        try:
-            action_status = TX_TO_ACTION_STATUS_DIRECT_MAPPING.get(tx.status)
-            if tx.fee is None or tx.block_header is None or action_status is None:
-                continue
+    confirmed_txids, checked_keys = set(), set()
 
-            _on_transaction_confirmed(
-                chain_code=chain_code,
-                txid=tx.txid,
-                status=action_status,
-                fee_used=Decimal(tx.fee.used),
-                block_hash=tx.block_header.block_hash,
-                block_number=tx.block_header.block_number,
-                block_time=tx.block_header.block_time,
-            )
-            confirmed_txids.add(tx.txid)
-            logger.info(
-                f"TxAction confirmed. chain_code: {chain_code}, txid: {tx.txid}, action_status: {action_status}"
-            )
-        except Exception as e:
-            logger.exception(f"Error in updating actions. chain_code: {chain_code}, txid: {tx.txid}, error: {repr(e)}")
+    for chain_code, checked_txids, transactions in _query_transactions_of_chain(txids_of_chain):
+        checked_keys.update((chain_code, i) for i in checked_txids)
+        _PENDING_TX_TRACKER.mark_checked(((chain_code, i) for i in checked_txids), now)
+
+        for tx in transactions:
+            try:
+                action_status = TX_TO_ACTION_STATUS_DIRECT_MAPPING.get(tx.status)
+                if tx.fee is None or tx.block_header is None or action_status is None:
+                    continue
+
+                _on_transaction_confirmed(
+                    chain_code=chain_code,
+                    txid=tx.txid,
+                    status=action_status,
+                    fee_used=Decimal(tx.fee.used),
+                    block_hash=tx.block_header.block_hash,
+                    block_number=tx.block_header.block_number,
+                    block_time=tx.block_header.block_time,
+                )
+                confirmed_txids.add(tx.txid)
+                logger.info(
+                    f"TxAction confirmed. chain_code: {chain_code}, txid: {tx.txid}, action_status: {action_status}"
+                )
+            except Exception as e:
+                logger.exception(
+                    f"Error in updating actions. chain_code: {chain_code}, txid: {tx.txid}, error: {repr(e)}"
+                )
 
-    unconfirmed_actions = [i for i in pending_actions if i.txid not in confirmed_txids]
+    unconfirmed_actions = [
+        i for i in pending_actions if i.txid not in confirmed_txids and i.status == TxActionStatus.PENDING
+    ]
     if not unconfirmed_actions:
         return
 
     now = datetime.datetime.now()
     too_old = datetime.timedelta(days=3)
-    too_old_txids = {(i.chain_code, i.txid) for i in unconfirmed_actions if now - i.created_time >= too_old}
+    # Only the ones just checked and still not confirmed, the others aren't due or failed to be checked
+    too_old_txids = {
+        (i.chain_code, i.txid)
+        for i in unconfirmed_actions
+        if now - i.created_time >= too_old and (i.chain_code, i.txid) in checked_keys
+    }
 
     with db.atomic():
         for chain_code, txid in too_old_txids:
             daos.update_actions_status(chain_code, txid, status=TxActionStatus.UNKNOWN)
+            _evict_unconfirmed_utxos(chain_code, txid)  # Likely dropped, so is its change
+
+
+def get_pending_tracker_metrics() -> dict:
+    return _PENDING_TX_TRACKER.metrics()
 
 
 def _query_transactions_of_chain(
     txids_of_chain: Iterable[Tuple[str, str]]
-) -> Iterable[Tuple[str, provider_data.Transaction]]:
+) -> Iterable[Tuple[str, List[str], List[provider_data.Transaction]]]:
     txids_of_chain = sorted(txids_of_chain, key=lambda i: i[0])  # in order to use itertools.groupby
 
+    jobs = []
     for chain_code, group in itertools.groupby(txids_of_chain, key=lambda i: i[0]):
-        for (_, txid) in group:
+        txids = [txid for _, txid in group]
+        jobs.extend(
+            (chain_code, txids[i : i + PENDING_TX_BATCH_SIZE]) for i in range(0, len(txids), PENDING_TX_BATCH_SIZE)
+        )
+
+    if not jobs:
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(PENDING_TX_MAX_WORKERS, len(jobs))) as executor:
+        futures = {
+            executor.submit(provider_manager.batch_get_transaction_by_txids, chain_code, txids): (chain_code, txids)
+            for chain_code, txids in jobs
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            chain_code, txids = futures[future]
             try:
-                yield chain_code, provider_manager.get_transaction_by_txid(chain_code, txid)
+                yield chain_code, txids, future.result()
             except Exception as e:
                 logger.exception(
-                    f"Error in getting transaction by txid. chain_code: {chain_code}, txid: {txid}, error: {repr(e)}"
+                    f"Error in getting transactions by txids. chain_code: {chain_code}, txids: {txids}, error: {repr(e)}"
                 )
 
 
@@ -194,7 +282,6 @@ def _tx_action_factory__account_model(
                 to_address=tx_output.address,
                 fee_limit=Decimal(tx.fee.limit),
                 fee_price_per_unit=Decimal(tx.fee.price_per_unit),
-                raw_tx=tx.raw_tx,
                 index=index,
             )
 
@@ -217,36 +304,82 @@ def _tx_action_factory__account_model(
             yield daos.new_action(**info)
 
 
+def _tx_action_factory__utxo_model(
+    chain_code: str, transactions: Iterable[provider_data.Transaction], addresses: Set[str] = None
+) -> Iterable[TxAction]:
+    """
+    :param addresses: the synced addresses, the first input of them is taken as the sender if any,
+    otherwise the first input of the tx
+    """
+    main_coin = coin_manager.get_coin_info(chain_code)
+    txids = set()
+
+    for tx in transactions:
+        if tx.txid in txids or tx.status not in TX_TO_ACTION_STATUS_DIRECT_MAPPING:
+            continue
+
+        txids.add(tx.txid)
+        input_addresses = [i.address for i in tx.inputs if i.address]
+        outputs = [i for i in tx.outputs if i.address]
+        if not input_addresses or not outputs:
+            continue
+
+        from_address = next((i for i in input_addresses if i in addresses), None) if addresses else None
+        from_address = from_address or input_addresses[0]
+
+        # One action per output paid to others, the change outputs are omitted
+        transfer_outputs = [i for i in outputs if i.address not in input_addresses] or outputs[:1]
+        status = TX_TO_ACTION_STATUS_DIRECT_MAPPING.get(tx.status)
+
+        for index, tx_output in enumerate(transfer_outputs):
+            info = dict(
+                txid=tx.txid,
+                status=status,
+                chain_code=chain_code,
+                coin_code=main_coin.code,
+                value=Decimal(tx_output.value),
+                from_address=from_address,
+                to_address=tx_output.address,
+                fee_limit=Decimal(tx.fee.limit),
+                fee_price_per_unit=Decimal(tx.fee.price_per_unit),
+                index=index,
+            )
+
+            if tx.block_header:
+                info.update(
+                    dict(
+                        fee_used=Decimal(tx.fee.used),
+                        block_number=tx.block_header.block_number,
+                        block_hash=tx.block_header.block_hash,
+                        block_time=tx.block_header.block_time,
+                        created_time=datetime.datetime.fromtimestamp(tx.block_header.block_time),
+                    )
+                )
+
+            yield daos.new_action(**info)
+
+
 _TX_ACTION_FACTORY_REGISTRY = {
     coin_data.ChainModel.ACCOUNT: _tx_action_factory__account_model,
+    coin_data.ChainModel.UTXO: _tx_action_factory__utxo_model,
 }
 
 
-def _search_actions_from_provider_by_address(
-    chain_code: str, address: str, paginate: provider_data.TxPaginate = None
-) -> List[TxAction]:
+def _get_action_factory(chain_code: str) -> Optional[Callable[..., Iterable[TxAction]]]:
     chain_info = coin_manager.get_chain_info(chain_code)
-    action_factory = _TX_ACTION_FACTORY_REGISTRY.get(chain_info.chain_model)
-
-    if not action_factory:
-        return []
-
-    try:
-        transactions = provider_manager.search_txs_by_address(chain_code, address, paginate=paginate)
-    except Exception as e:
-        transactions = []
-        logger.exception(
-            f"Error in searching txs by address form provider. "
-            f"chain_code: {chain_code}, address: {address}, paginate: {paginate}, error: {repr(e)}"
-        )
-
-    transactions = (i for i in transactions if i.status in TX_TO_ACTION_STATUS_DIRECT_MAPPING)
-    actions = action_factory(chain_code, transactions)
-    actions = [i for i in actions if i.from_address == address or i.to_address == address]
-    return actions
+    return _TX_ACTION_FACTORY_REGISTRY.get(chain_info.chain_model)
 
 
-_LAST_ARCHIVED_ID_CACHE = {}
+SYNC_ITEMS_PER_PAGE = 200
+SYNC_MAX_PAGES_PER_ROUND = 5
+SYNC_MAX_WORKERS = 4
+SYNC_BATCH_SIZE = 50
+DEFAULT_MAX_STALENESS = 60  # in seconds
+BACKGROUND_SYNC_INTERVAL = 60  # in seconds
+SYNC_LEASE_TTL = 5 * 60  # in seconds, bounds how long the syncing of a dead worker blocks the others
+SYNC_LOG_BLOCKS_PER_PAGE = 5000  # The nodes reject the log queries over too many blocks
+UNWATCHED_CURSOR_TTL = 7 * 24 * 60 * 60  # in seconds, the cursors of the addresses not watched expire if unread
+CURSOR_READ_TIME_RESOLUTION = 60 * 60  # in seconds, avoid writing the read time of a cursor on every read
 
 
 @timing_logger("transaction_manager.query_actions_by_address")
@@ -257,105 +390,745 @@ def query_actions_by_address(
     page_number: int = 1,
     items_per_page: int = 20,
     searching_address_as: Literal["sender", "receiver", "both"] = "both",
+    max_staleness: Optional[int] = DEFAULT_MAX_STALENESS,
+    page_cursor: str = None,
 ) -> List[TxAction]:
-    with timeout_lock("transaction_manager.query_actions_by_address") as acquired:
-        if not acquired:
+    """
+    Query actions from the local database, the history is synced by the cursor of the address.
+    :param max_staleness: in seconds, sync inline first if the cursor is older than it, never sync inline if None
+    :param page_number: deprecated, use page_cursor instead. Still served without OFFSET,
+    by walking the keyset pages from the first one, so the cost grows with it. Ignored if page_cursor is specified
+    :param page_cursor: returned by encode_page_cursor with the last action of the previous page
+    """
+    address = provider_manager.verify_address(chain_code, address).normalized_address
+    page_number = max(page_number, 1)
+    after = decode_page_cursor(page_cursor) if page_cursor else None
+
+    sync_inline = max_staleness is not None and _get_action_factory(chain_code) is not None
+    if sync_inline:
+        cursor, created = daos.get_or_create_sync_cursor(chain_code, address)
+        created or _mark_cursor_read(cursor)
+        if _is_cursor_stale(cursor, max_staleness):
+            sync_actions_by_address(chain_code, address)
+
+    local_actions = []
+    max_times = 3
+    for times in range(max_times + 1):
+        local_actions = _query_page_of_actions(
+            chain_code, address, coin_code, items_per_page, searching_address_as, after, page_number
+        )
+
+        if (
+            not sync_inline
+            or len(local_actions) >= items_per_page
+            or times == max_times  # No need to invoke synchronization the last time
+            or not _has_unfinished_round(chain_code, address)
+        ):
+            break
+
+        sync_actions_by_address(chain_code, address)  # Continue syncing the older history on demand
+
+    return local_actions
+
+
+def _query_page_of_actions(
+    chain_code: str,
+    address: str,
+    coin_code: Optional[str],
+    items_per_page: int,
+    searching_address_as: Literal["sender", "receiver", "both"],
+    after: Optional[Tuple[datetime.datetime, int]],
+    page_number: int,
+) -> List[TxAction]:
+    for _ in range(page_number - 1 if after is None else 0):
+        skipped_actions = daos.query_actions_by_address(
+            chain_code, address, coin_code, items_per_page, searching_address_as, after=after
+        )
+        if len(skipped_actions) < items_per_page:
             return []
 
-        address = provider_manager.verify_address(chain_code, address).normalized_address
-        page_number = max(page_number, 1)
-        is_first_page = page_number == 1
+        after = (skipped_actions[-1].created_time, skipped_actions[-1].id)
+
+    return daos.query_actions_by_address(
+        chain_code, address, coin_code, items_per_page, searching_address_as, after=after
+    )
+
+
+EXPORT_COLUMNS = (
+    "txid",
+    "status",
+    "coin_code",
+    "value",
+    "amount",
+    "from_address",
+    "to_address",
+    "fee",
+    "fee_amount",
+    "block_number",
+    "block_time",
+    "created_time",
+    "fiat_unit",
+    "fiat_price",
+    "fiat_value",
+    "fiat_fee",
+)
+EXPORT_ROWS_PER_CHUNK = 200
+
+
+def export_actions_by_address(
+    chain_code: str,
+    address: str,
+    coin_code: str = None,
+    searching_address_as: Literal["sender", "receiver", "both"] = "both",
+    file_format: Literal["ndjson", "csv"] = "ndjson",
+    fiat_unit: str = "usd",
+) -> Iterator[bytes]:
+    """
+    Export the whole local history of the address, encoded incrementally and yielded chunk by chunk.
+    The fiat columns are valued by the latest price, instead of the price at the time of the tx.
+    The arguments are checked at once, while the rows are fetched lazily during iteration.
+    """
+    require(file_format in ("ndjson", "csv"), f"Unsupported file format: {file_format}")
+    address = provider_manager.verify_address(chain_code, address).normalized_address
+    fee_coin_code = coin_manager.get_chain_info(chain_code).fee_coin
+    fields = (
+        TxAction.txid,
+        TxAction.status,
+        TxAction.coin_code,
+        TxAction.value,
+        TxAction.from_address,
+        TxAction.to_address,
+        TxAction.fee_limit,
+        TxAction.fee_used,
+        TxAction.fee_price_per_unit,
+        TxAction.block_number,
+        TxAction.block_time,
+        TxAction.created_time,
+    )
+    rows = daos.iterate_actions_by_address(
+        chain_code, address, coin_code=coin_code, searching_address_as=searching_address_as, fields=fields
+    )
+    rows = (_to_export_row(i, fee_coin_code, fiat_unit) for i in rows)
+    # Generators, nothing is queried until the first chunk is requested
+    return _encode_csv(rows) if file_format == "csv" else _encode_ndjson(rows)
+
+
+def _to_export_row(action: dict, fee_coin_code: str, fiat_unit: str) -> dict:
+    decimals, fiat_price = _get_valuation_of_coin(action["coin_code"], fiat_unit)
+    fee_decimals, fee_fiat_price = _get_valuation_of_coin(fee_coin_code, fiat_unit)
+    amount = action["value"] / pow(10, decimals)
+    fee = (action["fee_used"] or action["fee_limit"]) * action["fee_price_per_unit"]
+    fee_amount = fee / pow(10, fee_decimals)
+
+    return {
+        "txid": action["txid"],
+        "status": TxActionStatus(action["status"]).name,
+        "coin_code": action["coin_code"],
+        "value": action["value"],
+        "amount": amount,
+        "from_address": action["from_address"],
+        "to_address": action["to_address"],
+        "fee": fee,
+        "fee_amount": fee_amount,
+        "block_number": action["block_number"],
+        "block_time": action["block_time"],
+        "created_time": int(action["created_time"].timestamp()),
+        "fiat_unit": fiat_unit,
+        "fiat_price": fiat_price,
+        "fiat_value": amount * fiat_price,
+        "fiat_fee": fee_amount * fee_fiat_price,
+    }
+
+
+@cache_it(timeout=60)
+def _get_valuation_of_coin(coin_code: str, fiat_unit: str) -> Tuple[int, Decimal]:
+    coin = coin_manager.get_coin_info(coin_code)
+    return coin.decimals, Decimal(price_manager.get_last_price(coin_code, fiat_unit))
+
+
+def _encode_ndjson(rows: Iterable[dict]) -> Iterator[bytes]:
+    for chunk in _chunked(rows, EXPORT_ROWS_PER_CHUNK):
+        yield "".join(json_stringify(i) + "\n" for i in chunk).encode()
+
+
+def _encode_csv(rows: Iterable[dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+
+    for chunk in _chunked(rows, EXPORT_ROWS_PER_CHUNK):
+        writer.writerows({k: _format_csv_value(v) for k, v in i.items()} for i in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # Only the header if nothing exported
+
+
+def _format_csv_value(value):
+    if isinstance(value, Decimal):
+        return f"{value.normalize():f}"
+    elif value is None:
+        return ""
+    else:
+        return value
+
+
+def _chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def encode_page_cursor(action: TxAction) -> str:
+    raw = f"{action.created_time.isoformat()}|{action.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_page_cursor(page_cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(page_cursor + "=" * (-len(page_cursor) % 4)).decode()
+        created_time, action_id = raw.split("|", 1)
+        return datetime.datetime.fromisoformat(created_time), int(action_id)
+    except ValueError:
+        raise exceptions.InvalidPageCursor(page_cursor)
+
 
-        archived_id_cache_key = f"{chain_code}:{address}"
-        archived_id = _LAST_ARCHIVED_ID_CACHE.get(archived_id_cache_key)
-        if is_first_page or not archived_id:
-            archived_id = int(time.time() * 1e3)
-            _LAST_ARCHIVED_ID_CACHE[archived_id_cache_key] = archived_id
+def _is_cursor_stale(cursor: AddressSyncCursor, max_staleness: int) -> bool:
+    return cursor.synced_time is None or datetime.datetime.now() - cursor.synced_time >= datetime.timedelta(
+        seconds=max_staleness
+    )
+
+
+def _mark_cursor_read(cursor: AddressSyncCursor):
+    now = datetime.datetime.now()
+    if cursor.read_time is None or now - cursor.read_time >= datetime.timedelta(seconds=CURSOR_READ_TIME_RESOLUTION):
+        daos.update_sync_cursor(cursor.id, read_time=now)
+
+
+def _has_unfinished_round(chain_code: str, address: str) -> bool:
+    cursor = daos.get_sync_cursor(chain_code, address)
+    return cursor is not None and cursor.page_token is not None
+
+
+def _encode_page_token(head_block_number: int, end_block_number: int, head_txid: str) -> str:
+    return f"{head_block_number}:{end_block_number}:{head_txid}"
 
-        local_actions = []
-        max_times = 3
-        for times in range(max_times + 1):
-            local_actions = daos.query_actions_by_address(
+
+def _decode_page_token(page_token: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[str]]:
+    if not page_token:
+        return None, None, None
+
+    head_block_number, end_block_number, head_txid = page_token.split(":", 2)
+    return int(head_block_number), int(end_block_number), head_txid
+
+
+@error_interrupter(logger, interrupt=True, default=0)
+def sync_actions_by_address(
+    chain_code: str, address: str, max_pages: int = SYNC_MAX_PAGES_PER_ROUND, lock_timeout: float = 10
+) -> int:
+    """
+    Advance the sync cursor of the address by at most max_pages pages.
+    A round starts from the newest block and goes backward until reaching the last synced block,
+    it is saved as the page token of the cursor if running out of pages, then the next call resumes it.
+    """
+    action_factory = _get_action_factory(chain_code)
+    if not action_factory:
+        return 0
+
+    if _supports_utxo_history(chain_code):
+        return sync_actions_by_utxo_addresses(chain_code, [address], lock_timeout=lock_timeout)
+
+    if _supports_log_history(chain_code):
+        return _sync_actions_by_logs(chain_code, address, max_pages=max_pages, lock_timeout=lock_timeout)
+
+    with timeout_lock(
+        f"transaction_manager.sync_actions_by_address:{chain_code}:{address}", timeout=lock_timeout
+    ) as acquired, throttle_manager.lease(
+        throttle_manager.key_of("history_sync", chain_code, address), SYNC_LEASE_TTL
+    ) as leased:
+        if not acquired or not leased:
+            return 0  # Someone else is syncing the same address, maybe in the other workers
+
+        cursor, _ = daos.get_or_create_sync_cursor(chain_code, address)
+        start_block_number = (
+            max(0, cursor.last_block_number - 1)  # Ensure that the requested block overlaps the recorded block
+            if cursor.last_block_number is not None
+            else None
+        )
+        is_new_round = cursor.page_token is None
+        head_block_number, end_block_number, head_txid = _decode_page_token(cursor.page_token)
+
+        expand_count = 0
+        for _ in range(max_pages):
+            paginate = provider_data.TxPaginate(
+                start_block_number=start_block_number,
+                end_block_number=end_block_number,
+                items_per_page=SYNC_ITEMS_PER_PAGE,
+            )
+            transactions = provider_manager.search_txs_by_address(chain_code, address, paginate=paginate)
+            actions = action_factory(
+                chain_code, (i for i in transactions if i.status in TX_TO_ACTION_STATUS_DIRECT_MAPPING)
+            )
+            expand_count += _save_synced_actions(
                 chain_code,
-                address,
-                coin_code=coin_code,
-                items_per_page=items_per_page,
-                page_number=page_number,
-                archived_ids=[archived_id, None],
-                searching_address_as=searching_address_as,
+                [i for i in actions if i.from_address == address or i.to_address == address],
+                transactions,
             )
 
-            if (
-                len(local_actions) >= items_per_page
-                or times == max_times  # No need to invoke synchronization the last time
-                or _sync_actions_by_address(chain_code, address, archived_id, require_sync_number=200 * 1 << times) == 0
-            ):
+            confirmed_txs = [i for i in transactions if i.block_header is not None]
+            if head_block_number is None and confirmed_txs:
+                newest_tx = max(confirmed_txs, key=lambda i: i.block_header.block_number)
+                head_block_number, head_txid = newest_tx.block_header.block_number, newest_tx.txid
+
+            if len(transactions) < SYNC_ITEMS_PER_PAGE or not confirmed_txs:
+                end_block_number = None
                 break
 
-        return local_actions
+            lowest_block_number = min(i.block_header.block_number for i in confirmed_txs)
+            if end_block_number is None or lowest_block_number < end_block_number:
+                end_block_number = lowest_block_number  # Overlap the lowest block, it may not be fully fetched
+            else:
+                end_block_number -= 1  # Too many txs in a single block, skip it for making progress
 
+            if start_block_number is not None and end_block_number < start_block_number:
+                end_block_number = None
+                break
 
-@error_interrupter(logger, interrupt=True, default=0)
-def _sync_actions_by_address(chain_code: str, address: str, archived_id: int, require_sync_number: int = 200) -> int:
-    first_confirmed_action = daos.get_first_confirmed_action_at_the_same_archived_id(chain_code, address, archived_id)
-    last_confirmed_action_before_this_archived = daos.get_last_confirmed_action_before_archived_id(
-        chain_code, address, archived_id
-    )
+        now = datetime.datetime.now()
+        fields = dict(synced_time=now) if is_new_round else {}
+        if end_block_number is None:
+            fields.update(page_token=None, synced_time=now)
+            if head_block_number is not None:
+                fields.update(last_block_number=head_block_number, last_txid=head_txid)
+        else:
+            fields.update(page_token=_encode_page_token(head_block_number, end_block_number, head_txid))
+
+        daos.update_sync_cursor(cursor.id, **fields)
+        return expand_count
+
+
+def _save_synced_actions(
+    chain_code: str, syncing_actions: List[TxAction], transactions: Iterable[provider_data.Transaction] = ()
+) -> int:
+    """
+    :param transactions: where the actions come from, for saving the raw txs
+    """
+    if not syncing_actions:
+        return 0
 
-    paginate = provider_data.TxPaginate(
-        start_block_number=(
-            max(
-                0, last_confirmed_action_before_this_archived.block_number - 1
-            )  # Ensure that the requested block overlaps the recorded block
-            if last_confirmed_action_before_this_archived
-            else None
-        ),
-        end_block_number=first_confirmed_action.block_number if first_confirmed_action else None,
-        items_per_page=require_sync_number,
-    )
-    syncing_actions = _search_actions_from_provider_by_address(chain_code, address, paginate)
     syncing_txids = list({i.txid for i in syncing_actions})
 
-    pending_txids = daos.filter_existing_txids(chain_code, syncing_txids, status=TxActionStatus.PENDING)
+    pending_txids = daos.filter_existing_txids(chain_code, syncing_txids, statuses=_CONFIRMABLE_STATUSES)
     to_be_confirmed_actions = {
         i.txid: i for i in syncing_actions if i.txid in pending_txids and i.block_number is not None
     }
 
-    old_archived_ids = daos.query_existing_archived_ids(chain_code, syncing_txids)
-    if archived_id in old_archived_ids:
-        old_archived_ids.remove(archived_id)
-
     existing_txids = daos.filter_existing_txids(chain_code, syncing_txids)
     to_be_created_actions = [i for i in syncing_actions if i.txid not in existing_txids]
 
-    expand_count = 0
     with db.atomic():
-        if to_be_confirmed_actions:
-            for txid, action in to_be_confirmed_actions.items():
-                _on_transaction_confirmed(
-                    chain_code=chain_code,
-                    txid=txid,
-                    status=action.status,
-                    fee_used=action.fee_used,
-                    block_hash=action.block_hash,
-                    block_number=action.block_number,
-                    block_time=action.block_time,
-                    archived_id=archived_id,
+        for txid, action in to_be_confirmed_actions.items():
+            _on_transaction_confirmed(
+                chain_code=chain_code,
+                txid=txid,
+                status=action.status,
+                fee_used=action.fee_used,
+                block_hash=action.block_hash,
+                block_number=action.block_number,
+                block_time=action.block_time,
+            )
+
+        if to_be_created_actions:
+            daos.bulk_create(to_be_created_actions)
+            created_txids = {i.txid for i in to_be_created_actions}
+            daos.bulk_save_raw_txs(chain_code, {i.txid: i.raw_tx for i in transactions if i.txid in created_txids})
+
+    return len(to_be_confirmed_actions) + len(to_be_created_actions)
+
+
+def _supports_utxo_history(chain_code: str) -> bool:
+    if coin_manager.get_chain_info(chain_code).chain_model != coin_data.ChainModel.UTXO:
+        return False
+
+    try:
+        provider_manager.get_client_by_chain(chain_code, instance_required=provider_interfaces.UTXOHistoryMixin)
+        return True
+    except provider_exceptions.NoAvailableClient:
+        return False
+
+
+def _supports_log_history(chain_code: str) -> bool:
+    """
+    The account chains without any indexer, whose history is limited to the token transfers found by the logs
+    """
+    if coin_manager.get_chain_info(chain_code).chain_model != coin_data.ChainModel.ACCOUNT:
+        return False
+
+    try:
+        provider_manager.get_client_by_chain(chain_code, instance_required=provider_interfaces.SearchTransactionMixin)
+        return False
+    except provider_exceptions.NoAvailableClient:
+        pass
+
+    try:
+        provider_manager.get_client_by_chain(chain_code, instance_required=provider_interfaces.SearchTokenTransferMixin)
+        return True
+    except provider_exceptions.NoAvailableClient:
+        return False
+
+
+def _sync_actions_by_logs(chain_code: str, address: str, max_pages: int, lock_timeout: float) -> int:
+    """
+    Advance the sync cursor of the address by at most max_pages pages of SYNC_LOG_BLOCKS_PER_PAGE blocks.
+    The first round starts from the recent blocks, the older history can't be reached without an indexer
+    """
+    with timeout_lock(
+        f"transaction_manager.sync_actions_by_address:{chain_code}:{address}", timeout=lock_timeout
+    ) as acquired, throttle_manager.lease(
+        throttle_manager.key_of("history_sync", chain_code, address), SYNC_LEASE_TTL
+    ) as leased:
+        if not acquired or not leased:
+            return 0
+
+        cursor, _ = daos.get_or_create_sync_cursor(chain_code, address)
+        best_block_number = provider_manager.get_best_block_number(chain_code)
+        last_block_number = (
+            cursor.last_block_number
+            if cursor.last_block_number is not None
+            else max(0, best_block_number - SYNC_LOG_BLOCKS_PER_PAGE)
+        )
+
+        expand_count = 0
+        for _ in range(max_pages):
+            if last_block_number >= best_block_number:
+                break
+
+            # Overlap the last synced block, in case of the reorg
+            from_block_number = max(0, last_block_number - 1)
+            to_block_number = min(best_block_number, from_block_number + SYNC_LOG_BLOCKS_PER_PAGE - 1)
+            expand_count += sync_token_transfers_by_logs(
+                chain_code, from_block_number, to_block_number, addresses=[address]
+            )
+            last_block_number = to_block_number
+
+        daos.update_sync_cursor(
+            cursor.id, last_block_number=last_block_number, page_token=None, synced_time=datetime.datetime.now()
+        )
+        return expand_count
+
+
+@error_interrupter(logger, interrupt=True, default=0)
+def sync_actions_by_utxo_addresses(chain_code: str, addresses: List[str], lock_timeout: float = 10) -> int:
+    """
+    Sync the whole history of a set of addresses on a UTXO chain at once.
+    The prevouts referenced by all the txs are de-duplicated and resolved in one batch,
+    and persisted as TxOutput, so only the new ones are requested next time.
+    :param lock_timeout: only waited for a single address, the addresses of a set are try-locked
+    """
+    addresses = sorted(set(addresses))
+    lock_timeout = lock_timeout if len(addresses) == 1 else 0
+
+    with contextlib.ExitStack() as stack:
+        # Shared with sync_actions_by_address, the addresses held by the others are skipped this time,
+        # instead of stalling the whole set for each busy one
+        locked_addresses = [
+            address
+            for address in addresses
+            if stack.enter_context(
+                timeout_lock(
+                    f"transaction_manager.sync_actions_by_address:{chain_code}:{address}", timeout=lock_timeout
                 )
+            )
+        ]
+        lease_keys = {throttle_manager.key_of("history_sync", chain_code, i): i for i in locked_addresses}
+        leased_keys = throttle_manager.acquire(list(lease_keys), SYNC_LEASE_TTL)
+        stack.callback(throttle_manager.release, leased_keys)
+
+        addresses = [lease_keys[i] for i in leased_keys]
+        if not addresses:
+            return 0
+
+        history = provider_manager.batch_search_txids_by_addresses(chain_code, addresses)
+        block_numbers = {txid: block_number for items in history.values() for txid, block_number in items}
+        txids = list(block_numbers)
+
+        existing_txids, pending_txids = set(), set()
+        for i in range(0, len(txids), SYNC_ITEMS_PER_PAGE):
+            batch = txids[i : i + SYNC_ITEMS_PER_PAGE]
+            existing_txids.update(daos.filter_existing_txids(chain_code, batch))
+            pending_txids.update(daos.filter_existing_txids(chain_code, batch, statuses=_CONFIRMABLE_STATUSES))
+
+        syncing_txids = [i for i in txids if i not in existing_txids or (i in pending_txids and block_numbers[i] > 0)]
+        transactions = (
+            provider_manager.batch_get_transactions_without_prevouts(chain_code, syncing_txids) if syncing_txids else []
+        )
+        _resolve_prevouts(chain_code, transactions)
+
+        for tx in transactions:
+            if tx.block_header is not None and block_numbers.get(tx.txid):
+                tx.block_header.block_number = block_numbers[tx.txid]
+
+        address_set = set(addresses)
+        actions = _tx_action_factory__utxo_model(chain_code, transactions, address_set)
+        expand_count = _save_synced_actions(
+            chain_code,
+            [i for i in actions if i.from_address in address_set or i.to_address in address_set],
+            transactions,
+        )
 
-            expand_count += len(to_be_confirmed_actions)
+        daos.bulk_mark_sync_cursors_synced(
+            chain_code,
+            {address: max((i for _, i in history.get(address, ())), default=0) or None for address in addresses},
+        )
+        return expand_count
 
-        if old_archived_ids:
-            expand_count += daos.update_archived_id(list(old_archived_ids), archived_id)
 
-        if to_be_created_actions:
-            for i in to_be_created_actions:
-                i.archived_id = archived_id
+def _resolve_prevouts(chain_code: str, transactions: List[provider_data.Transaction]):
+    """
+    Fill the address and value of the inputs by the persisted outputs,
+    then the missing previous txs are requested in one batch and persisted too.
+    """
+    _persist_tx_outputs(chain_code, transactions)
+    outpoints = {(i.utxo.txid, i.utxo.vout) for tx in transactions for i in tx.inputs if i.utxo}
+    if not outpoints:
+        return
 
-            daos.bulk_create(to_be_created_actions)
-            expand_count += len(to_be_created_actions)
+    lookup = {
+        (i.txid, i.vout): (i.address, int(i.value))
+        for i in daos.query_tx_outputs_by_txids(chain_code, {txid for txid, _ in outpoints})
+    }
+    missing_txids = list({txid for txid, vout in outpoints if (txid, vout) not in lookup})
+
+    if missing_txids:
+        prev_txs = provider_manager.batch_get_transactions_without_prevouts(chain_code, missing_txids)
+        _persist_tx_outputs(chain_code, prev_txs)
+        lookup.update(
+            ((tx.txid, vout), (output.address, output.value))
+            for tx in prev_txs
+            for vout, output in enumerate(tx.outputs)
+        )
+
+    for tx in transactions:
+        is_resolved = True
+
+        for tx_input in tx.inputs:
+            prevout = lookup.get((tx_input.utxo.txid, tx_input.utxo.vout)) if tx_input.utxo else None
+            if prevout is None:
+                is_resolved = False
+                continue
+
+            tx_input.address, tx_input.value = prevout
+            tx_input.utxo.value = tx_input.value
+
+        if is_resolved and tx.fee is not None and tx.fee.limit:
+            total_fee = max(0, sum(i.value for i in tx.inputs) - sum(i.value for i in tx.outputs))
+            tx.fee.price_per_unit = int(total_fee / tx.fee.limit)
+
+
+def _persist_tx_outputs(chain_code: str, transactions: List[provider_data.Transaction]):
+    daos.bulk_create_tx_outputs(
+        chain_code,
+        (
+            (tx.txid, vout, output.address, Decimal(output.value))
+            for tx in transactions
+            for vout, output in enumerate(tx.outputs)
+        ),
+    )
+
+
+@timing_logger("transaction_manager.sync_stale_cursors")
+def sync_stale_cursors(
+    max_staleness: int = BACKGROUND_SYNC_INTERVAL,
+    limit: int = SYNC_BATCH_SIZE,
+    max_workers: int = SYNC_MAX_WORKERS,
+) -> dict:
+    expired = expire_unwatched_cursors()
+    synced_before = datetime.datetime.now() - datetime.timedelta(seconds=max_staleness)
+    targets = [(i.chain_code, i.address) for i in daos.query_stale_sync_cursors(synced_before, limit=limit)]
+
+    jobs = []
+    for chain_code, group in itertools.groupby(sorted(targets), key=lambda i: i[0]):
+        addresses = [address for _, address in group]
+        # Skip the addresses being synced by others
+        if _supports_utxo_history(chain_code):
+            jobs.append(functools.partial(sync_actions_by_utxo_addresses, chain_code, addresses, lock_timeout=0))
+        else:
+            jobs.extend(functools.partial(sync_actions_by_address, chain_code, i, lock_timeout=0) for i in addresses)
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        results = [job() for job in jobs]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            results = list(executor.map(lambda job: job(), jobs))
+
+    return {"cursors": len(targets), "expanded": sum(results), "expired": expired}
+
+
+_WATCHED_ADDRESSES = collections.defaultdict(set)
+_WATCHED_ADDRESSES_LOCK = threading.Lock()
+
+
+def watch_addresses(chain_code: str, addresses: Iterable[str]):
+    """
+    Watch addresses on the block scanner, the addresses with sync cursors are always watched
+    """
+    with _WATCHED_ADDRESSES_LOCK:
+        _WATCHED_ADDRESSES[chain_code].update(addresses)
+
+
+def unwatch_addresses(chain_code: str, addresses: Iterable[str]):
+    with _WATCHED_ADDRESSES_LOCK:
+        _WATCHED_ADDRESSES[chain_code].difference_update(addresses)
+
+
+def _get_watched_addresses(chain_code: str) -> Set[str]:
+    with _WATCHED_ADDRESSES_LOCK:
+        addresses = set(_WATCHED_ADDRESSES[chain_code])
+
+    addresses.update(daos.query_sync_cursor_addresses(chain_code))
+    return addresses
+
+
+def expire_unwatched_cursors(ttl: int = UNWATCHED_CURSOR_TTL) -> int:
+    """
+    Delete the sync cursors not read within ttl seconds, unless the addresses are watched,
+    so that the one-off lookups of the foreign addresses are not synced in the background forever.
+    The synced actions are kept, and the cursor is created again on the next read.
+    """
+    read_before = datetime.datetime.now() - datetime.timedelta(seconds=ttl)
+    cursors = daos.query_unread_sync_cursors(read_before)
+    with _WATCHED_ADDRESSES_LOCK:
+        expired_ids = [i.id for i in cursors if i.address not in _WATCHED_ADDRESSES.get(i.chain_code, ())]
+
+    return daos.delete_sync_cursors_by_ids(expired_ids) if expired_ids else 0
 
-    return expand_count
+
+@timing_logger("transaction_manager.scan_blocks")
+def scan_blocks(chain_code: str, max_blocks: int = None, reorg_depth: int = None) -> dict:
+    """
+    Scan the new blocks since the last scanned one, and save the actions of the watched addresses.
+    Start from the best block if never scanned, the history before is left to sync_actions_by_address.
+    """
+    config = settings.BLOCK_SCANNER
+    max_blocks = max_blocks or config.get("max_blocks_per_round", 20)
+    reorg_depth = reorg_depth or config.get("reorg_depth", 12)
+
+    with timeout_lock(f"transaction_manager.scan_blocks:{chain_code}", timeout=0) as acquired:
+        if not acquired:
+            return {}
+
+        client = provider_manager.get_client_by_chain(chain_code, instance_required=provider_interfaces.BlockScanMixin)
+        best_block_number = client.get_info().best_block_number
+        last_block = daos.get_last_scanned_block(chain_code)
+        start_block_number = last_block.block_number + 1 if last_block else best_block_number
+        receipt = {"scanned": 0, "expanded": 0, "reorg": None, "best_block_number": best_block_number}
+
+        if start_block_number <= best_block_number:
+            block_numbers = list(
+                range(start_block_number, min(best_block_number, start_block_number + max_blocks - 1) + 1)
+            )
+            addresses = _get_watched_addresses(chain_code)
+            token_addresses = {i.token_address for i in coin_manager.get_coins_by_chain(chain_code) if i.token_address}
+            blocks = client.scan_blocks(block_numbers, addresses, token_addresses)
+            action_factory = _get_action_factory(chain_code)
+            parent_hash = last_block.block_hash if last_block else None
+
+            for block in blocks:
+                if parent_hash is not None and block.parent_hash != parent_hash:
+                    receipt["reorg"] = _rollback_reorg(client, chain_code, reorg_depth)
+                    break
+
+                transactions = (i for i in block.transactions if i.status in TX_TO_ACTION_STATUS_DIRECT_MAPPING)
+                actions = [
+                    i
+                    for i in action_factory(chain_code, transactions)
+                    if i.from_address in addresses or i.to_address in addresses
+                ]
+                with db.atomic():
+                    receipt["expanded"] += _save_synced_actions(chain_code, actions, block.transactions)
+                    daos.create_scanned_block(chain_code, block.header.block_number, block.header.block_hash)
+
+                parent_hash = block.header.block_hash
+                receipt["scanned"] += 1
+
+        last_block = daos.get_last_scanned_block(chain_code)
+        if last_block is not None:
+            daos.delete_scanned_blocks(chain_code, before_block_number=last_block.block_number - reorg_depth)
+
+        receipt["lag"] = best_block_number - last_block.block_number if last_block else None
+        return receipt
+
+
+def _rollback_reorg(client: provider_interfaces.BlockScanMixin, chain_code: str, reorg_depth: int) -> dict:
+    scanned_blocks = daos.query_scanned_blocks(chain_code, limit=reorg_depth)
+    canonical_blocks = client.scan_blocks(sorted(i.block_number for i in scanned_blocks))
+    canonical_hashes = {i.header.block_number: i.header.block_hash for i in canonical_blocks}
+    ancestor = next((i for i in scanned_blocks if canonical_hashes.get(i.block_number) == i.block_hash), None)
+
+    if ancestor is not None:
+        ancestor_block_number = ancestor.block_number
+    else:
+        ancestor_block_number = scanned_blocks[-1].block_number - 1
+        logger.warning(
+            f"Reorg is deeper than the reorg_depth, scanning restarts from the best block. "
+            f"chain_code: {chain_code}, reorg_depth: {reorg_depth}"
+        )
+
+    with db.atomic():
+        reverted = daos.revert_confirmed_actions(chain_code, ancestor_block_number)
+        daos.delete_scanned_blocks(chain_code, after_block_number=ancestor_block_number)
+
+    logger.warning(
+        f"Reorg detected. chain_code: {chain_code}, ancestor_block_number: {ancestor_block_number}, "
+        f"reverted_actions: {reverted}"
+    )
+    return {"ancestor_block_number": ancestor_block_number, "reverted": reverted}
+
+
+@timing_logger("transaction_manager.sync_token_transfers_by_logs")
+def sync_token_transfers_by_logs(
+    chain_code: str,
+    from_block_number: int,
+    to_block_number: int = None,
+    addresses: List[str] = None,
+) -> int:
+    """
+    Sync the token transfers of many addresses at once by the logs of the node, no explorer required.
+    :param addresses: the watched addresses by default
+    """
+    action_factory = _get_action_factory(chain_code)
+    addresses = set(addresses) if addresses is not None else _get_watched_addresses(chain_code)
+    token_addresses = [i.token_address for i in coin_manager.get_coins_by_chain(chain_code) if i.token_address]
+    if not action_factory or not addresses or not token_addresses:
+        return 0
+
+    if to_block_number is None:
+        to_block_number = provider_manager.get_client_by_chain(chain_code).get_info().best_block_number
+
+    transactions = provider_manager.search_token_transfers(
+        chain_code, list(addresses), from_block_number, to_block_number, token_addresses=token_addresses
+    )
+    transactions = [i for i in transactions if i.status in TX_TO_ACTION_STATUS_DIRECT_MAPPING]
+    actions = [
+        i for i in action_factory(chain_code, transactions) if i.from_address in addresses or i.to_address in addresses
+    ]
+    return _save_synced_actions(chain_code, actions, transactions)
+
+
+def scan_blocks_of_configured_chains() -> dict:
+    receipts = {}
+    for chain_code in settings.BLOCK_SCANNER.get("chains") or ():
+        try:
+            receipts[chain_code] = scan_blocks(chain_code)
+        except Exception as e:
+            logger.exception(f"Error in scanning blocks. chain_code: {chain_code}, error: {repr(e)}")
+            receipts[chain_code] = {"error": repr(e)}
+
+    return receipts
 
 
 def _on_transaction_confirmed(
@@ -366,13 +1139,13 @@ def _on_transaction_confirmed(
     block_number: int,
     block_hash: str,
     block_time: int,
-    archived_id: int = None,
 ):
     require(status in (TxActionStatus.CONFIRM_SUCCESS, TxActionStatus.CONFIRM_REVERTED))
     logger.info(
         f"Transaction confirmed. chain_code: {chain_code}, txid: {txid}, status: {status}, block_number: {block_number}"
     )
 
+    actions = daos.query_actions_by_txid(chain_code, txid, index=0)
     daos.on_transaction_confirmed(
         chain_code=chain_code,
         txid=txid,
@@ -381,18 +1154,23 @@ def _on_transaction_confirmed(
         block_hash=block_hash,
         block_number=block_number,
         block_time=block_time,
-        archived_id=archived_id,
     )
 
     chain_info = coin_manager.get_chain_info(chain_code)
 
     if chain_info.chain_model == coin_data.ChainModel.UTXO:
         utxo_manager.mark_utxos_spent_by_txid(chain_code, txid)
+        utxo_manager.mark_utxos_confirmed_by_txid(chain_code, txid)
+
+    # The superseded tx is mined after all, so the replacement of it is the one dropped
+    replacement_txid = actions[0].replaced_by if actions else None
+    if replacement_txid:
+        daos.mark_actions_replaced(chain_code, (replacement_txid,), txid)
+        _evict_unconfirmed_utxos(chain_code, replacement_txid)
 
     if chain_info.nonce_supported is not True:
         return
 
-    actions = daos.query_actions_by_txid(chain_code, txid, index=0)
     main_action = actions[0] if actions and actions[0].nonce >= 0 else None
     if not main_action:
         return
@@ -401,8 +1179,33 @@ def _on_transaction_confirmed(
     replaced_action_txids = {
         i.txid for i in same_nonce_actions if i.txid != txid and i.status == TxActionStatus.PENDING
     }
-    for txid in replaced_action_txids:
-        daos.update_actions_status(chain_code, txid, TxActionStatus.REPLACED)
+    if replaced_action_txids:
+        daos.mark_actions_replaced(chain_code, replaced_action_txids, txid)
+
+
+def query_raw_txs(chain_code: str, txids: Iterable[str]) -> Dict[str, str]:
+    """
+    The raw txs are stored apart from the actions, load them only if needed
+    """
+    return daos.query_raw_txs(chain_code, txids)
+
+
+def get_raw_tx(chain_code: str, txid: str) -> Optional[str]:
+    return query_raw_txs(chain_code, [txid]).get(txid)
+
+
+@timing_logger("transaction_manager.archive_raw_txs")
+def archive_raw_txs(min_age_days: int = None, limit: int = 1000) -> int:
+    """
+    Move the raw txs of the old confirmed actions to the archive file, do nothing if no archive file configured
+    """
+    if daos.get_archive_database() is None:
+        return 0
+
+    min_age_days = settings.RAW_TX_ARCHIVE["min_age_days"] if min_age_days is None else min_age_days
+    confirmed_before = datetime.datetime.now() - datetime.timedelta(days=min_age_days)
+    raw_txs = daos.query_archivable_raw_txs(confirmed_before, limit)
+    return daos.archive_raw_txs(raw_txs) if raw_txs else 0
 
 
 def delete_actions_by_addresses(chain_code: str, addresses: List[str]) -> int:
@@ -412,3 +1215,9 @@ def delete_actions_by_addresses(chain_code: str, addresses: List[str]) -> int:
 @timing_logger("transaction_manager.on_ticker_signal")
 def on_ticker_signal():
     update_pending_actions()
+    return {
+        "pending": get_pending_tracker_metrics(),
+        "scan": scan_blocks_of_configured_chains(),
+        "sync": sync_stale_cursors(),
+        "archive": archive_raw_txs(),
+    }
@@ -0,0 +1,21 @@
+import peewee
+
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+
+
+def update(db, migrator, migrate):
+    class AddressSyncCursor(BaseModel):
+        id = peewee.IntegerField(primary_key=True)
+        chain_code = peewee.CharField()
+        address = peewee.CharField()
+        last_block_number = peewee.IntegerField(null=True)
+        last_txid = peewee.CharField(null=True)
+        page_token = peewee.CharField(null=True)
+        synced_time = peewee.DateTimeField(null=True)
+        created_time = AutoDateTimeField()
+        modified_time = AutoDateTimeField()
+
+        class Meta:
+            indexes = ((("chain_code", "address"), True),)
+
+    db.create_tables((AddressSyncCursor,))
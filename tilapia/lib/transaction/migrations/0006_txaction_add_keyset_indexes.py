@@ -0,0 +1,5 @@
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_index("txaction", ("chain_code", "coin_code", "from_address", "created_time"), False),
+        migrator.add_index("txaction", ("chain_code", "coin_code", "to_address", "created_time"), False),
+    )
@@ -0,0 +1,17 @@
+import peewee
+
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+
+
+def update(db, migrator, migrate):
+    class ScannedBlock(BaseModel):
+        id = peewee.IntegerField(primary_key=True)
+        chain_code = peewee.CharField()
+        block_number = peewee.IntegerField()
+        block_hash = peewee.CharField()
+        created_time = AutoDateTimeField()
+
+        class Meta:
+            indexes = ((("chain_code", "block_number"), True),)
+
+    db.create_tables((ScannedBlock,))
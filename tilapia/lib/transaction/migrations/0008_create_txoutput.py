@@ -0,0 +1,19 @@
+import peewee
+
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+
+
+def update(db, migrator, migrate):
+    class TxOutput(BaseModel):
+        id = peewee.IntegerField(primary_key=True)
+        chain_code = peewee.CharField()
+        txid = peewee.CharField()
+        vout = peewee.IntegerField()
+        address = peewee.CharField()
+        value = peewee.DecimalField(max_digits=32, decimal_places=0)
+        created_time = AutoDateTimeField()
+
+        class Meta:
+            indexes = ((("chain_code", "txid", "vout"), True),)
+
+    db.create_tables((TxOutput,))
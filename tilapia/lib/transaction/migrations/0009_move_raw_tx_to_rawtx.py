@@ -0,0 +1,32 @@
+import peewee
+
+from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
+from tilapia.lib.transaction import codec
+
+
+def update(db, migrator, migrate):
+    class RawTx(BaseModel):
+        id = peewee.IntegerField(primary_key=True)
+        chain_code = peewee.CharField()
+        txid = peewee.CharField()
+        codec = peewee.IntegerField()
+        payload = peewee.BlobField()
+        created_time = AutoDateTimeField()
+
+        class Meta:
+            indexes = ((("chain_code", "txid"), True),)
+
+    db.create_tables((RawTx,))
+
+    # Actions of the same txid share the same raw tx
+    cursor = db.execute_sql(
+        "SELECT chain_code, txid, MAX(raw_tx) FROM txaction WHERE raw_tx != '' GROUP BY chain_code, txid"
+    )
+    rows = (
+        dict(zip(("chain_code", "txid", "codec", "payload"), (chain_code, txid, *codec.encode_raw_tx(raw_tx))))
+        for chain_code, txid, raw_tx in cursor
+    )
+    for batch in peewee.chunked(rows, 100):
+        RawTx.insert_many(batch).on_conflict_ignore().execute()
+
+    migrate(migrator.drop_column("txaction", "raw_tx"))
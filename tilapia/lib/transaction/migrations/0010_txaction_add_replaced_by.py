@@ -0,0 +1,7 @@
+import peewee
+
+
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_column("txaction", "replaced_by", peewee.CharField(null=True)),
+    )
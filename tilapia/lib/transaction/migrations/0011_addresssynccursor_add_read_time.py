@@ -0,0 +1,9 @@
+import peewee
+
+
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_column("addresssynccursor", "read_time", peewee.DateTimeField(null=True)),
+    )
+    # The existing cursors start expiring since they were created
+    db.execute_sql("UPDATE addresssynccursor SET read_time = created_time")
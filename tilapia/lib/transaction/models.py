@@ -1,7 +1,9 @@
 import peewee
 
 from tilapia.lib.basic.orm.models import AutoDateTimeField, BaseModel
-from tilapia.lib.transaction.data import TxActionStatus
+from tilapia.lib.transaction.data import RawTxCodec, TxActionStatus
+
+archive_database = peewee.DatabaseProxy()  # Initialized on demand, see daos.get_archive_database
 
 
 class TxAction(BaseModel):
@@ -16,13 +18,13 @@ class TxAction(BaseModel):
     fee_limit = peewee.DecimalField(max_digits=32, decimal_places=0)
     fee_used = peewee.DecimalField(max_digits=32, decimal_places=0, default=0)
     fee_price_per_unit = peewee.DecimalField(max_digits=32, decimal_places=0, default=1)
-    raw_tx = peewee.TextField()
     block_number = peewee.IntegerField(null=True)
     block_hash = peewee.CharField(null=True)
     block_time = peewee.IntegerField(null=True)
     index = peewee.IntegerField(default=0, help_text="action index of the transaction")
     nonce = peewee.IntegerField(default=-1, help_text="a special field of the nonce model, likes eth")
     archived_id = peewee.IntegerField(null=True)
+    replaced_by = peewee.CharField(null=True, help_text="txid of the tx replacing this one, likes RBF on btc")
     created_time = AutoDateTimeField()
     modified_time = AutoDateTimeField()
 
@@ -34,4 +36,82 @@ class TxAction(BaseModel):
         )
 
     class Meta:
-        indexes = ((("txid", "coin_code", "index"), True),)
+        indexes = (
+            (("txid", "coin_code", "index"), True),
+            (("chain_code", "coin_code", "from_address", "created_time"), False),
+            (("chain_code", "coin_code", "to_address", "created_time"), False),
+        )
+
+
+class AddressSyncCursor(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    chain_code = peewee.CharField()
+    address = peewee.CharField()
+    last_block_number = peewee.IntegerField(null=True, help_text="the highest block number fully synced")
+    last_txid = peewee.CharField(null=True, help_text="the latest txid seen at last_block_number")
+    page_token = peewee.CharField(null=True, help_text="continuation of an unfinished sync round")
+    synced_time = peewee.DateTimeField(null=True)
+    read_time = peewee.DateTimeField(null=True, help_text="the last time the history was read by the address")
+    created_time = AutoDateTimeField()
+    modified_time = AutoDateTimeField()
+
+    def __str__(self):
+        return (
+            f"id: {self.id}, chain_code: {self.chain_code}, address: {self.address}, "
+            f"last_block_number: {self.last_block_number}, page_token: {self.page_token}, "
+            f"synced_time: {self.synced_time}"
+        )
+
+    class Meta:
+        indexes = ((("chain_code", "address"), True),)
+
+
+class ScannedBlock(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    chain_code = peewee.CharField()
+    block_number = peewee.IntegerField()
+    block_hash = peewee.CharField()
+    created_time = AutoDateTimeField()
+
+    def __str__(self):
+        return f"id: {self.id}, chain_code: {self.chain_code}, block_number: {self.block_number}, block_hash: {self.block_hash}"
+
+    class Meta:
+        indexes = ((("chain_code", "block_number"), True),)
+
+
+class TxOutput(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    chain_code = peewee.CharField()
+    txid = peewee.CharField()
+    vout = peewee.IntegerField()
+    address = peewee.CharField(help_text="empty if the output is not standard, likes OP_RETURN")
+    value = peewee.DecimalField(max_digits=32, decimal_places=0)
+    created_time = AutoDateTimeField()
+
+    def __str__(self):
+        return f"id: {self.id}, chain_code: {self.chain_code}, txid: {self.txid}, vout: {self.vout}, address: {self.address}, value: {self.value}"
+
+    class Meta:
+        indexes = ((("chain_code", "txid", "vout"), True),)
+
+
+class RawTx(BaseModel):
+    id = peewee.IntegerField(primary_key=True)
+    chain_code = peewee.CharField()
+    txid = peewee.CharField()
+    codec = peewee.IntegerField(choices=RawTxCodec.to_choices())
+    payload = peewee.BlobField(help_text="compressed by zlib")
+    created_time = AutoDateTimeField()
+
+    def __str__(self):
+        return f"id: {self.id}, chain_code: {self.chain_code}, txid: {self.txid}, codec: {self.codec}"
+
+    class Meta:
+        indexes = ((("chain_code", "txid"), True),)
+
+
+class ArchivedRawTx(RawTx):
+    class Meta:
+        database = archive_database
+        table_name = "rawtx"
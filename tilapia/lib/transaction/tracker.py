@@ -0,0 +1,81 @@
+import collections
+import math
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+AGE_BUCKETS = ((60, "1m"), (600, "10m"), (3600, "1h"), (86400, "1d"))  # in seconds
+
+
+class PendingTxTracker(object):
+    """
+    Decide which pending txs are due to recheck.
+    The recheck interval doubles as the tx gets older, from base_interval up to max_interval.
+    """
+
+    def __init__(self, base_interval: int = 15, max_interval: int = 1800):
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+
+        self._lock = threading.Lock()
+        self._last_checked_at: Dict[Tuple[str, str], float] = {}
+        self._metrics = {}
+
+    def recheck_interval(self, age: float) -> float:
+        if age <= self.base_interval:
+            return self.base_interval
+
+        return min(self.max_interval, self.base_interval * 2 ** int(math.log2(age / self.base_interval)))
+
+    def pick_due(self, pending_txs: Dict[Tuple[str, str], float], now: float) -> List[Tuple[str, str]]:
+        """
+        :param pending_txs: created time of (chain_code, txid)
+        :param now: timestamp
+        :return: list of (chain_code, txid) to be checked now
+        """
+        due = []
+        histogram = collections.OrderedDict((f"<{label}", 0) for _, label in AGE_BUCKETS)
+        histogram[f">={AGE_BUCKETS[-1][1]}"] = 0
+        chains = collections.defaultdict(lambda: {"pending": 0, "due": 0, "lag": 0})
+
+        with self._lock:
+            for key, created_at in pending_txs.items():
+                age = max(now - created_at, 0)
+                last_checked_at = self._last_checked_at.get(key)
+                is_due = last_checked_at is None or now - last_checked_at >= self.recheck_interval(age)
+                is_due and due.append(key)
+
+                histogram[_age_bucket(age)] += 1
+                chain = chains[key[0]]
+                chain["pending"] += 1
+                chain["due"] += int(is_due)
+                chain["lag"] = max(chain["lag"], int(now - (last_checked_at or created_at)))
+
+            self._metrics = {
+                "queue_size": len(pending_txs),
+                "due": len(due),
+                "age_histogram": dict(histogram),
+                "chains": dict(chains),
+            }
+
+        return due
+
+    def mark_checked(self, keys: Iterable[Tuple[str, str]], now: float):
+        with self._lock:
+            self._last_checked_at.update((key, now) for key in keys)
+
+    def retain(self, keys: Iterable[Tuple[str, str]]):
+        keys = set(keys)
+        with self._lock:
+            self._last_checked_at = {k: v for k, v in self._last_checked_at.items() if k in keys}
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self._metrics)
+
+
+def _age_bucket(age: float) -> str:
+    for upper, label in AGE_BUCKETS:
+        if age < upper:
+            return f"<{label}"
+
+    return f">={AGE_BUCKETS[-1][1]}"
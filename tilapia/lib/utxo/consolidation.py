@@ -0,0 +1,121 @@
+"""
+Consolidation merges the small utxos into one while the fee is low,
+then the later sendings spend one input instead of many at the peak fee.
+Likes utxo.selection, the planning works on the plain lists of values and vsizes.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from tilapia.lib.provider.chains.btc.sdk import transaction as btc_transaction
+
+# Far below the standardness limit of bitcoin core (400000 weight units), then a batch is still quick to sign on hardware
+MAX_TX_VSIZE = 10000
+
+
+@dataclass
+class ConsolidationParams(object):
+    fee_rate: int  # per vbyte, paid by the consolidation now
+    long_term_fee_rate: int  # the fee rate expected to spend the utxos in the future
+    not_input_vsize: int  # header and the single output, excluding the inputs
+    output_spend_vsize: int  # vsize to spend the consolidated output as an input in the future
+    max_tx_vsize: int = MAX_TX_VSIZE
+    max_fee: Optional[int] = None  # ceiling of the fee of each batch
+    min_output: int = 0  # likes dust_threshold
+    min_inputs: int = 2
+
+    @classmethod
+    def for_btc(
+        cls,
+        encoding: str,
+        fee_rate: int,
+        long_term_fee_rate: int,
+        max_tx_vsize: int = MAX_TX_VSIZE,
+        max_fee: int = None,
+        min_output: int = 0,
+    ) -> "ConsolidationParams":
+        input_vsize = btc_transaction.INPUT_VSIZE_LOOKUP[encoding]
+        tx_vsize = btc_transaction.calculate_vsize([encoding], [encoding])
+
+        return cls(
+            fee_rate=fee_rate,
+            long_term_fee_rate=long_term_fee_rate,
+            not_input_vsize=tx_vsize - input_vsize,
+            output_spend_vsize=input_vsize,
+            max_tx_vsize=max_tx_vsize,
+            max_fee=max_fee,
+            min_output=min_output,
+        )
+
+
+@dataclass
+class ConsolidationBatch(object):
+    indexes: List[int]  # of the utxos passed in
+    input_value: int
+    vsize: int
+    fee: int
+    output_value: int
+    saving: int  # the future fee saved minus the fee paid now, negative if not worth it
+
+
+def plan_batches(
+    values: Sequence[int],
+    input_vsizes: Sequence[int],
+    params: ConsolidationParams,
+    max_batches: int = None,
+) -> List[ConsolidationBatch]:
+    """
+    Pack the utxos into batches from the smallest, each batch is bounded by max_tx_vsize and max_fee.
+    The utxos costing more to spend now than they are worth are left alone,
+    so are the batches saving nothing at the long-term fee rate.
+    """
+    if params.fee_rate >= params.long_term_fee_rate:
+        return []
+
+    candidates = sorted(
+        (i for i, value in enumerate(values) if value > input_vsizes[i] * params.fee_rate),
+        key=lambda i: values[i],
+    )
+
+    batches = []
+    indexes, inputs_vsize = [], 0
+
+    def _close():
+        batch = _build_batch(values, indexes, inputs_vsize, params)
+        if len(indexes) >= params.min_inputs and batch.output_value >= params.min_output and batch.saving > 0:
+            batches.append(batch)
+
+    for i in candidates:
+        if max_batches is not None and len(batches) >= max_batches:
+            break
+
+        vsize = params.not_input_vsize + inputs_vsize + input_vsizes[i]
+        if vsize > params.max_tx_vsize or (params.max_fee is not None and vsize * params.fee_rate > params.max_fee):
+            _close()
+            indexes, inputs_vsize = [], 0
+
+        indexes.append(i)
+        inputs_vsize += input_vsizes[i]
+    else:
+        _close()
+
+    return batches
+
+
+def _build_batch(
+    values: Sequence[int], indexes: List[int], inputs_vsize: int, params: ConsolidationParams
+) -> ConsolidationBatch:
+    input_value = sum(values[i] for i in indexes)
+    vsize = params.not_input_vsize + inputs_vsize
+    fee = vsize * params.fee_rate
+    # Spending all of them later costs inputs_vsize at the long-term fee rate, while spending the merged one costs
+    # output_spend_vsize, plus the fee paid now
+    saving = (inputs_vsize - params.output_spend_vsize) * params.long_term_fee_rate - fee
+
+    return ConsolidationBatch(
+        indexes=list(indexes),
+        input_value=input_value,
+        vsize=vsize,
+        fee=fee,
+        output_value=input_value - fee,
+        saving=saving,
+    )
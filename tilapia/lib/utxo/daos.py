@@ -1,9 +1,9 @@
 import datetime
-import functools
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import peewee
 
+from tilapia.lib.basic.orm import bulk, lookup
 from tilapia.lib.utxo import data, models
 
 
@@ -15,6 +15,7 @@ def new_utxo(
     vout: int,
     status: data.UTXOStatus,
     value: int,
+    unconfirmed_depth: int = 0,
 ) -> models.UTXO:
     return models.UTXO(
         chain_code=chain_code,
@@ -24,11 +25,24 @@ def new_utxo(
         vout=vout,
         status=status,
         value=value,
+        unconfirmed_depth=unconfirmed_depth,
     )
 
 
-def bulk_create_utxos(utxos: List[models.UTXO]):
-    return models.UTXO.bulk_create(utxos, batch_size=10)
+def bulk_create_utxos(utxos: List[models.UTXO], ignore_conflicts: bool = False):
+    return bulk.bulk_insert(models.UTXO, utxos, ignore_conflicts=ignore_conflicts)
+
+
+def bulk_create_or_revive_utxos(utxos: List[models.UTXO]):
+    """
+    Insert the utxos, the existing ones of the same (coin_code, address, txid, vout) take the status
+    and the unconfirmed depth of the inserting
+    """
+    return bulk.bulk_insert(
+        models.UTXO,
+        utxos,
+        preserve=[models.UTXO.status, models.UTXO.unconfirmed_depth, models.UTXO.modified_time],
+    )
 
 
 def list_utxos_by_conditions(
@@ -40,6 +54,8 @@ def list_utxos_by_conditions(
     value_desc: bool = True,
     exclude_ids: List[int] = None,
     limit: int = None,
+    exclude_reserved: bool = False,
+    max_unconfirmed_depth: int = None,
 ) -> List[models.UTXO]:
     return list(
         _select_utxos_by_conditions(
@@ -51,6 +67,8 @@ def list_utxos_by_conditions(
             value_desc=value_desc,
             exclude_ids=exclude_ids,
             limit=limit,
+            exclude_reserved=exclude_reserved,
+            max_unconfirmed_depth=max_unconfirmed_depth,
         )
     )
 
@@ -64,6 +82,8 @@ def sum_of_utxos_by_conditions(
     value_desc: bool = True,
     exclude_ids: List[int] = None,
     limit: int = None,
+    exclude_reserved: bool = False,
+    max_unconfirmed_depth: int = None,
 ) -> int:
     sub_query = _select_utxos_by_conditions(
         coin_code=coin_code,
@@ -74,11 +94,23 @@ def sum_of_utxos_by_conditions(
         value_desc=value_desc,
         exclude_ids=exclude_ids,
         limit=limit,
+        exclude_reserved=exclude_reserved,
+        max_unconfirmed_depth=max_unconfirmed_depth,
     ).select(models.UTXO.value)
     sum_of_query = sub_query.select_from(peewee.fn.SUM(sub_query.c.value)).scalar()
     return sum_of_query or 0
 
 
+def list_unspent_utxos_by_addresses(coin_code: str, addresses: List[str]) -> List[models.UTXO]:
+    return list(
+        models.UTXO.select().where(
+            models.UTXO.coin_code == coin_code,
+            models.UTXO.address.in_(addresses),
+            models.UTXO.status != data.UTXOStatus.SPENT,
+        )
+    )
+
+
 def _select_utxos_by_conditions(
     coin_code: str,
     addresses: List[str],
@@ -88,6 +120,8 @@ def _select_utxos_by_conditions(
     value_desc: bool = True,
     exclude_ids: List[int] = None,
     limit: int = None,
+    exclude_reserved: bool = False,
+    max_unconfirmed_depth: int = None,
 ) -> peewee.ModelSelect:
     expressions = [models.UTXO.coin_code == coin_code, models.UTXO.address.in_(addresses)]
 
@@ -95,6 +129,8 @@ def _select_utxos_by_conditions(
     min_value is None or expressions.append(models.UTXO.value >= int(min_value))
     max_value is None or expressions.append(models.UTXO.value < int(max_value))
     exclude_ids is None or expressions.append(models.UTXO.id.not_in(exclude_ids))
+    exclude_reserved and expressions.append(_is_unreserved(datetime.datetime.now()))
+    max_unconfirmed_depth is None or expressions.append(models.UTXO.unconfirmed_depth <= max_unconfirmed_depth)
 
     return (
         models.UTXO.select()
@@ -104,25 +140,50 @@ def _select_utxos_by_conditions(
     )
 
 
-def query_utxos_by_ids(utxo_ids: List[int]) -> List[models.UTXO]:
-    return list(models.UTXO.select().where(models.UTXO.id.in_(utxo_ids)))
+def _is_unreserved(now: datetime.datetime, owner: str = None) -> peewee.Expression:
+    expression = models.UTXO.reserved_until.is_null() | (models.UTXO.reserved_until < now)
+    return expression if owner is None else expression | (models.UTXO.reserved_by == owner)
+
+
+def reserve_utxos(utxo_ids: List[int], owner: str, reserved_until: datetime.datetime) -> int:
+    """
+    Compare and set in one statement, only the spendable ones not reserved by the others are taken
+    :return: count of the utxos reserved
+    """
+    now = datetime.datetime.now()
+    return (
+        models.UTXO.update(reserved_by=owner, reserved_until=reserved_until, modified_time=now)
+        .where(
+            models.UTXO.id.in_(utxo_ids),
+            models.UTXO.status == data.UTXOStatus.SPENDABLE,
+            _is_unreserved(now, owner=owner),
+        )
+        .execute()
+    )
+
+
+def release_utxos(owner: str, utxo_ids: List[int] = None) -> int:
+    expressions = [models.UTXO.reserved_by == owner]
+    utxo_ids is None or expressions.append(models.UTXO.id.in_(utxo_ids))
+    return (
+        models.UTXO.update(reserved_by=None, reserved_until=None, modified_time=datetime.datetime.now())
+        .where(*expressions)
+        .execute()
+    )
 
 
-def query_utxo_ids_by_txid_vout_tuples(chain_code: str, txid_vout_tuples: List[Tuple[str, int]]) -> List[models.UTXO]:
-    res = []
+def query_utxo_ids_by_reservation_owner(owner: str) -> List[int]:
+    query = models.UTXO.select(models.UTXO.id).where(models.UTXO.reserved_by == owner).tuples()
+    return [i[0] for i in query]
 
-    for batch in peewee.chunked(txid_vout_tuples, 10):
-        expression = [
-            models.UTXO.chain_code == chain_code,
-            functools.reduce(
-                lambda a, b: a | b, ((models.UTXO.txid == txid) & (models.UTXO.vout == vout) for txid, vout in batch)
-            ),
-        ]
 
-        query = models.UTXO.select(models.UTXO.id).where(*expression).tuples()
-        res.extend(i[0] for i in query)
+def query_utxos_by_ids(utxo_ids: List[int]) -> List[models.UTXO]:
+    return list(lookup.select_by_keys(models.UTXO.select(), [models.UTXO.id], utxo_ids))
 
-    return res
+
+def query_utxo_ids_by_txid_vout_tuples(chain_code: str, txid_vout_tuples: List[Tuple[str, int]]) -> List[int]:
+    query = models.UTXO.select(models.UTXO.id).where(models.UTXO.chain_code == chain_code).tuples()
+    return [i[0] for i in lookup.select_by_keys(query, [models.UTXO.txid, models.UTXO.vout], txid_vout_tuples)]
 
 
 def query_utxo_ids_by_addresses(chain_code: str, addresses: List[str]) -> List[int]:
@@ -135,16 +196,49 @@ def query_utxo_ids_by_addresses(chain_code: str, addresses: List[str]) -> List[i
 
 
 def delete_utxos_by_ids(chain_code: str, utxo_ids: List[int]):
-    for batch in peewee.chunked(utxo_ids, 10):
-        models.UTXO.delete().where(models.UTXO.chain_code == chain_code, models.UTXO.id.in_(batch)).execute()
+    query = models.UTXO.delete().where(models.UTXO.chain_code == chain_code)
+    lookup.execute_by_keys(query, [models.UTXO.id], utxo_ids)
 
 
-def update_utxos_status(utxo_ids: List[int], status: data.UTXOStatus) -> int:
-    return (
-        models.UTXO.update(status=status, modified_time=datetime.datetime.now())
-        .where(models.UTXO.id.in_(utxo_ids))
-        .execute()
+def query_spent_utxo_ids(modified_before: datetime.datetime, after_id: int, limit: int) -> List[int]:
+    """
+    Walk by the primary key from after_id, then the whole table is scanned once over all the calls
+    """
+    query = (
+        models.UTXO.select(models.UTXO.id)
+        .where(
+            models.UTXO.id > after_id,
+            models.UTXO.status == data.UTXOStatus.SPENT,
+            models.UTXO.modified_time < modified_before,
+        )
+        .order_by(models.UTXO.id.asc())
+        .limit(limit)
+        .tuples()
     )
+    return [i[0] for i in query]
+
+
+def delete_spent_utxos_by_ids(utxo_ids: List[int], modified_before: datetime.datetime) -> int:
+    # Checked again, the ones revived in the meantime are kept
+    query = models.UTXO.delete().where(
+        models.UTXO.status == data.UTXOStatus.SPENT, models.UTXO.modified_time < modified_before
+    )
+    return lookup.execute_by_keys(query, [models.UTXO.id], utxo_ids)
+
+
+def update_utxos_status(utxo_ids: List[int], status: data.UTXOStatus) -> int:
+    query = models.UTXO.update(status=status, modified_time=datetime.datetime.now())
+    return lookup.execute_by_keys(query, [models.UTXO.id], utxo_ids)
+
+
+def query_unconfirmed_utxos_by_txids(chain_code: str, txids: List[str]) -> List[models.UTXO]:
+    query = models.UTXO.select().where(models.UTXO.chain_code == chain_code, models.UTXO.unconfirmed_depth > 0)
+    return list(lookup.select_by_keys(query, [models.UTXO.txid], txids))
+
+
+def update_utxos_unconfirmed_depth(utxo_ids: List[int], unconfirmed_depth: int) -> int:
+    query = models.UTXO.update(unconfirmed_depth=unconfirmed_depth, modified_time=datetime.datetime.now())
+    return lookup.execute_by_keys(query, [models.UTXO.id], utxo_ids)
 
 
 def bulk_update_utxos_status(utxos: List[models.UTXO]) -> int:
@@ -152,7 +246,7 @@ def bulk_update_utxos_status(utxos: List[models.UTXO]) -> int:
     for i in utxos:
         i.modified_time = now
 
-    return models.UTXO.bulk_update(utxos, [models.UTXO.status, models.UTXO.modified_time], batch_size=10)
+    return bulk.bulk_update(models.UTXO, utxos, [models.UTXO.status, models.UTXO.modified_time]).rows
 
 
 def new_who_spent(chain_code: str, txid: str, utxo_id: int) -> models.WhoSpent:
@@ -160,15 +254,21 @@ def new_who_spent(chain_code: str, txid: str, utxo_id: int) -> models.WhoSpent:
 
 
 def bulk_create_who_spent(who_spent: List[models.WhoSpent]):
-    return models.WhoSpent.bulk_create(who_spent, batch_size=10)
+    return bulk.bulk_insert(models.WhoSpent, who_spent)
 
 
 def query_who_spent_by_txid(chain_code: str, txid: str) -> List[models.WhoSpent]:
     return list(models.WhoSpent.select().where(models.WhoSpent.chain_code == chain_code, models.WhoSpent.txid == txid))
 
 
-def delete_who_spent_by_utxo_ids(chain_code: str, utxo_ids: List[int]):
-    for batch in peewee.chunked(utxo_ids, 10):
-        models.WhoSpent.delete().where(
-            models.WhoSpent.chain_code == chain_code, models.WhoSpent.utxo_id.in_(batch)
-        ).execute()
+def query_who_spent_by_utxo_ids(chain_code: str, utxo_ids: List[int]) -> List[models.WhoSpent]:
+    query = models.WhoSpent.select().where(models.WhoSpent.chain_code == chain_code)
+    return list(lookup.select_by_keys(query, [models.WhoSpent.utxo_id], utxo_ids))
+
+
+def delete_who_spent_by_utxo_ids(chain_code: Optional[str], utxo_ids: List[int]) -> int:
+    query = models.WhoSpent.delete()
+    if chain_code is not None:
+        query = query.where(models.WhoSpent.chain_code == chain_code)
+
+    return lookup.execute_by_keys(query, [models.WhoSpent.utxo_id], utxo_ids)
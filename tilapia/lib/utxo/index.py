@@ -0,0 +1,279 @@
+import bisect
+import collections
+import datetime
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tilapia.lib.utxo import daos, data, models
+
+# Bound how long the writes bypassing utxo.manager (likes from the other processes) stay invisible
+INDEX_TTL = 60  # in seconds
+
+
+class _Partitions(object):
+    """
+    The unspent utxos of one address, partitioned by status
+    """
+
+    def __init__(self, utxos: Iterable[models.UTXO], loaded_at: float):
+        self.loaded_at = loaded_at
+        self.utxos: Dict[int, models.UTXO] = {}
+        self.spendable: List[Tuple[int, int]] = []  # (value, id) in ascending order
+        self.chosen: Set[int] = set()  # Chosen by the txs not confirmed yet
+        self.reserved: Set[int] = set()  # Reserved by the sending, maybe expired already
+
+        for utxo in utxos:
+            self.put(utxo)
+
+    def put(self, utxo: models.UTXO):
+        self.remove(utxo.id)
+        if utxo.status == data.UTXOStatus.SPENT:
+            return
+
+        self.utxos[utxo.id] = utxo
+        if utxo.status == data.UTXOStatus.SPENDABLE:
+            bisect.insort(self.spendable, (int(utxo.value), utxo.id))
+        else:
+            self.chosen.add(utxo.id)
+
+        utxo.reserved_by is None or self.reserved.add(utxo.id)
+
+    def remove(self, utxo_id: int) -> Optional[models.UTXO]:
+        utxo = self.utxos.pop(utxo_id, None)
+        if utxo is None:
+            return None
+
+        if utxo.status == data.UTXOStatus.SPENDABLE:
+            del self.spendable[bisect.bisect_left(self.spendable, (int(utxo.value), utxo_id))]
+        self.chosen.discard(utxo_id)
+        self.reserved.discard(utxo_id)
+        return utxo
+
+    def sorted_keys(self, status: data.UTXOStatus, min_value: Optional[int], max_value: Optional[int]) -> List[tuple]:
+        if status == data.UTXOStatus.SPENDABLE:
+            keys = self.spendable
+        else:
+            keys = sorted((int(self.utxos[i].value), i) for i in self.chosen)
+
+        low = 0 if min_value is None else bisect.bisect_left(keys, (int(min_value),))
+        high = len(keys) if max_value is None else bisect.bisect_left(keys, (int(max_value),))
+        return keys[low:high]
+
+
+class UTXOIndex(object):
+    """
+    In-process index of the unspent utxos, serving the same queries as utxo.daos without hitting SQLite.
+    The utxos of each (coin_code, address) are loaded once, then utxo.manager applies its writes
+    after the transactions committed. The ones expired or invalidated are reloaded on the next query.
+    The models returned are shared, read only.
+    """
+
+    def __init__(self, ttl: int = INDEX_TTL):
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._version = 0  # Bumped by every write, then the loading started before is not stored
+        self._partitions: Dict[Tuple[str, str], _Partitions] = {}
+        self._keys: Dict[int, Tuple[str, str]] = {}  # utxo id to (coin_code, address)
+
+    def list_utxos_by_conditions(
+        self,
+        coin_code: str,
+        addresses: List[str],
+        status: data.UTXOStatus = None,
+        min_value: int = None,
+        max_value: int = None,
+        value_desc: bool = True,
+        exclude_ids: List[int] = None,
+        limit: int = None,
+        exclude_reserved: bool = False,
+        max_unconfirmed_depth: int = None,
+    ) -> List[models.UTXO]:
+        if status not in (data.UTXOStatus.SPENDABLE, data.UTXOStatus.CHOSEN):
+            # The spent ones aren't indexed
+            return daos.list_utxos_by_conditions(
+                coin_code,
+                addresses,
+                status,
+                min_value,
+                max_value,
+                value_desc,
+                exclude_ids,
+                limit,
+                exclude_reserved,
+                max_unconfirmed_depth,
+            )
+
+        partitions = self._load(coin_code, addresses)
+        with self._lock:
+            utxos = self._iterate(
+                partitions,
+                status,
+                min_value,
+                max_value,
+                value_desc,
+                exclude_ids,
+                exclude_reserved,
+                max_unconfirmed_depth,
+            )
+            return list(itertools.islice(utxos, limit))
+
+    def sum_of_utxos_by_conditions(
+        self,
+        coin_code: str,
+        addresses: List[str],
+        status: data.UTXOStatus = None,
+        min_value: int = None,
+        max_value: int = None,
+        value_desc: bool = True,
+        exclude_ids: List[int] = None,
+        limit: int = None,
+        exclude_reserved: bool = False,
+        max_unconfirmed_depth: int = None,
+    ) -> int:
+        if status not in (data.UTXOStatus.SPENDABLE, data.UTXOStatus.CHOSEN):
+            return daos.sum_of_utxos_by_conditions(
+                coin_code,
+                addresses,
+                status,
+                min_value,
+                max_value,
+                value_desc,
+                exclude_ids,
+                limit,
+                exclude_reserved,
+                max_unconfirmed_depth,
+            )
+
+        partitions = self._load(coin_code, addresses)
+        with self._lock:
+            utxos = self._iterate(
+                partitions,
+                status,
+                min_value,
+                max_value,
+                value_desc,
+                exclude_ids,
+                exclude_reserved,
+                max_unconfirmed_depth,
+            )
+            return sum(int(i.value) for i in itertools.islice(utxos, limit))
+
+    @staticmethod
+    def _iterate(
+        partitions: List[_Partitions],
+        status: data.UTXOStatus,
+        min_value: Optional[int],
+        max_value: Optional[int],
+        value_desc: bool,
+        exclude_ids: Optional[List[int]],
+        exclude_reserved: bool,
+        max_unconfirmed_depth: Optional[int],
+    ) -> Iterator[models.UTXO]:
+        utxos = {}
+        sorted_keys = []
+        for partition in partitions:
+            utxos.update(partition.utxos)
+            keys = partition.sorted_keys(status, min_value, max_value)
+            sorted_keys.append(reversed(keys) if value_desc else keys)
+
+        exclude_ids = set(exclude_ids or ())
+        reserved = set(itertools.chain.from_iterable(i.reserved for i in partitions)) if exclude_reserved else ()
+        now = datetime.datetime.now()
+
+        for _, utxo_id in heapq.merge(*sorted_keys, reverse=value_desc):
+            if utxo_id in exclude_ids:
+                continue
+
+            utxo = utxos[utxo_id]
+            if max_unconfirmed_depth is not None and utxo.unconfirmed_depth > max_unconfirmed_depth:
+                continue
+
+            if utxo_id in reserved and utxo.reserved_until is not None and utxo.reserved_until >= now:
+                continue
+
+            yield utxo
+
+    def _load(self, coin_code: str, addresses: List[str]) -> List[_Partitions]:
+        now = time.time()
+        with self._lock:
+            partitions = {i: self._partitions.get((coin_code, i)) for i in set(addresses)}
+            missing = [k for k, v in partitions.items() if v is None or now - v.loaded_at > self.ttl]
+            version = self._version
+
+        if not missing:
+            return list(partitions.values())
+
+        utxos_of_address = collections.defaultdict(list)
+        for utxo in daos.list_unspent_utxos_by_addresses(coin_code, missing):
+            utxos_of_address[utxo.address].append(utxo)
+
+        loaded = {i: _Partitions(utxos_of_address[i], now) for i in missing}
+        partitions.update(loaded)
+
+        with self._lock:
+            # Otherwise the ones loaded may miss the writes committed during querying, use them for this time only
+            if version == self._version:
+                for address, partition in loaded.items():
+                    self._discard((coin_code, address))
+                    self._partitions[(coin_code, address)] = partition
+                    self._keys.update((i, (coin_code, address)) for i in partition.utxos)
+
+        return list(partitions.values())
+
+    def _discard(self, key: Tuple[str, str]):
+        partition = self._partitions.pop(key, None)
+        if partition is not None:
+            for utxo_id in partition.utxos:
+                self._keys.pop(utxo_id, None)
+
+    def _update(self, utxo_ids: Iterable[int], **fields):
+        self._version += 1
+
+        for utxo_id in utxo_ids:
+            key = self._keys.get(utxo_id)
+            partition = self._partitions.get(key) if key else None
+            utxo = partition.remove(utxo_id) if partition else None
+            if utxo is None:
+                continue  # Not loaded yet
+
+            for name, value in fields.items():
+                setattr(utxo, name, value)
+
+            partition.put(utxo)
+            if utxo_id not in partition.utxos:
+                self._keys.pop(utxo_id)
+
+    def update_status(self, utxo_ids: List[int], status: data.UTXOStatus):
+        with self._lock:
+            self._update(utxo_ids, status=status)
+
+    def reserve(self, utxo_ids: List[int], owner: str, reserved_until: datetime.datetime):
+        with self._lock:
+            self._update(utxo_ids, reserved_by=owner, reserved_until=reserved_until)
+
+    def release(self, owner: str, utxo_ids: List[int] = None):
+        with self._lock:
+            candidates = None if utxo_ids is None else set(utxo_ids)
+            utxo_ids = [
+                utxo_id
+                for partition in self._partitions.values()
+                for utxo_id, utxo in partition.utxos.items()
+                if utxo.reserved_by == owner and (candidates is None or utxo_id in candidates)
+            ]
+            self._update(utxo_ids, reserved_by=None, reserved_until=None)
+
+    def invalidate(self, coin_code: str = None, addresses: List[str] = None):
+        """
+        Drop the ones of coin_code and addresses, or all if not specified, then reload them on the next query
+        """
+        with self._lock:
+            self._version += 1
+
+            addresses = set(addresses) if addresses is not None else None
+            for key in list(self._partitions):
+                if (coin_code is None or key[0] == coin_code) and (addresses is None or key[1] in addresses):
+                    self._discard(key)
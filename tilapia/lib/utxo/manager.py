@@ -1,16 +1,27 @@
+import contextlib
+import datetime
+import functools
+import itertools
 import logging
-import time
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from tilapia.lib.basic.functional.timing import timing_logger
 from tilapia.lib.basic.functional.wraps import timeout_lock
 from tilapia.lib.basic.orm import database as orm_database
 from tilapia.lib.coin import manager as coin_manager
+from tilapia.lib.conf import settings
+from tilapia.lib.provider import data as provider_data
 from tilapia.lib.provider import manager as provider_manager
-from tilapia.lib.utxo import daos, data, models, utxo_chooser
+from tilapia.lib.throttle import manager as throttle_manager
+from tilapia.lib.utxo import consolidation, daos, data, index, models, selection, utxo_chooser
 
 logger = logging.getLogger("app.utxo")
 
+# Long enough to sign on the hardware and broadcast, then the reservation expires if the sending dies halfway
+UTXO_RESERVATION_TTL = 5 * 60  # in seconds
+
+_UTXO_INDEX = index.UTXOIndex()
+
 
 def choose_utxos(
     coin_code: str,
@@ -20,6 +31,7 @@ def choose_utxos(
     min_value: int = 0,
     exclude_ids: List[int] = None,
     limit: int = None,
+    max_unconfirmed_depth: int = 0,
 ) -> List[models.UTXO]:
     min_value = max(min_value, 0)
     if require_value <= min_value:
@@ -34,94 +46,205 @@ def choose_utxos(
         exclude_ids=exclude_ids,
         limit=limit,
         value_desc=True,
+        exclude_reserved=True,
+        max_unconfirmed_depth=max_unconfirmed_depth,
     )
 
     query_one_utxo__gte_require_value = {**base_query, "min_value": require_value, "limit": 1, "value_desc": False}
-    candidates = daos.list_utxos_by_conditions(**query_one_utxo__gte_require_value)
+    candidates = _UTXO_INDEX.list_utxos_by_conditions(**query_one_utxo__gte_require_value)
     if candidates:
         return candidates
 
     query_utxos__lt_require_value = {**base_query, "max_value": require_value}
-    sum_of_utxos__lt_require_value = daos.sum_of_utxos_by_conditions(**query_utxos__lt_require_value)
+    sum_of_utxos__lt_require_value = _UTXO_INDEX.sum_of_utxos_by_conditions(**query_utxos__lt_require_value)
     if sum_of_utxos__lt_require_value >= require_value:
-        candidates = daos.list_utxos_by_conditions(**query_utxos__lt_require_value)
+        candidates = _UTXO_INDEX.list_utxos_by_conditions(**query_utxos__lt_require_value)
         candidates = utxo_chooser.choose(candidates, require_value, key=lambda i: i.value)
         return candidates
 
-    candidates = daos.list_utxos_by_conditions(**base_query)
+    candidates = _UTXO_INDEX.list_utxos_by_conditions(**base_query)
     return candidates
 
 
-RUNTIME_THROTTLE = {}
+def select_utxos(
+    coin_code: str,
+    addresses: List[str],
+    target: int,
+    params: selection.SelectionParams,
+    input_vsizes: Dict[str, int],
+    min_value: int = 0,
+    max_unconfirmed_depth: int = 0,
+) -> Tuple[List[models.UTXO], Optional[selection.SelectionResult]]:
+    """
+    Select the spendable utxos by the waste-aware coin selection, see utxo.selection
+    :param target: sum of the outputs, excluding the change
+    :param input_vsizes: mapping of address to the vsize to spend its utxo
+    :param max_unconfirmed_depth: the own unconfirmed utxos up to this depth are selectable too,
+    see create_unconfirmed_utxos
+    :return: the utxos selected and the result, or all the spendable utxos and None if insufficient
+    """
+    candidates = _UTXO_INDEX.list_utxos_by_conditions(
+        coin_code=coin_code,
+        addresses=addresses,
+        status=data.UTXOStatus.SPENDABLE,
+        min_value=max(min_value, 0),
+        exclude_reserved=True,
+        max_unconfirmed_depth=max_unconfirmed_depth,
+    )
+    result = selection.select_coins(
+        [int(i.value) for i in candidates], [input_vsizes[i.address] for i in candidates], target, params
+    )
+    if result is None:
+        return candidates, None
 
+    return [candidates[i] for i in result.indexes], result
+
+
+def plan_consolidation(
+    coin_code: str,
+    addresses: List[str],
+    params: consolidation.ConsolidationParams,
+    input_vsizes: Dict[str, int],
+    min_value: int = 0,
+    max_value: int = None,
+    max_batches: int = None,
+) -> Tuple[int, List[Tuple[List[models.UTXO], consolidation.ConsolidationBatch]]]:
+    """
+    Plan the consolidation of the spendable utxos, see utxo.consolidation
+    :param input_vsizes: mapping of address to the vsize to spend its utxo
+    :param max_value: the utxos not lower than it are kept as they are
+    :return: count of the spendable utxos, and the utxos of each batch with the batch
+    """
+    candidates = _UTXO_INDEX.list_utxos_by_conditions(
+        coin_code=coin_code,
+        addresses=addresses,
+        status=data.UTXOStatus.SPENDABLE,
+        min_value=max(min_value, 0),
+        max_value=max_value,
+        exclude_reserved=True,
+        max_unconfirmed_depth=0,  # Consolidated only after confirmed, never chaining more low-fee txs
+    )
+    batches = consolidation.plan_batches(
+        [int(i.value) for i in candidates],
+        [input_vsizes[i.address] for i in candidates],
+        params,
+        max_batches=max_batches,
+    )
+    return len(candidates), [([candidates[i] for i in batch.indexes], batch) for batch in batches]
 
-@timing_logger("utxo_manager.refresh_utxos_by_address")
-def refresh_utxos_by_address(chain_code: str, address: str, force_update: bool = False) -> int:
-    runtime_throttle_key = f"${chain_code}:{address}"
-    throttle_expired_at = RUNTIME_THROTTLE.get(runtime_throttle_key)
 
-    if not force_update and throttle_expired_at and throttle_expired_at >= time.time():
+# Skip refreshing the same address again in a short time, shared by all the workers
+REFRESH_THROTTLE_TTL = 60  # in seconds
+
+
+def refresh_utxos_by_address(chain_code: str, address: str, force_update: bool = False) -> int:
+    return refresh_utxos_by_addresses(chain_code, [address], force_update=force_update)
+
+
+@timing_logger("utxo_manager.refresh_utxos_by_addresses")
+def refresh_utxos_by_addresses(chain_code: str, addresses: List[str], force_update: bool = False) -> int:
+    """
+    Sync the utxos of the addresses with the ones searched from the provider in batch
+    :return: count of the utxos created, spent, revived, confirmed or evicted
+    """
+    throttle_keys = {throttle_manager.key_of("utxo_refresh", chain_code, i): i for i in addresses}
+    acquired_keys = throttle_manager.acquire(list(throttle_keys), REFRESH_THROTTLE_TTL, force=force_update)
+    addresses = [throttle_keys[i] for i in acquired_keys]
+    if not addresses:
         return 0
 
     dust_threshold = coin_manager.get_chain_info(chain_code).dust_threshold
 
     try:
-        remote_utxos = provider_manager.search_utxos_by_address(chain_code, address)
-        remote_utxos = [i for i in remote_utxos if i.txid and i.vout >= 0 and i.value >= dust_threshold]
+        remote_utxos_of_address = provider_manager.batch_search_utxos_by_addresses(chain_code, addresses)
     except Exception as e:
         logger.exception(
-            f"Error in searching utxos by address. chain_code: {chain_code}, address: {address}, error: {e}"
+            f"Error in searching utxos by addresses. chain_code: {chain_code}, addresses: {addresses}, error: {e}"
         )
-        return 0  # Return without setting the throttle
+        throttle_manager.release(acquired_keys)
+        return 0
 
-    def key_of_utxo(_utxo):
-        return f"{_utxo.txid}/{_utxo.vout}"
+    try:
+        with contextlib.ExitStack() as stack:
+            # Locked in order, then the refreshing of the overlapped addresses never waits for each other in circle
+            locked_addresses = [
+                address
+                for address in sorted(remote_utxos_of_address)
+                if stack.enter_context(timeout_lock(f"utxo_manager.refresh_utxos_by_address.{chain_code}.{address}"))
+            ]
+            locked_address_set = set(locked_addresses)
+            throttle_manager.release([i for i in acquired_keys if throttle_keys[i] not in locked_address_set])
+
+            remote_utxos_of_address = {i: remote_utxos_of_address[i] for i in locked_addresses}
+            return _sync_utxos(chain_code, remote_utxos_of_address, dust_threshold)
+    except Exception:
+        throttle_manager.release(acquired_keys)  # Free to retry
+        raise
+
+
+def _sync_utxos(chain_code: str, remote_utxos_of_address: Dict[str, List[provider_data.UTXO]], dust_threshold: int):
+    if not remote_utxos_of_address:
+        return 0
 
-    with timeout_lock(f"utxo_manager.refresh_utxos_by_address.{chain_code}.{address}") as acquired:
-        if not acquired:
-            return 0
+    coin_code = chain_code  # Only supports single token model
+
+    # Only the unspent ones are loaded, the spent ones found again are revived by the upsert
+    local_utxo_lookup = {
+        (i.address, i.txid, i.vout): i
+        for i in daos.list_unspent_utxos_by_addresses(coin_code, list(remote_utxos_of_address))
+    }
+    remote_utxo_lookup = {
+        (address, i.txid, i.vout): i
+        for address, utxos in remote_utxos_of_address.items()
+        for i in utxos
+        if i.txid and i.vout >= 0 and i.value >= dust_threshold
+    }
+
+    missing_keys = local_utxo_lookup.keys() - remote_utxo_lookup.keys()
+    # The own unconfirmed ones are unknown to the provider until confirmed, evicted only if not confirmed in time
+    unconfirmed_keys = {i for i in missing_keys if local_utxo_lookup[i].unconfirmed_depth > 0}
+    unconfirmed_ttl = datetime.timedelta(seconds=settings.UTXO_CHAINING["unconfirmed_ttl"])
+    expired_at = datetime.datetime.now() - unconfirmed_ttl
+    expired_txids = {
+        local_utxo_lookup[i].txid for i in unconfirmed_keys if local_utxo_lookup[i].created_time < expired_at
+    }
+
+    spent_keys = missing_keys - unconfirmed_keys
+    created_keys = remote_utxo_lookup.keys() - local_utxo_lookup.keys()
+    confirmed_keys = {
+        i for i in local_utxo_lookup.keys() & remote_utxo_lookup.keys() if local_utxo_lookup[i].unconfirmed_depth > 0
+    }
+    if not spent_keys and not created_keys and not confirmed_keys and not expired_txids:
+        return 0
 
-        coin_code = chain_code  # Only supports single token model
-        remote_utxo_lookup = {key_of_utxo(i): i for i in remote_utxos}
-
-        local_utxos = daos.list_utxos_by_conditions(coin_code, [address])
-        local_utxos_lookup: Dict[str, models.UTXO] = {key_of_utxo(i): i for i in local_utxos}
-
-        to_be_updated_utxos: List[models.UTXO] = []
-
-        spend_utxo_keys = set(local_utxos_lookup.keys()).difference(remote_utxo_lookup.keys())
-        for utxo_key in spend_utxo_keys:
-            local_utxo = local_utxos_lookup[utxo_key]
-            local_utxo.status = data.UTXOStatus.SPENT
-            to_be_updated_utxos.append(local_utxo)
-
-        for utxo_key, utxo in remote_utxo_lookup.items():
-            local_utxo = local_utxos_lookup.get(utxo_key)
-            if local_utxo and local_utxo.status not in (data.UTXOStatus.SPENDABLE, data.UTXOStatus.CHOSEN):
-                local_utxo.status = data.UTXOStatus.SPENDABLE
-                to_be_updated_utxos.append(local_utxo)
-
-        to_be_created_utxos = [
-            utxo for utxo_key, utxo in remote_utxo_lookup.items() if utxo_key not in local_utxos_lookup
-        ]
-        count = len(to_be_updated_utxos) + len(to_be_created_utxos)
-
-        if count:
-            with orm_database.db.atomic():
-                if to_be_updated_utxos:
-                    daos.bulk_update_utxos_status(to_be_updated_utxos)
-
-                if to_be_created_utxos:
-                    new_utxos = [
-                        daos.new_utxo(
-                            chain_code, coin_code, address, i.txid, i.vout, data.UTXOStatus.SPENDABLE, i.value
-                        )
-                        for i in to_be_created_utxos
-                    ]
-                    daos.bulk_create_utxos(new_utxos)
-
-    RUNTIME_THROTTLE[runtime_throttle_key] = time.time() + 1 * 60  # expired at 1 min later
-    return count
+    with orm_database.db.atomic():
+        if spent_keys:
+            daos.update_utxos_status([local_utxo_lookup[i].id for i in spent_keys], data.UTXOStatus.SPENT)
+
+        if created_keys:
+            new_utxos = [
+                daos.new_utxo(
+                    chain_code,
+                    coin_code,
+                    address,
+                    txid,
+                    vout,
+                    data.UTXOStatus.SPENDABLE,
+                    remote_utxo_lookup[(address, txid, vout)].value,
+                )
+                for address, txid, vout in created_keys
+            ]
+            daos.bulk_create_or_revive_utxos(new_utxos)
+
+        if confirmed_keys:
+            daos.update_utxos_unconfirmed_depth([local_utxo_lookup[i].id for i in confirmed_keys], 0)
+
+        evicted_count = evict_unconfirmed_utxos_by_txids(chain_code, list(expired_txids)) if expired_txids else 0
+
+        changed_addresses = list({i[0] for i in itertools.chain(spent_keys, created_keys, confirmed_keys)})
+        _on_commit(functools.partial(_UTXO_INDEX.invalidate, coin_code, changed_addresses))
+
+    return len(spent_keys) + len(created_keys) + len(confirmed_keys) + evicted_count
 
 
 def query_utxo_ids_by_txid_vout_tuples(chain_code: str, txid_vout_tuples: List[Tuple[str, int]]) -> List[int]:
@@ -133,26 +256,197 @@ def get_utxos_chosen_by_txid(chain_code: str, txid: str) -> List[models.UTXO]:
     return daos.query_utxos_by_ids([i.utxo_id for i in items])
 
 
-@orm_database.db.atomic()
 def mark_utxos_chosen_by_txid(chain_code: str, txid: str, utxo_ids: List[int]):
     if not utxo_ids:
         return
 
-    daos.update_utxos_status(utxo_ids, data.UTXOStatus.CHOSEN)
-    items = [daos.new_who_spent(chain_code, txid, i) for i in utxo_ids]
-    daos.bulk_create_who_spent(items)
+    with orm_database.db.atomic():
+        daos.update_utxos_status(utxo_ids, data.UTXOStatus.CHOSEN)
+        items = [daos.new_who_spent(chain_code, txid, i) for i in utxo_ids]
+        daos.bulk_create_who_spent(items)
+        _on_commit(functools.partial(_UTXO_INDEX.update_status, utxo_ids, data.UTXOStatus.CHOSEN))
+
+
+def reserve_utxos(
+    chain_code: str, owner: str, txid_vout_tuples: List[Tuple[str, int]], ttl: int = UTXO_RESERVATION_TTL
+) -> bool:
+    """
+    Reserve the utxos for the sending identified by owner, all or nothing.
+    The utxos reserved are skipped by choose_utxos until released, committed or expired.
+    :return: False if any of them is gone or taken by the other sending
+    """
+    txid_vout_tuples = list(set(txid_vout_tuples))
+    utxo_ids = daos.query_utxo_ids_by_txid_vout_tuples(chain_code, txid_vout_tuples)
+    if not utxo_ids or len(utxo_ids) != len(txid_vout_tuples):
+        return False
+
+    reserved_until = datetime.datetime.now() + datetime.timedelta(seconds=ttl)
+    count = daos.reserve_utxos(utxo_ids, owner, reserved_until)
+    if count < len(utxo_ids):
+        conflicts = [i for i in daos.query_utxos_by_ids(utxo_ids) if i.reserved_by != owner]
+        daos.release_utxos(owner, utxo_ids)  # Roll back the ones taken just now
+        _on_commit(functools.partial(_UTXO_INDEX.release, owner, utxo_ids))
+        # The index offered the conflicting ones as free, reload their addresses before choosing again
+        coin_code = chain_code  # Only supports single token model
+        _on_commit(functools.partial(_UTXO_INDEX.invalidate, coin_code, list({i.address for i in conflicts})))
+        logger.info(
+            f"UTXOs taken by the others. chain_code: {chain_code}, owner: {owner}, conflicts: {len(utxo_ids) - count}"
+        )
+        return False
+
+    _on_commit(functools.partial(_UTXO_INDEX.reserve, utxo_ids, owner, reserved_until))
+    return True
+
+
+def release_utxos(owner: str) -> int:
+    count = daos.release_utxos(owner)
+    count and _on_commit(functools.partial(_UTXO_INDEX.release, owner))
+    return count
+
+
+def commit_reserved_utxos(chain_code: str, owner: str, txid: str) -> List[int]:
+    """
+    Mark the utxos reserved by owner as chosen by the tx, see mark_utxos_chosen_by_txid
+    """
+    # Not as a decorator, the atomic object keeps the state of the transaction and isn't shareable between threads
+    with orm_database.db.atomic():
+        utxo_ids = daos.query_utxo_ids_by_reservation_owner(owner)
+        mark_utxos_chosen_by_txid(chain_code, txid, utxo_ids)
+        daos.release_utxos(owner)
+        _on_commit(functools.partial(_UTXO_INDEX.release, owner, utxo_ids))
+
+    return utxo_ids
 
 
-@orm_database.db.atomic()
 def mark_utxos_spent_by_txid(chain_code: str, txid: str):
     items = daos.query_who_spent_by_txid(chain_code, txid)
     if items:
-        daos.update_utxos_status([i.utxo_id for i in items], status=data.UTXOStatus.SPENT)
+        utxo_ids = [i.utxo_id for i in items]
+        daos.update_utxos_status(utxo_ids, status=data.UTXOStatus.SPENT)
+        _on_commit(functools.partial(_UTXO_INDEX.update_status, utxo_ids, data.UTXOStatus.SPENT))
+
+
+def create_unconfirmed_utxos(
+    chain_code: str, txid: str, outputs: List[Tuple[str, int, int]], spent_utxo_ids: List[int]
+) -> List[models.UTXO]:
+    """
+    Insert the own outputs of the tx just broadcast, likes the change, as spendable before it is confirmed.
+    The depth of them is one more than the deepest utxo spent by the tx,
+    then the sendings limit the length of the unconfirmed chain by max_unconfirmed_depth of choose_utxos
+    :param outputs: (address, vout, value) of the outputs
+    :param spent_utxo_ids: the utxos spent by the tx
+    """
+    if not outputs:
+        return []
+
+    coin_code = chain_code  # Only supports single token model
+    unconfirmed_depth = 1 + max((i.unconfirmed_depth for i in daos.query_utxos_by_ids(spent_utxo_ids)), default=0)
+    utxos = [
+        daos.new_utxo(
+            chain_code,
+            coin_code,
+            address,
+            txid,
+            vout,
+            data.UTXOStatus.SPENDABLE,
+            value,
+            unconfirmed_depth=unconfirmed_depth,
+        )
+        for address, vout, value in outputs
+    ]
+
+    with orm_database.db.atomic():
+        daos.bulk_create_utxos(utxos, ignore_conflicts=True)  # Found by the refreshing already
+        _on_commit(functools.partial(_UTXO_INDEX.invalidate, coin_code, list({i.address for i in utxos})))
+
+    logger.info(
+        f"Unconfirmed utxos created. chain_code: {chain_code}, txid: {txid}, "
+        f"count: {len(utxos)}, unconfirmed_depth: {unconfirmed_depth}"
+    )
+    return utxos
+
+
+def mark_utxos_confirmed_by_txid(chain_code: str, txid: str):
+    # The descendants keep their depth, a bit shorter chain is allowed until they are confirmed too
+    coin_code = chain_code  # Only supports single token model
+    utxos = daos.query_unconfirmed_utxos_by_txids(chain_code, [txid])
+    if utxos:
+        daos.update_utxos_unconfirmed_depth([i.id for i in utxos], 0)
+        _on_commit(functools.partial(_UTXO_INDEX.invalidate, coin_code, list({i.address for i in utxos})))
+
+
+def evict_unconfirmed_utxos_by_txids(chain_code: str, txids: List[str]) -> int:
+    """
+    Mark the unconfirmed utxos created by the txs as spent, likes the ones of the txs replaced or dropped.
+    The ones created by the descendant txs spending them are evicted too, they are never confirmed either.
+    :return: count of the utxos evicted
+    """
+    coin_code = chain_code  # Only supports single token model
+    evicted = {}
+    while txids:
+        utxos = [i for i in daos.query_unconfirmed_utxos_by_txids(chain_code, txids) if i.id not in evicted]
+        evicted.update((i.id, i) for i in utxos)
+        spending = daos.query_who_spent_by_utxo_ids(chain_code, [i.id for i in utxos]) if utxos else []
+        txids = list({i.txid for i in spending})
+
+    utxos = [i for i in evicted.values() if i.status != data.UTXOStatus.SPENT]
+    if not utxos:
+        return 0
+
+    with orm_database.db.atomic():
+        daos.update_utxos_status([i.id for i in utxos], data.UTXOStatus.SPENT)
+        _on_commit(functools.partial(_UTXO_INDEX.invalidate, coin_code, list({i.address for i in utxos})))
+
+    logger.info(f"Unconfirmed utxos evicted. chain_code: {chain_code}, txids: {list({i.txid for i in utxos})}")
+    return len(utxos)
 
 
-@orm_database.db.atomic()
 def delete_utxos_by_addresses(chain_code: str, addresses: List[str]):
+    coin_code = chain_code  # Only supports single token model
     utxo_ids = daos.query_utxo_ids_by_addresses(chain_code, addresses)
     if utxo_ids:
-        daos.delete_utxos_by_ids(chain_code, utxo_ids)
-        daos.delete_who_spent_by_utxo_ids(chain_code, utxo_ids)
+        with orm_database.db.atomic():
+            daos.delete_utxos_by_ids(chain_code, utxo_ids)
+            daos.delete_who_spent_by_utxo_ids(chain_code, utxo_ids)
+            _on_commit(functools.partial(_UTXO_INDEX.invalidate, coin_code, addresses))
+
+
+@timing_logger("utxo_manager.prune_spent_utxos")
+def prune_spent_utxos(retention_days: int, chunk_size: int = 1000, max_chunks: int = None) -> int:
+    """
+    Delete the spent utxos not modified within retention_days, with the records of who spent them.
+    A transaction per chunk, then the writers wait no longer than one chunk.
+    The ones found by the refreshing again are created as new
+    :return: count of the utxos deleted
+    """
+    modified_before = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    count, after_id = 0, 0
+
+    for _ in itertools.count() if max_chunks is None else range(max_chunks):
+        utxo_ids = daos.query_spent_utxo_ids(modified_before, after_id, chunk_size)
+        if not utxo_ids:
+            break
+
+        with orm_database.db.atomic():
+            deleted = daos.delete_spent_utxos_by_ids(utxo_ids, modified_before)
+            kept_ids = {i.id for i in daos.query_utxos_by_ids(utxo_ids)} if deleted < len(utxo_ids) else set()
+            daos.delete_who_spent_by_utxo_ids(None, [i for i in utxo_ids if i not in kept_ids])
+
+        count += deleted
+        after_id = utxo_ids[-1]
+
+    # The spent ones aren't indexed, nothing to invalidate
+    logger.info(f"Spent utxos pruned. count: {count}, modified_before: {modified_before}")
+    return count
+
+
+def invalidate_utxo_index(coin_code: str = None, addresses: List[str] = None):
+    """
+    For the writes bypassing this module, otherwise they stay invisible to choose_utxos until the index expired
+    """
+    _UTXO_INDEX.invalidate(coin_code, addresses)
+
+
+def _on_commit(callback: Callable[[], None]):
+    # By the database UTXO bound to, which differs from orm_database.db in tests
+    models.UTXO._meta.database.on_commit(callback)
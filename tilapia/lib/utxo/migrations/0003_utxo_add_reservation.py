@@ -0,0 +1,9 @@
+import peewee
+
+
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_column("utxo", "reserved_by", peewee.CharField(null=True)),
+        migrator.add_column("utxo", "reserved_until", peewee.DateTimeField(null=True)),
+        migrator.add_index("utxo", ("reserved_by",), False),
+    )
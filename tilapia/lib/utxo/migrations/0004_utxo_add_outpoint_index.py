@@ -0,0 +1,4 @@
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_index("utxo", ("chain_code", "txid", "vout"), False),
+    )
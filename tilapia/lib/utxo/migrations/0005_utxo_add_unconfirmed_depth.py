@@ -0,0 +1,7 @@
+import peewee
+
+
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_column("utxo", "unconfirmed_depth", peewee.SmallIntegerField(default=0)),
+    )
@@ -0,0 +1,4 @@
+def update(db, migrator, migrate):
+    migrate(
+        migrator.add_index("whospent", ("utxo_id",), False),
+    )
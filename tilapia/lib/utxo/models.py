@@ -13,11 +13,19 @@ class UTXO(BaseModel):
     vout = peewee.SmallIntegerField()
     status = peewee.IntegerField(choices=data.UTXOStatus.to_choices())
     value = peewee.DecimalField(max_digits=32, decimal_places=0)
+    reserved_by = peewee.CharField(null=True, index=True, help_text="owner token of the sending which reserves it")
+    reserved_until = peewee.DateTimeField(null=True, help_text="the reservation is released automatically after it")
+    unconfirmed_depth = peewee.SmallIntegerField(
+        default=0, help_text="0 if confirmed, otherwise the depth in the chain of the own unconfirmed txs"
+    )
     created_time = AutoDateTimeField()
     modified_time = AutoDateTimeField()
 
     class Meta:
-        indexes = ((("coin_code", "address", "txid", "vout"), True),)
+        indexes = (
+            (("coin_code", "address", "txid", "vout"), True),
+            (("chain_code", "txid", "vout"), False),  # For the lookups by outpoints
+        )
 
     def __str__(self):
         return (
@@ -34,7 +42,10 @@ class WhoSpent(BaseModel):
     created_time = AutoDateTimeField()
 
     class Meta:
-        indexes = ((("chain_code", "txid", "utxo_id"), True),)
+        indexes = (
+            (("chain_code", "txid", "utxo_id"), True),
+            (("utxo_id",), False),  # For the lookups by the utxos spent
+        )
 
     def __str__(self):
         return f"id: {self.id}, chain_code: {self.chain_code}, txid: {self.txid}, utxo_id: {self.utxo_id}"
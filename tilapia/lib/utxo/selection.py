@@ -0,0 +1,334 @@
+"""
+Coin selection likes Bitcoin Core.
+Branch and bound searches for a changeless solution, knapsack and single random draw make the ones with change,
+then the solution of the least waste wins.
+All the algorithms work on the plain lists of effective values, which are the values minus the fee to spend them.
+"""
+import bisect
+import itertools
+import math
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from tilapia.lib.provider.chains.btc.sdk import transaction as btc_transaction
+
+# Bitcoin Core tries 100000 times in C++, the budgets here are scaled down to keep
+# the selection of a wallet with 10k+ utxos in milliseconds
+BNB_MAX_TRIES = 10000
+KNAPSACK_MAX_ITERATIONS = 1000
+KNAPSACK_MAX_STEPS = 20000  # iterations * candidates of approximating
+
+
+@dataclass
+class SelectionParams(object):
+    fee_rate: int  # per vbyte
+    long_term_fee_rate: int  # the fee rate expected to spend the utxos in the future
+    not_input_vsize: int  # header and the outputs, excluding the inputs and the change
+    change_output_vsize: int
+    change_spend_vsize: int  # vsize to spend the change as an input in the future
+    min_change: int = 0  # the change lower than it is spent as fee, likes dust_threshold
+
+    @property
+    def change_fee(self) -> int:
+        return self.change_output_vsize * self.fee_rate
+
+    @property
+    def cost_of_change(self) -> int:
+        return self.change_fee + self.change_spend_vsize * self.long_term_fee_rate
+
+    @classmethod
+    def for_btc(
+        cls,
+        input_encoding: str,
+        output_encodings: List[str],
+        fee_rate: int,
+        long_term_fee_rate: int,
+        min_change: int = 0,
+        change_encoding: str = None,
+        op_return: str = None,
+    ) -> "SelectionParams":
+        change_encoding = change_encoding or input_encoding
+        input_vsize = btc_transaction.INPUT_VSIZE_LOOKUP[input_encoding]
+        tx_vsize = btc_transaction.calculate_vsize([input_encoding], output_encodings, op_return=op_return)
+
+        return cls(
+            fee_rate=fee_rate,
+            long_term_fee_rate=long_term_fee_rate,
+            not_input_vsize=tx_vsize - input_vsize,
+            change_output_vsize=btc_transaction.OUTPUT_VSIZE_LOOKUP[change_encoding],
+            change_spend_vsize=btc_transaction.INPUT_VSIZE_LOOKUP[change_encoding],
+            min_change=min_change,
+        )
+
+
+def input_vsize_of(encoding: str) -> int:
+    return btc_transaction.INPUT_VSIZE_LOOKUP[encoding]
+
+
+@dataclass
+class SelectionResult(object):
+    indexes: List[int]  # of the utxos passed in
+    algorithm: str
+    input_value: int
+    vsize: int
+    fee: int
+    change: int  # 0 if changeless
+    waste: int
+
+
+def select_coins(
+    values: Sequence[int],
+    input_vsizes: Sequence[int],
+    target: int,
+    params: SelectionParams,
+    rng: random.Random = None,
+) -> Optional[SelectionResult]:
+    """
+    Select utxos to pay the target value and the fee
+    :param values: values of the utxos
+    :param input_vsizes: vsize to spend each utxo, see input_vsize_of
+    :param target: sum of the outputs, excluding the change
+    :return: SelectionResult, or None if the utxos are insufficient
+    """
+    rng = rng or random.Random()
+    fee_rate, long_term_fee_rate = params.fee_rate, params.long_term_fee_rate
+
+    # Uneconomic utxos cost more fee than their values, never select them
+    candidates = [i for i, (value, vsize) in enumerate(zip(values, input_vsizes)) if value > vsize * fee_rate]
+    effective_values = [values[i] - input_vsizes[i] * fee_rate for i in candidates]
+    selection_target = target + params.not_input_vsize * fee_rate
+
+    solutions = []
+    picked = branch_and_bound(
+        effective_values,
+        selection_target,
+        params.cost_of_change,
+        [input_vsizes[i] * (fee_rate - long_term_fee_rate) for i in candidates],
+    )
+    if picked is not None:
+        solutions.append(("bnb", picked))
+
+    picked = knapsack(effective_values, selection_target + params.change_fee, params.min_change, rng)
+    if picked is not None:
+        solutions.append(("knapsack", picked))
+
+    picked = single_random_draw(effective_values, selection_target + params.change_fee + params.min_change, rng)
+    if picked is not None:
+        solutions.append(("srd", picked))
+
+    results = (
+        _build_result(algorithm, [candidates[i] for i in picked], values, input_vsizes, target, params)
+        for algorithm, picked in solutions
+    )
+    results = [i for i in results if i is not None]
+    return min(results, key=lambda i: (i.waste, len(i.indexes))) if results else None
+
+
+def _build_result(
+    algorithm: str,
+    indexes: List[int],
+    values: Sequence[int],
+    input_vsizes: Sequence[int],
+    target: int,
+    params: SelectionParams,
+) -> Optional[SelectionResult]:
+    input_value = sum(values[i] for i in indexes)
+    inputs_vsize = sum(input_vsizes[i] for i in indexes)
+    vsize = params.not_input_vsize + inputs_vsize
+    fee = vsize * params.fee_rate
+    if input_value < target + fee:
+        return None
+
+    # The waste of spending the utxos now instead of at the long term fee rate
+    waste = inputs_vsize * (params.fee_rate - params.long_term_fee_rate)
+    change = input_value - target - fee - params.change_fee
+
+    if change > 0 and change >= params.min_change:
+        vsize += params.change_output_vsize
+        fee += params.change_fee
+        waste += params.cost_of_change
+    else:
+        change = 0
+        waste += input_value - target - fee  # The excess is dropped to fee
+        fee = input_value - target
+
+    return SelectionResult(
+        indexes=sorted(indexes),
+        algorithm=algorithm,
+        input_value=input_value,
+        vsize=vsize,
+        fee=fee,
+        change=change,
+        waste=waste,
+    )
+
+
+def branch_and_bound(
+    effective_values: Sequence[int],
+    target: int,
+    cost_of_change: int,
+    wastes: Sequence[int],
+    max_tries: int = BNB_MAX_TRIES,
+) -> Optional[List[int]]:
+    """
+    Depth first search for the selection in [target, target + cost_of_change] of the least waste, without change.
+    See SelectCoinsBnB of Bitcoin Core.
+    :param wastes: waste of each utxo, (fee_rate - long_term_fee_rate) * input vsize
+    :return: indexes of the utxos selected, or None if not found
+    """
+    upper_bound = target + cost_of_change
+    # The ones exceeding upper bound alone are never in the solution
+    pool = sorted(
+        (i for i, value in enumerate(effective_values) if value <= upper_bound),
+        key=lambda i: effective_values[i],
+        reverse=True,
+    )
+    pool_values = [effective_values[i] for i in pool]
+    pool_wastes = [wastes[i] for i in pool]
+    negative_values = [-i for i in pool_values]  # Ascending for bisect
+    # Waste never decreases by more inputs unless the fee rate is lower than the long term one
+    is_waste_increasing = all(i >= 0 for i in pool_wastes)
+
+    # available_values[i] is the sum of pool_values[i:], the lookahead of the undecided ones
+    available_values = list(itertools.accumulate(reversed(pool_values), initial=0))[::-1]
+    if available_values[0] < target:
+        return None
+
+    current_value, current_waste, selection = 0, 0, []
+    best_selection, best_waste = None, math.inf
+    index = 0
+
+    for _ in range(max_tries):
+        if current_value + available_values[index] < target or (is_waste_increasing and current_waste > best_waste):
+            backtrack = True
+        elif current_value >= target:
+            waste = current_waste + current_value - target
+            if waste <= best_waste:
+                best_selection, best_waste = list(selection), waste
+            backtrack = True
+        else:
+            backtrack = False
+
+        if backtrack:
+            if not selection:
+                break  # Exhausted
+
+            # Try the branch omitting the last included one
+            index = selection.pop()
+            current_value -= pool_values[index]
+            current_waste -= pool_wastes[index]
+        elif current_value + pool_values[index] > upper_bound:
+            # Omit all the ones overshooting at once
+            index = bisect.bisect_left(negative_values, current_value - upper_bound, index)
+            continue
+        elif (
+            not selection
+            or index - 1 == selection[-1]
+            or pool_values[index] != pool_values[index - 1]
+            or pool_wastes[index] != pool_wastes[index - 1]
+        ):
+            selection.append(index)
+            current_value += pool_values[index]
+            current_waste += pool_wastes[index]
+        # Otherwise skip the branch equivalent to the one just omitted
+
+        index += 1
+
+    return [pool[i] for i in best_selection] if best_selection is not None else None
+
+
+def knapsack(effective_values: Sequence[int], target: int, min_change: int, rng: random.Random) -> Optional[List[int]]:
+    """
+    Stochastic approximation of the subset closest to target, or target + min_change.
+    See KnapsackSolver of Bitcoin Core.
+    :return: indexes of the utxos selected, or None if insufficient
+    """
+    applicable, lowest_larger, total_lower = [], None, 0
+    for i in range(len(effective_values)):
+        value = effective_values[i]
+        if value == target:
+            return [i]
+        elif value < target + min_change:
+            applicable.append(i)
+            total_lower += value
+        elif lowest_larger is None or value < effective_values[lowest_larger]:
+            lowest_larger = i
+
+    if total_lower == target:
+        return applicable
+    elif total_lower < target:
+        return [lowest_larger] if lowest_larger is not None else None
+
+    applicable.sort(key=lambda i: effective_values[i], reverse=True)
+    applicable_values = [effective_values[i] for i in applicable]
+    iterations = max(1, min(KNAPSACK_MAX_ITERATIONS, KNAPSACK_MAX_STEPS // len(applicable)))
+
+    best, best_value = _approximate_best_subset(applicable_values, total_lower, target, iterations, rng)
+    if best_value != target and total_lower >= target + min_change:
+        best, best_value = _approximate_best_subset(
+            applicable_values, total_lower, target + min_change, iterations, rng
+        )
+
+    if lowest_larger is not None and (
+        (best_value != target and best_value < target + min_change) or effective_values[lowest_larger] <= best_value
+    ):
+        return [lowest_larger]
+
+    return [applicable[i] for i in best]
+
+
+def _approximate_best_subset(
+    values: List[int], total_lower: int, target: int, iterations: int, rng: random.Random
+) -> (List[int], int):
+    count = len(values)
+    best, best_value = None, total_lower  # All of them by default
+
+    for _ in range(iterations):
+        if best_value == target:
+            break
+
+        included, selected, total, reached = [False] * count, [], 0, False
+        for round_ in range(2):
+            if reached:
+                break
+
+            # Include randomly on the first round, then all the rest on the second round
+            for i in range(count):
+                if included[i] or (round_ == 0 and rng.random() < 0.5):
+                    continue
+
+                if total + values[i] >= target:
+                    reached = True
+                    if total + values[i] < best_value:
+                        # selected is append only, keep the prefix instead of copying
+                        best, best_value = (selected, len(selected), i), total + values[i]
+                else:
+                    total += values[i]
+                    included[i] = True
+                    selected.append(i)
+
+    if best is None:
+        return list(range(count)), best_value
+    else:
+        selected, length, last = best
+        return selected[:length] + [last], best_value
+
+
+def single_random_draw(effective_values: Sequence[int], target: int, rng: random.Random) -> Optional[List[int]]:
+    """
+    Draw the utxos randomly until the target is covered, which tends to spend the small ones over time
+    :return: indexes of the utxos selected, or None if insufficient
+    """
+    order = list(range(len(effective_values)))
+    total = 0
+
+    # Shuffle lazily, only the ones drawn
+    for count in range(len(order)):
+        drawn = rng.randrange(count, len(order))
+        order[count], order[drawn] = order[drawn], order[count]
+        total += effective_values[order[count]]
+        if total >= target:
+            return order[: count + 1]
+
+    return None
@@ -7,6 +7,9 @@ def choose(utxos: list, target: int, key: Callable = None) -> list:
     The simplest sliding window solution，and its time complexity is n.
     It isn't the best solution, but simple and fast enough.
     """
+    if not utxos:
+        return []  # Taken by the others since they were summed up
+
     key = key or (lambda m: m)
     random.seed(key(utxos[0]))
     random.shuffle(utxos)  # Deterministically shuffle the utxos
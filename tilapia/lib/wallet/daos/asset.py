@@ -2,6 +2,7 @@ import datetime
 from decimal import Decimal
 from typing import List, Optional
 
+from tilapia.lib.basic.orm import bulk
 from tilapia.lib.wallet import models
 
 
@@ -55,7 +56,7 @@ def bulk_update_balance(assets: List[models.AssetModel]):
     for i in assets:
         i.modified_time = now
 
-    models.AssetModel.bulk_update(assets, [models.AssetModel.balance, models.AssetModel.modified_time], batch_size=10)
+    bulk.bulk_update(models.AssetModel, assets, [models.AssetModel.balance, models.AssetModel.modified_time])
 
 
 def hide_asset(asset_id: int):
@@ -1,11 +1,17 @@
+import math
+from decimal import Decimal
 from typing import Optional
 
 from tilapia.lib.coin import manager as coin_manager
 from tilapia.lib.provider import data as provider_data
 from tilapia.lib.provider import manager as provider_manager
+from tilapia.lib.transaction import manager as transaction_manager
 from tilapia.lib.wallet import daos
 from tilapia.lib.wallet.interfaces import ChainModelInterface
 
+# Geth rejects the replacement paying less than 110% of the gas price of the pending tx
+MIN_REPLACEMENT_PRICE_RATIO = 1.1
+
 
 class AccountChainModelHandler(ChainModelInterface):
     def generate_unsigned_tx(
@@ -53,3 +59,28 @@ class AccountChainModelHandler(ChainModelInterface):
         unsigned_tx = provider_manager.fill_unsigned_tx(chain_coin.code, unsigned_tx)
 
         return unsigned_tx
+
+    def generate_replacement_tx(self, wallet_id: int, action, fee_multiplier: float) -> provider_data.UnsignedTx:
+        """
+        Re-send the transfer at the same nonce, with the payload recovered from the raw tx of the original one,
+        such as the calldata of a contract call
+        """
+        if action.nonce < 0:
+            raise Exception("Only the tx with nonce can be replaced")
+
+        raw_tx = transaction_manager.get_raw_tx(action.chain_code, action.txid)
+        if not raw_tx:
+            raise Exception("The raw tx of the original one not found, its payload can't be kept")
+
+        fee_multiplier = Decimal(str(max(fee_multiplier, MIN_REPLACEMENT_PRICE_RATIO)))
+        fee_price_per_unit = math.ceil(Decimal(int(action.fee_price_per_unit)) * fee_multiplier)
+        return self.generate_unsigned_tx(
+            wallet_id,
+            action.coin_code,
+            action.to_address,
+            int(action.value),
+            nonce=action.nonce,
+            fee_limit=int(action.fee_limit),
+            fee_price_per_unit=fee_price_per_unit,
+            payload=provider_manager.get_payload_of_raw_tx(action.chain_code, raw_tx),
+        )
@@ -1,18 +1,26 @@
 import logging
+import math
+from dataclasses import dataclass
+from decimal import Decimal
 from typing import List, Optional, Tuple
 
 from tilapia.lib.basic.functional.timing import timing_logger
 from tilapia.lib.coin import data as coin_data
 from tilapia.lib.coin import manager as coin_manager
+from tilapia.lib.conf import settings
 from tilapia.lib.provider import data as provider_data
 from tilapia.lib.provider import manager as provider_manager
-from tilapia.lib.utxo import data as utxo_data
+from tilapia.lib.utxo import consolidation
 from tilapia.lib.utxo import manager as utxo_manager
 from tilapia.lib.utxo import models as utxo_models
+from tilapia.lib.utxo import selection
 from tilapia.lib.wallet import daos, interfaces
 
 logger = logging.getLogger("app.chain")
 
+# The replacement pays for its own relay at least, at the default incremental relay fee of bitcoin core, see BIP125
+INCREMENTAL_RELAY_FEE_PER_UNIT = 1
+
 
 class UTXOChainModelHandler(interfaces.ChainModelInterface):
     def generate_unsigned_tx(
@@ -42,6 +50,8 @@ class UTXOChainModelHandler(interfaces.ChainModelInterface):
         fee_limit = int(fee_limit) if fee_limit is not None else 0
         fee_price_per_unit = int(fee_price_per_unit) if fee_price_per_unit is not None else 0
         payload = dict(payload) if payload is not None else {}
+        if chain_info.rbf_supported:
+            payload.setdefault("rbf", True)  # Replaceable in case of stuck, see speed_up of wallet manager
         input_addresses = [account.address]
         outputs = [provider_data.TransactionOutput(address=to_address, value=int(value))]
         change_output_placeholder = provider_data.TransactionOutput(
@@ -49,16 +59,17 @@ class UTXOChainModelHandler(interfaces.ChainModelInterface):
             value=0,
             payload={"is_change": True, "bip44_path": account.bip44_path},  # Required by hardware
         )
-        utxos, fee_price_per_unit, fee_limit = _choose_utxos(
+        utxos, fee_breakdown = _choose_utxos(
             coin_code,
             chain_info,
             input_addresses,
             outputs,
             change_output_placeholder,
-            fee_limit,
             fee_price_per_unit,
             payload,
         )
+        fee_price_per_unit = fee_breakdown.fee_price_per_unit
+        fee_limit = max(fee_limit, fee_breakdown.vsize)
 
         input_value = sum(i.value for i in utxos)
         fee = fee_price_per_unit * fee_limit
@@ -74,10 +85,9 @@ class UTXOChainModelHandler(interfaces.ChainModelInterface):
             )
             outputs = [provider_data.TransactionOutput(address=to_address, value=value)]
             change = 0
-        elif 0 < change < chain_info.dust_threshold:
-            # Spend change as fee if it is less than dust_threshold
-            fee = input_value - value - change
-            fee_price_per_unit = int(fee / fee_limit)
+        elif 0 < change and (change < chain_info.dust_threshold or not fee_breakdown.change):
+            # Spend change as fee if it is less than dust_threshold, or the excess of the changeless selection
+            fee_price_per_unit = int((input_value - value) / fee_limit)
             change = 0
 
         unsigned_tx = _build_unsigned_tx(
@@ -85,6 +95,143 @@ class UTXOChainModelHandler(interfaces.ChainModelInterface):
         )
         return unsigned_tx
 
+    def generate_replacement_tx(self, wallet_id: int, action, fee_multiplier: float) -> provider_data.UnsignedTx:
+        """
+        Build the BIP125 replacement spending the same UTXOs, the raised fee is taken from the change.
+        The payload of the pending tx (likes op_return) isn't kept.
+        """
+        chain_code = action.chain_code
+        chain_info = coin_manager.get_chain_info(chain_code)
+        utxos = utxo_manager.get_utxos_chosen_by_txid(chain_code, action.txid)
+        if not utxos:
+            raise Exception("No UTXOs chosen by the tx found, only the tx sent from here can be replaced")
+
+        account = daos.account.query_first_account_by_wallet(wallet_id)
+        fee_price_per_unit = int(action.fee_price_per_unit)
+        fee_price_per_unit = max(
+            math.ceil(fee_price_per_unit * Decimal(str(fee_multiplier))),
+            fee_price_per_unit + INCREMENTAL_RELAY_FEE_PER_UNIT,
+        )
+        payload = {"rbf": True}
+        value = int(action.value)
+        input_value = sum(int(i.value) for i in utxos)
+        outputs = [provider_data.TransactionOutput(address=action.to_address, value=value)]
+        change_output_placeholder = provider_data.TransactionOutput(
+            address=account.address,
+            value=0,
+            payload={"is_change": True, "bip44_path": account.bip44_path},  # Required by hardware
+        )
+
+        unsigned_tx = _build_unsigned_tx(
+            chain_info, utxos, input_value - value, outputs, change_output_placeholder, fee_price_per_unit, 0, payload
+        )
+        fee_limit = max(provider_manager.fill_unsigned_tx(chain_code, unsigned_tx).fee_limit, int(action.fee_limit))
+        change = input_value - value - fee_limit * fee_price_per_unit
+        if change < 0:
+            raise Exception("Not enough change to raise the fee")
+        elif 0 < change < chain_info.dust_threshold:
+            # Spend change as fee if it is less than dust_threshold
+            fee_price_per_unit = int((input_value - value) / fee_limit)
+            change = 0
+
+        return _build_unsigned_tx(
+            chain_info, utxos, change, outputs, change_output_placeholder, fee_price_per_unit, fee_limit, payload
+        )
+
+    def plan_consolidation(
+        self,
+        wallet_id: int,
+        coin_code: str,
+        max_value: Optional[int] = None,
+        max_tx_vsize: int = consolidation.MAX_TX_VSIZE,
+        max_fee: Optional[int] = None,
+        max_batches: Optional[int] = None,
+    ) -> "ConsolidationPlan":
+        """
+        Plan merging the spendable utxos of the wallet into its own address.
+        The consolidation pays the slowest fee price of the estimator now,
+        to save the normal one paid by the later sendings on each input, see _choose_utxos.
+        """
+        chain_info = coin_manager.get_chain_info(coin_manager.get_coin_info(coin_code).chain_code)
+        chain_code = chain_info.chain_code
+        account = daos.account.query_first_account_by_wallet(wallet_id)
+        utxo_manager.refresh_utxos_by_addresses(coin_code, [account.address])
+
+        prices = provider_manager.get_prices_per_unit_of_fee(chain_code)
+        fee_price_per_unit = min(int(i.price) for i in prices)
+        long_term_fee_price_per_unit = int(prices.normal.price)
+
+        encoding = _encoding_of(chain_code, account.address)
+        params = consolidation.ConsolidationParams.for_btc(
+            encoding,
+            fee_rate=fee_price_per_unit,
+            long_term_fee_rate=long_term_fee_price_per_unit,
+            max_tx_vsize=max_tx_vsize,
+            max_fee=max_fee,
+            min_output=chain_info.dust_threshold,
+        )
+        utxo_count, batches = utxo_manager.plan_consolidation(
+            coin_code,
+            [account.address],
+            params,
+            {account.address: selection.input_vsize_of(encoding)},
+            min_value=chain_info.dust_threshold,
+            max_value=max_value,
+            max_batches=max_batches,
+        )
+        return ConsolidationPlan(
+            fee_price_per_unit=fee_price_per_unit,
+            long_term_fee_price_per_unit=long_term_fee_price_per_unit,
+            utxo_count=utxo_count,
+            batches=batches,
+        )
+
+    def generate_consolidation_tx(
+        self,
+        wallet_id: int,
+        utxos: List[utxo_models.UTXO],
+        batch: consolidation.ConsolidationBatch,
+        fee_price_per_unit: int,
+    ) -> provider_data.UnsignedTx:
+        chain_info = coin_manager.get_chain_info(utxos[0].chain_code)
+        account = daos.account.query_first_account_by_wallet(wallet_id)
+        output = provider_data.TransactionOutput(
+            address=account.address,
+            value=0,
+            payload={"is_change": True, "bip44_path": account.bip44_path},  # Back to itself, no confirming on hardware
+        )
+        return _build_unsigned_tx(
+            chain_info,
+            utxos,
+            batch.output_value,
+            [],
+            output,
+            fee_price_per_unit,
+            batch.vsize,
+            {"rbf": chain_info.rbf_supported},
+        )
+
+
+@dataclass
+class ConsolidationPlan(object):
+    fee_price_per_unit: int
+    long_term_fee_price_per_unit: int
+    utxo_count: int  # of the spendable ones before consolidating
+    batches: List[Tuple[List[utxo_models.UTXO], consolidation.ConsolidationBatch]]
+
+
+@dataclass
+class FeeBreakdown(object):
+    fee_price_per_unit: int
+    long_term_fee_price_per_unit: int
+    vsize: int  # as fee_limit
+    inputs_vsize: int
+    change_output_vsize: int  # 0 if changeless
+    fee: int
+    change: int  # 0 if changeless
+    waste: Optional[int] = None
+    algorithm: Optional[str] = None  # None if insufficient, then all the spendable utxos are chosen
+
 
 @timing_logger("utxo_handler.choose_utxos")
 def _choose_utxos(
@@ -93,49 +240,80 @@ def _choose_utxos(
     input_addresses: List[str],
     outputs: List[provider_data.TransactionOutput],
     change_output_placeholder: provider_data.TransactionOutput,
-    fee_limit: int,
     fee_price_per_unit: int,
     payload: dict,
-) -> Tuple[List[utxo_models.UTXO], int, int]:
-    for address in input_addresses:
-        utxo_manager.refresh_utxos_by_address(coin_code, address)
+) -> Tuple[List[utxo_models.UTXO], FeeBreakdown]:
+    """
+    Select the utxos in one pass, the fee rate is fetched once,
+    then the vsize of each input and output is known by the encoding of its address
+    """
+    utxo_manager.refresh_utxos_by_addresses(coin_code, input_addresses)
 
     chain_code, dust_threshold = chain_info.chain_code, chain_info.dust_threshold
 
-    fee = fee_price_per_unit * fee_limit
+    prices = provider_manager.get_prices_per_unit_of_fee(chain_code)
+    fee_price_per_unit = fee_price_per_unit or int(prices.normal.price)
+    long_term_fee_price_per_unit = min(int(i.price) for i in prices)  # The slowest one is affordable in the long term
+
+    input_encodings = {i: _encoding_of(chain_code, i) for i in input_addresses}
+    params = selection.SelectionParams.for_btc(
+        input_encodings[input_addresses[0]],
+        [_encoding_of(chain_code, i.address) for i in outputs],
+        fee_rate=fee_price_per_unit,
+        long_term_fee_rate=long_term_fee_price_per_unit,
+        min_change=dust_threshold,
+        change_encoding=_encoding_of(chain_code, change_output_placeholder.address),
+        op_return=payload.get("op_return"),
+    )
+    input_vsizes = {address: selection.input_vsize_of(encoding) for address, encoding in input_encodings.items()}
     output_value = sum(i.value for i in outputs)
-    require_value = output_value + fee
-    ratio = 1
-    input_value = 0
-    utxos = ()
 
-    for times in range(4):  # ratio is 1, 1.1, 1.3, 1.7
-        utxos = utxo_manager.choose_utxos(
-            coin_code,
-            input_addresses,
-            require_value=int(require_value * ratio),
-            status=utxo_data.UTXOStatus.SPENDABLE,
-            min_value=dust_threshold,
+    utxos, result = utxo_manager.select_utxos(
+        coin_code,
+        input_addresses,
+        output_value,
+        params,
+        input_vsizes,
+        min_value=dust_threshold,
+        max_unconfirmed_depth=settings.UTXO_CHAINING["max_unconfirmed_depth"],
+    )
+
+    if result is not None:
+        fee_breakdown = FeeBreakdown(
+            fee_price_per_unit=fee_price_per_unit,
+            long_term_fee_price_per_unit=long_term_fee_price_per_unit,
+            vsize=result.vsize,
+            inputs_vsize=sum(input_vsizes[i.address] for i in utxos),
+            change_output_vsize=params.change_output_vsize if result.change else 0,
+            fee=result.fee,
+            change=result.change,
+            waste=result.waste,
+            algorithm=result.algorithm,
+        )
+    else:
+        # Insufficient, the output value is cut down by generate_unsigned_tx
+        inputs_vsize = sum(input_vsizes[i.address] for i in utxos)
+        vsize = params.not_input_vsize + inputs_vsize
+        fee_breakdown = FeeBreakdown(
+            fee_price_per_unit=fee_price_per_unit,
+            long_term_fee_price_per_unit=long_term_fee_price_per_unit,
+            vsize=vsize,
+            inputs_vsize=inputs_vsize,
+            change_output_vsize=0,
+            fee=vsize * fee_price_per_unit,
+            change=0,
         )
-        ratio += (1 << times) / 10
 
-        sum_of_utxos = sum(i.value for i in utxos)
-        if sum_of_utxos <= input_value:  # Can't find more UTXOs
-            break
+    logger.debug(f"UTXOs chosen. count: {len(utxos)}, fee_breakdown: {fee_breakdown}")
+    return utxos, fee_breakdown
 
-        input_value = sum_of_utxos
-        change = max(input_value - require_value, 0)
-        unsigned_tx = _build_unsigned_tx(
-            chain_info, utxos, change, outputs, change_output_placeholder, fee_price_per_unit, fee_limit, payload
-        )
-        unsigned_tx = provider_manager.fill_unsigned_tx(chain_code, unsigned_tx)
-        fee_limit, fee_price_per_unit = unsigned_tx.fee_limit, unsigned_tx.fee_price_per_unit
-        fee = fee_limit * fee_price_per_unit
-        require_value = output_value + fee
-        if input_value >= require_value:
-            break
-
-    return utxos, fee_price_per_unit, fee_limit
+
+def _encoding_of(chain_code: str, address: str) -> str:
+    address_validation = provider_manager.verify_address(chain_code, address)
+    if not address_validation.is_valid:
+        raise Exception(f"Invalid address: {repr(address)}")
+
+    return address_validation.encoding
 
 
 def _build_unsigned_tx(
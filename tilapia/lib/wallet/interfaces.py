@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Any, Optional
 
 from tilapia.lib.provider import data
 
@@ -18,3 +18,13 @@ class ChainModelInterface(ABC):
         payload: Optional[dict] = None,
     ) -> data.UnsignedTx:
         pass
+
+    @abstractmethod
+    def generate_replacement_tx(self, wallet_id: int, action: Any, fee_multiplier: float) -> data.UnsignedTx:
+        """
+        Generate the tx replacing the pending one with a higher fee
+        :param wallet_id: the wallet sent the pending tx
+        :param action: the main TxAction of the pending tx
+        :param fee_multiplier: multiplier to the fee price of the pending tx, greater than 1
+        :return: UnsignedTx
+        """
@@ -1,13 +1,13 @@
 import collections
+import concurrent.futures
 import contextlib
 import datetime
 import decimal
 import functools
 import itertools
 import logging
-from typing import Iterable, List, Tuple, Union
-
-import eth_account
+import uuid
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
 from tilapia.lib.basic import bip44
 from tilapia.lib.basic.functional.require import require
@@ -16,18 +16,26 @@ from tilapia.lib.basic.orm import database as orm_database
 from tilapia.lib.coin import codes
 from tilapia.lib.coin import data as coin_data
 from tilapia.lib.coin import manager as coin_manager
+from tilapia.lib.conf import settings
 from tilapia.lib.hardware import manager as hardware_manager
 from tilapia.lib.provider import data as provider_data
 from tilapia.lib.provider import manager as provider_manager
 from tilapia.lib.secret import data as secret_data
+from tilapia.lib.secret import executor as secret_executor
 from tilapia.lib.secret import manager as secret_manager
+from tilapia.lib.secret import session as secret_session
+from tilapia.lib.throttle import manager as throttle_manager
 from tilapia.lib.transaction import data as transaction_data
 from tilapia.lib.transaction import manager as transaction_manager
+from tilapia.lib.utxo import consolidation as utxo_consolidation
 from tilapia.lib.utxo import manager as utxo_manager
 from tilapia.lib.wallet import daos, data, exceptions, handlers, models, utils
 
 logger = logging.getLogger("app.wallet")
 
+# Choose again if the utxos chosen are taken by the concurrent sendings
+UTXO_RESERVATION_ATTEMPTS = 3
+
 
 def has_primary_wallet() -> bool:
     return daos.wallet.has_primary_wallet()
@@ -66,7 +74,11 @@ def _create_default_wallet(
     pubkey_id: int = None,
     bip44_path: str = None,
     hardware_key_id: str = None,
+    password: str = None,
 ) -> dict:
+    """
+    :param password: of the software wallet, then the signer of the account is added to its live signing sessions
+    """
     if hardware_key_id is not None:
         require(data.WalletType.is_hardware_wallet(wallet_type))
 
@@ -81,6 +93,10 @@ def _create_default_wallet(
             address_encoding=address_encoding,
         )
         asset = daos.asset.create_asset(wallet.id, account.id, chain_code, chain_code)
+        # Then the block scanner picks up its txs, see transaction_manager.scan_blocks
+        orm_database.db.on_commit(functools.partial(transaction_manager.watch_addresses, chain_code, [address]))
+        if password and pubkey_id is not None:
+            orm_database.db.on_commit(functools.partial(_add_signers_to_sessions, wallet.id, [pubkey_id], password))
 
     return _build_wallet_info(wallet, account, [asset])
 
@@ -126,6 +142,7 @@ def import_standalone_wallet_by_prvkey(
             address,
             pubkey_id=pubkey_model.id,
             address_encoding=address_encoding,
+            password=password,
         )
 
     return wallet_info
@@ -179,6 +196,7 @@ def import_standalone_wallet_by_mnemonic(
             address_encoding=address_encoding,
             pubkey_id=pubkey_model.id,
             bip44_path=bip44_path,
+            password=password,
         )
 
     return wallet_info
@@ -195,11 +213,15 @@ def create_primary_wallets(
     master_seed = secret_manager.mnemonic_to_seed(mnemonic, passphrase)
     default_wallets = []
 
-    for chain_code in chain_codes:
-        chain_info = coin_manager.get_chain_info(chain_code)
+    chain_infos = [coin_manager.get_chain_info(i) for i in chain_codes]
+    paths = [
+        get_default_bip44_path(chain_code, chain_info.default_address_encoding).to_bip44_path()
+        for chain_code, chain_info in zip(chain_codes, chain_infos)
+    ]
+    verifiers = _derive_keys_by_curve(master_seed, [(i.curve, path) for i, path in zip(chain_infos, paths)])
+
+    for chain_code, chain_info, bip44_path, verifier in zip(chain_codes, chain_infos, paths, verifiers):
         address_encoding = chain_info.default_address_encoding
-        bip44_path = get_default_bip44_path(chain_code, address_encoding).to_bip44_path()
-        verifier = secret_manager.raw_create_key_by_master_seed(chain_info.curve, master_seed, path=bip44_path)
         address = provider_manager.pubkey_to_address(chain_code, verifier, encoding=address_encoding)
         default_wallets.append(
             {
@@ -231,10 +253,15 @@ def search_existing_wallets(
         candidates: List[dict] = []
 
         with timing_logger(f"search_existing_{chain_code}_wallets"):
-            for address_encoding, path in _generate_searching_bip44_address_paths(
-                chain_info, bip44_max_searching_address_index=bip44_max_searching_address_index
-            ):
-                verifier = secret_manager.raw_create_key_by_master_seed(chain_info.curve, master_seed, path)
+            searching_paths = list(
+                _generate_searching_bip44_address_paths(
+                    chain_info, bip44_max_searching_address_index=bip44_max_searching_address_index
+                )
+            )
+            verifiers = secret_manager.raw_create_keys_by_master_seed(
+                chain_info.curve, master_seed, [path for _, path in searching_paths]
+            )
+            for (address_encoding, path), verifier in zip(searching_paths, verifiers):
                 address = provider_manager.pubkey_to_address(chain_code, verifier, encoding=address_encoding)
                 candidates.append(
                     {
@@ -272,6 +299,23 @@ def search_existing_wallets(
     return result
 
 
+def _derive_keys_by_curve(master_seed: bytes, curves_and_paths: List[Tuple[int, str]]) -> list:
+    """
+    Derive the keys of the same curve in one job, in the same order of curves_and_paths
+    """
+    positions_of_curve = {}
+    for position, (curve, _) in enumerate(curves_and_paths):
+        positions_of_curve.setdefault(curve, []).append(position)
+
+    keys = [None] * len(curves_and_paths)
+    for curve, positions in positions_of_curve.items():
+        paths = [curves_and_paths[i][1] for i in positions]
+        for position, key in zip(positions, secret_manager.raw_create_keys_by_master_seed(curve, master_seed, paths)):
+            keys[position] = key
+
+    return keys
+
+
 def _generate_searching_bip44_address_paths(
     chain_info: coin_data.ChainInfo, bip44_account: int = 0, bip44_max_searching_address_index: int = 20
 ) -> Iterable[Union[str, str]]:
@@ -311,9 +355,12 @@ def create_selected_primary_wallets(
 
     for chain_code, group in itertools.groupby(selected_wallets, lambda i: i["chain_code"]):
         chain_info = coin_manager.get_chain_info(chain_code)
+        group = list(group)
+        verifiers = secret_manager.raw_create_keys_by_master_seed(
+            chain_info.curve, master_seed, [i["bip44_path"] for i in group]
+        )
 
-        for wallet in group:
-            verifier = secret_manager.raw_create_key_by_master_seed(chain_info.curve, master_seed, wallet["bip44_path"])
+        for wallet, verifier in zip(group, verifiers):
             address = provider_manager.pubkey_to_address(chain_code, verifier, encoding=wallet["address_encoding"])
             if address == wallet["address"]:
                 to_be_created_wallets.append(
@@ -343,6 +390,7 @@ def create_selected_primary_wallets(
                     address_encoding=wallet["address_encoding"],
                     pubkey_id=pubkey_model.id,
                     bip44_path=pubkey_model.path,
+                    password=password,
                 )
 
                 created_wallets.append(wallet_info)
@@ -368,6 +416,9 @@ def update_wallet_password(wallet_id: int, old_password: str, new_password: str)
     secret_key_id = _get_wallet_secret_key_id(wallet_id)
     secret_manager.update_secret_key_password(secret_key_id, old_password, new_password)
 
+    if old_password != new_password:
+        secret_session.close_sessions_by_owner(_session_owner_of_wallet(wallet_id))
+
 
 def check_wallet_password(wallet_id: int, password: str):
     update_wallet_password(
@@ -375,6 +426,36 @@ def check_wallet_password(wallet_id: int, password: str):
     )  # todo separate check_wallet_password from update_wallet_password
 
 
+def _session_owner_of_wallet(wallet_id: int) -> str:
+    return f"wallet:{wallet_id}"
+
+
+def _add_signers_to_sessions(wallet_id: int, pubkey_ids: List[int], password: str):
+    secret_session.add_signers(
+        _session_owner_of_wallet(wallet_id), lambda: secret_manager.get_signers(password, pubkey_ids)
+    )
+
+
+def unlock(wallet_id: int, password: str, ttl: int = secret_session.DEFAULT_TTL) -> str:
+    wallet = _get_wallet_by_id(wallet_id)
+    require(
+        data.WalletType.is_software_wallet(wallet.type),
+        exceptions.IllegalWalletOperation("Only software wallet can be unlocked"),
+    )
+    require(password, exceptions.IllegalWalletOperation("Require password"))
+
+    accounts = daos.account.query_accounts_by_wallets([wallet_id])
+    pubkey_ids = list({i.pubkey_id for i in accounts if i.pubkey_id is not None})
+    require(pubkey_ids, exceptions.IllegalWalletState("No signable account found"))
+
+    signers = secret_manager.get_signers(password, pubkey_ids)
+    return secret_session.open_session(_session_owner_of_wallet(wallet_id), signers, ttl=ttl)
+
+
+def lock(wallet_id: int, session_token: str) -> bool:
+    return secret_session.close_session(session_token, owner=_session_owner_of_wallet(wallet_id))
+
+
 def _get_wallet_secret_key_id(wallet_id: int) -> int:
     account = daos.account.query_first_account_by_wallet(wallet_id)
     require(account is not None)
@@ -416,6 +497,7 @@ def create_next_derived_primary_wallet(chain_code: str, name: str, password: str
             address_encoding=address_encoding,
             pubkey_id=pubkey_model.id,
             bip44_path=pubkey_model.path,
+            password=password,
         )
 
     return wallet_info
@@ -488,7 +570,7 @@ def export_prvkey(wallet_id: int, password: str) -> str:
 
 def export_keystore(wallet_id: int, password: str) -> dict:
     prvk = export_prvkey(wallet_id, password)
-    encrypted_private_key = eth_account.Account.encrypt(prvk, password)
+    encrypted_private_key = secret_executor.encrypt_eth_keystore(bytes.fromhex(prvk), password)
     return encrypted_private_key
 
 
@@ -633,20 +715,10 @@ def send(
     fee_price_per_unit: int = None,
     payload: dict = None,
     auto_broadcast: bool = True,
+    session_token: str = None,
 ) -> provider_data.SignedTx:
     wallet = _get_wallet_by_id(wallet_id)
-    wallet_type = wallet.type
-
-    if data.WalletType.is_watchonly_wallet(wallet_type):
-        raise exceptions.IllegalWalletOperation("Watchonly wallet can not send asset")
-    elif data.WalletType.is_software_wallet(wallet_type):
-        require(password, exceptions.IllegalWalletOperation("Require password"))
-    elif data.WalletType.is_hardware_wallet(wallet_type):
-        require(hardware_device_path, exceptions.IllegalWalletOperation("Require hardware_device_path"))
-        hardware_key_id = hardware_manager.get_key_id(hardware_device_path)
-        require(hardware_key_id == wallet.hardware_key_id, exceptions.IllegalWalletOperation("Device mismatch"))
-    else:
-        raise ValueError(f"Illegal wallet_type: {wallet_type}")
+    _require_signing_credentials(wallet, password, hardware_device_path, session_token)
 
     coin_info = coin_manager.get_coin_info(coin_code)
     if coin_info.chain_code != wallet.chain_code:
@@ -663,27 +735,34 @@ def send(
     if not value or value < 0:
         raise exceptions.IllegalWalletOperation(f"Invalid value: {repr(value)}")
 
-    unsigned_tx = handler.generate_unsigned_tx(
-        wallet_id, coin_code, to_address, value, nonce, fee_limit, fee_price_per_unit, payload
-    )
-    is_valid, validation_message = _verify_unsigned_tx(wallet_id, coin_code, unsigned_tx)
-    if not is_valid:
-        raise exceptions.IllegalUnsignedTx(validation_message)
-
-    accounts = daos.account.query_accounts_by_addresses(wallet.id, [i.address for i in unsigned_tx.inputs])
-    if data.WalletType.is_software_wallet(wallet_type):
-        signed_tx = _sign_tx_by_software_wallet(wallet, accounts, password, unsigned_tx)
-    elif data.WalletType.is_hardware_wallet(wallet_type):
-        signed_tx = _sign_tx_by_hardware_wallet(wallet, accounts, hardware_device_path, unsigned_tx)
+    reservation_owner = uuid.uuid4().hex
+    for _ in range(UTXO_RESERVATION_ATTEMPTS):
+        unsigned_tx = handler.generate_unsigned_tx(
+            wallet_id, coin_code, to_address, value, nonce, fee_limit, fee_price_per_unit, payload
+        )
+        if _reserve_utxos_of_tx(chain_info, unsigned_tx, reservation_owner):
+            break
     else:
-        raise NotImplementedError("Should not be here")
+        raise exceptions.IllegalWalletOperation("UTXOs are taken by the other sendings, please retry later")
 
-    if auto_broadcast:
-        receipt = broadcast_transaction(wallet.chain_code, signed_tx)
-        if not receipt.is_success:
-            raise exceptions.UnexpectedBroadcastReceipt(
-                f"Error in broadcast. txid: {receipt.txid}, signed_tx: {signed_tx.to_dict()}"
-            )
+    try:
+        is_valid, validation_message = _verify_unsigned_tx(wallet_id, coin_code, unsigned_tx)
+        if not is_valid:
+            raise exceptions.IllegalUnsignedTx(validation_message)
+
+        accounts = daos.account.query_accounts_by_addresses(wallet.id, [i.address for i in unsigned_tx.inputs])
+        signed_tx = _sign_tx(wallet, accounts, unsigned_tx, password, hardware_device_path, session_token)
+
+        if auto_broadcast:
+            receipt = broadcast_transaction(wallet.chain_code, signed_tx)
+            if not receipt.is_success:
+                raise exceptions.UnexpectedBroadcastReceipt(
+                    f"Error in broadcast. txid: {receipt.txid}, signed_tx: {signed_tx.to_dict()}"
+                )
+    except Exception:
+        if chain_info.chain_model == coin_data.ChainModel.UTXO:
+            utxo_manager.release_utxos(reservation_owner)
+        raise
 
     with orm_database.db.atomic():
         transaction_manager.create_action(
@@ -701,15 +780,272 @@ def send(
             nonce=-1 if unsigned_tx.nonce is None else unsigned_tx.nonce,
             raw_tx=signed_tx.raw_tx,
         )
+        if chain_info.chain_model == coin_data.ChainModel.UTXO:
+            utxo_ids = utxo_manager.commit_reserved_utxos(chain_info.chain_code, reservation_owner, signed_tx.txid)
+            auto_broadcast and _create_unconfirmed_change(chain_info.chain_code, unsigned_tx, signed_tx.txid, utxo_ids)
+
+    return signed_tx
+
+
+def _create_unconfirmed_change(
+    chain_code: str, unsigned_tx: provider_data.UnsignedTx, txid: str, spent_utxo_ids: List[int]
+):
+    """
+    Then the change of the tx just broadcast is spendable by the next sendings before confirmed, see UTXO_CHAINING
+    """
+    if settings.UTXO_CHAINING["max_unconfirmed_depth"] <= 0:
+        return
+
+    outputs = [
+        (output.address, vout, output.value)
+        for vout, output in enumerate(unsigned_tx.outputs)  # The outputs are kept in order by the signing
+        if output.payload.get("is_change")
+    ]
+    utxo_manager.create_unconfirmed_utxos(chain_code, txid, outputs, spent_utxo_ids)
+
+
+def _reserve_utxos_of_tx(chain_info: coin_data.ChainInfo, unsigned_tx: provider_data.UnsignedTx, owner: str) -> bool:
+    if chain_info.chain_model != coin_data.ChainModel.UTXO or not unsigned_tx.inputs:
+        return True
+
+    return utxo_manager.reserve_utxos(
+        chain_info.chain_code, owner, [(i.utxo.txid, i.utxo.vout) for i in unsigned_tx.inputs if i.utxo]
+    )
+
+
+def speed_up(
+    wallet_id: int,
+    txid: str,
+    fee_multiplier: float = 1.5,
+    password: str = None,
+    hardware_device_path: str = None,
+    session_token: str = None,
+) -> provider_data.SignedTx:
+    """
+    Replace the stuck tx by the one paying a higher fee, as BIP125 on the utxo chains
+    or at the same nonce on the account chains, then the stuck one is marked as replaced and won't be polled anymore
+    """
+    wallet = _get_wallet_by_id(wallet_id)
+    _require_signing_credentials(wallet, password, hardware_device_path, session_token)
+    require(fee_multiplier > 1, exceptions.IllegalWalletOperation(f"Invalid fee_multiplier: {repr(fee_multiplier)}"))
+
+    chain_code = wallet.chain_code
+    chain_info = coin_manager.get_chain_info(chain_code)
+    require(
+        chain_info.chain_model != coin_data.ChainModel.UTXO or chain_info.rbf_supported,
+        exceptions.IllegalWalletOperation(f"Replace-by-fee isn't supported on {chain_code}"),
+    )
+    actions = transaction_manager.query_actions_by_txid(chain_code, txid)
+    main_action = actions[0] if actions else None
+    require(
+        main_action is not None and main_action.status == transaction_data.TxActionStatus.PENDING,
+        exceptions.IllegalWalletOperation(f"Only the pending tx can be sped up. txid: {txid}"),
+    )
+    default_account = get_default_account_by_wallet(wallet_id)
+    require(
+        main_action.from_address == default_account.address,
+        exceptions.IllegalWalletOperation(f"The tx isn't sent by the wallet. txid: {txid}"),
+    )
+
+    handler = handlers.get_handler_by_chain_model(chain_info.chain_model)
+    unsigned_tx = handler.generate_replacement_tx(wallet_id, main_action, fee_multiplier)
+    is_valid, validation_message = _verify_unsigned_tx(wallet_id, main_action.coin_code, unsigned_tx)
+    if not is_valid:
+        raise exceptions.IllegalUnsignedTx(validation_message)
+
+    accounts = daos.account.query_accounts_by_addresses(wallet.id, [i.address for i in unsigned_tx.inputs])
+    signed_tx = _sign_tx(wallet, accounts, unsigned_tx, password, hardware_device_path, session_token)
+
+    receipt = broadcast_transaction(chain_code, signed_tx)
+    if not receipt.is_success:
+        raise exceptions.UnexpectedBroadcastReceipt(
+            f"Error in broadcast. txid: {receipt.txid}, signed_tx: {signed_tx.to_dict()}"
+        )
+
+    with orm_database.db.atomic():
+        transaction_manager.create_action(
+            txid=signed_tx.txid,
+            status=transaction_data.TxActionStatus.PENDING,
+            chain_code=chain_code,
+            coin_code=main_action.coin_code,
+            value=main_action.value,
+            from_address=main_action.from_address,
+            to_address=main_action.to_address,
+            fee_limit=decimal.Decimal(unsigned_tx.fee_limit),
+            fee_price_per_unit=unsigned_tx.fee_price_per_unit,
+            nonce=-1 if unsigned_tx.nonce is None else unsigned_tx.nonce,
+            raw_tx=signed_tx.raw_tx,
+        )
+        transaction_manager.mark_actions_replaced(chain_code, txid, signed_tx.txid)
         if chain_info.chain_model == coin_data.ChainModel.UTXO:
             utxo_ids = utxo_manager.query_utxo_ids_by_txid_vout_tuples(
-                chain_info.chain_code, [(i.utxo.txid, i.utxo.vout) for i in unsigned_tx.inputs]
+                chain_code, [(i.utxo.txid, i.utxo.vout) for i in unsigned_tx.inputs]
             )
-            utxo_manager.mark_utxos_chosen_by_txid(chain_info.chain_code, signed_tx.txid, utxo_ids)
+            utxo_manager.mark_utxos_chosen_by_txid(chain_code, signed_tx.txid, utxo_ids)
+            _create_unconfirmed_change(chain_code, unsigned_tx, signed_tx.txid, utxo_ids)
 
     return signed_tx
 
 
+def consolidate_utxos(
+    wallet_id: int,
+    max_fee_price_per_unit: int,
+    dry_run: bool = True,
+    max_value: int = None,
+    max_tx_vsize: int = None,
+    max_fee: int = None,
+    max_batches: int = None,
+    password: str = None,
+    hardware_device_path: str = None,
+    session_token: str = None,
+) -> dict:
+    """
+    Merge the small utxos of the wallet into its own address, then the later sendings spend fewer inputs.
+    The batches are sent only in the low-fee window,
+    when the slowest fee price of the estimator isn't greater than max_fee_price_per_unit,
+    so it is expected to be called periodically, and the dry run shows what would be done.
+    :param max_fee_price_per_unit: ceiling of the fee price, the window is closed beyond it
+    :param max_value: the utxos not lower than it are kept as they are
+    :param max_tx_vsize: vsize limit of each batch, see utxo.consolidation.MAX_TX_VSIZE
+    :param max_fee: fee limit of each batch
+    :return: the plan with the projected saving of the future fee, and the txids if sent
+    """
+    wallet = _get_wallet_by_id(wallet_id)
+    if not dry_run:
+        _require_signing_credentials(wallet, password, hardware_device_path, session_token)
+
+    chain_info = coin_manager.get_chain_info(wallet.chain_code)
+    require(
+        chain_info.chain_model == coin_data.ChainModel.UTXO,
+        exceptions.IllegalWalletOperation("Only the utxos can be consolidated"),
+    )
+
+    handler = handlers.get_handler_by_chain_model(chain_info.chain_model)
+    plan = handler.plan_consolidation(
+        wallet_id,
+        chain_info.chain_code,
+        max_value=max_value,
+        max_tx_vsize=max_tx_vsize or utxo_consolidation.MAX_TX_VSIZE,
+        max_fee=max_fee,
+        max_batches=max_batches,
+    )
+    is_low_fee_window = plan.fee_price_per_unit <= max_fee_price_per_unit
+    txids = [None] * len(plan.batches)
+
+    if not dry_run and is_low_fee_window:
+        for index, (utxos, batch) in enumerate(plan.batches):
+            unsigned_tx = handler.generate_consolidation_tx(wallet_id, utxos, batch, plan.fee_price_per_unit)
+            signed_tx = _send_consolidation_tx(
+                wallet, chain_info, unsigned_tx, password, hardware_device_path, session_token
+            )
+            txids[index] = signed_tx.txid if signed_tx is not None else None
+
+    return {
+        "fee_price_per_unit": plan.fee_price_per_unit,
+        "long_term_fee_price_per_unit": plan.long_term_fee_price_per_unit,
+        "is_low_fee_window": is_low_fee_window,
+        "utxo_count": plan.utxo_count,
+        "utxo_count_after": plan.utxo_count - sum(len(utxos) - 1 for utxos, _ in plan.batches),
+        "total_fee": sum(batch.fee for _, batch in plan.batches),
+        "projected_saving": sum(batch.saving for _, batch in plan.batches),
+        "batches": [
+            {
+                "input_count": len(utxos),
+                "input_value": batch.input_value,
+                "vsize": batch.vsize,
+                "fee": batch.fee,
+                "output_value": batch.output_value,
+                "saving": batch.saving,
+                "txid": txid,
+            }
+            for (utxos, batch), txid in zip(plan.batches, txids)
+        ],
+    }
+
+
+def _send_consolidation_tx(
+    wallet: models.WalletModel,
+    chain_info: coin_data.ChainInfo,
+    unsigned_tx: provider_data.UnsignedTx,
+    password: str = None,
+    hardware_device_path: str = None,
+    session_token: str = None,
+) -> Optional[provider_data.SignedTx]:
+    reservation_owner = uuid.uuid4().hex
+    if not _reserve_utxos_of_tx(chain_info, unsigned_tx, reservation_owner):
+        logger.info(f"UTXOs of the consolidation are taken by the other sendings. wallet_id: {wallet.id}")
+        return None
+
+    try:
+        is_valid, validation_message = _verify_unsigned_tx(wallet.id, chain_info.chain_code, unsigned_tx)
+        if not is_valid:
+            raise exceptions.IllegalUnsignedTx(validation_message)
+
+        accounts = daos.account.query_accounts_by_addresses(wallet.id, [i.address for i in unsigned_tx.inputs])
+        signed_tx = _sign_tx(wallet, accounts, unsigned_tx, password, hardware_device_path, session_token)
+
+        receipt = broadcast_transaction(chain_info.chain_code, signed_tx)
+        if not receipt.is_success:
+            raise exceptions.UnexpectedBroadcastReceipt(
+                f"Error in broadcast. txid: {receipt.txid}, signed_tx: {signed_tx.to_dict()}"
+            )
+    except Exception:
+        utxo_manager.release_utxos(reservation_owner)
+        raise
+
+    with orm_database.db.atomic():
+        transaction_manager.create_action(
+            txid=signed_tx.txid,
+            status=transaction_data.TxActionStatus.PENDING,
+            chain_code=chain_info.chain_code,
+            coin_code=chain_info.chain_code,
+            value=decimal.Decimal(sum(i.value for i in unsigned_tx.outputs)),
+            from_address=accounts[0].address,
+            to_address=unsigned_tx.outputs[0].address,
+            fee_limit=decimal.Decimal(unsigned_tx.fee_limit),
+            fee_price_per_unit=unsigned_tx.fee_price_per_unit,
+            nonce=-1,
+            raw_tx=signed_tx.raw_tx,
+        )
+        utxo_ids = utxo_manager.commit_reserved_utxos(chain_info.chain_code, reservation_owner, signed_tx.txid)
+        _create_unconfirmed_change(chain_info.chain_code, unsigned_tx, signed_tx.txid, utxo_ids)
+
+    return signed_tx
+
+
+def _require_signing_credentials(
+    wallet: models.WalletModel, password: str = None, hardware_device_path: str = None, session_token: str = None
+):
+    wallet_type = wallet.type
+
+    if data.WalletType.is_watchonly_wallet(wallet_type):
+        raise exceptions.IllegalWalletOperation("Watchonly wallet can not send asset")
+    elif data.WalletType.is_software_wallet(wallet_type):
+        require(password or session_token, exceptions.IllegalWalletOperation("Require password or session_token"))
+    elif data.WalletType.is_hardware_wallet(wallet_type):
+        require(hardware_device_path, exceptions.IllegalWalletOperation("Require hardware_device_path"))
+        hardware_key_id = hardware_manager.get_key_id(hardware_device_path)
+        require(hardware_key_id == wallet.hardware_key_id, exceptions.IllegalWalletOperation("Device mismatch"))
+    else:
+        raise ValueError(f"Illegal wallet_type: {wallet_type}")
+
+
+def _sign_tx(
+    wallet: models.WalletModel,
+    accounts: List[models.AccountModel],
+    unsigned_tx: provider_data.UnsignedTx,
+    password: str = None,
+    hardware_device_path: str = None,
+    session_token: str = None,
+) -> provider_data.SignedTx:
+    if data.WalletType.is_software_wallet(wallet.type):
+        return _sign_tx_by_software_wallet(wallet, accounts, password, unsigned_tx, session_token=session_token)
+    elif data.WalletType.is_hardware_wallet(wallet.type):
+        return _sign_tx_by_hardware_wallet(wallet, accounts, hardware_device_path, unsigned_tx)
+    else:
+        raise NotImplementedError("Should not be here")
+
+
 def _verify_unsigned_tx(wallet_id: int, coin_code: str, unsigned_tx: provider_data.UnsignedTx) -> Tuple[bool, str]:
     wallet = _get_wallet_by_id(wallet_id)
 
@@ -757,12 +1093,29 @@ def _sign_tx_by_software_wallet(
     accounts: List[models.AccountModel],
     password: str,
     unsigned_tx: provider_data.UnsignedTx,
+    session_token: str = None,
 ) -> provider_data.SignedTx:
-    key_mapping = {i.address: secret_manager.get_signer(password, i.pubkey_id) for i in accounts}
-    signed_tx = provider_manager.sign_transaction(wallet.chain_code, unsigned_tx, key_mapping)
+    with _use_software_signers(wallet.id, [i.pubkey_id for i in accounts], password, session_token) as signers:
+        key_mapping = {i.address: signers[i.pubkey_id] for i in accounts}
+        signed_tx = provider_manager.sign_transaction(wallet.chain_code, unsigned_tx, key_mapping)
+
     return signed_tx
 
 
+@contextlib.contextmanager
+def _use_software_signers(
+    wallet_id: int, pubkey_ids: List[int], password: str = None, session_token: str = None
+) -> Iterator[dict]:
+    """
+    The signers of the session are held until the signing is done, then never zeroized by locking meanwhile
+    """
+    if session_token:
+        with secret_session.use_signers(session_token, _session_owner_of_wallet(wallet_id), pubkey_ids) as signers:
+            yield signers
+    else:
+        yield {i: secret_manager.get_signer(password, i) for i in pubkey_ids}
+
+
 def _sign_tx_by_hardware_wallet(
     wallet: models.WalletModel,
     accounts: List[models.AccountModel],
@@ -798,6 +1151,78 @@ def broadcast_transaction(chain_code: str, signed_tx: provider_data.SignedTx) ->
     return receipt
 
 
+def query_history(
+    wallet_id: int,
+    coin_code: str,
+    page_cursor: str = None,
+    items_per_page: int = 20,
+    searching_address_as: str = "both",
+    include_raw_tx: bool = False,
+) -> dict:
+    default_account = get_default_account_by_wallet(wallet_id)
+    coin_info = coin_manager.get_coin_info(coin_code)
+    require(coin_info.chain_code == default_account.chain_code, "Chain code mismatched")
+
+    actions = transaction_manager.query_actions_by_address(
+        default_account.chain_code,
+        coin_code,
+        default_account.address,
+        items_per_page=items_per_page,
+        searching_address_as=searching_address_as,
+        page_cursor=page_cursor,
+    )
+    next_page_cursor = (
+        transaction_manager.encode_page_cursor(actions[-1]) if actions and len(actions) >= items_per_page else None
+    )
+    items = [
+        {
+            "txid": i.txid,
+            "status": transaction_data.TxActionStatus(i.status).name,
+            "coin_code": i.coin_code,
+            "value": i.value,
+            "from_address": i.from_address,
+            "to_address": i.to_address,
+            "fee_limit": i.fee_limit,
+            "fee_used": i.fee_used,
+            "fee_price_per_unit": i.fee_price_per_unit,
+            "block_number": i.block_number,
+            "block_hash": i.block_hash,
+            "block_time": i.block_time,
+            "nonce": i.nonce,
+            "created_time": int(i.created_time.timestamp()),
+        }
+        for i in actions
+    ]
+
+    if include_raw_tx:
+        raw_txs = transaction_manager.query_raw_txs(default_account.chain_code, {i.txid for i in actions})
+        for item in items:
+            item["raw_tx"] = raw_txs.get(item["txid"], "")
+
+    return {"items": items, "next_page_cursor": next_page_cursor}
+
+
+def export_history(
+    wallet_id: int,
+    coin_code: str,
+    searching_address_as: str = "both",
+    file_format: str = "ndjson",
+    fiat_unit: str = "usd",
+) -> Iterator[bytes]:
+    default_account = get_default_account_by_wallet(wallet_id)
+    coin_info = coin_manager.get_coin_info(coin_code)
+    require(coin_info.chain_code == default_account.chain_code, "Chain code mismatched")
+
+    return transaction_manager.export_actions_by_address(
+        default_account.chain_code,
+        default_account.address,
+        coin_code=coin_code,
+        searching_address_as=searching_address_as,
+        file_format=file_format,
+        fiat_unit=fiat_unit,
+    )
+
+
 def create_or_show_asset(wallet_id: int, coin_code: str):
     coin_info = coin_manager.get_coin_info(coin_code)  # Check coin existing only
     default_account = get_default_account_by_wallet(wallet_id)
@@ -827,11 +1252,18 @@ def refresh_assets(
     need_update_flag_datetime = datetime.datetime.now() - datetime.timedelta(seconds=cache_in_seconds)
     need_update_assets = assets if force_update else [i for i in assets if i.modified_time < need_update_flag_datetime]
 
+    # The ones being refreshed by the other workers are skipped
+    throttle_keys = {throttle_manager.key_of("balance_refresh", i.id): i for i in need_update_assets}
+    acquired_keys = throttle_manager.acquire(list(throttle_keys), cache_in_seconds, force=force_update)
+    need_update_assets = [throttle_keys[i] for i in acquired_keys]
+
     if not need_update_assets:
         return assets
 
     accounts = daos.account.query_accounts_by_ids([i.account_id for i in need_update_assets])
     accounts_lookup = {i.id: i for i in accounts}
+    for account in accounts:  # Watched again after the process restarted
+        transaction_manager.watch_addresses(account.chain_code, [account.address])
     coins = coin_manager.query_coins_by_codes([i.coin_code for i in need_update_assets])
     coins_lookup = {i.code: i for i in coins}
 
@@ -847,6 +1279,7 @@ def refresh_assets(
                     asset.balance = decimal.Decimal(balance)
                     updated_assets.append(asset)
                 except Exception as e:
+                    throttle_manager.release([throttle_manager.key_of("balance_refresh", asset.id)])
                     logger.exception(
                         f"Error in get balance by asset. chain_code: {chain_code}, coin_code: {asset.coin_code}, "
                         f"account_id: {account_id}, error: {e}"
@@ -901,10 +1334,12 @@ def cascade_delete_wallet_related_models(wallet_id: int, password: str = None):
         secret_manager.cascade_delete_related_models_by_pubkey_ids(list(related_pubkey_ids))
 
     transaction_manager.delete_actions_by_addresses(chain_code, addresses)
+    transaction_manager.unwatch_addresses(chain_code, addresses)
     utxo_manager.delete_utxos_by_addresses(chain_code, addresses)
     daos.wallet.delete_wallet_by_id(wallet_id)
     daos.account.delete_accounts_by_wallet_id(wallet_id)
     daos.asset.delete_assets_by_wallet_id(wallet_id)
+    secret_session.close_sessions_by_owner(_session_owner_of_wallet(wallet_id))
 
 
 @_require_primary_wallet_exists()
@@ -1018,6 +1453,7 @@ def sign_message(
     message: str,
     password: str = None,
     hardware_device_path: str = None,
+    session_token: str = None,
 ) -> str:
     wallet = _get_wallet_by_id(wallet_id)
     account = get_default_account_by_wallet(wallet_id)
@@ -1026,10 +1462,11 @@ def sign_message(
     if data.WalletType.is_watchonly_wallet(wallet_type):
         raise exceptions.IllegalWalletOperation("Watchonly wallet can not sign message")
     elif data.WalletType.is_software_wallet(wallet_type):
-        require(password, exceptions.IllegalWalletOperation("Require password"))
-        return provider_manager.sign_message(
-            wallet.chain_code, message, secret_manager.get_signer(password, account.pubkey_id), address=account.address
-        )
+        require(password or session_token, exceptions.IllegalWalletOperation("Require password or session_token"))
+        with _use_software_signers(wallet_id, [account.pubkey_id], password, session_token) as signers:
+            return provider_manager.sign_message(
+                wallet.chain_code, message, signers[account.pubkey_id], address=account.address
+            )
     elif data.WalletType.is_hardware_wallet(wallet_type):
         require(hardware_device_path, exceptions.IllegalWalletOperation("Require hardware_device_path"))
         hardware_key_id = hardware_manager.get_key_id(hardware_device_path)
@@ -1052,6 +1489,58 @@ def verify_message(
         return provider_manager.verify_message(chain_code, address, message, signature)
 
 
+VERIFY_MESSAGES_CHUNK_SIZE = 100
+VERIFY_MESSAGES_MAX_WORKERS = 4
+VERIFY_MESSAGES_MAX_ITEMS = 1000  # Bounds the work of a single request
+
+
+def verify_messages(items: List[dict]) -> List[bool]:
+    """
+    Verify signatures of software wallets in batch
+    :param items: list of {"chain_code", "address", "message", "signature"}
+    :return: list of verification result, in the same order of items, False for the ones failed to verify
+    """
+    results = [False] * len(items)
+    indexes_of_chain = collections.defaultdict(list)
+    for index, item in enumerate(items):
+        indexes_of_chain[item["chain_code"]].append(index)
+
+    tasks = []
+    for chain_code, indexes in indexes_of_chain.items():
+        for i in range(0, len(indexes), VERIFY_MESSAGES_CHUNK_SIZE):
+            tasks.append((chain_code, indexes[i : i + VERIFY_MESSAGES_CHUNK_SIZE]))
+
+    def _verify_chunk(chain_code: str, indexes: List[int]) -> List[Tuple[int, bool]]:
+        chunk, verifying_indexes = [], []
+        for index in indexes:
+            item = items[index]
+            try:
+                address_validation = provider_manager.verify_address(chain_code, item["address"])
+            except Exception as e:
+                logger.warning(f"Error in verifying address. chain_code: {chain_code}, index: {index}, error: {e}")
+                continue
+
+            chunk.append((address_validation.normalized_address, item["message"], item["signature"]))
+            verifying_indexes.append(index)
+
+        return list(zip(verifying_indexes, provider_manager.verify_messages(chain_code, chunk))) if chunk else []
+
+    # ecdsa recovery releases the GIL when pycoin runs on the native backend
+    with concurrent.futures.ThreadPoolExecutor(max_workers=VERIFY_MESSAGES_MAX_WORKERS) as executor:
+        futures = {executor.submit(_verify_chunk, chain_code, indexes): chain_code for chain_code, indexes in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                verified = future.result()
+            except Exception as e:
+                logger.exception(f"Error in verifying messages. chain_code: {futures[future]}, error: {repr(e)}")
+                continue
+
+            for index, is_valid in verified:
+                results[index] = is_valid
+
+    return results
+
+
 def confirm_address_on_hardware(wallet_id: int, hardware_device_path: str) -> str:
     wallet = _get_wallet_by_id(wallet_id)
     require(data.WalletType.is_hardware_wallet(wallet.type))